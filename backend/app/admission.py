@@ -0,0 +1,173 @@
+"""
+Control de admisión y descarte de carga para el endpoint público de solicitudes
+
+- Token bucket por cliente en memoria: 429 + Retry-After al agotarse
+- Límite global de concurrencia ligado a la capacidad del pool de conexiones
+- Presupuesto de espera en cola: si no hay cupo en ADMISSION_QUEUE_TIMEOUT
+  segundos, o la cola ya está llena, 503 + Retry-After inmediato
+
+Las peticiones admitidas nunca esperan una conexión del pool, por lo que su
+latencia se mantiene estable aunque el tráfico exceda la capacidad.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from .config import settings
+
+MAX_CLIENTES = 100_000
+
+
+class TokenBucketLimiter:
+    """Token bucket por cliente; los buckets inactivos se desalojan por LRU"""
+
+    def __init__(self, rate: float, burst: int, max_clientes: int = MAX_CLIENTES):
+        self.rate = rate
+        self.burst = burst
+        self.max_clientes = max_clientes
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, cliente: str) -> float:
+        """
+        Consumir un token
+
+        Returns:
+            0 si se admite; si no, segundos hasta que haya un token disponible
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._buckets.get(cliente, (float(self.burst), ahora))
+            tokens = min(float(self.burst), tokens + (ahora - ultimo) * self.rate)
+            if tokens >= 1:
+                espera = 0.0
+                tokens -= 1
+            else:
+                espera = (1 - tokens) / self.rate if self.rate > 0 else 60.0
+            self._buckets[cliente] = (tokens, ahora)
+            self._buckets.move_to_end(cliente)
+            while len(self._buckets) > self.max_clientes:
+                self._buckets.popitem(last=False)
+        return espera
+
+
+class ConcurrencyLimiter:
+    """Semáforo con cola acotada y tiempo máximo de espera"""
+
+    def __init__(self, limite: int, max_cola: int, timeout: float):
+        self.limite = limite
+        self.max_cola = max_cola
+        self.timeout = timeout
+        self.en_cola = 0
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _semaforo_actual(self) -> asyncio.Semaphore:
+        # El semáforo pertenece a un event loop; se recrea si cambia (tests)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaforo = asyncio.Semaphore(self.limite)
+            self._loop = loop
+        return self._semaforo
+
+    async def adquirir(self) -> bool:
+        """Esperar un cupo dentro del presupuesto; False si hay que descartar"""
+        semaforo = self._semaforo_actual()
+        if not semaforo.locked():
+            await semaforo.acquire()
+            return True
+        if self.en_cola >= self.max_cola:
+            return False
+        self.en_cola += 1
+        try:
+            await asyncio.wait_for(semaforo.acquire(), timeout=self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.en_cola -= 1
+
+    def liberar(self) -> None:
+        self._semaforo.release()
+
+
+class AdmissionController:
+    """Combina el límite por cliente con el límite global de concurrencia"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_concurrencia: int,
+        max_cola: int,
+        queue_timeout: float,
+    ):
+        self.rate_limiter = TokenBucketLimiter(rate, burst)
+        self.concurrencia = ConcurrencyLimiter(max_concurrencia, max_cola, queue_timeout)
+
+    @asynccontextmanager
+    async def admitir(self, cliente: str):
+        espera = self.rate_limiter.consumir(cliente)
+        if espera > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Demasiadas solicitudes, intente más tarde",
+                headers={"Retry-After": str(math.ceil(espera))},
+            )
+        if not await self.concurrencia.adquirir():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio saturado, intente de nuevo en unos segundos",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            yield
+        finally:
+            self.concurrencia.liberar()
+
+
+def crear_controller() -> AdmissionController:
+    """Crear el controlador con la configuración de Settings"""
+    return AdmissionController(
+        rate=settings.ADMISSION_RATE_PER_SECOND,
+        burst=settings.ADMISSION_BURST,
+        max_concurrencia=settings.ADMISSION_MAX_CONCURRENCY or (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW),
+        max_cola=settings.ADMISSION_MAX_QUEUE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    )
+
+
+controller = crear_controller()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Dependency que retorna el controlador de admisión del proceso"""
+    return controller
+
+
+def identificar_cliente(request: Request) -> str:
+    """Identificador del cliente para el rate limit"""
+    if settings.ADMISSION_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # El último salto lo agrega nuestro proxy y no lo controla el cliente
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "desconocido"
+
+
+async def admitir_solicitud(
+    request: Request,
+    admission: AdmissionController = Depends(get_admission_controller)
+):
+    """Dependency que aplica el control de admisión durante la petición"""
+    if not settings.ADMISSION_ENABLED:
+        yield
+        return
+    async with admission.admitir(identificar_cliente(request)):
+        yield
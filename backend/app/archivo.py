@@ -0,0 +1,248 @@
+"""
+Archivado de solicitudes antiguas
+
+`solicitudes` no se depura nunca, así que sus índices y los agregados crecen
+mes a mes. Este trabajo mueve las solicitudes con fecha anterior al
+horizonte (ARCHIVO_HORIZONTE_DIAS) a `solicitudes_archivadas`:
+
+- En lotes de --lote filas, cada uno en su propia transacción: se leen las
+  más antiguas por (fecha_solicitud, id) con FOR UPDATE SKIP LOCKED, se
+  copian al archivo, se suman a resumen_archivado y se borran de la tabla
+  activa. Un lote no espera más de ARCHIVO_LOCK_TIMEOUT_MS por un bloqueo y
+  entre lotes se hace una pausa (--pausa) para no competir con las escrituras
+  de la API
+- resumen_archivado guarda los agregados al grano más fino de los segmentos
+  (sucursal, bandas de score y edad, plazo, tarjeta y crédito automotriz);
+  los indicadores y los segmentos suman ese resumen a lo que leen de la tabla
+  activa, así que sus totales no cambian al archivar. Si cambian las bandas
+  configuradas, el resumen se reconstruye desde el archivo en la siguiente
+  ejecución
+- GET /api/solicitudes/recientes consulta el archivo solo cuando el rango de
+  fechas pedido llega a lo archivado (estado_archivo.fecha_max)
+- Con un dataset Parquet configurado (PARQUET_DESTINO o --parquet-destino)
+  no se archivan solicitudes que la exportación (app/parquet_export.py) aún
+  no escribió, porque esta solo lee la tabla activa: ni por encima de su
+  marca ni de su primer hueco pendiente. Si la marca no se puede leer no se
+  archiva nada; --sin-parquet archiva sin consultarla
+- Con SHARD_DATABASE_URLS cada shard archiva sus propias solicitudes, con
+  la marca de su partición del dataset Parquet
+
+Los sketches de cuantiles leen ambas tablas, así que una reconstrucción
+sigue viendo todo el historial.
+
+Uso:
+    python -m app.archivo
+    python -m app.archivo --horizonte-dias 365 --lote 2000 --pausa 0.5 --parquet-destino /data/solicitudes
+    python -m app.archivo --sin-parquet   # sin exportación a Parquet aunque PARQUET_DESTINO esté configurado
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, TextIO
+
+from sqlalchemy import case, delete, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from . import models, segmentos, versiones
+from .config import settings
+
+COLUMNAS = tuple(c.name for c in models.SolicitudArchivada.__table__.columns)
+# Llave del grano fino de resumen_archivado
+LLAVE = ("sucursal_id", "score_banda", "edad_banda", "plazo_meses",
+         "tiene_tarjeta_credito", "tiene_credito_automotriz")
+METRICAS = ("total", "aprobadas", "monto", "monto_aprobado", "suma_score")
+
+
+def _sumar_resumen(conn: Connection, agregados: Dict[tuple, list]) -> None:
+    """Sumar agregados por llave a resumen_archivado (UPDATE y, si no existe, INSERT)"""
+    resumen = models.ResumenArchivado.__table__
+    for llave, valores in agregados.items():
+        condicion = [resumen.c[c].is_not_distinct_from(v) for c, v in zip(LLAVE, llave)]
+        actualizados = conn.execute(
+            update(resumen).where(*condicion).values(
+                {resumen.c[m]: resumen.c[m] + v for m, v in zip(METRICAS, valores)}
+            )
+        ).rowcount
+        if not actualizados:
+            conn.execute(insert(resumen).values(dict(zip(LLAVE + METRICAS, (*llave, *valores)))))
+
+
+def _agregar(agregados: Dict[tuple, list], fila) -> None:
+    acumulado = agregados[tuple(fila[c] for c in LLAVE)]
+    aprobado = fila["estado"] == "aprobado"
+    acumulado[0] += 1
+    acumulado[1] += int(aprobado)
+    acumulado[2] += fila["monto_solicitado"]
+    acumulado[3] += fila["monto_solicitado"] if aprobado else 0
+    acumulado[4] += fila["score_crediticio"]
+
+
+def _nuevos_agregados() -> Dict[tuple, list]:
+    return defaultdict(lambda: [0, 0, 0, 0, 0])
+
+
+def reconstruir_resumen(conn: Connection, cortes: Dict[str, List[int]]) -> None:
+    """Recalcular resumen_archivado desde solicitudes_archivadas con los cortes dados"""
+    base = segmentos._base(cortes, models.SolicitudArchivada)
+    conn.execute(delete(models.ResumenArchivado.__table__))
+    agregados = _nuevos_agregados()
+    consulta = select(
+        base.c.sucursal.label("sucursal_id"), base.c.score.label("score_banda"),
+        base.c.edad.label("edad_banda"), base.c.plazo.label("plazo_meses"),
+        base.c.tarjeta.label("tiene_tarjeta_credito"), base.c.automotriz.label("tiene_credito_automotriz"),
+        base.c.estado, base.c.monto_solicitado, base.c.score_crediticio,
+    )
+    for fila in conn.execute(consulta).mappings():
+        _agregar(agregados, fila)
+    _sumar_resumen(conn, agregados)
+
+
+def _estado(conn: Connection, cortes: Dict[str, List[int]]) -> None:
+    """Fila de estado_archivo; se crea o se pone al día con las bandas vigentes"""
+    tabla = models.EstadoArchivo.__table__
+    estado = conn.execute(select(tabla).where(tabla.c.nombre == segmentos.ARCHIVO)).first()
+    if estado is None:
+        conn.execute(insert(tabla).values(
+            nombre=segmentos.ARCHIVO, filas=0, cortes=json.dumps(cortes), actualizado=datetime.utcnow()
+        ))
+    elif json.loads(estado.cortes) != cortes:
+        reconstruir_resumen(conn, cortes)
+        conn.execute(update(tabla).where(tabla.c.nombre == segmentos.ARCHIVO).values(
+            cortes=json.dumps(cortes), actualizado=datetime.utcnow()
+        ))
+
+
+def _lote(conn: Connection, limite: datetime, lote: int, hasta_id: Optional[int], cortes) -> int:
+    """Mover un lote al archivo dentro de la transacción de `conn`"""
+    solicitud, cliente = models.Solicitud.__table__, models.Cliente.__table__
+    consulta = (
+        select(
+            *(solicitud.c[c] for c in COLUMNAS),
+            segmentos._banda(solicitud.c.score_crediticio, cortes["score"]).label("score_banda"),
+            segmentos._banda(cliente.c.edad, cortes["edad"]).label("edad_banda"),
+        )
+        .join(cliente, cliente.c.id == solicitud.c.cliente_id)
+        .where(solicitud.c.fecha_solicitud < limite)
+        .order_by(solicitud.c.fecha_solicitud, solicitud.c.id)
+        .limit(lote)
+        # Las filas que otra transacción tiene tomadas quedan para el siguiente lote
+        .with_for_update(skip_locked=True, of=solicitud)
+    )
+    if hasta_id is not None:
+        consulta = consulta.where(solicitud.c.id <= hasta_id)
+    filas = conn.execute(consulta).mappings().all()
+    if not filas:
+        return 0
+
+    conn.execute(insert(models.SolicitudArchivada.__table__), [{c: fila[c] for c in COLUMNAS} for fila in filas])
+    agregados = _nuevos_agregados()
+    for fila in filas:
+        _agregar(agregados, fila)
+    _sumar_resumen(conn, agregados)
+    conn.execute(delete(solicitud).where(solicitud.c.id.in_([fila["id"] for fila in filas])))
+
+    estado = models.EstadoArchivo.__table__
+    fecha_max = max(fila["fecha_solicitud"] for fila in filas)
+    conn.execute(update(estado).where(estado.c.nombre == segmentos.ARCHIVO).values(
+        filas=estado.c.filas + len(filas),
+        fecha_max=case(
+            (estado.c.fecha_max.is_(None) | (estado.c.fecha_max < fecha_max), fecha_max),
+            else_=estado.c.fecha_max,
+        ),
+        actualizado=datetime.utcnow(),
+    ))
+    # Los agregados no cambian, pero los listados y las exportaciones sí
+    versiones.incrementar(conn)
+    return len(filas)
+
+
+def archivar(
+    db_engine: Engine,
+    horizonte_dias: int = settings.ARCHIVO_HORIZONTE_DIAS,
+    lote: int = settings.ARCHIVO_LOTE,
+    pausa: float = settings.ARCHIVO_PAUSA,
+    hasta_id: Optional[int] = None,
+    progreso: Optional[TextIO] = None,
+) -> dict:
+    """
+    Archivar las solicitudes con fecha anterior a `horizonte_dias`
+
+    Args:
+        hasta_id: no archivar solicitudes con id mayor (marca de la exportación a Parquet)
+
+    Returns:
+        dict con filas archivadas, lotes y segundos
+    """
+    limite = datetime.now(timezone.utc) - timedelta(days=horizonte_dias)
+    cortes = segmentos.cortes_bandas()
+    inicio = time.perf_counter()
+    with db_engine.begin() as conn:
+        _estado(conn, cortes)
+
+    filas = lotes = 0
+    while True:
+        with db_engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text(f"SET LOCAL lock_timeout = {int(settings.ARCHIVO_LOCK_TIMEOUT_MS)}"))
+            movidas = _lote(conn, limite, lote, hasta_id, cortes)
+        if not movidas:
+            break
+        filas += movidas
+        lotes += 1
+        if progreso is not None:
+            print(f"  {filas:,} solicitudes archivadas", file=progreso)
+        if movidas < lote:
+            break
+        if pausa:
+            time.sleep(pausa)
+    return {"filas": filas, "lotes": lotes, "segundos": time.perf_counter() - inicio}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Archivado de solicitudes antiguas")
+    parser.add_argument("--horizonte-dias", type=int, default=settings.ARCHIVO_HORIZONTE_DIAS,
+                        help="Archivar solicitudes con más de estos días")
+    parser.add_argument("--lote", type=int, default=settings.ARCHIVO_LOTE, help="Solicitudes por transacción")
+    parser.add_argument("--pausa", type=float, default=settings.ARCHIVO_PAUSA, help="Segundos entre lotes")
+    parser.add_argument("--parquet-destino", default=settings.PARQUET_DESTINO,
+                        help="Dataset de app.parquet_export; no archivar lo que aún no exportó "
+                             "(por defecto PARQUET_DESTINO)")
+    parser.add_argument("--sin-parquet", action="store_true",
+                        help="Archivar sin consultar la marca de la exportación a Parquet")
+    args = parser.parse_args(argv)
+    destino = None if args.sin_parquet else args.parquet_destino
+
+    from . import shards
+    from .database import SessionLocal, engine
+
+    router = None
+    if settings.SHARD_DATABASE_URLS:
+        router = shards.ShardRouter(settings.SHARD_DATABASE_URLS)
+        with SessionLocal() as db:
+            router.preparar(db)
+    try:
+        for shard, db_engine in enumerate(router.engines if router is not None else [engine]):
+            hasta_id = None
+            if destino:
+                from .parquet_export import destino_shard, limite_archivo
+                marca = destino if router is None else destino_shard(destino, shard)
+                try:
+                    hasta_id = limite_archivo(marca)
+                except (OSError, ValueError) as e:
+                    # Sin marca no se sabe qué falta exportar: no se archiva nada
+                    print(f"❌ No se pudo leer la marca de agua de {marca}: {e}", file=sys.stderr)
+                    return 1
+            resultado = archivar(db_engine, args.horizonte_dias, args.lote, args.pausa, hasta_id, sys.stderr)
+            print(f"✅ {resultado['filas']} solicitudes archivadas en {resultado['lotes']} lotes "
+                  f"({resultado['segundos']:.1f}s)", file=sys.stderr)
+    finally:
+        if router is not None:
+            router.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
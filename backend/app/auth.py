@@ -86,7 +86,13 @@ async def get_current_user(
     Obtener usuario actual desde el token JWT
     Dependency para proteger rutas
     """
-    token = credentials.credentials
+    return usuario_del_token(db, credentials.credentials)
+
+
+def usuario_del_token(db: Session, token: str) -> UsuarioAdmin:
+    """
+    Usuario admin del token JWT, leído con la sesión dada
+    """
     token_data = decode_access_token(token)
     
     user = db.query(UsuarioAdmin).filter(UsuarioAdmin.username == token_data.username).first()
@@ -0,0 +1,307 @@
+"""
+Evaluación de solicitudes por lotes sin pasar por HTTP
+
+Lee un archivo CSV (con encabezado) o NDJSON con los campos de
+SolicitudCreate, valida cada fila, la evalúa con la tabla de reglas activa y
+escribe una decisión por fila en NDJSON o CSV, en el orden de entrada. Con
+--persistir las solicitudes válidas también se guardan en la base de datos
+(o en el shard de su sucursal) con inserciones en bloque y un commit por lote.
+
+- La entrada se lee por lotes de --lote registros y los lotes se reparten en
+  un ProcessPoolExecutor con una ventana acotada de lotes en vuelo: la
+  memoria no depende del tamaño del archivo y, si el destino es más lento,
+  la lectura espera
+- Los workers validan, evalúan y serializan; el proceso principal solo lee
+  registros y escribe texto (y persiste mientras los workers siguen con los
+  lotes siguientes), así que el rendimiento crece con los núcleos
+- Una fila inválida no detiene el proceso: se reporta con su número de
+  línea en --errores (NDJSON, por defecto stderr)
+
+Uso:
+    python -m app.batch_score --entrada solicitudes.csv --salida decisiones.ndjson --workers 8
+    python -m app.batch_score --entrada solicitudes.ndjson --formato-salida csv --persistir
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+from typing import FrozenSet, Iterator, List, NamedTuple, Optional
+
+import orjson
+from pydantic import ValidationError
+
+from . import rules, schemas
+from .business_logic import calcular_contraoferta
+from .crud import calcular_datos_financieros
+from .generator import _edad
+from .responses import dumps
+
+COLUMNAS_SALIDA = [
+    "linea", "email", "sucursal_id", "edad", "estado", "motivo_rechazo",
+    "cuota_mensual", "tasa_interes_anual", "total_a_pagar", "total_intereses",
+    "contraoferta_monto_maximo", "contraoferta_plazo_minimo", "version_reglas",
+]
+
+
+class Lote(NamedTuple):
+    """Registros crudos: (línea, valores) con valores lista CSV o línea JSON"""
+    formato: str
+    encabezado: Optional[List[str]]
+    registros: List[tuple]
+
+
+class Tarea(NamedTuple):
+    lote: Lote
+    formato_salida: str
+    fecha_referencia: date
+    # Con persistencia: ids de sucursal existentes; None = no se verifican
+    sucursales: Optional[FrozenSet[int]]
+    persistir: bool
+
+
+class ResultadoLote(NamedTuple):
+    """Salida y errores ya serializados, y filas para insertar (si se persiste)"""
+    salida: str
+    errores: str
+    filas: List[dict]
+    validas: int
+    invalidas: int
+    aprobadas: int
+
+
+def leer_lotes(stream, formato: str, tamano: int) -> Iterator[Lote]:
+    """Partir la entrada en lotes de `tamano` registros sin interpretarlos"""
+    if formato == "csv":
+        lector = csv.reader(stream)
+        encabezado = [columna.strip() for columna in next(lector, [])]
+        # line_num es la última línea del registro (un campo puede tener saltos)
+        registros = ((lector.line_num, valores) for valores in lector if valores)
+    else:
+        encabezado = None
+        registros = ((n, linea) for n, linea in enumerate(stream, start=1) if linea.strip())
+    while True:
+        bloque = list(islice(registros, tamano))
+        if not bloque:
+            return
+        yield Lote(formato, encabezado, bloque)
+
+
+def _registro(lote: Lote, valores) -> dict:
+    if lote.formato == "csv":
+        # Celdas vacías = campo ausente, para que apliquen los valores por defecto
+        return {campo: valor for campo, valor in zip(lote.encabezado, valores) if valor != ""}
+    datos = orjson.loads(valores)
+    if not isinstance(datos, dict):
+        raise ValueError("Se esperaba un objeto JSON")
+    return datos
+
+
+def evaluar(solicitud: schemas.SolicitudCreate, fecha_referencia: date, evaluador: rules.EvaluadorCompilado) -> dict:
+    """Decisión, datos financieros y contraoferta de una solicitud validada"""
+    edad = _edad(solicitud.fecha_nacimiento, fecha_referencia)
+    aprobado, motivo_rechazo = evaluador.evaluar(
+        edad, solicitud.monto_solicitado, solicitud.ingreso_mensual, solicitud.score_crediticio,
+        solicitud.tiene_tarjeta_credito, solicitud.tiene_credito_automotriz, solicitud.plazo_meses,
+    )
+    contraoferta = None
+    if not aprobado:
+        contraoferta = calcular_contraoferta(
+            edad, solicitud.monto_solicitado, solicitud.ingreso_mensual, solicitud.score_crediticio,
+            solicitud.tiene_tarjeta_credito, solicitud.tiene_credito_automotriz, solicitud.plazo_meses,
+        )
+    return {
+        "email": solicitud.email,
+        "sucursal_id": solicitud.sucursal_id,
+        "edad": edad,
+        "estado": "aprobado" if aprobado else "rechazado",
+        "motivo_rechazo": motivo_rechazo,
+        **calcular_datos_financieros(aprobado, solicitud.monto_solicitado, solicitud.plazo_meses),
+        "contraoferta_monto_maximo": contraoferta["monto_maximo"] if contraoferta else None,
+        "contraoferta_plazo_minimo": contraoferta["plazo_minimo"] if contraoferta else None,
+        "version_reglas": evaluador.version,
+    }
+
+
+def _error(linea: int, campo: Optional[str], mensaje: str) -> dict:
+    return {"linea": linea, "errores": [{"campo": campo, "mensaje": mensaje}]}
+
+
+def evaluar_lote(tarea: Tarea) -> ResultadoLote:
+    """Validar, evaluar y serializar un lote (se ejecuta en los workers)"""
+    evaluador = rules.evaluador_actual()
+    salida = io.StringIO()
+    escritor = csv.writer(salida) if tarea.formato_salida == "csv" else None
+    errores = []
+    filas = []
+    validas = aprobadas = 0
+    for linea, valores in tarea.lote.registros:
+        try:
+            solicitud = schemas.SolicitudCreate.model_validate(_registro(tarea.lote, valores))
+        except ValidationError as e:
+            errores.append({"linea": linea, "errores": [
+                {"campo": ".".join(str(parte) for parte in error["loc"]), "mensaje": error["msg"]}
+                for error in e.errors()
+            ]})
+            continue
+        except ValueError as e:
+            errores.append(_error(linea, None, f"Registro inválido: {e}"))
+            continue
+        if tarea.sucursales is not None and solicitud.sucursal_id not in tarea.sucursales:
+            errores.append(_error(linea, "sucursal_id", f"Sucursal con ID {solicitud.sucursal_id} no existe"))
+            continue
+
+        decision = evaluar(solicitud, tarea.fecha_referencia, evaluador)
+        validas += 1
+        aprobadas += decision["estado"] == "aprobado"
+        if escritor is not None:
+            escritor.writerow([linea] + [decision[columna] for columna in COLUMNAS_SALIDA[1:]])
+        else:
+            salida.write(dumps({"linea": linea, **decision}).decode())
+            salida.write("\n")
+        if tarea.persistir:
+            filas.append({
+                **solicitud.model_dump(),
+                "edad": decision["edad"],
+                "estado": decision["estado"],
+                "motivo_rechazo": decision["motivo_rechazo"],
+            })
+    return ResultadoLote(
+        salida=salida.getvalue(),
+        errores="".join(dumps(error).decode() + "\n" for error in errores),
+        filas=filas,
+        validas=validas,
+        invalidas=len(errores),
+        aprobadas=aprobadas,
+    )
+
+
+def _inicializar_worker(reglas_path: Optional[str]) -> None:
+    # Con spawn el worker cargaría la tabla por defecto y no la del proceso principal
+    if reglas_path:
+        rules.recargar(reglas_path)
+
+
+def evaluar_archivo(
+    stream,
+    formato_entrada: str,
+    formato_salida: str = "ndjson",
+    fecha_referencia: Optional[date] = None,
+    workers: int = 1,
+    lote: int = 5000,
+    sucursales: Optional[FrozenSet[int]] = None,
+    persistir: bool = False,
+) -> Iterator[ResultadoLote]:
+    """
+    Evaluar la entrada lote por lote, en orden
+
+    Con workers > 1 los lotes se reparten en un ProcessPoolExecutor con a lo
+    más workers * 2 lotes en vuelo.
+    """
+    fecha_referencia = fecha_referencia or schemas.hoy()
+    tareas = (
+        Tarea(bloque, formato_salida, fecha_referencia, sucursales, persistir)
+        for bloque in leer_lotes(stream, formato_entrada, lote)
+    )
+    if workers <= 1:
+        for tarea in tareas:
+            yield evaluar_lote(tarea)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_inicializar_worker, initargs=(rules.evaluador_actual().origen,)
+    ) as executor:
+        pendientes = deque()
+        for tarea in tareas:
+            pendientes.append(executor.submit(evaluar_lote, tarea))
+            if len(pendientes) >= workers * 2:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+
+def _formato_por_extension(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluación de solicitudes por lotes")
+    parser.add_argument("--entrada", required=True, help="Archivo CSV o NDJSON ('-' para stdin)")
+    parser.add_argument("--formato-entrada", choices=["csv", "ndjson"],
+                        help="Por defecto según la extensión (.csv o NDJSON)")
+    parser.add_argument("--salida", help="Archivo de decisiones (por defecto stdout)")
+    parser.add_argument("--formato-salida", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--errores", help="Archivo NDJSON de filas inválidas (por defecto stderr)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lote", type=int, default=5000)
+    parser.add_argument("--fecha-referencia", type=date.fromisoformat, default=None,
+                        help="Fecha para calcular edades (YYYY-MM-DD); por defecto hoy")
+    parser.add_argument("--reglas", help="Tabla de reglas a usar en lugar de la configurada")
+    parser.add_argument("--persistir", action="store_true",
+                        help="Guardar las solicitudes válidas en la base de datos")
+    args = parser.parse_args(argv)
+
+    if args.reglas:
+        rules.recargar(args.reglas)
+    formato_entrada = args.formato_entrada or _formato_por_extension(args.entrada)
+
+    db = None
+    sucursales = None
+    if args.persistir:
+        from . import crud, shards
+        from .config import settings
+        from .database import SessionLocal
+
+        db = SessionLocal()
+        sucursales = frozenset(s.id for s in crud.get_sucursales(db, limit=1000))
+        if not sucursales:
+            print("No hay sucursales disponibles", file=sys.stderr)
+            db.close()
+            return 1
+        if settings.SHARD_DATABASE_URLS:
+            shards.router = shards.ShardRouter(settings.SHARD_DATABASE_URLS)
+            shards.router.preparar(db)
+
+    entrada = sys.stdin if args.entrada == "-" else open(args.entrada, encoding="utf-8", newline="")
+    salida = open(args.salida, "w", encoding="utf-8", newline="") if args.salida else sys.stdout
+    errores = open(args.errores, "w", encoding="utf-8") if args.errores else sys.stderr
+    if args.formato_salida == "csv":
+        csv.writer(salida).writerow(COLUMNAS_SALIDA)
+
+    inicio = time.perf_counter()
+    validas = invalidas = aprobadas = 0
+    try:
+        for resultado in evaluar_archivo(entrada, formato_entrada, args.formato_salida, args.fecha_referencia,
+                                         args.workers, args.lote, sucursales, args.persistir):
+            salida.write(resultado.salida)
+            errores.write(resultado.errores)
+            if resultado.filas:
+                shards.insertar_lote_evaluado(db, resultado.filas)
+            validas += resultado.validas
+            invalidas += resultado.invalidas
+            aprobadas += resultado.aprobadas
+    finally:
+        salida.flush()
+        for stream in (entrada, salida, errores):
+            if stream not in (sys.stdin, sys.stdout, sys.stderr):
+                stream.close()
+        if db is not None:
+            db.close()
+            if shards.router is not None:
+                shards.router.cerrar()
+    segundos = time.perf_counter() - inicio
+    total = validas + invalidas
+    print(
+        f"{total} filas en {segundos:.1f}s ({total / max(segundos, 1e-9):,.0f} filas/s): "
+        f"{aprobadas} aprobadas, {validas - aprobadas} rechazadas, {invalidas} inválidas",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 """
 Lógica de negocio para aprobación de créditos
 """
-from decimal import Decimal
-from typing import Tuple
+from decimal import ROUND_FLOOR, Decimal
+from typing import Optional, Tuple
+
+from . import rules
 
 
 def evaluar_solicitud_credito(
@@ -17,12 +19,15 @@ def evaluar_solicitud_credito(
     """
     Evaluar una solicitud de crédito según las reglas de negocio
     
-    Reglas:
+    Las reglas se definen en la tabla de app/reglas_credito.json (ver
+    app/rules.py); la tabla por defecto aplica:
     1. Edad: entre 18 y 70 años
-    2. Relación deuda/ingreso: cuota mensual no debe exceder 40% del ingreso
-    3. Score crediticio mínimo: 600
-    4. Si tiene tarjeta o crédito automotriz y score > 650: mejor evaluación
-    5. Monto máximo: hasta 10x el ingreso mensual
+    2. Score crediticio mínimo: 600
+    3. Monto máximo: hasta 10x el ingreso mensual
+    4. Relación deuda/ingreso: cuota mensual no debe exceder 40% del ingreso
+    5. Con tarjeta o crédito automotriz: aprobado con score >= 650; con score
+       justo la cuota no debe exceder 35% del ingreso
+    6. Sin historial: score >= 650, cuota hasta 30% y monto hasta 5x el ingreso
     
     Args:
         edad: Edad del solicitante
@@ -36,56 +41,15 @@ def evaluar_solicitud_credito(
     Returns:
         Tuple[bool, str]: (aprobado, motivo_rechazo)
     """
-    
-    # Regla 1: Validar edad
-    if edad < 18:
-        return False, "Edad inferior al mínimo requerido (18 años)"
-    if edad > 70:
-        return False, "Edad superior al máximo permitido (70 años)"
-    
-    # Regla 2: Score crediticio mínimo
-    if score_crediticio < 600:
-        return False, f"Score crediticio insuficiente"
-    
-    # Regla 3: Monto máximo según ingreso
-    monto_maximo = ingreso_mensual * 10
-    if monto_solicitado > monto_maximo:
-        return False, f"Monto solicitado excede el máximo permitido (10x ingreso mensual: ${monto_maximo:,.2f})"
-    
-    # Regla 4: Relación deuda/ingreso (cuota mensual vs ingreso)
-    # Calculamos una cuota mensual simplificada (sin intereses para simplicidad)
-    cuota_mensual = monto_solicitado / plazo_meses
-    porcentaje_ingreso = (cuota_mensual / ingreso_mensual) * 100
-    
-    if porcentaje_ingreso > 40:
-        return False, f"Cuota mensual excede el 40% del ingreso ({porcentaje_ingreso:.1f}%). Considere un plazo mayor o menor monto."
-    
-    # Regla 5: Evaluación mejorada con historial crediticio
-    # Si tiene productos crediticios y buen score, más probabilidad de aprobación
-    if tiene_tarjeta_credito or tiene_credito_automotriz:
-        if score_crediticio >= 650:
-            # Cliente con historial positivo
-            return True, None
-        elif score_crediticio >= 600:
-            # Cliente con historial pero score justo
-            # Aplicamos criterio más estricto en relación deuda/ingreso
-            if porcentaje_ingreso > 35:
-                return False, f"Para su perfil crediticio, la cuota mensual no debe exceder el 35% del ingreso ({porcentaje_ingreso:.1f}%)"
-            return True, None
-    
-    # Cliente sin historial crediticio (primera vez)
-    if not tiene_tarjeta_credito and not tiene_credito_automotriz:
-        # Criterios más estrictos para clientes nuevos
-        if score_crediticio < 650:
-            return False, "Para clientes sin historial crediticio se requiere score mínimo de 650"
-        if porcentaje_ingreso > 30:
-            return False, f"Para clientes sin historial crediticio, la cuota no debe exceder el 30% del ingreso ({porcentaje_ingreso:.1f}%)"
-        # Límite más bajo para clientes nuevos
-        if monto_solicitado > ingreso_mensual * 5:
-            return False, "Para clientes sin historial crediticio, el monto máximo es 5x el ingreso mensual"
-    
-    # Si pasa todas las validaciones
-    return True, None
+    return rules.evaluador_actual().evaluar(
+        edad,
+        monto_solicitado,
+        ingreso_mensual,
+        score_crediticio,
+        tiene_tarjeta_credito,
+        tiene_credito_automotriz,
+        plazo_meses,
+    )
 
 
 def calcular_cuota_mensual(monto: Decimal, plazo_meses: int, tasa_anual: Decimal = Decimal("12.0")) -> Decimal:
@@ -112,29 +76,106 @@ def calcular_cuota_mensual(monto: Decimal, plazo_meses: int, tasa_anual: Decimal
     return cuota.quantize(Decimal("0.01"))
 
 
+def _redondear_abajo(monto: Decimal, paso: Decimal = Decimal("100")) -> Decimal:
+    return (monto / paso).to_integral_value(rounding=ROUND_FLOOR) * paso
+
+
+def calcular_contraoferta(
+    edad: Optional[int],
+    monto_solicitado: Decimal,
+    ingreso_mensual: Decimal,
+    score_crediticio: int,
+    tiene_tarjeta_credito: bool,
+    tiene_credito_automotriz: bool,
+    plazo_meses: int
+) -> Optional[dict]:
+    """
+    Calcular la contraoferta aprobable más cercana a la solicitud
+    
+    En vez de probar montos, se usan las cotas de la política para el perfil
+    (monto <= multiplo x ingreso y monto <= ratio% x ingreso x plazo) y se
+    recorre una sola vez la lista de plazos permitidos.
+    
+    Returns:
+        dict con monto_maximo (al plazo solicitado), plazo_minimo (para el
+        monto solicitado) y opciones por plazo; None si el perfil no es
+        aprobable con ningún monto ni plazo
+    """
+    evaluador = rules.evaluador_actual()
+    limites = evaluador.limites(
+        edad, ingreso_mensual, score_crediticio, tiene_tarjeta_credito or tiene_credito_automotriz
+    )
+    if limites is None:
+        return None
+    multiplo, ratio = limites
+    tope_ingreso = ingreso_mensual * multiplo if multiplo is not None else None
+    
+    def monto_maximo(plazo: int) -> Optional[Decimal]:
+        topes = [t for t in (tope_ingreso, ratio * ingreso_mensual * plazo / 100 if ratio is not None else None)
+                 if t is not None]
+        return _redondear_abajo(min(topes)) if topes else None
+    
+    opciones = []
+    plazo_minimo = None
+    for plazo in sorted(set(evaluador.plazos) | {plazo_meses}):
+        maximo = monto_maximo(plazo)
+        if maximo is not None and maximo <= 0:
+            continue
+        if plazo_minimo is None and (maximo is None or maximo >= monto_solicitado):
+            plazo_minimo = plazo
+        if plazo in evaluador.plazos and maximo is not None:
+            opciones.append({
+                "plazo_meses": plazo,
+                "monto_maximo": maximo,
+                "cuota_mensual": calcular_cuota_mensual(maximo, plazo),
+            })
+    
+    maximo_solicitado = monto_maximo(plazo_meses)
+    if maximo_solicitado is not None and maximo_solicitado <= 0:
+        maximo_solicitado = None
+    if maximo_solicitado is None and plazo_minimo is None and not opciones:
+        return None
+    return {
+        "monto_maximo": maximo_solicitado,
+        "plazo_minimo": plazo_minimo,
+        "opciones": opciones,
+    }
+
+
 def obtener_recomendaciones(
     monto_solicitado: Decimal,
     ingreso_mensual: Decimal,
     plazo_meses: int,
-    score_crediticio: int
+    score_crediticio: int,
+    tiene_tarjeta_credito: bool = False,
+    tiene_credito_automotriz: bool = False,
+    edad: Optional[int] = None
 ) -> dict:
     """
     Obtener recomendaciones para mejorar la solicitud
     
+    Las sugerencias de plazo y monto salen de la contraoferta, por lo que
+    respetan los límites del perfil (historial y score).
+    
     Returns:
-        dict con recomendaciones
+        dict con recomendaciones y la contraoferta
     """
     recomendaciones = []
     
     cuota = monto_solicitado / plazo_meses
     porcentaje = (cuota / ingreso_mensual) * 100
     
-    if porcentaje > 40:
-        plazo_recomendado = int((monto_solicitado / (ingreso_mensual * Decimal("0.35"))).to_integral_value())
-        recomendaciones.append(f"Considere extender el plazo a {plazo_recomendado} meses")
-        
-        monto_recomendado = ingreso_mensual * Decimal("0.35") * plazo_meses
-        recomendaciones.append(f"O reduzca el monto a ${monto_recomendado:,.2f}")
+    contraoferta = calcular_contraoferta(
+        edad, monto_solicitado, ingreso_mensual, score_crediticio,
+        tiene_tarjeta_credito, tiene_credito_automotriz, plazo_meses
+    )
+    if contraoferta is not None:
+        maximo = contraoferta["monto_maximo"]
+        if maximo is not None and maximo < monto_solicitado:
+            plazo_minimo = contraoferta["plazo_minimo"]
+            if plazo_minimo is not None and plazo_minimo != plazo_meses:
+                recomendaciones.append(f"Considere extender el plazo a {plazo_minimo} meses")
+            recomendaciones.append(f"O reduzca el monto a ${maximo:,.2f}")
     
     if score_crediticio < 650:
         recomendaciones.append("Mejore su score crediticio para mejores condiciones")
@@ -142,6 +183,6 @@ def obtener_recomendaciones(
     return {
         "cuota_mensual_estimada": float(cuota),
         "porcentaje_ingreso": float(porcentaje),
-        "recomendaciones": recomendaciones
+        "recomendaciones": recomendaciones,
+        "contraoferta": contraoferta
     }
-
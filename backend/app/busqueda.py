@@ -0,0 +1,248 @@
+"""
+Búsqueda de clientes por nombre, apellido o email parcial
+
+- PostgreSQL: índices GIN con pg_trgm sobre nombre, apellido y email
+  (declarados en models.Cliente), que resuelven ILIKE '%texto%' sin
+  recorrer la tabla; la relevancia es la similitud de trigramas con el
+  nombre completo o el email
+- SQLite (desarrollo y pruebas): tabla virtual FTS5 con tokenizador trigram
+  sincronizada por triggers; la relevancia es bm25
+
+Cada palabra de la búsqueda debe aparecer en alguno de los tres campos. Los
+resultados se ordenan por relevancia e id y se paginan por keyset: el cursor
+lleva la relevancia y el id del último resultado, así que avanzar de página
+no recorre las filas anteriores como lo haría OFFSET.
+
+Con shards cada uno entrega su página desde el mismo cursor y se combinan
+por relevancia e id (combinar_paginas); los ids son globales, así que el
+cursor sirve en todos. En SQLite bm25 depende de los documentos de cada
+shard, así que el orden entre shards es aproximado.
+
+Las estructuras de búsqueda se crean junto con la tabla clientes
+(metadata.create_all); en bases existentes los índices GIN y la tabla FTS5
+los crea python -m app.migraciones (asegurar_fts), nunca una búsqueda: las
+lecturas pueden ir a la réplica.
+"""
+import base64
+import heapq
+from decimal import Decimal
+from itertools import islice
+from typing import List, Optional, Tuple
+
+import orjson
+from sqlalchemy import DDL, Float, Integer, Numeric, and_, case, cast, event, func, inspect, literal, or_, select, text, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Las condiciones de trigramas no aplican a textos de menos de 3 caracteres
+MIN_TRIGRAMA = 3
+
+_DDL_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5("
+    "nombre, apellido, email, content='clientes', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN "
+    "INSERT INTO clientes_fts(rowid, nombre, apellido, email) VALUES (new.id, new.nombre, new.apellido, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN "
+    "INSERT INTO clientes_fts(clientes_fts, rowid, nombre, apellido, email) "
+    "VALUES ('delete', old.id, old.nombre, old.apellido, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE ON clientes BEGIN "
+    "INSERT INTO clientes_fts(clientes_fts, rowid, nombre, apellido, email) "
+    "VALUES ('delete', old.id, old.nombre, old.apellido, old.email); "
+    "INSERT INTO clientes_fts(rowid, nombre, apellido, email) VALUES (new.id, new.nombre, new.apellido, new.email); END",
+    # Indexar las filas que ya existieran
+    "INSERT INTO clientes_fts(clientes_fts) VALUES ('rebuild')",
+]
+
+# Los índices GIN de models.Cliente requieren la extensión
+event.listen(
+    models.Cliente.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+for _sentencia in _DDL_SQLITE:
+    event.listen(models.Cliente.__table__, "after_create", DDL(_sentencia).execute_if(dialect="sqlite"))
+# El índice FTS5 no pertenece a la metadata: se elimina con la tabla
+event.listen(
+    models.Cliente.__table__, "after_drop",
+    DDL("DROP TABLE IF EXISTS clientes_fts").execute_if(dialect="sqlite"),
+)
+
+
+def asegurar_fts(db_engine: Engine) -> bool:
+    """
+    Crear el índice FTS5 en una base SQLite creada antes de la búsqueda
+
+    Lo llama app.migraciones con el engine de la base principal (o de un
+    shard); en PostgreSQL no hace nada.
+
+    Returns:
+        Si se creó
+    """
+    if db_engine.dialect.name != "sqlite":
+        return False
+    with db_engine.begin() as conn:
+        tablas = inspect(conn).get_table_names()
+        if "clientes_fts" in tablas or models.Cliente.__tablename__ not in tablas:
+            return False
+        for sentencia in _DDL_SQLITE:
+            conn.execute(text(sentencia))
+    return True
+
+
+def codificar_cursor(relevancia, cliente_id: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([str(relevancia), cliente_id])).decode()
+
+
+def decodificar_cursor(cursor: str) -> Tuple[Decimal, int]:
+    try:
+        relevancia, cliente_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return Decimal(relevancia), int(cliente_id)
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
+
+def _terminos(q: str) -> List[str]:
+    return [t for t in q.lower().split() if t]
+
+
+def _like(termino: str) -> str:
+    escapado = termino.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escapado}%"
+
+
+def _contiene(termino: str):
+    patron = _like(termino)
+    cliente = models.Cliente
+    return or_(
+        cliente.nombre.ilike(patron, escape="\\"),
+        cliente.apellido.ilike(patron, escape="\\"),
+        cliente.email.ilike(patron, escape="\\"),
+    )
+
+
+def _candidatos_postgresql(q: str, terminos: List[str]):
+    cliente = models.Cliente
+    similitud = func.greatest(
+        func.similarity(func.concat_ws(" ", cliente.nombre, cliente.apellido), q),
+        func.similarity(cliente.email, q),
+    )
+    return select(
+        cliente.id,
+        func.round(cast(similitud, Numeric), 6).label("relevancia"),
+    ).where(and_(*[_contiene(t) for t in terminos]))
+
+
+def _candidatos_sqlite(terminos: List[str]):
+    cliente = models.Cliente
+    largos = [t for t in terminos if len(t) >= MIN_TRIGRAMA]
+    cortos = [t for t in terminos if len(t) < MIN_TRIGRAMA]
+    if not largos:
+        # Sin trigramas posibles: coincidencia simple sobre la tabla
+        return select(cliente.id, literal(0.0, Float).label("relevancia")).where(
+            and_(*[_contiene(t) for t in cortos])
+        )
+    consulta_fts = " AND ".join('"' + t.replace('"', '""') + '"' for t in largos)
+    fts = text(
+        "SELECT rowid AS id, round(-bm25(clientes_fts), 6) AS relevancia "
+        "FROM clientes_fts WHERE clientes_fts MATCH :consulta"
+    ).bindparams(consulta=consulta_fts).columns(id=Integer, relevancia=Float).subquery("fts")
+    consulta = select(fts.c.id, fts.c.relevancia)
+    if cortos:
+        consulta = consulta.join(cliente, cliente.id == fts.c.id).where(and_(*[_contiene(t) for t in cortos]))
+    return consulta
+
+
+def _resumenes(db: Session, ids: List[int]) -> dict:
+    """Resumen de las solicitudes de cada cliente de la página (incluidas las archivadas)"""
+    solicitud = union_all(*(
+        select(tabla.cliente_id, tabla.estado, tabla.monto_solicitado, tabla.fecha_solicitud)
+        .where(tabla.cliente_id.in_(ids))
+        for tabla in (models.Solicitud, models.SolicitudArchivada)
+    )).subquery().c
+    aprobado = solicitud.estado == "aprobado"
+    filas = db.execute(
+        select(
+            solicitud.cliente_id,
+            func.count().label("total"),
+            func.sum(case((aprobado, 1), else_=0)).label("aprobadas"),
+            func.sum(solicitud.monto_solicitado).label("monto"),
+            func.max(solicitud.fecha_solicitud).label("ultima"),
+        )
+        .group_by(solicitud.cliente_id)
+    )
+    return {
+        f.cliente_id: {
+            "total": f.total,
+            "aprobadas": f.aprobadas,
+            "rechazadas": f.total - f.aprobadas,
+            "monto_total_solicitado": round(Decimal(f.monto), 2),
+            "ultima_solicitud": f.ultima,
+        }
+        for f in filas
+    }
+
+
+def buscar_clientes(db: Session, q: str, limite: int = 20, cursor: Optional[str] = None) -> dict:
+    """
+    Buscar clientes por nombre, apellido o email parcial
+
+    Returns:
+        dict con los resultados de la página y el cursor de la siguiente
+        (None si no hay más)
+    """
+    terminos = _terminos(q)
+    if not terminos:
+        return {"resultados": [], "siguiente": None}
+
+    postgresql = db.get_bind().dialect.name == "postgresql"
+    candidatos = (_candidatos_postgresql(q.lower(), terminos) if postgresql else _candidatos_sqlite(terminos)).subquery()
+
+    consulta = select(candidatos.c.id, candidatos.c.relevancia)
+    if cursor:
+        relevancia, ultimo_id = decodificar_cursor(cursor)
+        valor = literal(relevancia, Numeric) if postgresql else literal(float(relevancia), Float)
+        consulta = consulta.where(or_(
+            candidatos.c.relevancia < valor,
+            and_(candidatos.c.relevancia == valor, candidatos.c.id > ultimo_id),
+        ))
+    pagina = db.execute(
+        consulta.order_by(candidatos.c.relevancia.desc(), candidatos.c.id).limit(limite + 1)
+    ).all()
+    hay_mas = len(pagina) > limite
+    pagina = pagina[:limite]
+
+    ids = [fila.id for fila in pagina]
+    clientes = {c.id: c for c in db.query(models.Cliente).filter(models.Cliente.id.in_(ids))} if ids else {}
+    resumenes = _resumenes(db, ids) if ids else {}
+    vacio = {"total": 0, "aprobadas": 0, "rechazadas": 0,
+             "monto_total_solicitado": Decimal("0.00"), "ultima_solicitud": None}
+    resultados = []
+    for fila in pagina:
+        cliente = clientes[fila.id]
+        resultados.append({
+            "id": cliente.id,
+            "nombre": cliente.nombre,
+            "apellido": cliente.apellido,
+            "email": cliente.email,
+            "telefono": cliente.telefono,
+            "relevancia": float(fila.relevancia),
+            "solicitudes": resumenes.get(cliente.id, vacio),
+        })
+    siguiente = codificar_cursor(pagina[-1].relevancia, pagina[-1].id) if hay_mas else None
+    return {"resultados": resultados, "siguiente": siguiente}
+
+
+def combinar_paginas(paginas: List[dict], limite: int) -> dict:
+    """
+    Página de resultados de varias bases (una por shard) buscadas con el mismo cursor
+
+    Cada página viene ordenada por relevancia descendente e id; el cursor
+    siguiente sale del último resultado combinado.
+    """
+    resultados = heapq.merge(*(p["resultados"] for p in paginas), key=lambda r: (-r["relevancia"], r["id"]))
+    pagina = list(islice(resultados, limite + 1))
+    hay_mas = len(pagina) > limite or any(p["siguiente"] for p in paginas)
+    pagina = pagina[:limite]
+    siguiente = codificar_cursor(pagina[-1]["relevancia"], pagina[-1]["id"]) if hay_mas and pagina else None
+    return {"resultados": pagina, "siguiente": siguiente}
@@ -1,7 +1,7 @@
 """
 Configuración de la aplicación
 """
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
 
@@ -14,6 +14,99 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "credit_system"
     POSTGRES_HOST: str = "db"
     POSTGRES_PORT: int = 5432
+    # URL completa opcional; si se define tiene prioridad sobre POSTGRES_*
+    DATABASE_URL: Optional[str] = None
+    
+    # Pool de conexiones
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800  # segundos; -1 desactiva el reciclado
+    DB_POOL_TIMEOUT: float = 5.0  # segundos de espera por una conexión libre
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # 0 desactiva el timeout por sentencia
+    # Modo compatible con PgBouncer en modo transacción: NullPool, sin
+    # parámetros de arranque ni sentencias preparadas del lado del servidor
+    DB_PGBOUNCER: bool = False
+    
+    # Shards de escritura por sucursal (opcional; ver app/shards.py)
+    SHARD_DATABASE_URLS: list[str] = []  # una URL por shard; vacío = una sola base
+    SHARD_RANGO_IDS: int = 100_000_000  # ids de clientes y solicitudes reservados por shard
+    
+    # Réplica de solo lectura (opcional)
+    REPLICA_DATABASE_URL: Optional[str] = None
+    REPLICA_MAX_LAG_SECONDS: float = 5.0  # con más retraso se lee del primario
+    REPLICA_CHECK_INTERVAL: float = 5.0  # segundos entre verificaciones de salud
+    
+    # Trabajos de simulación en segundo plano
+    SIMULACION_JOB_WORKERS: int = 2
+    SIMULACION_JOB_CHUNK: int = 1000  # filas por commit
+    SIMULACION_JOB_STALE_SECONDS: int = 60  # sin heartbeat se considera huérfano
+    SIMULACION_MUESTRA: int = 10  # solicitudes devueltas con detalle=sample
+    
+    # Idempotency-Key en POST /api/solicitudes
+    IDEMPOTENCY_BACKEND: str = "memory"  # "memory" o "database" (varios workers)
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000  # capacidad del LRU en memoria
+    IDEMPOTENCY_LEASE_SECONDS: int = 60  # reserva en curso que otra petición puede tomar al vencer
+    IDEMPOTENCY_PURGA_INTERVALO: int = 300  # segundos entre borrados de claves vencidas (database)
+    
+    # Control de admisión de POST /api/solicitudes
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_RATE_PER_SECOND: float = 5.0  # tokens por segundo por cliente
+    ADMISSION_BURST: int = 20  # capacidad del token bucket
+    ADMISSION_MAX_CONCURRENCY: Optional[int] = None  # por defecto DB_POOL_SIZE + DB_MAX_OVERFLOW
+    ADMISSION_MAX_QUEUE: int = 100  # peticiones esperando un cupo
+    ADMISSION_QUEUE_TIMEOUT: float = 0.5  # segundos máximos de espera en cola
+    ADMISSION_TRUST_FORWARDED: bool = False  # identificar al cliente por X-Forwarded-For
+    
+    # Persistencia diferida (write-behind) de solicitudes
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_MAX_QUEUE: int = 10000
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL_MS: int = 50
+    WRITE_BEHIND_ENQUEUE_TIMEOUT: float = 0.1  # espera máxima con la cola llena
+    WRITE_BEHIND_WAL_PATH: Optional[str] = None  # archivo con fsync antes de responder
+    WRITE_BEHIND_ID_BLOCK: int = 100  # ids pre-asignados por consulta a la secuencia
+    WRITE_BEHIND_REINTENTO_INICIAL: float = 0.5  # espera tras un error transitorio de la BD; se duplica
+    WRITE_BEHIND_REINTENTO_MAX: float = 30.0
+    
+    # Política de crédito
+    REGLAS_PATH: Optional[str] = None  # JSON/YAML; por defecto app/reglas_credito.json
+    REGLAS_RECARGA_INTERVALO: float = 0  # segundos entre revisiones del archivo (0 = solo manual)
+    
+    # Precalificación en memoria
+    PRECALIFICACION_CACHE_SIZE: int = 100_000  # respuestas serializadas en el LRU
+    
+    # GET condicional (ETag)
+    SUCURSALES_MAX_AGE: int = 60  # navegador y nginx reutilizan la lista sin revalidar
+    
+    # Indicadores por segmento: límite inferior de cada banda
+    SEGMENTOS_BANDAS_SCORE: list[int] = [600, 650, 700, 750]
+    SEGMENTOS_BANDAS_EDAD: list[int] = [25, 35, 45, 55, 65]
+    
+    # Versión de los datos de solicitudes (app/versiones.py)
+    VERSIONES_HUECO_SEGUNDOS: float = 30  # una versión sin confirmar después de esto se da por descartada
+    VERSIONES_PURGA_INTERVALO: float = 5  # segundos entre purgas de versiones_confirmadas por proceso
+    
+    # Sketches de cuantiles (medianas, p90 e histogramas)
+    SKETCHES_ERROR_RELATIVO: float = 0.01  # error relativo máximo de cada cuantil
+    SKETCHES_PERSISTIR_INTERVALO: float = 300  # segundos entre compactaciones de los deltas
+    
+    # Eventos en vivo del dashboard (SSE)
+    EVENTOS_CANAL: str = "solicitudes_eventos"  # canal de LISTEN/NOTIFY en PostgreSQL
+    EVENTOS_COLA_MAX: int = 1000  # eventos sin leer por suscriptor antes de pedir resincronizar
+    EVENTOS_INTERVALO_MS: int = 250  # ventana en que se agrupan los eventos de cada mensaje
+    EVENTOS_MAX_DECISIONES: int = 10  # decisiones individuales por mensaje
+    EVENTOS_HEARTBEAT: float = 15  # segundos entre comentarios keep-alive
+    EVENTOS_DURACION_MAX: float = 300  # segundos; después el cliente reconecta
+    
+    # Archivado de solicitudes antiguas (app/archivo.py)
+    ARCHIVO_HORIZONTE_DIAS: int = 730  # se archivan las solicitudes con más días
+    ARCHIVO_LOTE: int = 5000  # solicitudes movidas por transacción
+    ARCHIVO_PAUSA: float = 0.1  # segundos entre lotes
+    ARCHIVO_LOCK_TIMEOUT_MS: int = 2000  # espera máxima por un bloqueo en cada lote
+    
+    # Dataset de app/parquet_export.py; el archivado no pasa de su marca de agua
+    PARQUET_DESTINO: Optional[str] = None
     
     # JWT
     JWT_SECRET_KEY: str = "your-secret-key-change-this-in-production"
@@ -31,11 +124,11 @@ class Settings(BaseSettings):
     @property
     def database_url(self) -> str:
         """Construye la URL de conexión a la base de datos"""
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
 
 settings = Settings()
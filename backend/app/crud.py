@@ -2,13 +2,19 @@
 Operaciones CRUD para la base de datos
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from typing import List, Optional
-from datetime import datetime, date
+from sqlalchemy import func, and_, insert, select
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from datetime import datetime, date, timezone
 from decimal import Decimal
+from itertools import islice
+import heapq
+import logging
 import random
-from . import models, schemas
-from .business_logic import evaluar_solicitud_credito, calcular_cuota_mensual
+from . import models, schemas, generator, eventos, versiones
+from .database import foto_consistente
+from .business_logic import evaluar_solicitud_credito, calcular_cuota_mensual, calcular_contraoferta
+
+logger = logging.getLogger(__name__)
 
 
 def get_sucursales(db: Session, skip: int = 0, limit: int = 100) -> List[models.Sucursal]:
@@ -16,6 +22,25 @@ def get_sucursales(db: Session, skip: int = 0, limit: int = 100) -> List[models.
     return db.query(models.Sucursal).offset(skip).limit(limit).all()
 
 
+def version_sucursales(db: Session) -> tuple:
+    """Versión de la tabla de sucursales (cambia al agregar o eliminar filas)"""
+    return tuple(db.query(
+        func.count(models.Sucursal.id),
+        func.max(models.Sucursal.id),
+        func.max(models.Sucursal.created_at),
+    ).one())
+
+
+def version_solicitudes(db: Session) -> versiones.Version:
+    """
+    Versión de las solicitudes
+
+    Cambia con cada transacción que inserta, modifica o borra solicitudes
+    (ver app/versiones.py); sin huecos, una lectura por índice
+    """
+    return versiones.leer(db)
+
+
 def get_sucursal(db: Session, sucursal_id: int) -> Optional[models.Sucursal]:
     """Obtener una sucursal por ID"""
     return db.query(models.Sucursal).filter(models.Sucursal.id == sucursal_id).first()
@@ -89,25 +114,12 @@ def crear_solicitud(
     )
     
     db.add(solicitud)
+    # El id se necesita para el evento del dashboard, que se publica al confirmar
+    db.flush()
+    eventos.registrar(db, [solicitud])
     db.commit()
     db.refresh(solicitud)
     
-    # Calcular datos financieros si es aprobado
-    cuota_mensual = None
-    tasa_interes_anual = None
-    total_a_pagar = None
-    total_intereses = None
-    
-    if aprobado:
-        tasa_interes_anual = Decimal("12.0")  # Tasa fija del 12% anual
-        cuota_mensual = calcular_cuota_mensual(
-            monto=solicitud_data.monto_solicitado,
-            plazo_meses=solicitud_data.plazo_meses,
-            tasa_anual=tasa_interes_anual
-        )
-        total_a_pagar = cuota_mensual * solicitud_data.plazo_meses
-        total_intereses = total_a_pagar - solicitud_data.monto_solicitado
-    
     # Construir respuesta
     response = schemas.SolicitudResponse(
         id=solicitud.id,
@@ -125,133 +137,385 @@ def crear_solicitud(
         cliente_nombre=f"{cliente.nombre} {cliente.apellido}",
         cliente_email=cliente.email,
         sucursal_nombre=sucursal.nombre,
-        cuota_mensual=cuota_mensual,
-        tasa_interes_anual=tasa_interes_anual,
-        total_a_pagar=total_a_pagar,
-        total_intereses=total_intereses
+        **calcular_datos_financieros(aprobado, solicitud_data.monto_solicitado, solicitud_data.plazo_meses),
+        contraoferta=contraoferta_solicitud(aprobado, solicitud_data),
     )
     
     return response
 
 
-def simular_solicitudes(db: Session, cantidad: int) -> schemas.SimulacionResponse:
+def calcular_datos_financieros(aprobado: bool, monto: Decimal, plazo_meses: int) -> dict:
+    """Calcular cuota, tasa y totales (solo para solicitudes aprobadas)"""
+    if not aprobado:
+        return {
+            "cuota_mensual": None,
+            "tasa_interes_anual": None,
+            "total_a_pagar": None,
+            "total_intereses": None,
+        }
+    tasa_interes_anual = Decimal("12.0")  # Tasa fija del 12% anual
+    cuota_mensual = calcular_cuota_mensual(
+        monto=monto,
+        plazo_meses=plazo_meses,
+        tasa_anual=tasa_interes_anual
+    )
+    total_a_pagar = cuota_mensual * plazo_meses
+    return {
+        "cuota_mensual": cuota_mensual,
+        "tasa_interes_anual": tasa_interes_anual,
+        "total_a_pagar": total_a_pagar,
+        "total_intereses": total_a_pagar - monto,
+    }
+
+
+def contraoferta_solicitud(aprobado: bool, solicitud_data: schemas.SolicitudCreate) -> Optional[dict]:
+    """Contraoferta para solicitudes rechazadas"""
+    if aprobado:
+        return None
+    return calcular_contraoferta(
+        edad=solicitud_data.edad,
+        monto_solicitado=solicitud_data.monto_solicitado,
+        ingreso_mensual=solicitud_data.ingreso_mensual,
+        score_crediticio=solicitud_data.score_crediticio,
+        tiene_tarjeta_credito=solicitud_data.tiene_tarjeta_credito,
+        tiene_credito_automotriz=solicitud_data.tiene_credito_automotriz,
+        plazo_meses=solicitud_data.plazo_meses
+    )
+
+
+def crear_solicitud_diferida(
+    db: Session,
+    solicitud_data: schemas.SolicitudCreate,
+    cola
+) -> schemas.SolicitudResponse:
     """
-    Simular múltiples solicitudes aleatorias
+    Evaluar una solicitud y diferir su persistencia (modo write-behind)
+    
+    En la petición solo se hacen lecturas: los ids de cliente y solicitud se
+    toman de bloques pre-asignados y la escritura se encola para que el writer
+    de `cola` la confirme en lote.
+    """
+    sucursal = get_sucursal(db, solicitud_data.sucursal_id)
+    if not sucursal:
+        raise ValueError(f"Sucursal con ID {solicitud_data.sucursal_id} no existe")
+    
+    nuevo_cliente = None
+    cliente = get_cliente_por_email(db, solicitud_data.email)
+    if cliente:
+        cliente_id, nombre, apellido = cliente.id, cliente.nombre, cliente.apellido
+    else:
+        cliente_id, es_nuevo = cola.reservar_cliente(solicitud_data.email)
+        nombre, apellido = solicitud_data.nombre, solicitud_data.apellido
+        if es_nuevo:
+            nuevo_cliente = {
+                "id": cliente_id,
+                "nombre": solicitud_data.nombre,
+                "apellido": solicitud_data.apellido,
+                "email": solicitud_data.email,
+                "telefono": solicitud_data.telefono,
+                "fecha_nacimiento": solicitud_data.fecha_nacimiento,
+                "edad": solicitud_data.edad
+            }
+    
+    aprobado, motivo_rechazo = evaluar_solicitud_credito(
+        edad=solicitud_data.edad,
+        monto_solicitado=solicitud_data.monto_solicitado,
+        ingreso_mensual=solicitud_data.ingreso_mensual,
+        score_crediticio=solicitud_data.score_crediticio,
+        tiene_tarjeta_credito=solicitud_data.tiene_tarjeta_credito,
+        tiene_credito_automotriz=solicitud_data.tiene_credito_automotriz,
+        plazo_meses=solicitud_data.plazo_meses
+    )
+    
+    solicitud = {
+        "id": cola.siguiente_id_solicitud(),
+        "cliente_id": cliente_id,
+        "sucursal_id": solicitud_data.sucursal_id,
+        "monto_solicitado": solicitud_data.monto_solicitado,
+        "ingreso_mensual": solicitud_data.ingreso_mensual,
+        "score_crediticio": solicitud_data.score_crediticio,
+        "tiene_tarjeta_credito": solicitud_data.tiene_tarjeta_credito,
+        "tiene_credito_automotriz": solicitud_data.tiene_credito_automotriz,
+        "plazo_meses": solicitud_data.plazo_meses,
+        "estado": "aprobado" if aprobado else "rechazado",
+        "motivo_rechazo": motivo_rechazo,
+        "fecha_solicitud": datetime.now(timezone.utc),
+    }
+    cola.encolar({"cliente": nuevo_cliente, "solicitud": solicitud})
+    
+    return schemas.SolicitudResponse(
+        **solicitud,
+        cliente_nombre=f"{nombre} {apellido}",
+        cliente_email=solicitud_data.email,
+        sucursal_nombre=sucursal.nombre,
+        **calcular_datos_financieros(aprobado, solicitud_data.monto_solicitado, solicitud_data.plazo_meses),
+        contraoferta=contraoferta_solicitud(aprobado, solicitud_data),
+    )
+
+
+class ErrorSimulacion(NamedTuple):
+    """Solicitud simulada que no se pudo crear"""
+    indice: int
+    detalle: str
+
+
+def iterar_simulacion(
+    db: Session,
+    cantidad: int,
+    lote: int = 100,
+    crear: Optional[Callable[[Session, schemas.SolicitudCreate], schemas.SolicitudResponse]] = None
+) -> Iterator[Union[schemas.SolicitudResponse, ErrorSimulacion]]:
+    """
+    Crear solicitudes aleatorias y entregarlas una a una conforme se crean
+    
+    Las filas se generan por lotes, así que la memoria no depende de la
+    cantidad. Valida las sucursales antes de retornar el iterador. `crear`
+    reemplaza a crear_solicitud (p. ej. para enrutar a un shard). Una
+    solicitud que falla se registra en el log y se entrega como
+    ErrorSimulacion para que el resumen la cuente.
     """
     sucursales = get_sucursales(db)
     if not sucursales:
         raise ValueError("No hay sucursales disponibles")
+    return _iterar_simulacion(db, cantidad, lote, [s.id for s in sucursales], crear or crear_solicitud)
+
+
+def _iterar_simulacion(
+    db: Session, cantidad: int, lote: int, sucursal_ids: List[int], crear
+) -> Iterator[Union[schemas.SolicitudResponse, ErrorSimulacion]]:
+    seed = random.randrange(2**32)
+    config = generator.DistribucionConfig()
+    hoy = date.today()
+    for inicio in range(0, cantidad, lote):
+        # Los datos salen del generador como dicts planos; model_construct evita
+        # revalidar (email incluido) datos que ya son válidos por construcción
+        filas = generator.generar_shard(
+            seed=seed,
+            inicio=inicio,
+            cantidad=min(lote, cantidad - inicio),
+            sucursal_ids=sucursal_ids,
+            config=config,
+            fecha_referencia=hoy,
+            # crear evalúa cada solicitud: evaluarla aquí contaría dos veces cada regla
+            evaluar=False,
+        )
+        for i, fila in enumerate(filas, start=inicio):
+            solicitud_data = schemas.SolicitudCreate.model_construct(
+                **{campo: fila[campo] for campo in schemas.SolicitudCreate.model_fields}
+            )
+            try:
+                solicitud = crear(db, solicitud_data)
+            except Exception as e:
+                logger.exception("Error creando la solicitud simulada %d", i)
+                # La siguiente empieza con la sesión limpia
+                db.rollback()
+                yield ErrorSimulacion(i, str(e))
+                continue
+            yield solicitud
+
+
+def simular_solicitudes(
+    db: Session,
+    cantidad: int,
+    detalle: str = "full",
+    tamano_muestra: int = 10,
+    crear=None
+) -> schemas.SimulacionResponse:
+    """
+    Simular múltiples solicitudes aleatorias
     
-    nombres = ["Juan", "María", "Carlos", "Ana", "Pedro", "Laura", "Luis", "Sofia", "Jorge", "Carmen"]
-    apellidos = ["García", "Rodríguez", "Martínez", "López", "Hernández", "González", "Pérez", "Sánchez", "Ramírez", "Torres"]
-    
-    solicitudes_creadas = []
+    detalle: "full" retorna todas las solicitudes, "sample" una muestra
+    aleatoria uniforme de `tamano_muestra` y "none" solo los conteos.
+    `errores` cuenta las que no se pudieron crear.
+    """
+    solicitudes = []
     aprobadas = 0
     rechazadas = 0
+    errores = 0
+    n = 0
     
-    for i in range(cantidad):
-        # Generar datos aleatorios
-        nombre = random.choice(nombres)
-        apellido = random.choice(apellidos)
-        edad = random.randint(18, 70)
-        fecha_nac = date(datetime.now().year - edad, random.randint(1, 12), random.randint(1, 28))
-        
-        solicitud_data = schemas.SolicitudCreate(
-            # Datos del cliente
-            nombre=nombre,
-            apellido=apellido,
-            email=f"{nombre.lower()}.{apellido.lower()}{i}@email.com",
-            telefono=f"55-{random.randint(1000, 9999)}-{random.randint(1000, 9999)}",
-            fecha_nacimiento=fecha_nac,
-            edad=edad,
-            # Datos de la solicitud
-            monto_solicitado=Decimal(str(random.randint(5000, 500000))),
-            ingreso_mensual=Decimal(str(random.randint(5000, 100000))),
-            score_crediticio=random.randint(400, 800),
-            tiene_tarjeta_credito=random.choice([True, False]),
-            tiene_credito_automotriz=random.choice([True, False]),
-            plazo_meses=random.choice([12, 24, 36, 48, 60]),
-            sucursal_id=random.choice(sucursales).id
-        )
-        
-        try:
-            solicitud = crear_solicitud(db, solicitud_data)
-            solicitudes_creadas.append(solicitud)
-            if solicitud.estado == "aprobado":
-                aprobadas += 1
-            else:
-                rechazadas += 1
-        except Exception as e:
-            print(f"Error creando solicitud {i}: {e}")
+    for solicitud in iterar_simulacion(db, cantidad, crear=crear):
+        if isinstance(solicitud, ErrorSimulacion):
+            errores += 1
             continue
+        if solicitud.estado == "aprobado":
+            aprobadas += 1
+        else:
+            rechazadas += 1
+        if detalle == "full":
+            solicitudes.append(solicitud)
+        elif detalle == "sample":
+            # Muestreo de reservorio: memoria fija sin conocer el total
+            if n < tamano_muestra:
+                solicitudes.append(solicitud)
+            else:
+                j = random.randint(0, n)
+                if j < tamano_muestra:
+                    solicitudes[j] = solicitud
+        n += 1
     
     return schemas.SimulacionResponse(
-        total_generadas=len(solicitudes_creadas),
+        total_generadas=aprobadas + rechazadas,
         aprobadas=aprobadas,
         rechazadas=rechazadas,
-        solicitudes=solicitudes_creadas
+        errores=errores,
+        solicitudes=solicitudes
     )
 
 
+CAMPOS_CLIENTE = ("nombre", "apellido", "email", "telefono", "fecha_nacimiento", "edad")
+CAMPOS_SOLICITUD = (
+    "sucursal_id", "monto_solicitado", "ingreso_mensual", "score_crediticio",
+    "tiene_tarjeta_credito", "tiene_credito_automotriz", "plazo_meses", "estado", "motivo_rechazo",
+)
+
+
+def _insertar_solicitudes(db: Session, filas: List[dict], valores: List[dict]) -> None:
+    """INSERT multi-fila de las solicitudes de un lote; cada fila recibe su id para el evento en vivo"""
+    ids = db.scalars(
+        insert(models.Solicitud).returning(models.Solicitud.id, sort_by_parameter_order=True), valores
+    ).all()
+    for fila, solicitud_id in zip(filas, ids):
+        fila["id"] = solicitud_id
+    eventos.registrar(db, filas)
+
+
+def insertar_lote_simulado(db: Session, filas: List[dict]) -> Tuple[int, int]:
+    """
+    Insertar en bloque un lote de solicitudes ya evaluadas sin hacer commit
+
+    Las filas son las que produce app.generator (datos del cliente, de la
+    solicitud y la decisión). Se emiten dos INSERT multi-fila con RETURNING
+    de los ids: clientes y después las solicitudes. Las decisiones y el delta
+    de indicadores del lote se publican al dashboard cuando el llamador
+    confirma.
+    
+    Returns:
+        Tuple[int, int]: (aprobadas, rechazadas)
+    """
+    if not filas:
+        return 0, 0
+    cliente_ids = db.scalars(
+        insert(models.Cliente).returning(models.Cliente.id, sort_by_parameter_order=True),
+        [{campo: fila[campo] for campo in CAMPOS_CLIENTE} for fila in filas]
+    ).all()
+    _insertar_solicitudes(db, filas, [
+        {"cliente_id": cliente_id, **{campo: fila[campo] for campo in CAMPOS_SOLICITUD}}
+        for cliente_id, fila in zip(cliente_ids, filas)
+    ])
+    aprobadas = sum(1 for fila in filas if fila["estado"] == "aprobado")
+    return aprobadas, len(filas) - aprobadas
+
+
+def insertar_lote_evaluado(db: Session, filas: List[dict]) -> Tuple[int, int]:
+    """
+    Insertar en bloque solicitudes evaluadas de clientes que pueden existir
+
+    Igual que insertar_lote_simulado, pero los clientes se buscan por email
+    con una sola consulta y solo se insertan los que faltan (una vez por
+    email aunque se repita en el lote). No hace commit.
+
+    Returns:
+        Tuple[int, int]: (aprobadas, rechazadas)
+    """
+    if not filas:
+        return 0, 0
+    cliente_ids = dict(db.execute(
+        select(models.Cliente.email, models.Cliente.id).where(
+            models.Cliente.email.in_({fila["email"] for fila in filas})
+        )
+    ).all())
+    nuevos = {}
+    for fila in filas:
+        if fila["email"] not in cliente_ids and fila["email"] not in nuevos:
+            nuevos[fila["email"]] = {campo: fila[campo] for campo in CAMPOS_CLIENTE}
+    if nuevos:
+        ids = db.scalars(
+            insert(models.Cliente).returning(models.Cliente.id, sort_by_parameter_order=True),
+            list(nuevos.values())
+        ).all()
+        cliente_ids.update(zip(nuevos, ids))
+    _insertar_solicitudes(db, filas, [
+        {"cliente_id": cliente_ids[fila["email"]], **{campo: fila[campo] for campo in CAMPOS_SOLICITUD}}
+        for fila in filas
+    ])
+    aprobadas = sum(1 for fila in filas if fila["estado"] == "aprobado")
+    return aprobadas, len(filas) - aprobadas
+
+
+def _resumen_archivado(db: Session) -> dict:
+    """Totales de las solicitudes archivadas por sucursal: (total, aprobadas, monto, monto_aprobado, suma_score)"""
+    resumen = models.ResumenArchivado
+    filas = db.query(
+        resumen.sucursal_id,
+        func.sum(resumen.total),
+        func.sum(resumen.aprobadas),
+        func.sum(resumen.monto),
+        func.sum(resumen.monto_aprobado),
+        func.sum(resumen.suma_score),
+    ).group_by(resumen.sucursal_id)
+    return {sucursal_id: tuple(valores) for sucursal_id, *valores in filas}
+
+
 def get_indicadores(db: Session) -> schemas.IndicadoresGenerales:
     """
     Obtener indicadores generales y por sucursal
+    
+    Incluye las solicitudes archivadas desde resumen_archivado (app/archivo.py).
     """
+    archivado = _resumen_archivado(db)
+    total_archivado = [sum(valores[i] or 0 for valores in archivado.values()) for i in range(5)]
+    
     # Indicadores generales
-    total_solicitudes = db.query(func.count(models.Solicitud.id)).scalar()
+    total_solicitudes = db.query(func.count(models.Solicitud.id)).scalar() + total_archivado[0]
     total_aprobadas = db.query(func.count(models.Solicitud.id)).filter(
         models.Solicitud.estado == "aprobado"
-    ).scalar()
-    total_rechazadas = db.query(func.count(models.Solicitud.id)).filter(
-        models.Solicitud.estado == "rechazado"
-    ).scalar()
+    ).scalar() + total_archivado[1]
+    total_rechazadas = total_solicitudes - total_aprobadas
     
     tasa_aprobacion = (total_aprobadas / total_solicitudes * 100) if total_solicitudes > 0 else 0
     
-    monto_total_solicitado_raw = db.query(func.sum(models.Solicitud.monto_solicitado)).scalar()
+    monto_total_solicitado_raw = (db.query(func.sum(models.Solicitud.monto_solicitado)).scalar() or 0) + total_archivado[2]
     monto_total_solicitado = round(monto_total_solicitado_raw, 2) if monto_total_solicitado_raw else Decimal("0.00")
     
-    monto_total_aprobado_raw = db.query(func.sum(models.Solicitud.monto_solicitado)).filter(
+    monto_total_aprobado_raw = (db.query(func.sum(models.Solicitud.monto_solicitado)).filter(
         models.Solicitud.estado == "aprobado"
-    ).scalar()
+    ).scalar() or 0) + total_archivado[3]
     monto_total_aprobado = round(monto_total_aprobado_raw, 2) if monto_total_aprobado_raw else Decimal("0.00")
     
-    score_promedio = db.query(func.avg(models.Solicitud.score_crediticio)).scalar() or 0
+    suma_score = (db.query(func.sum(models.Solicitud.score_crediticio)).scalar() or 0) + total_archivado[4]
+    score_promedio = suma_score / total_solicitudes if total_solicitudes else 0
     
     # Indicadores por sucursal
     indicadores_sucursal = []
     sucursales = get_sucursales(db)
     
     for sucursal in sucursales:
+        archivado_suc = archivado.get(sucursal.id, (0, 0, 0, 0, 0))
         total_suc = db.query(func.count(models.Solicitud.id)).filter(
             models.Solicitud.sucursal_id == sucursal.id
-        ).scalar()
+        ).scalar() + archivado_suc[0]
         
         aprobadas_suc = db.query(func.count(models.Solicitud.id)).filter(
             and_(
                 models.Solicitud.sucursal_id == sucursal.id,
                 models.Solicitud.estado == "aprobado"
             )
-        ).scalar()
+        ).scalar() + archivado_suc[1]
         
-        rechazadas_suc = db.query(func.count(models.Solicitud.id)).filter(
-            and_(
-                models.Solicitud.sucursal_id == sucursal.id,
-                models.Solicitud.estado == "rechazado"
-            )
-        ).scalar()
+        rechazadas_suc = total_suc - aprobadas_suc
         
-        monto_promedio_raw = db.query(func.avg(models.Solicitud.monto_solicitado)).filter(
+        monto_suc = (db.query(func.sum(models.Solicitud.monto_solicitado)).filter(
             models.Solicitud.sucursal_id == sucursal.id
-        ).scalar()
-        monto_promedio = round(monto_promedio_raw, 2) if monto_promedio_raw else Decimal("0.00")
+        ).scalar() or 0) + archivado_suc[2]
+        monto_promedio = round(Decimal(monto_suc) / total_suc, 2) if total_suc else Decimal("0.00")
         
-        monto_aprobado_total_raw = db.query(func.sum(models.Solicitud.monto_solicitado)).filter(
+        monto_aprobado_total_raw = (db.query(func.sum(models.Solicitud.monto_solicitado)).filter(
             and_(
                 models.Solicitud.sucursal_id == sucursal.id,
                 models.Solicitud.estado == "aprobado"
             )
-        ).scalar()
+        ).scalar() or 0) + archivado_suc[3]
         monto_aprobado_total = round(monto_aprobado_total_raw, 2) if monto_aprobado_total_raw else Decimal("0.00")
         
         indicadores_sucursal.append(
@@ -279,10 +543,66 @@ def get_indicadores(db: Session) -> schemas.IndicadoresGenerales:
     )
 
 
-def get_solicitudes_recientes(db: Session, limit: int = 50) -> List[models.Solicitud]:
-    """Obtener solicitudes recientes"""
-    return db.query(models.Solicitud)\
-        .order_by(models.Solicitud.fecha_solicitud.desc())\
-        .limit(limit)\
-        .all()
+def get_indicadores_con_version(db: Session) -> Tuple[versiones.Version, schemas.IndicadoresGenerales]:
+    """Versión de las solicitudes e indicadores leídos de la misma foto"""
+    with foto_consistente(db):
+        return version_solicitudes(db), get_indicadores(db)
+
+
+def _listar_solicitudes(
+    db: Session, solicitud, limit: int, sucursal_id: Optional[int],
+    desde: Optional[datetime], hasta: Optional[datetime],
+) -> List[schemas.SolicitudReciente]:
+    cliente, sucursal = models.Cliente, models.Sucursal
+    columnas = solicitud.__table__.c
+    consulta = (
+        select(
+            *(columnas[campo] for campo in schemas.Solicitud.model_fields),
+            (cliente.nombre + " " + cliente.apellido).label("cliente_nombre"),
+            cliente.email.label("cliente_email"),
+            sucursal.nombre.label("sucursal_nombre"),
+        )
+        .join(cliente, cliente.id == solicitud.cliente_id)
+        .join(sucursal, sucursal.id == solicitud.sucursal_id)
+        .order_by(solicitud.fecha_solicitud.desc(), solicitud.id.desc())
+        .limit(limit)
+    )
+    if sucursal_id is not None:
+        consulta = consulta.where(solicitud.sucursal_id == sucursal_id)
+    if desde is not None:
+        consulta = consulta.where(solicitud.fecha_solicitud >= desde)
+    if hasta is not None:
+        consulta = consulta.where(solicitud.fecha_solicitud < hasta)
+    construir = schemas.SolicitudReciente.model_construct
+    return [construir(**fila) for fila in db.execute(consulta).mappings()]
+
+
+def get_solicitudes_recientes(
+    db: Session, limit: int = 50, sucursal_id: Optional[int] = None,
+    desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+) -> List[schemas.SolicitudReciente]:
+    """
+    Obtener solicitudes recientes con los nombres de cliente y sucursal
+    
+    Una sola consulta sobre solicitudes ⋈ clientes ⋈ sucursales con solo las
+    columnas de la respuesta (sin cargas perezosas por fila). Las filas se
+    convierten en modelos con model_construct: no pasan por el identity map
+    del ORM ni se revalidan, porque los tipos ya vienen de la base.
+    Con `sucursal_id` solo se listan las de esa sucursal y con `desde` /
+    `hasta` solo las de fecha_solicitud en [desde, hasta).
+    
+    Las solicitudes archivadas (app/archivo.py) se consultan solo si el rango
+    llega a la fecha más reciente archivada y la tabla activa no alcanza a
+    llenar la página con filas posteriores a ella.
+    """
+    recientes = _listar_solicitudes(db, models.Solicitud, limit, sucursal_id, desde, hasta)
+    estado = db.query(models.EstadoArchivo.fecha_max).filter(models.EstadoArchivo.fecha_max.isnot(None))
+    if desde is not None:
+        estado = estado.filter(models.EstadoArchivo.fecha_max >= desde)
+    fecha_max = estado.scalar()
+    if fecha_max is None or (len(recientes) == limit and recientes[-1].fecha_solicitud > fecha_max):
+        return recientes
+    archivadas = _listar_solicitudes(db, models.SolicitudArchivada, limit, sucursal_id, desde, hasta)
+    ordenadas = heapq.merge(recientes, archivadas, key=lambda s: (s.fecha_solicitud, s.id), reverse=True)
+    return list(islice(ordenadas, limit))
 
@@ -1,17 +1,86 @@
 """
 Configuración de la base de datos con SQLAlchemy
 """
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex
 from .config import settings
 
+
+def _engine_options(url: str) -> dict:
+    """
+    Construir los argumentos de create_engine a partir de la configuración
+
+    - Pool: tamaño, overflow, reciclado y tiempo máximo de espera
+    - statement_timeout por sentencia (solo PostgreSQL)
+    - Modo PgBouncer: NullPool (el pool lo administra PgBouncer), sin
+      parámetros de arranque y sin sentencias preparadas del lado del servidor
+    """
+    url_obj = make_url(url)
+    backend = url_obj.get_backend_name()
+    options = {"pool_pre_ping": True}
+    connect_args = {}
+
+    if settings.DB_PGBOUNCER:
+        options["poolclass"] = NullPool
+    elif not (backend == "sqlite" and url_obj.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+
+    if backend == "sqlite":
+        connect_args["check_same_thread"] = False
+    elif backend == "postgresql":
+        if url_obj.get_driver_name() == "psycopg":
+            # psycopg 3 prepara sentencias automáticamente; PgBouncer en modo
+            # transacción no las soporta. psycopg2 nunca las usa.
+            connect_args["prepare_threshold"] = None
+        if settings.DB_STATEMENT_TIMEOUT_MS and not settings.DB_PGBOUNCER:
+            connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def create_db_engine(url: str) -> Engine:
+    """Crear un engine de SQLAlchemy con la configuración de pool de la aplicación"""
+    db_engine = create_engine(url, **_engine_options(url))
+
+    if (
+        settings.DB_PGBOUNCER
+        and settings.DB_STATEMENT_TIMEOUT_MS
+        and db_engine.dialect.name == "postgresql"
+    ):
+        # PgBouncer descarta los parámetros de arranque: el timeout se fija
+        # por transacción con SET LOCAL
+        @event.listens_for(db_engine, "begin")
+        def _set_statement_timeout(conn):
+            conn.exec_driver_sql(
+                f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}"
+            )
+
+    return db_engine
+
+
 # Crear el engine de SQLAlchemy
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+engine = create_db_engine(settings.database_url)
+
+# Engine opcional para la réplica de solo lectura
+replica_engine: Optional[Engine] = (
+    create_db_engine(settings.REPLICA_DATABASE_URL) if settings.REPLICA_DATABASE_URL else None
 )
 
 # Crear la sesión local
@@ -20,14 +89,239 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base para los modelos
 Base = declarative_base()
 
+# Índices de versiones anteriores, reemplazados por los declarados en los
+# modelos (los índices de llave primaria y de UNIQUE los da la restricción)
+INDICES_OBSOLETOS = {
+    "solicitudes": ("idx_solicitudes_sucursal", "idx_solicitudes_estado", "idx_solicitudes_fecha",
+                    "ix_solicitudes_fecha_solicitud", "ix_solicitudes_id"),
+    "clientes": ("idx_clientes_email", "ix_clientes_id"),
+    "sucursales": ("ix_sucursales_id",),
+    "simulacion_jobs": ("ix_simulacion_jobs_id",),
+    "usuarios_admin": ("idx_usuarios_admin_username", "ix_usuarios_admin_id"),
+}
+
+
+# Lock consultivo de PostgreSQL: una migración de índices a la vez por base
+LOCK_MIGRACION = 7_310_044
+
+
+def _indices_invalidos(conn) -> set:
+    """Índices que quedaron INVALID por un CREATE INDEX CONCURRENTLY que falló"""
+    return set(conn.exec_driver_sql(
+        "SELECT c.relname FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE NOT i.indisvalid AND n.nspname = current_schema()"
+    ).scalars())
+
+
+def asegurar_indices(db_engine: Engine) -> list:
+    """
+    Crear en una base existente los índices de los modelos que falten y
+    eliminar los obsoletos
+
+    create_all solo crea los índices de las tablas que crea él mismo. En
+    PostgreSQL se usa CONCURRENTLY para no bloquear las escrituras: antes se
+    crea pg_trgm (índices GIN de clientes) y los índices que quedaron
+    INVALID por una creación interrumpida se eliminan y se vuelven a crear.
+    Se ejecuta desde app.migraciones, no al importar la aplicación.
+
+    Returns:
+        Nombres de los índices creados
+    """
+    postgresql = db_engine.dialect.name == "postgresql"
+    concurrente = " CONCURRENTLY" if postgresql else ""
+    creados = []
+    with db_engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        invalidos = set()
+        if postgresql:
+            conn.exec_driver_sql(f"SELECT pg_advisory_lock({LOCK_MIGRACION})")
+        try:
+            if postgresql:
+                conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                invalidos = _indices_invalidos(conn)
+            inspector = inspect(conn)
+            tablas = set(inspector.get_table_names())
+            for tabla in Base.metadata.sorted_tables:
+                if tabla.name not in tablas:
+                    continue
+                presentes = {i["name"] for i in inspector.get_indexes(tabla.name)}
+                for indice in tabla.indexes:
+                    condicion = indice._ddl_if
+                    if condicion is not None and condicion.dialect not in (None, db_engine.dialect.name):
+                        continue
+                    if indice.name in invalidos:
+                        conn.exec_driver_sql(f"DROP INDEX{concurrente} IF EXISTS {indice.name}")
+                    elif indice.name in presentes:
+                        continue
+                    sql = str(CreateIndex(indice, if_not_exists=True).compile(dialect=db_engine.dialect))
+                    conn.exec_driver_sql(sql.replace("INDEX", "INDEX" + concurrente, 1))
+                    creados.append(indice.name)
+                for nombre in INDICES_OBSOLETOS.get(tabla.name, ()):
+                    if nombre in presentes:
+                        conn.exec_driver_sql(f"DROP INDEX{concurrente} IF EXISTS {nombre}")
+        finally:
+            if postgresql:
+                # La conexión vuelve al pool: el lock de sesión no se libera solo
+                conn.exec_driver_sql(f"SELECT pg_advisory_unlock({LOCK_MIGRACION})")
+    return creados
+
+
+def _checkout_connection(db_engine: Engine):
+    """
+    Reservar una conexión del pool para toda la petición
+
+    Si el pool está agotado durante más de DB_POOL_TIMEOUT se responde
+    503 de inmediato en lugar de dejar la petición colgada.
+    """
+    try:
+        return db_engine.connect()
+    except PoolTimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio saturado, intente de nuevo en unos segundos",
+            headers={"Retry-After": "1"},
+        )
+
 
 def get_db():
     """
     Dependency para obtener la sesión de base de datos
+
+    La sesión queda ligada a una única conexión durante la petición, de modo
+    que los commits intermedios no la devuelven al pool.
     """
-    db = SessionLocal()
+    with sesion() as db:
+        yield db
+
+
+@contextmanager
+def sesion(lectura: bool = False) -> Iterator[Session]:
+    """
+    Sesión ligada a una conexión que vuelve al pool al salir del bloque
+
+    Para respuestas que siguen abiertas después de leer (streams): una
+    dependency de FastAPI no libera su conexión hasta que termina la
+    respuesta. Con `lectura` se usa la réplica como en get_read_db.
+    """
+    connection = _checkout_read_connection() if lectura else _checkout_connection(engine)
+    db = SessionLocal(bind=connection)
     try:
         yield db
     finally:
         db.close()
+        connection.close()
+
+
+FOTO = "foto_consistente"
+
+
+@contextmanager
+def foto_consistente(db: Session) -> Iterator[Session]:
+    """
+    Lecturas de `db` dentro del bloque desde una sola foto de la base
+
+    En PostgreSQL la transacción se reinicia en REPEATABLE READ, así que la
+    versión de los datos (app/versiones.py) y lo que se calcule después con
+    la misma sesión corresponden al mismo instante aunque entre tanto se
+    confirmen escrituras. Solo para lecturas: la transacción se descarta al
+    salir. Anidado reutiliza la foto exterior.
+    """
+    if db.get_bind().dialect.name != "postgresql" or db.info.get(FOTO):
+        yield db
+        return
+    db.rollback()
+    db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"))
+    db.info[FOTO] = True
+    try:
+        yield db
+    finally:
+        db.info.pop(FOTO, None)
+        db.rollback()
+
+
+def replication_lag(connection) -> float:
+    """
+    Retraso de replicación en segundos de la conexión dada
+
+    En un servidor que no está en recuperación (o en SQLite) es 0. Si la
+    réplica ya aplicó todo lo recibido también se considera al día, aunque
+    el primario lleve un rato sin escribir.
+    """
+    if connection.dialect.name != "postgresql":
+        return 0.0
+    lag = connection.exec_driver_sql(
+        "SELECT CASE "
+        "WHEN NOT pg_is_in_recovery() THEN 0 "
+        "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    ).scalar()
+    return float(lag or 0)
+
 
+class ReplicaMonitor:
+    """
+    Estado de salud de la réplica
+
+    El resultado de la verificación se reutiliza durante
+    REPLICA_CHECK_INTERVAL segundos para no agregar una consulta por petición.
+    """
+
+    def __init__(self, replica: Engine, max_lag: float, check_interval: float):
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._disponible = False
+        self._proxima_verificacion = 0.0
+        self._lock = threading.Lock()
+
+    def disponible(self) -> bool:
+        """Indica si la réplica es alcanzable y su retraso está en el umbral"""
+        ahora = time.monotonic()
+        if ahora < self._proxima_verificacion:
+            return self._disponible
+        with self._lock:
+            if ahora >= self._proxima_verificacion:
+                self._disponible = self._verificar()
+                self._proxima_verificacion = ahora + self.check_interval
+        return self._disponible
+
+    def marcar_caida(self) -> None:
+        """Marcar la réplica como no disponible hasta la siguiente verificación"""
+        self._disponible = False
+        self._proxima_verificacion = time.monotonic() + self.check_interval
+
+    def _verificar(self) -> bool:
+        try:
+            with self.replica.connect() as connection:
+                return replication_lag(connection) <= self.max_lag
+        except SQLAlchemyError:
+            return False
+
+
+replica_monitor: Optional[ReplicaMonitor] = (
+    ReplicaMonitor(replica_engine, settings.REPLICA_MAX_LAG_SECONDS, settings.REPLICA_CHECK_INTERVAL)
+    if replica_engine is not None else None
+)
+
+
+def _checkout_read_connection():
+    """Conexión de lectura: réplica si está sana, primario en caso contrario"""
+    if replica_engine is not None and replica_monitor is not None and replica_monitor.disponible():
+        try:
+            return replica_engine.connect()
+        except SQLAlchemyError:
+            replica_monitor.marcar_caida()
+    return _checkout_connection(engine)
+
+
+def get_read_db():
+    """
+    Dependency para endpoints de solo lectura
+
+    Usa la réplica configurada en REPLICA_DATABASE_URL y recurre al primario
+    cuando la réplica no responde o su retraso supera REPLICA_MAX_LAG_SECONDS.
+    """
+    with sesion(lectura=True) as db:
+        yield db
@@ -0,0 +1,360 @@
+"""
+Eventos en vivo del tablero (Server-Sent Events)
+
+Cada commit que inserta solicitudes publica un evento con las decisiones y el
+delta de indicadores por sucursal; GET /api/indicadores/eventos los entrega
+al dashboard, que los suma a la última foto en lugar de volver a pedir todos
+los agregados.
+
+Flujo:
+- `registrar(db, solicitudes)` agrega el evento a la sesión; se publica solo
+  si la transacción se confirma (un rollback lo descarta)
+- Al confirmar, cada evento lleva la versión de los datos que asignó su
+  transacción (app/versiones.py) y, con shards, el shard que la asignó. La
+  versión de la foto inicial dice exactamente qué transacciones contiene,
+  así que un stream descarta los eventos que ya están en ella, aunque sus
+  ids o sus versiones se hayan asignado en otro orden
+- En PostgreSQL el evento viaja con pg_notify dentro de la misma transacción
+  y cada worker lo recibe con LISTEN (EscuchaPostgres) y lo reenvía a su
+  difusor local; en otros motores (o con DB_PGBOUNCER) se publica directo en
+  el difusor del proceso
+- El difusor entrega cada evento a la cola acotada de cada suscriptor; el
+  stream agrupa lo recibido en ventanas de EVENTOS_INTERVALO_MS, de modo que
+  un tablero recibe a lo más unos pocos mensajes por segundo aunque entren
+  miles de solicitudes
+
+Formato del stream (text/event-stream):
+- `event: indicadores`: foto completa (IndicadoresGenerales) al conectar
+- `event: actualizacion`: {"decisiones": [...], "delta": [...]} con las
+  últimas decisiones y las sumas por sucursal desde el mensaje anterior
+- `event: resincronizar`: el suscriptor no alcanzó a leer su cola; el
+  cliente debe reconectar para recibir una foto nueva
+- Comentarios `: ping` cada EVENTOS_HEARTBEAT segundos. El servidor cierra
+  el stream tras EVENTOS_DURACION_MAX segundos y el cliente reconecta
+"""
+import asyncio
+import select
+import threading
+from decimal import Decimal
+from typing import AsyncIterator, Iterable, List, Optional, Set, Tuple, Union
+
+import orjson
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import responses, versiones
+from .config import settings
+
+PENDIENTES = "eventos_pendientes"
+# Shard de la sesión (ShardRouter.sesion); ausente en la base principal
+SHARD = "shard"
+# fecha_solicitud la asigna la BD al insertar; leerla tras el flush costaría una consulta
+CAMPOS_DECISION = ("id", "sucursal_id", "estado", "monto_solicitado", "score_crediticio")
+
+
+def _valor(solicitud, campo: str):
+    """Campo de una solicitud como dict (inserciones en bloque) o como modelo"""
+    if isinstance(solicitud, dict):
+        return solicitud.get(campo)
+    return getattr(solicitud, campo, None)
+
+
+def construir_evento(solicitudes: Iterable) -> Optional[dict]:
+    """
+    Evento con las últimas decisiones y el delta por sucursal de `solicitudes`
+
+    Solo se incluyen como decisiones las que ya tienen id. La versión se
+    agrega al confirmar.
+    """
+    delta = {}
+    decisiones = []
+    for solicitud in solicitudes:
+        sucursal_id = _valor(solicitud, "sucursal_id")
+        suma = delta.get(sucursal_id)
+        if suma is None:
+            suma = delta[sucursal_id] = _delta_vacio(sucursal_id)
+        monto = Decimal(str(_valor(solicitud, "monto_solicitado")))
+        aprobada = _valor(solicitud, "estado") == "aprobado"
+        suma["total_solicitudes"] += 1
+        suma["aprobadas" if aprobada else "rechazadas"] += 1
+        suma["monto_solicitado"] += monto
+        suma["monto_aprobado"] += monto if aprobada else 0
+        suma["suma_score"] += _valor(solicitud, "score_crediticio")
+        if _valor(solicitud, "id") is not None:
+            decisiones.append({campo: _valor(solicitud, campo) for campo in CAMPOS_DECISION})
+    if not delta:
+        return None
+    return {
+        "decisiones": decisiones[-settings.EVENTOS_MAX_DECISIONES:],
+        "delta": list(delta.values()),
+    }
+
+
+def _delta_vacio(sucursal_id: int) -> dict:
+    return {
+        "sucursal_id": sucursal_id,
+        "total_solicitudes": 0,
+        "aprobadas": 0,
+        "rechazadas": 0,
+        "monto_solicitado": Decimal("0"),
+        "monto_aprobado": Decimal("0"),
+        "suma_score": 0,
+    }
+
+
+Version = Union[versiones.Version, Tuple[versiones.Version, ...]]
+
+
+def incluido(evento: dict, version: Optional[Version]) -> bool:
+    """
+    Si la foto de versión `version` ya contiene el evento
+
+    Con shards `version` tiene la de cada shard; los eventos de la base
+    principal no forman parte de esa foto y se consideran incluidos.
+    """
+    if version is None or evento.get("version") is None:
+        return False
+    if isinstance(version, tuple) and not isinstance(version, versiones.Foto):
+        shard = evento.get(SHARD)
+        return shard is None or versiones.incluye(version[shard], evento["version"])
+    return evento.get(SHARD) is None and versiones.incluye(version, evento["version"])
+
+
+def combinar(eventos: List[dict], version: Optional[Version] = None) -> Optional[dict]:
+    """
+    Agrupar varios eventos en una actualización
+
+    Los eventos que ya están en la foto de versión `version` que recibió el
+    suscriptor se descartan.
+    """
+    delta = {}
+    decisiones = []
+    for evento in eventos:
+        if incluido(evento, version):
+            continue
+        decisiones.extend(evento["decisiones"])
+        for parcial in evento["delta"]:
+            suma = delta.get(parcial["sucursal_id"])
+            if suma is None:
+                suma = delta[parcial["sucursal_id"]] = _delta_vacio(parcial["sucursal_id"])
+            for campo in ("total_solicitudes", "aprobadas", "rechazadas", "suma_score"):
+                suma[campo] += parcial[campo]
+            for campo in ("monto_solicitado", "monto_aprobado"):
+                # Los eventos de pg_notify llegan con los montos como cadena
+                suma[campo] += Decimal(str(parcial[campo]))
+    if not delta:
+        return None
+    return {"decisiones": decisiones[-settings.EVENTOS_MAX_DECISIONES:], "delta": list(delta.values())}
+
+
+# ==================== Publicación al confirmar ====================
+
+def usa_notify(db_engine: Engine) -> bool:
+    """
+    Si los eventos viajan por LISTEN/NOTIFY
+
+    LISTEN necesita una conexión de sesión; detrás de PgBouncer en modo
+    transacción cada worker publica solo en su difusor local.
+    """
+    return db_engine.dialect.name == "postgresql" and not settings.DB_PGBOUNCER
+
+
+def registrar(db: Session, solicitudes: Iterable) -> None:
+    """Publicar las solicitudes cuando se confirme la transacción actual de `db`"""
+    evento = construir_evento(solicitudes)
+    if evento is not None:
+        db.info.setdefault(PENDIENTES, []).append(evento)
+        versiones.marcar(db)
+
+
+@versiones.al_confirmar
+def _sellar(session: Session, version: int) -> None:
+    eventos = session.info.get(PENDIENTES)
+    if not eventos:
+        return
+    for evento in eventos:
+        evento["version"] = version
+        if SHARD in session.info:
+            evento[SHARD] = session.info[SHARD]
+    if not usa_notify(session.get_bind()):
+        return
+    # NOTIFY se entrega al confirmar; también a este worker, vía EscuchaPostgres
+    for evento in session.info.pop(PENDIENTES):
+        session.execute(func.pg_notify(settings.EVENTOS_CANAL, responses.dumps(evento).decode()).select())
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_local(session: Session) -> None:
+    for evento in session.info.pop(PENDIENTES, []):
+        difusor.publicar(evento)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(session: Session) -> None:
+    session.info.pop(PENDIENTES, None)
+
+
+# ==================== Difusor en memoria ====================
+
+class Suscripcion:
+    """Cola acotada de un stream, atada al event loop que la consume"""
+
+    def __init__(self, difusor: "Difusor", loop: asyncio.AbstractEventLoop, capacidad: int):
+        self.difusor = difusor
+        self.loop = loop
+        self.cola: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(maxsize=capacidad)
+        self.desbordada = False
+
+    def _entregar(self, evento: Optional[dict]) -> None:
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Se pierde la continuidad: el stream pide resincronizar
+            self.desbordada = True
+
+    def drenar(self) -> List[Optional[dict]]:
+        eventos = []
+        while not self.cola.empty():
+            eventos.append(self.cola.get_nowait())
+        return eventos
+
+    def cancelar(self) -> None:
+        self.difusor.cancelar(self)
+
+
+class Difusor:
+    """Reparte eventos a los suscriptores del proceso; publicar() es seguro entre hilos"""
+
+    def __init__(self, capacidad: int = settings.EVENTOS_COLA_MAX):
+        self.capacidad = capacidad
+        self._suscripciones: Set[Suscripcion] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def suscriptores(self) -> int:
+        return len(self._suscripciones)
+
+    def suscribir(self) -> Suscripcion:
+        """Crear una suscripción; se llama desde el event loop que la consumirá"""
+        suscripcion = Suscripcion(self, asyncio.get_running_loop(), self.capacidad)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion) -> None:
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, evento: Optional[dict]) -> None:
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+            except RuntimeError:
+                # El event loop del suscriptor ya terminó
+                self.cancelar(suscripcion)
+
+    def cerrar(self) -> None:
+        """Terminar todos los streams abiertos (al detener la aplicación)"""
+        self.publicar(None)
+
+
+def _mensaje(tipo: str, datos: bytes) -> bytes:
+    return b"event: " + tipo.encode() + b"\ndata: " + datos + b"\n\n"
+
+
+async def flujo(
+    suscripcion: Suscripcion,
+    indicadores: bytes,
+    version: Optional[Version],
+) -> AsyncIterator[bytes]:
+    """
+    Stream SSE de una suscripción: foto inicial y actualizaciones agrupadas
+
+    `indicadores` es la foto ya serializada y `version` la versión de los
+    datos que incluye (una por shard con shards); la suscripción se crea
+    antes de tomar la foto para no perder eventos entre ambas.
+    """
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + settings.EVENTOS_DURACION_MAX
+    try:
+        yield b"retry: 3000\n" + _mensaje("indicadores", indicadores)
+        while True:
+            restante = limite - loop.time()
+            if restante <= 0:
+                break
+            try:
+                evento = await asyncio.wait_for(
+                    suscripcion.cola.get(), timeout=min(settings.EVENTOS_HEARTBEAT, restante)
+                )
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if evento is not None:
+                await asyncio.sleep(settings.EVENTOS_INTERVALO_MS / 1000)
+            eventos = [evento] + suscripcion.drenar()
+            if suscripcion.desbordada:
+                yield _mensaje("resincronizar", b"{}")
+                break
+            actualizacion = combinar([e for e in eventos if e is not None], version)
+            if actualizacion is not None:
+                yield _mensaje("actualizacion", responses.dumps(actualizacion))
+            if None in eventos:
+                break
+    finally:
+        suscripcion.cancelar()
+
+
+# ==================== LISTEN/NOTIFY entre workers ====================
+
+class EscuchaPostgres:
+    """Hilo con una conexión dedicada en LISTEN que reenvía al difusor local"""
+
+    def __init__(self, db_engine: Engine, canal: str = settings.EVENTOS_CANAL):
+        self.engine = db_engine
+        self.canal = canal
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._hilo = threading.Thread(target=self._escuchar, name="eventos-listen", daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout: Optional[float] = None) -> None:
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=timeout)
+
+    def _escuchar(self) -> None:
+        while not self._detener.is_set():
+            try:
+                self._escuchar_conexion()
+            except Exception as e:
+                print(f"❌ Error en LISTEN {self.canal}, reconectando: {e}")
+                self._detener.wait(1)
+
+    def _escuchar_conexion(self) -> None:
+        conexion = self.engine.raw_connection()
+        # Fuera del pool: la conexión queda en LISTEN mientras viva el proceso
+        conexion.detach()
+        try:
+            pg = conexion.driver_connection
+            pg.autocommit = True
+            with pg.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.canal}")
+            while not self._detener.is_set():
+                if select.select([pg], [], [], 1.0) == ([], [], []):
+                    continue
+                pg.poll()
+                while pg.notifies:
+                    difusor.publicar(orjson.loads(pg.notifies.pop(0).payload))
+        finally:
+            conexion.close()
+
+
+# Instancias del proceso; las escuchas (una por base que recibe solicitudes)
+# se inician en el arranque con PostgreSQL
+difusor = Difusor()
+escuchas: List[EscuchaPostgres] = []
@@ -0,0 +1,308 @@
+"""
+Generador reproducible de solicitudes sintéticas
+
+El trabajo se divide en shards de tamaño fijo; cada shard usa su propio
+random.Random sembrado con (seed, inicio), así que el resultado depende solo
+de la semilla, la cantidad, el tamaño de shard y la fecha de referencia, y no
+del número de procesos. Las filas se generan como dicts planos (sin construir
+SolicitudCreate ni validar EmailStr) y ya incluyen la decisión de crédito.
+
+Uso:
+    python -m app.generator --cantidad 1000000 --seed 42 --workers 8 --formato ndjson --salida datos.ndjson
+    python -m app.generator --cantidad 1000000 --seed 42 --formato db
+"""
+import argparse
+import csv
+import json
+import math
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .business_logic import evaluar_solicitud_credito
+
+NOMBRES = ["Juan", "María", "Carlos", "Ana", "Pedro", "Laura", "Luis", "Sofia", "Jorge", "Carmen"]
+APELLIDOS = ["García", "Rodríguez", "Martínez", "López", "Hernández", "González", "Pérez", "Sánchez", "Ramírez", "Torres"]
+
+COLUMNAS = [
+    "nombre", "apellido", "email", "telefono", "fecha_nacimiento", "edad",
+    "monto_solicitado", "ingreso_mensual", "score_crediticio", "tiene_tarjeta_credito",
+    "tiene_credito_automotriz", "plazo_meses", "sucursal_id", "estado", "motivo_rechazo",
+]
+
+
+class DistribucionConfig(BaseModel):
+    """Distribuciones de los datos sintéticos"""
+    # Score: normal truncada al rango válido
+    score_media: float = 680
+    score_desviacion: float = 70
+    # Ingreso mensual: log-normal (mediana y sigma del logaritmo)
+    ingreso_mediana: float = 25000
+    ingreso_sigma: float = 0.6
+    ingreso_min: int = 5000
+    ingreso_max: int = 500000
+    # Monto: múltiplo del ingreso, log-normal
+    monto_multiplo_mediana: float = 4.0
+    monto_multiplo_sigma: float = 0.5
+    monto_min: int = 5000
+    # Edad: triangular
+    edad_min: int = 18
+    edad_max: int = 75
+    edad_moda: int = 35
+    # Plazos y sucursales con pesos relativos
+    plazos: Dict[int, float] = Field(default_factory=lambda: {12: 0.2, 24: 0.25, 36: 0.3, 48: 0.15, 60: 0.1})
+    sucursal_pesos: Optional[Dict[int, float]] = None
+    prob_tarjeta: float = 0.55
+    prob_automotriz: float = 0.25
+
+
+def _fecha_nacimiento(rng: random.Random, edad: int, referencia: date) -> date:
+    """Fecha de nacimiento tal que la edad cumplida en la referencia sea exacta"""
+    # El último nacimiento posible cumple años justo en la referencia; hasta
+    # 364 días antes la edad sigue siendo la misma
+    dia = 28 if (referencia.month, referencia.day) == (2, 29) else referencia.day
+    ultimo = date(referencia.year - edad, referencia.month, dia)
+    return date.fromordinal(ultimo.toordinal() - rng.randint(0, 364))
+
+
+def _edad(nacimiento: date, referencia: date) -> int:
+    return referencia.year - nacimiento.year - (
+        (referencia.month, referencia.day) < (nacimiento.month, nacimiento.day)
+    )
+
+
+def generar_shard(
+    seed: int,
+    inicio: int,
+    cantidad: int,
+    sucursal_ids: List[int],
+    config: DistribucionConfig,
+    fecha_referencia: date,
+    prefijo: str = "s",
+    evaluar: bool = True,
+) -> List[dict]:
+    """
+    Generar las filas [inicio, inicio + cantidad) de forma determinista
+
+    El email incluye prefijo, semilla e índice para que sea único entre
+    conjuntos generados con semillas distintas. Con evaluar=False las filas
+    no traen estado ni motivo_rechazo: las evalúa quien las inserte.
+    """
+    rng = random.Random(f"{seed}:{inicio}")
+    plazos = list(config.plazos)
+    plazo_pesos = list(config.plazos.values())
+    if config.sucursal_pesos:
+        sucursales = list(config.sucursal_pesos)
+        sucursal_pesos = list(config.sucursal_pesos.values())
+    else:
+        sucursales = list(sucursal_ids)
+        sucursal_pesos = None
+    mu_ingreso = math.log(config.ingreso_mediana)
+    mu_multiplo = math.log(config.monto_multiplo_mediana)
+
+    filas = []
+    for indice in range(inicio, inicio + cantidad):
+        nombre = rng.choice(NOMBRES)
+        apellido = rng.choice(APELLIDOS)
+        edad = round(rng.triangular(config.edad_min, config.edad_max, config.edad_moda))
+        score = int(min(850, max(300, rng.gauss(config.score_media, config.score_desviacion))))
+        ingreso = min(config.ingreso_max, max(config.ingreso_min, round(rng.lognormvariate(mu_ingreso, config.ingreso_sigma))))
+        monto = max(config.monto_min, round(ingreso * rng.lognormvariate(mu_multiplo, config.monto_multiplo_sigma), -2))
+        tarjeta = rng.random() < config.prob_tarjeta
+        automotriz = rng.random() < config.prob_automotriz
+        plazo = rng.choices(plazos, plazo_pesos)[0]
+        sucursal_id = rng.choices(sucursales, sucursal_pesos)[0]
+        telefono = f"55-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"
+        nacimiento = _fecha_nacimiento(rng, edad, fecha_referencia)
+
+        monto_solicitado = Decimal(monto)
+        ingreso_mensual = Decimal(ingreso)
+        fila = {
+            "nombre": nombre,
+            "apellido": apellido,
+            "email": f"{nombre.lower()}.{apellido.lower()}.{prefijo}{seed}.{indice}@email.com",
+            "telefono": telefono,
+            "fecha_nacimiento": nacimiento,
+            "edad": edad,
+            "monto_solicitado": monto_solicitado,
+            "ingreso_mensual": ingreso_mensual,
+            "score_crediticio": score,
+            "tiene_tarjeta_credito": tarjeta,
+            "tiene_credito_automotriz": automotriz,
+            "plazo_meses": plazo,
+            "sucursal_id": sucursal_id,
+        }
+        if evaluar:
+            aprobado, motivo_rechazo = evaluar_solicitud_credito(
+                edad=edad,
+                monto_solicitado=monto_solicitado,
+                ingreso_mensual=ingreso_mensual,
+                score_crediticio=score,
+                tiene_tarjeta_credito=tarjeta,
+                tiene_credito_automotriz=automotriz,
+                plazo_meses=plazo,
+            )
+            fila["estado"] = "aprobado" if aprobado else "rechazado"
+            fila["motivo_rechazo"] = motivo_rechazo
+        filas.append(fila)
+    return filas
+
+
+def _generar_shard_args(args: tuple) -> List[dict]:
+    return generar_shard(*args)
+
+
+def generar(
+    cantidad: int,
+    seed: int,
+    sucursal_ids: List[int],
+    config: Optional[DistribucionConfig] = None,
+    fecha_referencia: Optional[date] = None,
+    workers: int = 1,
+    shard_size: int = 10000,
+) -> Iterator[List[dict]]:
+    """
+    Generar `cantidad` filas en shards, en orden
+
+    Con workers > 1 los shards se reparten en un ProcessPoolExecutor; como
+    cada shard tiene su propio generador, la salida es idéntica a la de un
+    solo proceso.
+    """
+    config = config or DistribucionConfig()
+    fecha_referencia = fecha_referencia or date.today()
+    tareas = [
+        (seed, inicio, min(shard_size, cantidad - inicio), sucursal_ids, config, fecha_referencia)
+        for inicio in range(0, cantidad, shard_size)
+    ]
+    if workers <= 1:
+        for tarea in tareas:
+            yield _generar_shard_args(tarea)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Ventana acotada de shards en vuelo: la memoria no crece si el
+        # destino es más lento que la generación, y el orden se conserva
+        pendientes = deque()
+        for tarea in tareas:
+            pendientes.append(executor.submit(_generar_shard_args, tarea))
+            if len(pendientes) >= workers * 2:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+
+# ==================== Destinos ====================
+
+def _a_texto(valor):
+    if isinstance(valor, (Decimal, date)):
+        return str(valor)
+    return valor
+
+
+class NDJSONSink:
+    """Escribe una fila JSON por línea"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, filas: List[dict]) -> None:
+        self.stream.writelines(
+            json.dumps({k: _a_texto(v) for k, v in fila.items()}, ensure_ascii=False) + "\n"
+            for fila in filas
+        )
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class CSVSink:
+    """Escribe filas CSV con encabezado"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=COLUMNAS)
+        self.writer.writeheader()
+
+    def write(self, filas: List[dict]) -> None:
+        self.writer.writerows(filas)
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class DatabaseSink:
+    """Inserta cada shard en la base de datos con un commit por shard"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def write(self, filas: List[dict]) -> None:
+        from . import crud
+
+        with self.session_factory() as db:
+            crud.insertar_lote_simulado(db, filas)
+            db.commit()
+
+    def close(self) -> None:
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generador reproducible de solicitudes sintéticas")
+    parser.add_argument("--cantidad", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--shard-size", type=int, default=10000)
+    parser.add_argument("--formato", choices=["ndjson", "csv", "db"], default="ndjson")
+    parser.add_argument("--salida", help="Archivo de salida (por defecto stdout)")
+    parser.add_argument("--sucursales", default="1,2,3,4,5", help="IDs de sucursal separados por coma")
+    parser.add_argument("--fecha-referencia", type=date.fromisoformat, default=date.today(),
+                        help="Fecha para calcular edades (YYYY-MM-DD); fíjela para regenerar exactamente")
+    parser.add_argument("--config", help="Archivo JSON con DistribucionConfig")
+    args = parser.parse_args(argv)
+
+    config = DistribucionConfig()
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = DistribucionConfig(**json.load(f))
+
+    stream = None
+    if args.formato == "db":
+        from . import crud
+        from .database import SessionLocal
+
+        with SessionLocal() as db:
+            sucursal_ids = [s.id for s in crud.get_sucursales(db, limit=1000)]
+        if not sucursal_ids:
+            print("No hay sucursales disponibles", file=sys.stderr)
+            return 1
+        sink = DatabaseSink(SessionLocal)
+    else:
+        sucursal_ids = [int(x) for x in args.sucursales.split(",")]
+        stream = open(args.salida, "w", encoding="utf-8", newline="") if args.salida else sys.stdout
+        sink = NDJSONSink(stream) if args.formato == "ndjson" else CSVSink(stream)
+
+    inicio = time.perf_counter()
+    total = 0
+    try:
+        for filas in generar(args.cantidad, args.seed, sucursal_ids, config,
+                             args.fecha_referencia, args.workers, args.shard_size):
+            sink.write(filas)
+            total += len(filas)
+    finally:
+        sink.close()
+        if stream is not None and stream is not sys.stdout:
+            stream.close()
+    segundos = time.perf_counter() - inicio
+    print(f"{total} filas en {segundos:.1f}s ({total / max(segundos, 1e-9):,.0f} filas/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+GET condicional con ETag derivado de la versión de los datos
+
+El ETag se calcula con una consulta barata (conteos y máximos) en lugar de
+serializar la respuesta, así que un If-None-Match coincidente se responde
+con 304 sin construir el cuerpo.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from fastapi import Response, status
+
+
+def etag(*partes: Any) -> str:
+    """ETag fuerte a partir de los componentes de la versión"""
+    return '"' + hashlib.sha1(repr(partes).encode()).hexdigest() + '"'
+
+
+def coincide(if_none_match: Optional[str], etag_actual: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110), como exige el estándar"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # nginx marca como débil (W/) el ETag de las respuestas que comprime
+    return any(
+        candidato.strip().removeprefix("W/") == etag_actual
+        for candidato in if_none_match.split(",")
+    )
+
+
+def no_modificado(etag_actual: str, cache_control: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag_actual, "Cache-Control": cache_control},
+    )
+
+
+class UltimaRespuesta:
+    """
+    Conserva el cuerpo calculado para los últimos ETag
+
+    Así, clientes distintos sin If-None-Match tampoco recalculan una
+    respuesta costosa mientras los datos no cambien. `capacidad` > 1 sirve
+    para endpoints cuyo ETag depende también de los parámetros.
+    """
+
+    def __init__(self, capacidad: int = 1):
+        self._capacidad = capacidad
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, etag_actual: str, calcular: Callable[[], bytes]) -> bytes:
+        body = self.buscar(etag_actual)
+        if body is None:
+            body = self.guardar(etag_actual, calcular())
+        return body
+
+    def buscar(self, etag_actual: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._bodies.get(etag_actual)
+            if body is not None:
+                self._bodies.move_to_end(etag_actual)
+            return body
+
+    def guardar(self, etag_actual: str, body: bytes) -> bytes:
+        with self._lock:
+            self._bodies[etag_actual] = body
+            while len(self._bodies) > self._capacidad:
+                self._bodies.popitem(last=False)
+        return body
+
+
+# Último cuerpo de GET /api/indicadores en este proceso
+indicadores = UltimaRespuesta()
+# Cuerpos de GET /api/indicadores/segmentos por versión y parámetros
+segmentos = UltimaRespuesta(capacidad=32)
@@ -0,0 +1,209 @@
+"""
+Claves de idempotencia para POST /api/solicitudes
+
+La primera petición con una Idempotency-Key reserva la clave, se procesa y
+guarda su respuesta; los reintentos con la misma clave y el mismo cuerpo
+reciben la respuesta guardada sin volver a evaluar ni escribir la solicitud.
+
+- MemoryIdempotencyStore: LRU acotado con TTL, válido para un solo proceso
+- DatabaseIdempotencyStore: tabla idempotency_keys compartida entre workers,
+  con el LRU en memoria como primer nivel. Una reserva en curso vence a los
+  IDEMPOTENCY_LEASE_SECONDS (el worker pudo caerse sin completarla) y un
+  reintento la toma; al completarse la respuesta se guarda por
+  IDEMPOTENCY_TTL_SECONDS. Cada IDEMPOTENCY_PURGA_INTERVALO segundos cada
+  worker borra un lote de claves vencidas
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+
+class RespuestaGuardada(NamedTuple):
+    """Respuesta almacenada para una clave"""
+    huella: str
+    status_code: Optional[int]  # None mientras la petición original está en curso
+    body: Optional[bytes]
+
+
+class IdempotencyConflict(Exception):
+    """La clave está en uso por otra petición o con otro contenido"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def huella(body: bytes) -> str:
+    """Huella del cuerpo normalizado de la petición"""
+    return hashlib.sha256(body).hexdigest()
+
+
+def _evaluar(guardada: RespuestaGuardada, huella_peticion: str) -> RespuestaGuardada:
+    if guardada.huella != huella_peticion:
+        raise IdempotencyConflict(422, "La Idempotency-Key ya se usó con una petición distinta")
+    if guardada.status_code is None:
+        raise IdempotencyConflict(409, "Hay una petición en curso con la misma Idempotency-Key")
+    return guardada
+
+
+class MemoryIdempotencyStore:
+    """LRU en memoria con TTL"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def buscar(self, clave: str) -> Optional[RespuestaGuardada]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            guardada, expira = entrada
+            if expira <= time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return guardada
+
+    def guardar(self, clave: str, guardada: RespuestaGuardada) -> None:
+        with self._lock:
+            self._entradas[clave] = (guardada, time.monotonic() + self.ttl_seconds)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entries:
+                self._entradas.popitem(last=False)
+
+    def eliminar(self, clave: str) -> None:
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def reservar(self, db: Session, clave: str, huella_peticion: str) -> Optional[RespuestaGuardada]:
+        """
+        Reservar la clave para procesar la petición
+
+        Returns:
+            None si la clave quedó reservada; la respuesta guardada si es un reintento
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[1] <= time.monotonic():
+                self._entradas[clave] = (
+                    RespuestaGuardada(huella_peticion, None, None),
+                    time.monotonic() + self.ttl_seconds,
+                )
+                return None
+            self._entradas.move_to_end(clave)
+            guardada = entrada[0]
+        return _evaluar(guardada, huella_peticion)
+
+    def completar(self, db: Session, clave: str, huella_peticion: str, status_code: int, body: bytes) -> None:
+        self.guardar(clave, RespuestaGuardada(huella_peticion, status_code, body))
+
+    def liberar(self, db: Session, clave: str) -> None:
+        self.eliminar(clave)
+
+
+class DatabaseIdempotencyStore:
+    """Tabla idempotency_keys compartida entre workers, con LRU local al frente"""
+
+    # Claves vencidas borradas por purga
+    LOTE_PURGA = 1000
+
+    def __init__(
+        self, ttl_seconds: int, max_entries: int,
+        lease_seconds: int = settings.IDEMPOTENCY_LEASE_SECONDS,
+        purga_intervalo: float = settings.IDEMPOTENCY_PURGA_INTERVALO,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.purga_intervalo = purga_intervalo
+        self.memoria = MemoryIdempotencyStore(ttl_seconds, max_entries)
+        self._proxima_purga = 0.0
+
+    def purgar(self, db: Session) -> int:
+        """Borrar un lote de claves vencidas (respuestas viejas y reservas abandonadas)"""
+        tabla = models.IdempotencyKey.__table__
+        vencidas = select(tabla.c.clave).where(tabla.c.expira_en < datetime.utcnow()).limit(self.LOTE_PURGA)
+        borradas = db.execute(delete(tabla).where(tabla.c.clave.in_(vencidas))).rowcount
+        db.commit()
+        return borradas
+
+    def reservar(self, db: Session, clave: str, huella_peticion: str) -> Optional[RespuestaGuardada]:
+        guardada = self.memoria.buscar(clave)
+        if guardada is not None:
+            return _evaluar(guardada, huella_peticion)
+
+        if time.monotonic() >= self._proxima_purga:
+            self._proxima_purga = time.monotonic() + self.purga_intervalo
+            self.purgar(db)
+
+        ahora = datetime.utcnow()
+        lease = ahora + timedelta(seconds=self.lease_seconds)
+        tabla = models.IdempotencyKey.__table__
+        # Respuesta expirada o reserva cuyo lease venció: se toma en una sola
+        # sentencia, así que solo un reintento concurrente la obtiene
+        tomada = db.execute(
+            update(tabla).where(tabla.c.clave == clave, tabla.c.expira_en <= ahora)
+            .values(huella=huella_peticion, status_code=None, body=None, expira_en=lease)
+        ).rowcount
+        db.commit()
+        if tomada:
+            return None
+        fila = db.get(models.IdempotencyKey, clave, populate_existing=True)
+        if fila is None:
+            db.add(models.IdempotencyKey(clave=clave, huella=huella_peticion, expira_en=lease))
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                # Otro worker reservó la misma clave al mismo tiempo
+                db.rollback()
+                fila = db.get(models.IdempotencyKey, clave, populate_existing=True)
+                if fila is None:
+                    raise IdempotencyConflict(409, "Hay una petición en curso con la misma Idempotency-Key")
+
+        guardada = _evaluar(RespuestaGuardada(fila.huella, fila.status_code, fila.body), huella_peticion)
+        self.memoria.guardar(clave, guardada)
+        return guardada
+
+    def completar(self, db: Session, clave: str, huella_peticion: str, status_code: int, body: bytes) -> None:
+        fila = db.get(models.IdempotencyKey, clave)
+        if fila is not None:
+            fila.status_code = status_code
+            fila.body = body
+            fila.expira_en = datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+            db.commit()
+        self.memoria.guardar(clave, RespuestaGuardada(huella_peticion, status_code, body))
+
+    def liberar(self, db: Session, clave: str) -> None:
+        db.rollback()
+        db.query(models.IdempotencyKey).filter(models.IdempotencyKey.clave == clave).delete()
+        db.commit()
+        self.memoria.eliminar(clave)
+
+
+def crear_store():
+    """Crear el almacén configurado en IDEMPOTENCY_BACKEND"""
+    if settings.IDEMPOTENCY_BACKEND == "database":
+        return DatabaseIdempotencyStore(settings.IDEMPOTENCY_TTL_SECONDS, settings.IDEMPOTENCY_MAX_ENTRIES)
+    return MemoryIdempotencyStore(settings.IDEMPOTENCY_TTL_SECONDS, settings.IDEMPOTENCY_MAX_ENTRIES)
+
+
+store = crear_store()
+
+
+def get_idempotency_store():
+    """Dependency que retorna el almacén de idempotencia del proceso"""
+    return store
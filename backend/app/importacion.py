@@ -0,0 +1,318 @@
+"""
+Importación histórica de clientes y solicitudes
+
+Carga archivos CSV de sistemas anteriores (una solicitud ya decidida por
+fila, con los datos de su cliente) sin pasar por crud.crear_solicitud:
+
+- El archivo se lee en streaming por lotes de --lote filas; cada fila se
+  valida con SolicitudHistorica y las inválidas se reportan con su línea en
+  --errores (NDJSON, por defecto stderr) sin detener la carga
+- Los clientes se deduplican por email con un conjunto en memoria sembrado
+  con los emails de `clientes` (del orden de 100 bytes por cliente): cada
+  email nuevo se carga una sola vez aunque se repita en el archivo
+- Cada lote se carga con COPY en dos tablas temporales y se combina con dos
+  INSERT ... SELECT: los clientes con ON CONFLICT (email) DO NOTHING y las
+  solicitudes con el id de su cliente resuelto por email en la misma sentencia
+- El avance (última línea confirmada) se guarda en la tabla importaciones
+  dentro de la transacción del lote; al repetir el comando con el mismo
+  --nombre se continúa después de esa línea sin duplicar filas
+- Con SHARD_DATABASE_URLS cada fila va al shard de su sucursal, que lleva su
+  propio avance y su propio conjunto de emails
+
+En SQLite (desarrollo y pruebas) las tablas temporales se llenan con
+executemany en lugar de COPY; la combinación es la misma. Cada lote sube la
+versión de los datos y guarda su delta de sketches; no se publican eventos
+en vivo: los tableros ven los totales nuevos en su siguiente foto.
+
+Columnas del CSV: las de SolicitudCreate más estado, motivo_rechazo y
+fecha_solicitud (opcional).
+
+Uso:
+    python -m app.importacion --archivo historico_2019.csv
+    python -m app.importacion --archivo historico_2019.csv --nombre hist-2019 --lote 100000 --errores invalidas.ndjson
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, select, text, update
+from sqlalchemy.engine import Engine
+
+from . import models, schemas, sketches, versiones
+from .responses import dumps
+
+COLUMNAS_CLIENTE = ("nombre", "apellido", "email", "telefono", "fecha_nacimiento", "edad")
+COLUMNAS_SOLICITUD = (
+    "sucursal_id", "monto_solicitado", "ingreso_mensual", "score_crediticio", "tiene_tarjeta_credito",
+    "tiene_credito_automotriz", "plazo_meses", "estado", "motivo_rechazo", "fecha_solicitud",
+)
+
+# Tablas temporales de carga: mismas columnas y tipos que las definitivas, sin
+# restricciones. En PostgreSQL se crean en la transacción de cada lote y se
+# eliminan al confirmarla (compatible con PgBouncer en modo transacción)
+_staging = MetaData()
+STAGING_CLIENTES = Table(
+    "importacion_clientes", _staging,
+    *[Column(c.name, c.type) for c in models.Cliente.__table__.columns if c.name in COLUMNAS_CLIENTE],
+    prefixes=["TEMPORARY"], postgresql_on_commit="DROP",
+)
+STAGING_SOLICITUDES = Table(
+    "importacion_solicitudes", _staging,
+    Column("linea", Integer),
+    Column("email", String(150)),
+    *[Column(c.name, c.type) for c in models.Solicitud.__table__.columns if c.name in COLUMNAS_SOLICITUD],
+    prefixes=["TEMPORARY"], postgresql_on_commit="DROP",
+)
+
+_columnas_cliente = ", ".join(COLUMNAS_CLIENTE)
+_columnas_solicitud = ", ".join(COLUMNAS_SOLICITUD)
+# WHERE true: SQLite lo requiere para distinguir ON CONFLICT de un JOIN ... ON
+MERGE_CLIENTES = text(
+    f"INSERT INTO clientes ({_columnas_cliente}) "
+    f"SELECT {_columnas_cliente} FROM importacion_clientes WHERE true "
+    "ON CONFLICT (email) DO NOTHING"
+)
+# Ids en el orden del archivo; sin fecha de origen se usa la de la importación
+MERGE_SOLICITUDES = text(
+    f"INSERT INTO solicitudes (cliente_id, {_columnas_solicitud}) "
+    "SELECT c.id, " + ", ".join(
+        "COALESCE(s.fecha_solicitud, CURRENT_TIMESTAMP)" if columna == "fecha_solicitud" else f"s.{columna}"
+        for columna in COLUMNAS_SOLICITUD
+    ) + " FROM importacion_solicitudes s JOIN clientes c ON c.email = s.email ORDER BY s.linea"
+)
+
+
+class Destino:
+    """
+    Base que recibe filas: una conexión, los emails que ya tiene y la última
+    línea confirmada de la importación
+    """
+
+    def __init__(self, db_engine: Engine, nombre: str):
+        self.nombre = nombre
+        self.conexion = db_engine.connect()
+        self.usa_copy = db_engine.dialect.name == "postgresql"
+        with self.conexion.begin():
+            self.linea = self.conexion.execute(
+                select(models.Importacion.linea).where(models.Importacion.nombre == nombre)
+            ).scalar() or 0
+        # Cursor de servidor en PostgreSQL: los emails no se cargan en un solo resultado
+        emails = self.conexion.execution_options(yield_per=50_000).execute(select(models.Cliente.email))
+        self.emails: Set[str] = set(emails.scalars())
+        self.conexion.commit()
+
+    def cerrar(self) -> None:
+        with self.conexion.begin():
+            _staging.drop_all(self.conexion)
+        self.conexion.close()
+
+    def _copiar(self, tabla: Table, filas: List[dict]) -> None:
+        if not filas:
+            return
+        columnas = [c.name for c in tabla.columns]
+        if not self.usa_copy:
+            self.conexion.execute(insert(tabla), filas)
+            return
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerows([fila[c] for c in columnas] for fila in filas)
+        sql = f"COPY {tabla.name} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)"
+        cursor = self.conexion.connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with cursor.copy(sql) as copia:
+                    copia.write(buffer.getvalue())
+        finally:
+            cursor.close()
+
+    def cargar(self, solicitudes: List[Tuple[int, schemas.SolicitudHistorica]], hasta_linea: int) -> Tuple[int, int]:
+        """
+        Cargar un lote y avanzar el checkpoint hasta `hasta_linea` en una transacción
+
+        Returns:
+            Tuple[int, int]: (solicitudes insertadas, clientes nuevos)
+        """
+        nuevos = {}
+        filas = []
+        for linea, solicitud in solicitudes:
+            if solicitud.email not in self.emails and solicitud.email not in nuevos:
+                nuevos[solicitud.email] = {campo: getattr(solicitud, campo) for campo in COLUMNAS_CLIENTE}
+            filas.append({
+                "linea": linea,
+                "email": solicitud.email,
+                **{campo: getattr(solicitud, campo) for campo in COLUMNAS_SOLICITUD},
+            })
+        with self.conexion.begin():
+            if self.usa_copy:
+                # Un lote grande no debe cortarse por el timeout pensado para la API
+                self.conexion.execute(text("SET LOCAL statement_timeout = 0"))
+            _staging.create_all(self.conexion)
+            self._copiar(STAGING_CLIENTES, list(nuevos.values()))
+            self._copiar(STAGING_SOLICITUDES, filas)
+            clientes = self.conexion.execute(MERGE_CLIENTES).rowcount if nuevos else 0
+            insertadas = self.conexion.execute(MERGE_SOLICITUDES).rowcount if filas else 0
+            if not self.usa_copy:
+                self.conexion.execute(STAGING_CLIENTES.delete())
+                self.conexion.execute(STAGING_SOLICITUDES.delete())
+            self._avanzar(hasta_linea, insertadas, clientes)
+            if insertadas:
+                sketches.guardar_delta(self.conexion, versiones.incrementar(self.conexion), sketches.delta_de(filas))
+        # Solo después de confirmar: si el lote falla sus emails siguen siendo nuevos
+        self.emails.update(nuevos)
+        self.linea = hasta_linea
+        return insertadas, clientes
+
+    def _avanzar(self, linea: int, filas: int, clientes: int) -> None:
+        tabla = models.Importacion.__table__
+        valores = {"linea": linea, "actualizado": datetime.utcnow()}
+        if self.conexion.execute(
+            update(tabla).where(tabla.c.nombre == self.nombre).values(
+                filas=tabla.c.filas + filas, clientes_nuevos=tabla.c.clientes_nuevos + clientes, **valores
+            )
+        ).rowcount:
+            return
+        self.conexion.execute(insert(tabla).values(nombre=self.nombre, filas=filas, clientes_nuevos=clientes, **valores))
+
+
+def leer_lotes(
+    stream, tamano: int, desde_linea: int = 0
+) -> Iterator[Tuple[List[Tuple[int, object]], int]]:
+    """
+    Validar el CSV en lotes de `tamano` filas
+
+    Cada lote es ([(línea, SolicitudHistorica o lista de errores)], última
+    línea leída). Las filas hasta `desde_linea` se saltan sin validarlas.
+    """
+    lector = csv.DictReader(stream)
+    lote = []
+    for registro in lector:
+        linea = lector.line_num
+        if linea <= desde_linea:
+            continue
+        # Celdas vacías = campo ausente, para que apliquen los valores por defecto
+        datos = {campo.strip(): valor for campo, valor in registro.items() if campo and valor not in ("", None)}
+        try:
+            lote.append((linea, schemas.SolicitudHistorica.model_validate(datos)))
+        except ValidationError as e:
+            lote.append((linea, [
+                {"campo": ".".join(str(parte) for parte in error["loc"]), "mensaje": error["msg"]}
+                for error in e.errors()
+            ]))
+        if len(lote) >= tamano:
+            yield lote, linea
+            lote = []
+    if lote:
+        yield lote, lector.line_num
+
+
+def importar(
+    stream,
+    nombre: str,
+    destinos: List[Destino],
+    shard_de: Callable[[int], int] = lambda sucursal_id: 0,
+    sucursales: Optional[Set[int]] = None,
+    lote: int = 50_000,
+    errores=None,
+    progreso=None,
+) -> dict:
+    """
+    Importar el CSV de `stream` en los destinos (uno por shard)
+
+    `errores` y `progreso` son streams de texto opcionales para las filas
+    inválidas (NDJSON) y el avance por lote.
+    """
+    inicio = time.perf_counter()
+    totales = {"filas": 0, "clientes_nuevos": 0, "invalidas": 0}
+    for filas, hasta_linea in leer_lotes(stream, lote, desde_linea=min(d.linea for d in destinos)):
+        por_shard = defaultdict(list)
+        for linea, resultado in filas:
+            if isinstance(resultado, list):
+                invalida = {"linea": linea, "errores": resultado}
+            elif sucursales is not None and resultado.sucursal_id not in sucursales:
+                invalida = {"linea": linea, "errores": [
+                    {"campo": "sucursal_id", "mensaje": f"Sucursal con ID {resultado.sucursal_id} no existe"}
+                ]}
+            elif not 0 <= resultado.edad <= 150:
+                invalida = {"linea": linea, "errores": [{"campo": "fecha_nacimiento", "mensaje": "Edad fuera de rango"}]}
+            else:
+                shard = shard_de(resultado.sucursal_id)
+                # Al reanudar, un shard puede ir más adelante que otro
+                if linea > destinos[shard].linea:
+                    por_shard[shard].append((linea, resultado))
+                continue
+            totales["invalidas"] += 1
+            if errores is not None:
+                errores.write(dumps(invalida).decode() + "\n")
+        for shard, destino in enumerate(destinos):
+            if destino.linea >= hasta_linea:
+                continue
+            insertadas, clientes = destino.cargar(por_shard[shard], hasta_linea)
+            totales["filas"] += insertadas
+            totales["clientes_nuevos"] += clientes
+        if progreso is not None:
+            segundos = time.perf_counter() - inicio
+            print(
+                f"{nombre}: línea {hasta_linea}, {totales['filas']} solicitudes, "
+                f"{totales['clientes_nuevos']} clientes nuevos ({totales['filas'] / max(segundos, 1e-9):,.0f} filas/s)",
+                file=progreso,
+            )
+    totales["segundos"] = time.perf_counter() - inicio
+    return totales
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Importación histórica de clientes y solicitudes")
+    parser.add_argument("--archivo", required=True, help="CSV con encabezado")
+    parser.add_argument("--nombre", help="Identificador del avance guardado (por defecto el nombre del archivo)")
+    parser.add_argument("--lote", type=int, default=50_000)
+    parser.add_argument("--errores", help="Archivo NDJSON de filas inválidas (por defecto stderr)")
+    args = parser.parse_args(argv)
+
+    from . import crud, shards
+    from .config import settings
+    from .database import SessionLocal, engine
+
+    nombre = args.nombre or os.path.basename(args.archivo)
+    with SessionLocal() as db:
+        sucursales = {s.id for s in crud.get_sucursales(db, limit=1000)}
+        router = None
+        if settings.SHARD_DATABASE_URLS:
+            router = shards.ShardRouter(settings.SHARD_DATABASE_URLS)
+            router.preparar(db)
+    engines = router.engines if router is not None else [engine]
+    destinos = [Destino(db_engine, nombre) for db_engine in engines]
+    errores = open(args.errores, "w", encoding="utf-8") if args.errores else sys.stderr
+    try:
+        with open(args.archivo, encoding="utf-8", newline="") as stream:
+            totales = importar(
+                stream, nombre, destinos, router.shard_de if router is not None else (lambda sucursal_id: 0),
+                sucursales, args.lote, errores, progreso=sys.stderr,
+            )
+    finally:
+        for destino in destinos:
+            destino.cerrar()
+        if errores is not sys.stderr:
+            errores.close()
+        if router is not None:
+            router.cerrar()
+    print(
+        f"✅ Importación {nombre}: {totales['filas']} solicitudes y {totales['clientes_nuevos']} clientes nuevos "
+        f"en {totales['segundos']:.1f}s ({totales['filas'] / max(totales['segundos'], 1e-9):,.0f} filas/s), "
+        f"{totales['invalidas']} filas inválidas",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
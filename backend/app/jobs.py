@@ -0,0 +1,191 @@
+"""
+Trabajos de simulación en segundo plano
+
+Cada trabajo genera e inserta solicitudes en lotes de SIMULACION_JOB_CHUNK
+filas; cada lote se confirma junto con el avance del trabajo, así que tras un
+reinicio el trabajo continúa exactamente donde quedó. Los trabajos se toman
+con un propietario y un heartbeat para que, con varios workers, solo uno
+ejecute cada trabajo y los huérfanos se reanuden.
+"""
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from . import crud, generator, models
+from .config import settings
+
+ESTADOS_ACTIVOS = ("pendiente", "en_proceso")
+
+
+class SimulacionJobManager:
+    """Pool local de workers que ejecuta trabajos de simulación"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_workers: int = settings.SIMULACION_JOB_WORKERS,
+        chunk_size: int = settings.SIMULACION_JOB_CHUNK,
+        stale_seconds: int = settings.SIMULACION_JOB_STALE_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.stale_seconds = stale_seconds
+        self.config = generator.DistribucionConfig()
+        self.worker_id = uuid.uuid4().hex
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="simulacion")
+        self._futures: Dict[int, Future] = {}
+        self._detener = threading.Event()
+
+    # ---------------------------------------------------------------- API
+    def start(self) -> None:
+        """Reanudar trabajos pendientes o huérfanos de ejecuciones anteriores"""
+        with self.session_factory() as db:
+            ids = [
+                job_id for (job_id,) in db.query(models.SimulacionJob.id)
+                .filter(models.SimulacionJob.estado.in_(ESTADOS_ACTIVOS))
+                .all()
+            ]
+        for job_id in ids:
+            if self._tomar(job_id):
+                self._programar(job_id)
+
+    def submit(self, db: Session, cantidad: int) -> models.SimulacionJob:
+        """Registrar un nuevo trabajo y programarlo en el pool"""
+        if not crud.get_sucursales(db, limit=1):
+            raise ValueError("No hay sucursales disponibles")
+        job = models.SimulacionJob(
+            cantidad=cantidad,
+            procesadas=0,
+            aprobadas=0,
+            rechazadas=0,
+            estado="pendiente",
+            cancelar=False,
+            propietario=self.worker_id,
+            heartbeat=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._programar(job.id)
+        return job
+
+    def cancel(self, db: Session, job_id: int) -> Optional[models.SimulacionJob]:
+        """Solicitar la cancelación; el worker se detiene al terminar el lote en curso"""
+        job = db.get(models.SimulacionJob, job_id)
+        if job is None:
+            return None
+        if job.estado in ESTADOS_ACTIVOS:
+            job.cancelar = True
+            if job.propietario is None:
+                job.estado = "cancelado"
+            db.commit()
+            db.refresh(job)
+        return job
+
+    def esperar(self, job_id: int, timeout: Optional[float] = None) -> None:
+        """Esperar a que el trabajo termine en este proceso"""
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Detener el pool; los trabajos en curso se liberan para reanudarse"""
+        self._detener.set()
+        self._executor.shutdown(wait=wait)
+
+    # ----------------------------------------------------------- internos
+    def _programar(self, job_id: int) -> None:
+        self._futures[job_id] = self._executor.submit(self._ejecutar, job_id)
+
+    def _tomar(self, job_id: int) -> bool:
+        """Tomar el trabajo si no tiene dueño o su dueño dejó de latir"""
+        limite = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        with self.session_factory() as db:
+            result = db.execute(
+                update(models.SimulacionJob)
+                .where(
+                    models.SimulacionJob.id == job_id,
+                    models.SimulacionJob.estado.in_(ESTADOS_ACTIVOS),
+                    or_(
+                        models.SimulacionJob.propietario.is_(None),
+                        models.SimulacionJob.propietario == self.worker_id,
+                        models.SimulacionJob.heartbeat < limite,
+                    ),
+                )
+                .values(propietario=self.worker_id, heartbeat=datetime.utcnow())
+            )
+            db.commit()
+            return result.rowcount == 1
+
+    def _ejecutar(self, job_id: int) -> None:
+        try:
+            with self.session_factory() as db:
+                sucursal_ids = [s.id for s in crud.get_sucursales(db, limit=1000)]
+            while self._procesar_lote(job_id, sucursal_ids):
+                pass
+        except Exception as e:
+            with self.session_factory() as db:
+                job = db.get(models.SimulacionJob, job_id)
+                if job is not None:
+                    job.estado = "error"
+                    job.mensaje_error = str(e)
+                    job.propietario = None
+                    db.commit()
+
+    def _procesar_lote(self, job_id: int, sucursal_ids: list) -> bool:
+        """Procesar y confirmar un lote; retorna False cuando el trabajo termina"""
+        with self.session_factory() as db:
+            job = db.get(models.SimulacionJob, job_id)
+            if job is None or job.propietario != self.worker_id:
+                return False
+            if job.cancelar:
+                job.estado = "cancelado"
+                job.propietario = None
+                db.commit()
+                return False
+            if job.procesadas >= job.cantidad:
+                job.estado = "completado"
+                job.propietario = None
+                db.commit()
+                return False
+            if self._detener.is_set():
+                job.propietario = None
+                db.commit()
+                return False
+
+            # Semilla por lote: un lote reanudado genera las mismas filas
+            n = min(self.chunk_size, job.cantidad - job.procesadas)
+            filas = generator.generar_shard(
+                seed=job.id,
+                inicio=job.procesadas,
+                cantidad=n,
+                sucursal_ids=sucursal_ids,
+                config=self.config,
+                fecha_referencia=date.today(),
+                prefijo="job",
+            )
+            aprobadas, rechazadas = crud.insertar_lote_simulado(db, filas)
+
+            job.procesadas += n
+            job.aprobadas += aprobadas
+            job.rechazadas += rechazadas
+            job.estado = "en_proceso"
+            job.heartbeat = datetime.utcnow()
+            db.commit()
+            return True
+
+
+# Instancia del proceso; se crea en el arranque de la aplicación
+manager: Optional[SimulacionJobManager] = None
+
+
+def get_job_manager() -> SimulacionJobManager:
+    """Dependency que retorna el administrador de trabajos del proceso"""
+    if manager is None:
+        raise RuntimeError("El administrador de trabajos no está inicializado")
+    return manager
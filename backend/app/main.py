@@ -1,18 +1,25 @@
 """
 Aplicación principal FastAPI
 """
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import List
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Tuple
 
-from . import models, schemas, crud, auth
-from .database import engine, get_db
+from . import models, schemas, crud, auth, jobs, idempotency, admission, write_behind, rules, precalificacion, http_cache, segmentos, sketches, busqueda, eventos, shards, database
+from .database import engine, get_db, get_read_db, SessionLocal
 from .config import settings
+from . import responses
+from .responses import FastJSONResponse
 
-# Crear tablas
+# Crear tablas faltantes; los índices de bases existentes los agrega
+# python -m app.migraciones antes de arrancar
 models.Base.metadata.create_all(bind=engine)
 
 # Crear aplicación FastAPI
@@ -21,7 +28,8 @@ app = FastAPI(
     description="API para gestión de solicitudes de crédito",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # Configurar CORS
@@ -37,7 +45,8 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """Inicialización al arrancar la aplicación"""
-    db = next(get_db())
+    db_gen = get_db()
+    db = next(db_gen)
     try:
         # Crear usuario admin por defecto
         auth.create_admin_user(db)
@@ -45,7 +54,53 @@ async def startup_event():
     except Exception as e:
         print(f"❌ Error al crear admin: {e}")
     finally:
-        db.close()
+        db_gen.close()
+    
+    # Reanudar trabajos de simulación interrumpidos
+    jobs.manager = jobs.SimulacionJobManager(SessionLocal)
+    try:
+        jobs.manager.start()
+    except Exception as e:
+        print(f"❌ Error al reanudar trabajos de simulación: {e}")
+    
+    # Shards de escritura por sucursal
+    if settings.SHARD_DATABASE_URLS:
+        shards.router = shards.ShardRouter(settings.SHARD_DATABASE_URLS)
+        with SessionLocal() as origen:
+            shards.router.preparar(origen)
+        print(f"✅ {shards.router.cantidad} shards de escritura preparados")
+    
+    # Persistencia diferida de solicitudes (recupera el WAL pendiente)
+    if settings.WRITE_BEHIND_ENABLED and shards.router is not None:
+        print("❌ WRITE_BEHIND_ENABLED no se combina con shards; se escribe de forma síncrona")
+    elif settings.WRITE_BEHIND_ENABLED:
+        cola = write_behind.WriteBehindQueue(SessionLocal)
+        try:
+            cola.start()
+            write_behind.cola = cola
+        except RuntimeError as e:
+            print(f"❌ {e}; se escribe de forma síncrona")
+    
+    # Eventos del dashboard de todos los workers (LISTEN/NOTIFY)
+    motores = shards.router.engines if shards.router is not None else [engine]
+    eventos.escuchas = [eventos.EscuchaPostgres(m) for m in motores if eventos.usa_notify(m)]
+    for escucha in eventos.escuchas:
+        escucha.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Liberar recursos al detener la aplicación"""
+    if jobs.manager is not None:
+        jobs.manager.shutdown(wait=True)
+    if write_behind.cola is not None:
+        write_behind.cola.close()
+    # Los streams abiertos terminan para que el servidor pueda detenerse
+    eventos.difusor.cerrar()
+    for escucha in eventos.escuchas:
+        escucha.detener(timeout=2)
+    if shards.router is not None:
+        shards.router.cerrar()
 
 
 @app.get("/")
@@ -106,13 +161,46 @@ async def get_current_user_info(
 async def listar_sucursales(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ):
     """
     Listar todas las sucursales disponibles
+    
+    Responde con ETag y Cache-Control; con If-None-Match coincidente responde 304
     """
+    etag = http_cache.etag("sucursales", crud.version_sucursales(db), skip, limit)
+    cache_control = f"public, max-age={settings.SUCURSALES_MAX_AGE}"
+    if http_cache.coincide(if_none_match, etag):
+        return http_cache.no_modificado(etag, cache_control)
     sucursales = crud.get_sucursales(db, skip=skip, limit=limit)
-    return sucursales
+    return FastJSONResponse(
+        schemas.SucursalesAdapter.validate_python(sucursales, from_attributes=True),
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+# ==================== Clientes ====================
+
+@app.get("/api/clientes/buscar", response_model=schemas.BusquedaClientesResponse, tags=["Clientes"])
+async def buscar_clientes(
+    q: str = Query(..., min_length=2, max_length=100, description="Parte del nombre, apellido o email"),
+    limite: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Valor de `siguiente` de la página anterior"),
+    db: Session = Depends(get_read_db),
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
+):
+    """
+    Buscar clientes por nombre, apellido o email parcial (requiere autenticación admin)
+    
+    Resultados ordenados por relevancia, con el resumen de solicitudes de
+    cada cliente y paginación por cursor
+    """
+    try:
+        # Con shards se busca en todos y se combinan las páginas
+        return FastJSONResponse(shards.buscar_clientes(db, q, limite, cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 # ==================== Solicitudes ====================
@@ -120,20 +208,139 @@ async def listar_sucursales(
 @app.post("/api/solicitudes", response_model=schemas.SolicitudResponse, tags=["Solicitudes"], status_code=status.HTTP_201_CREATED)
 async def crear_solicitud(
     solicitud: schemas.SolicitudCreate,
-    db: Session = Depends(get_db)
+    _admision: None = Depends(admission.admitir_solicitud),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    idempotency_store=Depends(idempotency.get_idempotency_store),
+    cola: Optional[write_behind.WriteBehindQueue] = Depends(write_behind.get_write_behind_queue)
 ):
     """
     Crear una nueva solicitud de crédito
     
     Evalúa automáticamente la solicitud y retorna el resultado (aprobado/rechazado)
+    
+    Con el header `Idempotency-Key` los reintentos con el mismo cuerpo reciben
+    la respuesta original sin crear una solicitud duplicada.
+    
+    Bajo sobrecarga responde 429 (límite por cliente) o 503 (sin cupo en el
+    tiempo de espera permitido), ambos con `Retry-After`.
+    
+    Con WRITE_BEHIND_ENABLED la decisión se responde de inmediato (con su id
+    pre-asignado) y la persistencia se confirma en lote en segundo plano.
     """
+    huella = None
+    if idempotency_key:
+        huella = idempotency.huella(solicitud.model_dump_json().encode())
+        try:
+            guardada = idempotency_store.reservar(db, idempotency_key, huella)
+        except idempotency.IdempotencyConflict as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        if guardada is not None:
+            return Response(
+                content=guardada.body,
+                status_code=guardada.status_code,
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"}
+            )
+    
     try:
-        resultado = crud.crear_solicitud(db, solicitud)
-        return resultado
+        if cola is not None:
+            resultado = crud.crear_solicitud_diferida(db, solicitud, cola)
+        else:
+            # Con shards se escribe en el de la sucursal
+            resultado = shards.crear_solicitud(db, solicitud)
+        # El modelo ya está validado: se serializa sin pasar por response_model
+        response = FastJSONResponse(resultado, status_code=status.HTTP_201_CREATED)
+    except write_behind.ColaLlena as e:
+        if idempotency_key:
+            idempotency_store.liberar(db, idempotency_key)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
     except ValueError as e:
+        if idempotency_key:
+            idempotency_store.liberar(db, idempotency_key)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
+        if idempotency_key:
+            idempotency_store.liberar(db, idempotency_key)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    
+    if idempotency_key:
+        idempotency_store.completar(db, idempotency_key, huella, response.status_code, response.body)
+    return response
+
+
+@app.post("/api/precalificar", response_model=schemas.PrecalificacionResponse, tags=["Solicitudes"])
+async def precalificar(datos: schemas.PrecalificacionRequest):
+    """
+    Precalificar una solicitud sin registrarla
+    
+    Se evalúa en memoria, sin sesión de base de datos; las respuestas para
+    entradas iguales se sirven desde caché.
+    """
+    resultado = precalificacion.precalificar(datos)
+    return Response(content=resultado.body, media_type="application/json", headers={"ETag": resultado.etag})
+
+
+@app.get("/api/precalificar", response_model=schemas.PrecalificacionResponse, tags=["Solicitudes"])
+async def precalificar_get(
+    monto_solicitado: Decimal = Query(...),
+    ingreso_mensual: Decimal = Query(...),
+    score_crediticio: int = Query(...),
+    plazo_meses: int = Query(...),
+    fecha_nacimiento: date = Query(...),
+    tiene_tarjeta_credito: bool = Query(False),
+    tiene_credito_automotriz: bool = Query(False),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    """
+    Variante GET de la precalificación
+    
+    Responde con ETag (con If-None-Match coincidente, 304) y sin caché
+    compartida: la consulta lleva ingreso, score y monto del solicitante.
+    """
+    try:
+        datos = schemas.PrecalificacionRequest(
+            monto_solicitado=monto_solicitado,
+            ingreso_mensual=ingreso_mensual,
+            score_crediticio=score_crediticio,
+            plazo_meses=plazo_meses,
+            fecha_nacimiento=fecha_nacimiento,
+            tiene_tarjeta_credito=tiene_tarjeta_credito,
+            tiene_credito_automotriz=tiene_credito_automotriz,
+        )
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    resultado = precalificacion.precalificar(datos)
+    # Los datos financieros van en la URL: ni proxies ni navegador la guardan
+    headers = {"ETag": resultado.etag, "Cache-Control": "private, no-store"}
+    if http_cache.coincide(if_none_match, resultado.etag):
+        return http_cache.no_modificado(resultado.etag, headers["Cache-Control"])
+    return Response(content=resultado.body, media_type="application/json", headers=headers)
+
+
+def _simulacion_ndjson(solicitudes):
+    """Serializar cada solicitud al crearse; la sesión sigue abierta hasta terminar la respuesta"""
+    aprobadas = rechazadas = errores = 0
+    for solicitud in solicitudes:
+        if isinstance(solicitud, crud.ErrorSimulacion):
+            errores += 1
+            yield responses.dumps({"error": solicitud._asdict()}) + b"\n"
+            continue
+        if solicitud.estado == "aprobado":
+            aprobadas += 1
+        else:
+            rechazadas += 1
+        yield responses.dumps(solicitud) + b"\n"
+    yield responses.dumps({"resumen": {
+        "total_generadas": aprobadas + rechazadas,
+        "aprobadas": aprobadas,
+        "rechazadas": rechazadas,
+        "errores": errores,
+    }}) + b"\n"
 
 
 @app.post("/api/solicitudes/simular", response_model=schemas.SimulacionResponse, tags=["Solicitudes"])
@@ -144,36 +351,161 @@ async def simular_solicitudes(
     """
     Simular múltiples solicitudes de crédito aleatorias
     
-    Útil para pruebas y generación de datos
+    Útil para pruebas y generación de datos. Con `detalle` se limita qué
+    solicitudes se incluyen; con `formato=ndjson` cada solicitud se envía en
+    cuanto se crea y la última línea es {"resumen": {...}}. Las que no se
+    pudieron crear se cuentan en `errores` (en ndjson, una línea
+    {"error": {"indice": ..., "detalle": ...}} cada una).
     """
     try:
-        resultado = crud.simular_solicitudes(db, simulacion.cantidad)
-        return resultado
+        if simulacion.formato == "ndjson":
+            solicitudes = crud.iterar_simulacion(db, simulacion.cantidad, crear=shards.crear_solicitud)
+            return StreamingResponse(_simulacion_ndjson(solicitudes), media_type="application/x-ndjson")
+        resultado = crud.simular_solicitudes(
+            db, simulacion.cantidad, simulacion.detalle, settings.SIMULACION_MUESTRA,
+            crear=shards.crear_solicitud
+        )
+        return FastJSONResponse(resultado)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
-@app.get("/api/solicitudes/recientes", response_model=List[schemas.Solicitud], tags=["Solicitudes"])
+@app.get("/api/solicitudes/recientes", response_model=List[schemas.SolicitudReciente], tags=["Solicitudes"])
 async def solicitudes_recientes(
     limit: int = 50,
+    sucursal_id: Optional[int] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
+):
+    """
+    Obtener solicitudes recientes con nombre de cliente y sucursal (requiere autenticación admin)
+    
+    Con `sucursal_id` solo las de esa sucursal (con shards se consulta solo su shard).
+    Con `desde` / `hasta` solo las de fecha_solicitud en [desde, hasta); las
+    archivadas se incluyen cuando el rango llega a ellas.
+    """
+    return FastJSONResponse(shards.get_solicitudes_recientes(
+        db, limit=limit, sucursal_id=sucursal_id, desde=desde, hasta=hasta
+    ))
+
+
+# ==================== Trabajos de simulación ====================
+
+@app.post("/api/simulaciones", response_model=schemas.SimulacionJob, tags=["Simulaciones"], status_code=status.HTTP_202_ACCEPTED)
+async def crear_trabajo_simulacion(
+    simulacion: schemas.SimulacionJobRequest,
+    db: Session = Depends(get_db),
+    manager: jobs.SimulacionJobManager = Depends(jobs.get_job_manager),
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
+):
+    """
+    Crear un trabajo de simulación en segundo plano (requiere autenticación admin)
+    
+    Las solicitudes se generan e insertan en lotes confirmados; el avance se
+    consulta con GET /api/simulaciones/{id}
+    """
+    if shards.router is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Los trabajos en segundo plano no están disponibles con shards"
+        )
+    try:
+        return manager.submit(db, simulacion.cantidad)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@app.get("/api/simulaciones/{job_id}", response_model=schemas.SimulacionJob, tags=["Simulaciones"])
+async def obtener_trabajo_simulacion(
+    job_id: int,
     db: Session = Depends(get_db),
     current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
 ):
     """
-    Obtener solicitudes recientes (requiere autenticación admin)
+    Consultar estado y progreso de un trabajo de simulación
     """
-    solicitudes = crud.get_solicitudes_recientes(db, limit=limit)
-    return solicitudes
+    job = db.get(models.SimulacionJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trabajo no encontrado")
+    return job
+
+
+@app.delete("/api/simulaciones/{job_id}", response_model=schemas.SimulacionJob, tags=["Simulaciones"])
+async def cancelar_trabajo_simulacion(
+    job_id: int,
+    db: Session = Depends(get_db),
+    manager: jobs.SimulacionJobManager = Depends(jobs.get_job_manager),
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
+):
+    """
+    Cancelar un trabajo de simulación; se detiene al terminar el lote en curso
+    """
+    job = manager.cancel(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trabajo no encontrado")
+    return job
+
+
+# ==================== Reglas de crédito ====================
+
+@app.get("/api/reglas", response_model=schemas.ReglasEstado, tags=["Reglas"])
+async def obtener_reglas(
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
+):
+    """
+    Consultar la tabla de reglas activa con evaluaciones y decisiones por regla
+    """
+    return rules.evaluador_actual().estadisticas()
+
+
+@app.post("/api/reglas/recargar", response_model=schemas.ReglasEstado, tags=["Reglas"])
+async def recargar_reglas(
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
+):
+    """
+    Recargar la tabla de reglas desde su archivo (requiere autenticación admin)
+    
+    Si la tabla no es válida se responde 400 y se mantiene la activa
+    """
+    try:
+        return rules.recargar().estadisticas()
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Tabla de reglas inválida: {e}")
 
 
 # ==================== Indicadores ====================
 
+def _version_indicadores(db: Session) -> Tuple[object, str]:
+    """Versión de las solicitudes (una por shard con shards) y ETag de GET /api/indicadores"""
+    version = shards.version_solicitudes(db)
+    return version, http_cache.etag("indicadores", version, crud.version_sucursales(db))
+
+
+def _foto_indicadores(db: Session, version, etag: str) -> Tuple[object, str, bytes]:
+    """
+    Versión, ETag y cuerpo de los indicadores
+
+    El cuerpo guardado con un ETag contiene exactamente esa versión: si no
+    está en memoria se leen versión e indicadores de una misma foto (una por
+    shard) y se guarda con el ETag de lo leído, que puede ser más reciente.
+    """
+    body = http_cache.indicadores.buscar(etag)
+    if body is None:
+        version, indicadores = shards.get_indicadores_con_version(db)
+        etag = http_cache.etag("indicadores", version, crud.version_sucursales(db))
+        body = http_cache.indicadores.guardar(etag, responses.dumps(indicadores))
+    return version, etag, body
+
+
 @app.get("/api/indicadores", response_model=schemas.IndicadoresGenerales, tags=["Indicadores"])
 async def obtener_indicadores(
-    db: Session = Depends(get_db),
-    current_user: models.UsuarioAdmin = Depends(auth.get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ):
     """
     Obtener indicadores generales y por sucursal (requiere autenticación admin)
@@ -186,12 +518,123 @@ async def obtener_indicadores(
     - Desglose por sucursal
     """
     try:
-        indicadores = crud.get_indicadores(db)
-        return indicadores
+        version, etag = _version_indicadores(db)
+        # Privado: requiere token; el navegador revalida en cada visita
+        cache_control = "private, no-cache"
+        if http_cache.coincide(if_none_match, etag):
+            return http_cache.no_modificado(etag, cache_control)
+        _, etag, body = _foto_indicadores(db, version, etag)
+        return Response(
+            content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": cache_control}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@app.get("/api/indicadores/segmentos", response_model=schemas.IndicadoresSegmentos, tags=["Indicadores"])
+async def obtener_indicadores_segmentos(
+    dimensiones: Optional[List[schemas.DimensionSegmento]] = Query(
+        None, description="Dimensiones a cortar (por defecto todas)"
+    ),
+    por_sucursal: bool = Query(True, description="Repetir cada corte por sucursal"),
+    db: Session = Depends(get_read_db),
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    """
+    Tasas de aprobación por banda de score, banda de edad, plazo e historial
+    crediticio, en total y por sucursal (requiere autenticación admin)
+    
+    Todos los cortes se calculan en una sola consulta (GROUPING SETS en
+    PostgreSQL) y la respuesta se reutiliza mientras no haya solicitudes nuevas
+    """
+    try:
+        dimensiones = [d for d in segmentos.DIMENSIONES if d in (dimensiones or segmentos.DIMENSIONES)]
+        cortes = segmentos.cortes_bandas()
+        cache_control = "private, no-cache"
+        etag = http_cache.etag("segmentos", shards.version_solicitudes(db), dimensiones, por_sucursal, cortes)
+        if http_cache.coincide(if_none_match, etag):
+            return http_cache.no_modificado(etag, cache_control)
+        body = http_cache.segmentos.buscar(etag)
+        if body is None:
+            # Versión y segmentos de una misma foto (una por shard con shards)
+            version, resultado = shards.calcular_segmentos_con_version(db, dimensiones, por_sucursal)
+            etag = http_cache.etag("segmentos", version, dimensiones, por_sucursal, cortes)
+            body = http_cache.segmentos.guardar(etag, responses.dumps(resultado))
+        return Response(
+            content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": cache_control}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@app.get("/api/indicadores/distribuciones", response_model=schemas.IndicadoresDistribuciones, tags=["Indicadores"])
+async def obtener_indicadores_distribuciones(
+    cubetas: int = Query(10, ge=1, le=100, description="Cubetas de cada histograma"),
+    db: Session = Depends(get_read_db),
+    current_user: models.UsuarioAdmin = Depends(auth.get_current_user),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    """
+    Mediana, p90, p99 e histograma de score, monto solicitado e ingreso
+    mensual, en general y por sucursal (requiere autenticación admin)
+    
+    Los cuantiles vienen de sketches con error relativo acotado
+    (`error_relativo`) que se alimentan al confirmar cada transacción; la
+    consulta solo suma los deltas nuevos, sin leer la tabla de solicitudes
+    """
+    try:
+        # Con shards, los sketches de cada uno
+        estados = shards.distribuciones(db)
+    except sketches.EstadoNoDisponible as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    try:
+        etag = http_cache.etag(
+            "distribuciones", [e.version for e in estados], cubetas, estados[0].error_relativo
+        )
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if http_cache.coincide(if_none_match, etag):
+            return http_cache.no_modificado(etag, headers["Cache-Control"])
+        body = responses.dumps(sketches.resumir(estados, cubetas))
+        shards.compactar_distribuciones()
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+@app.get("/api/indicadores/eventos", tags=["Indicadores"], response_class=StreamingResponse)
+async def eventos_indicadores(
+    credentials: HTTPAuthorizationCredentials = Depends(auth.security)
+):
+    """
+    Stream en vivo de decisiones y deltas de indicadores (Server-Sent Events)
+    
+    El primer mensaje (`indicadores`) es la foto completa; los siguientes
+    (`actualizacion`) traen las últimas decisiones y las sumas por sucursal a
+    agregar. Con `resincronizar` o al cerrarse el stream el cliente reconecta.
+    
+    El stream dura minutos, así que no usa get_db (su conexión no vuelve al
+    pool hasta que termina la respuesta): usuario y foto se leen con una
+    sesión que se cierra antes de empezar a enviar.
+    """
+    with database.sesion() as db:
+        auth.usuario_del_token(db, credentials.credentials)
+        # Suscribirse antes de la foto: lo que se confirme entre ambas no se pierde
+        suscripcion = eventos.difusor.suscribir()
+        try:
+            # El stream descarta los eventos con versión ya incluida en la foto
+            version, _, body = _foto_indicadores(db, *_version_indicadores(db))
+        except Exception as e:
+            suscripcion.cancelar()
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    return StreamingResponse(
+        eventos.flujo(suscripcion, body, version),
+        media_type="text/event-stream",
+        # Sin buffer en nginx para que cada mensaje llegue al enviarse
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ==================== Manejo de errores ====================
 
 @app.exception_handler(HTTPException)
@@ -0,0 +1,69 @@
+"""
+Migración del esquema de una base existente
+
+La API solo crea al importar las tablas que faltan. Los índices nuevos de
+tablas existentes (y la extensión pg_trgm que necesitan los de búsqueda, o
+en SQLite la tabla FTS5) los agrega este comando, que se ejecuta una vez
+antes de arrancar los workers:
+
+- En PostgreSQL los índices se crean con CONCURRENTLY, sin bloquear las
+  escrituras, y un lock consultivo evita que dos migraciones corran a la vez
+- Un índice que quedó INVALID por una creación interrumpida se vuelve a crear
+- Con SHARD_DATABASE_URLS se preparan y migran también los shards
+
+Uso:
+    python -m app.migraciones
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import busqueda
+from .config import settings
+from .database import Base, SessionLocal, asegurar_indices, engine
+
+
+def migrar(db_engine: Engine) -> list:
+    """
+    Crear las tablas, índices y el índice de búsqueda que falten en `db_engine`
+
+    Returns:
+        Nombres de los índices creados en tablas existentes
+    """
+    Base.metadata.create_all(bind=db_engine)
+    busqueda.asegurar_fts(db_engine)
+    return asegurar_indices(db_engine)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Migración de tablas e índices")
+    parser.parse_args(argv)
+
+    # Registra todos los modelos y los eventos DDL de búsqueda y sketches
+    from . import shards
+
+    try:
+        creados = migrar(engine)
+        print(f"✅ Base principal: {len(creados)} índices creados", file=sys.stderr)
+        if settings.SHARD_DATABASE_URLS:
+            router = shards.ShardRouter(settings.SHARD_DATABASE_URLS)
+            try:
+                with SessionLocal() as origen:
+                    router.preparar(origen)
+                for shard, shard_engine in enumerate(router.engines):
+                    busqueda.asegurar_fts(shard_engine)
+                    creados = asegurar_indices(shard_engine)
+                    print(f"✅ Shard {shard}: {len(creados)} índices creados", file=sys.stderr)
+            finally:
+                router.cerrar()
+    except SQLAlchemyError as e:
+        print(f"❌ Error al migrar: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 """
 Modelos de base de datos con SQLAlchemy
 """
-from sqlalchemy import Column, Integer, String, Boolean, DECIMAL, DateTime, Date, Text, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, Boolean, DECIMAL, DateTime, Date, Text, ForeignKey, CheckConstraint, LargeBinary, Float, Index, BigInteger
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -11,7 +11,7 @@ class Sucursal(Base):
     """Modelo para sucursales"""
     __tablename__ = "sucursales"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     nombre = Column(String(100), nullable=False)
     ciudad = Column(String(100), nullable=False)
     direccion = Column(String(255), nullable=False)
@@ -26,10 +26,10 @@ class Cliente(Base):
     """Modelo para clientes"""
     __tablename__ = "clientes"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     nombre = Column(String(100), nullable=False)
     apellido = Column(String(100), nullable=False)
-    email = Column(String(150), unique=True, nullable=False, index=True)
+    email = Column(String(150), unique=True, nullable=False)
     telefono = Column(String(20))
     fecha_nacimiento = Column(Date, nullable=False)
     edad = Column(Integer, nullable=False)
@@ -40,6 +40,15 @@ class Cliente(Base):
     
     __table_args__ = (
         CheckConstraint('edad >= 0 AND edad <= 150', name='chk_edad'),
+        # Búsqueda por texto parcial (app/busqueda.py); en SQLite se usa FTS5
+        Index("ix_clientes_nombre_trgm", "nombre", postgresql_using="gin",
+              postgresql_ops={"nombre": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_clientes_apellido_trgm", "apellido", postgresql_using="gin",
+              postgresql_ops={"apellido": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_clientes_email_trgm", "email", postgresql_using="gin",
+              postgresql_ops={"email": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        # SQLite: ids nunca reutilizados y rangos por shard (app/shards.py)
+        {"sqlite_autoincrement": True},
     )
 
 
@@ -47,7 +56,7 @@ class Solicitud(Base):
     """Modelo para solicitudes de crédito"""
     __tablename__ = "solicitudes"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     cliente_id = Column(Integer, ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False)
     sucursal_id = Column(Integer, ForeignKey("sucursales.id", ondelete="RESTRICT"), nullable=False)
     monto_solicitado = Column(DECIMAL(15, 2), nullable=False)
@@ -58,7 +67,7 @@ class Solicitud(Base):
     plazo_meses = Column(Integer, nullable=False)
     estado = Column(String(20), nullable=False)  # 'aprobado' o 'rechazado'
     motivo_rechazo = Column(Text)
-    fecha_solicitud = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    fecha_solicitud = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relaciones
     cliente = relationship("Cliente", back_populates="solicitudes")
@@ -70,15 +79,171 @@ class Solicitud(Base):
         CheckConstraint('ingreso_mensual > 0', name='chk_ingreso_positivo'),
         CheckConstraint('score_crediticio >= 300 AND score_crediticio <= 850', name='chk_score_range'),
         CheckConstraint('plazo_meses > 0 AND plazo_meses <= 360', name='chk_plazo_positivo'),
+        # Índices (database/init.sql crea los mismos con los mismos nombres)
+        # Solicitudes de un cliente y borrado en cascada
+        Index("idx_solicitudes_cliente", "cliente_id"),
+        # Conteos y montos por sucursal y estado (indicadores) sin leer la
+        # tabla; también cubre las búsquedas por sucursal_id sola
+        Index("idx_solicitudes_sucursal_estado", "sucursal_id", "estado",
+              postgresql_include=["monto_solicitado"]),
+        # Totales por estado (indicadores generales)
+        Index("idx_solicitudes_estado_monto", "estado", postgresql_include=["monto_solicitado"]),
+        # Solicitudes recientes: ORDER BY fecha_solicitud DESC, id DESC LIMIT n
+        Index("idx_solicitudes_fecha_id", fecha_solicitud.desc(), id.desc()),
+        # SQLite: ids nunca reutilizados (marcas de agua por id) y rangos por shard
+        {"sqlite_autoincrement": True},
     )
 
 
+class SolicitudArchivada(Base):
+    """Solicitudes antiguas movidas fuera de la tabla activa (ver app/archivo.py)"""
+    __tablename__ = "solicitudes_archivadas"
+
+    # Mismo id que tuvo en solicitudes
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    cliente_id = Column(Integer, ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False)
+    sucursal_id = Column(Integer, ForeignKey("sucursales.id", ondelete="RESTRICT"), nullable=False)
+    monto_solicitado = Column(DECIMAL(15, 2), nullable=False)
+    ingreso_mensual = Column(DECIMAL(15, 2), nullable=False)
+    score_crediticio = Column(Integer, nullable=False)
+    tiene_tarjeta_credito = Column(Boolean, default=False)
+    tiene_credito_automotriz = Column(Boolean, default=False)
+    plazo_meses = Column(Integer, nullable=False)
+    estado = Column(String(20), nullable=False)
+    motivo_rechazo = Column(Text)
+    fecha_solicitud = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # Historial de un cliente (búsqueda) y borrado en cascada
+        Index("idx_solicitudes_archivadas_cliente", "cliente_id"),
+        # Listados con rango de fechas que llegan al archivo
+        Index("idx_solicitudes_archivadas_fecha_id", fecha_solicitud.desc(), id.desc()),
+    )
+
+
+class ResumenArchivado(Base):
+    """
+    Agregados de las solicitudes archivadas al grano más fino de los
+    segmentos (bandas de score y edad según `EstadoArchivo.cortes`)
+    """
+    __tablename__ = "resumen_archivado"
+
+    id = Column(Integer, primary_key=True)
+    sucursal_id = Column(Integer, nullable=False)
+    score_banda = Column(Integer, nullable=False)
+    edad_banda = Column(Integer, nullable=False)
+    plazo_meses = Column(Integer, nullable=False)
+    tiene_tarjeta_credito = Column(Boolean)
+    tiene_credito_automotriz = Column(Boolean)
+    total = Column(Integer, nullable=False, default=0)
+    aprobadas = Column(Integer, nullable=False, default=0)
+    monto = Column(DECIMAL(18, 2), nullable=False, default=0)
+    monto_aprobado = Column(DECIMAL(18, 2), nullable=False, default=0)
+    suma_score = Column(BigInteger, nullable=False, default=0)
+
+
+class EstadoArchivo(Base):
+    """Avance del archivado de solicitudes (una fila)"""
+    __tablename__ = "estado_archivo"
+
+    nombre = Column(String(50), primary_key=True)
+    filas = Column(Integer, nullable=False, default=0)  # solicitudes archivadas
+    fecha_max = Column(DateTime(timezone=True))  # la más reciente archivada
+    cortes = Column(Text, nullable=False)  # JSON de segmentos.cortes_bandas() del resumen
+    actualizado = Column(DateTime, nullable=False)
+
+
+class SimulacionJob(Base):
+    """Modelo para trabajos de simulación en segundo plano"""
+    __tablename__ = "simulacion_jobs"
+    
+    id = Column(Integer, primary_key=True)
+    cantidad = Column(Integer, nullable=False)
+    procesadas = Column(Integer, nullable=False, default=0)
+    aprobadas = Column(Integer, nullable=False, default=0)
+    rechazadas = Column(Integer, nullable=False, default=0)
+    # 'pendiente', 'en_proceso', 'completado', 'cancelado' o 'error'
+    estado = Column(String(20), nullable=False, default="pendiente")
+    cancelar = Column(Boolean, nullable=False, default=False)
+    mensaje_error = Column(Text)
+    # Worker que tiene tomado el trabajo y su último latido
+    propietario = Column(String(64))
+    heartbeat = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    @property
+    def progreso(self) -> float:
+        """Porcentaje de filas confirmadas"""
+        return round(self.procesadas * 100 / self.cantidad, 2) if self.cantidad else 0.0
+
+
+class IdempotencyKey(Base):
+    """Respuestas guardadas por Idempotency-Key para reintentos de clientes"""
+    __tablename__ = "idempotency_keys"
+    
+    clave = Column(String(255), primary_key=True)
+    huella = Column(String(64), nullable=False)  # SHA-256 del cuerpo de la petición
+    status_code = Column(Integer)  # NULL mientras la petición original está en curso
+    body = Column(LargeBinary)
+    expira_en = Column(DateTime, nullable=False, index=True)
+
+
+class SketchDistribucion(Base):
+    """Base compactada de los sketches de cuantiles (ver app/sketches.py)"""
+    __tablename__ = "sketches_distribucion"
+    
+    nombre = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False)  # versión de los datos incorporada
+    error_relativo = Column(Float, nullable=False)
+    datos = Column(LargeBinary, nullable=False)  # JSON por sucursal y métrica
+    actualizado = Column(DateTime, nullable=False)
+
+
+class SketchDelta(Base):
+    """Sketches de las solicitudes de una transacción, por su versión (ver app/sketches.py)"""
+    __tablename__ = "sketches_delta"
+
+    version = Column(BigInteger, primary_key=True)
+    datos = Column(LargeBinary, nullable=False)
+    creado = Column(DateTime, nullable=False)
+
+
+class VersionDatos(Base):
+    """Versión hasta la que ya se purgó versiones_confirmadas (ver app/versiones.py)"""
+    __tablename__ = "versiones"
+
+    nombre = Column(String(50), primary_key=True)
+    valor = Column(BigInteger, nullable=False, default=0)
+
+
+class VersionConfirmada(Base):
+    """Versión de cada transacción que cambió solicitudes (ver app/versiones.py)"""
+    __tablename__ = "versiones_confirmadas"
+    # Sin AUTOINCREMENT SQLite reutilizaría los valores purgados
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    valor = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    creado = Column(DateTime, nullable=False)
+
+
+class Importacion(Base):
+    """Avance de una importación histórica (ver app/importacion.py)"""
+    __tablename__ = "importaciones"
+
+    nombre = Column(String(255), primary_key=True)
+    linea = Column(Integer, nullable=False)  # última línea del archivo ya confirmada
+    filas = Column(Integer, nullable=False, default=0)
+    clientes_nuevos = Column(Integer, nullable=False, default=0)
+    actualizado = Column(DateTime, nullable=False)
+
+
 class UsuarioAdmin(Base):
     """Modelo para usuarios administradores"""
     __tablename__ = "usuarios_admin"
     
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(50), unique=True, nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    username = Column(String(50), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     email = Column(String(150), unique=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
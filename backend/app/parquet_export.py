@@ -0,0 +1,340 @@
+"""
+Exportación incremental de solicitudes a Parquet
+
+Agrega a un dataset Parquet local, particionado por mes de la solicitud
+(anio_mes=YYYY-MM), solo las filas con id mayor a la marca de agua de la
+exportación anterior. Los análisis leen los archivos (memory-mapped) en vez
+de escanear la base de datos de producción.
+
+- Las filas se leen con un cursor de servidor en lotes y cada lote se
+  convierte directamente en columnas Arrow, sin pasar por el ORM
+- Montos como decimal128(15, 2) y compresión zstd
+- La marca de agua (_watermark.json) avanza después de escribir cada lote;
+  si una ejecución se interrumpe, los archivos posteriores a la marca se
+  eliminan al iniciar la siguiente, así que no quedan filas duplicadas
+- Los ids no se confirman en orden (transacciones concurrentes, bloques del
+  write-behind), así que los ids que faltan por debajo de la marca se
+  guardan como huecos junto a ella. Cada ejecución vuelve a buscarlos y
+  exporta los que ya aparecieron (archivos part-...-h<ejecución>.parquet);
+  un hueco se descarta tras `retencion_huecos` segundos (ids de
+  transacciones revertidas o de bloques que no se usaron)
+- No se exportan filas más recientes que `retraso` segundos, para que la
+  mayoría de los ids pendientes de confirmar ni siquiera llegue a ser hueco
+- Con SHARD_DATABASE_URLS cada shard se exporta a su partición shard=k,
+  con su propia marca de agua
+
+Requiere pyarrow (dependencia opcional para analítica):
+    pip install pyarrow
+    python -m app.parquet_export --destino /data/solicitudes   # o PARQUET_DESTINO
+
+Lectura:
+    import pyarrow.dataset as ds
+    tabla = ds.dataset("/data/solicitudes", format="parquet", partitioning="hive").to_table()
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.engine import Engine
+
+from . import models
+from .config import settings
+
+MARCA = "_watermark.json"
+# Ids que faltan se vuelven a buscar por rangos en consultas de este tamaño
+RANGOS_POR_CONSULTA = 500
+
+COLUMNAS = (
+    "id", "cliente_id", "sucursal_id", "monto_solicitado", "ingreso_mensual",
+    "score_crediticio", "tiene_tarjeta_credito", "tiene_credito_automotriz",
+    "plazo_meses", "estado", "motivo_rechazo", "fecha_solicitud",
+)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Se requiere pyarrow para exportar a Parquet: pip install pyarrow")
+    return pyarrow
+
+
+def esquema():
+    """Esquema Arrow de los archivos exportados"""
+    pa = _pyarrow()
+    dinero = pa.decimal128(15, 2)
+    return pa.schema([
+        ("id", pa.int64()),
+        ("cliente_id", pa.int64()),
+        ("sucursal_id", pa.int32()),
+        ("monto_solicitado", dinero),
+        ("ingreso_mensual", dinero),
+        ("score_crediticio", pa.int16()),
+        ("tiene_tarjeta_credito", pa.bool_()),
+        ("tiene_credito_automotriz", pa.bool_()),
+        ("plazo_meses", pa.int16()),
+        ("estado", pa.string()),
+        ("motivo_rechazo", pa.string()),
+        ("fecha_solicitud", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def leer_estado(destino: str, requerida: bool = False) -> dict:
+    """
+    Marca de agua del dataset
+
+    Args:
+        requerida: FileNotFoundError si aún no hay marca en vez de empezar en 0
+
+    Returns:
+        dict con ultimo_id (0 si el dataset es nuevo), huecos
+        ([primer id, último id, primera vez visto en epoch]) y ejecucion
+    """
+    try:
+        with open(os.path.join(destino, MARCA), encoding="utf-8") as f:
+            estado = json.load(f)
+    except FileNotFoundError:
+        if requerida:
+            raise
+        estado = {"ultimo_id": 0}
+    estado.setdefault("huecos", [])
+    estado.setdefault("ejecucion", 0)
+    return estado
+
+
+def leer_marca(destino: str) -> int:
+    """Último id exportado (0 si el dataset es nuevo)"""
+    return leer_estado(destino)["ultimo_id"]
+
+
+def limite_archivo(destino: str) -> int:
+    """
+    Mayor id que se puede archivar sin perder filas del dataset
+
+    Por debajo de la marca y del primer hueco pendiente: un id que falta aún
+    puede confirmarse y exportarse en una ejecución posterior.
+
+    Raises:
+        OSError o ValueError si la marca no existe o no se puede leer
+    """
+    estado = leer_estado(destino, requerida=True)
+    try:
+        return min([int(estado["ultimo_id"])] + [int(inicio) - 1 for inicio, _, _ in estado["huecos"]])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Marca de agua inválida: {e!r}")
+
+
+def destino_shard(destino: str, shard: int) -> str:
+    """Subdirectorio del dataset con las solicitudes de un shard (partición shard=k)"""
+    return os.path.join(destino, f"shard={shard}")
+
+
+def _guardar_marca(destino: str, ultimo_id: int, huecos: Optional[List[list]] = None, ejecucion: int = 0) -> None:
+    path = os.path.join(destino, MARCA)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "ultimo_id": ultimo_id, "huecos": huecos or [], "ejecucion": ejecucion,
+            "actualizado": datetime.now(timezone.utc).isoformat(),
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def _partes(nombre: str) -> Optional[tuple]:
+    # part-<primer id>-<último id>[-h<ejecución>].parquet
+    if not (nombre.startswith("part-") and nombre.endswith(".parquet")):
+        return None
+    partes = nombre[:-len(".parquet")].split("-")
+    ejecucion = int(partes[3][1:]) if len(partes) > 3 else None
+    return int(partes[1]), ejecucion
+
+
+def _limpiar_incompletos(destino: str, marca: int, ejecucion: int) -> None:
+    """
+    Eliminar archivos de una ejecución interrumpida: posteriores a la marca
+    o de huecos de una ejecución que no llegó a guardar la marca
+    """
+    for raiz, _, archivos in os.walk(destino):
+        for nombre in archivos:
+            partes = _partes(nombre)
+            if nombre.endswith(".tmp") or (partes is not None and (
+                partes[0] > marca if partes[1] is None else partes[1] > ejecucion
+            )):
+                os.remove(os.path.join(raiz, nombre))
+
+
+def _quitar(huecos: List[list], encontrados: List[int]) -> List[list]:
+    """Partir los rangos de huecos quitando los ids encontrados"""
+    encontrados = sorted(encontrados)
+    resultado = []
+    for inicio, fin, visto in huecos:
+        for id_ in encontrados[bisect.bisect_left(encontrados, inicio):bisect.bisect_right(encontrados, fin)]:
+            if id_ > inicio:
+                resultado.append([inicio, id_ - 1, visto])
+            inicio = id_ + 1
+        if inicio <= fin:
+            resultado.append([inicio, fin, visto])
+    return resultado
+
+
+def _mes(fecha: datetime) -> str:
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc)
+    return f"{fecha.year:04d}-{fecha.month:02d}"
+
+
+def _limite_superior(conn, marca: int, retraso: float) -> Optional[int]:
+    """Primer id que aún no se exporta por ser demasiado reciente"""
+    if retraso <= 0:
+        return None
+    corte = datetime.now(timezone.utc) - timedelta(seconds=retraso)
+    tabla = models.Solicitud.__table__
+    return conn.execute(
+        select(func.min(tabla.c.id)).where(tabla.c.id > marca, tabla.c.fecha_solicitud >= corte)
+    ).scalar()
+
+
+def _escribir(pa, filas, destino: str, sufijo: str = "") -> int:
+    """Escribir filas leídas de la base, un archivo por mes; devuelve cuántos archivos"""
+    schema = esquema()
+    columnas = list(zip(*filas))
+    batch = pa.Table.from_arrays(
+        [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, schema)],
+        schema=schema,
+    )
+    meses = pa.array([_mes(f) for f in columnas[-1]])
+    archivos = 0
+    for mes in sorted(set(meses.to_pylist())):
+        parte = batch.filter(pa.compute.equal(meses, mes))
+        ids = parte.column("id")
+        carpeta = os.path.join(destino, f"anio_mes={mes}")
+        os.makedirs(carpeta, exist_ok=True)
+        path = os.path.join(
+            carpeta,
+            f"part-{pa.compute.min(ids).as_py():012d}-{pa.compute.max(ids).as_py():012d}{sufijo}.parquet",
+        )
+        pa.parquet.write_table(parte, path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        archivos += 1
+    return archivos
+
+
+def _exportar_huecos(pa, conn, destino: str, huecos: List[list], ejecucion: int) -> tuple:
+    """
+    Exportar las filas que aparecieron en los huecos
+
+    Returns:
+        (filas, archivos, huecos restantes)
+    """
+    tabla = models.Solicitud.__table__
+    filas_escritas = archivos = 0
+    encontrados = []
+    for i in range(0, len(huecos), RANGOS_POR_CONSULTA):
+        rangos = huecos[i:i + RANGOS_POR_CONSULTA]
+        filas = conn.execute(
+            select(*(tabla.c[c] for c in COLUMNAS))
+            .where(or_(*(tabla.c.id.between(inicio, fin) for inicio, fin, _ in rangos)))
+            .order_by(tabla.c.id)
+        ).all()
+        if filas:
+            archivos += _escribir(pa, filas, destino, f"-h{ejecucion:06d}")
+            filas_escritas += len(filas)
+            encontrados.extend(fila[0] for fila in filas)
+    return filas_escritas, archivos, _quitar(huecos, encontrados)
+
+
+def exportar(
+    engine: Engine, destino: str, lote: int = 100_000, retraso: float = 60,
+    retencion_huecos: float = 7 * 86400,
+) -> dict:
+    """
+    Exportar las solicitudes nuevas desde la última marca de agua y las que
+    se confirmaron después en huecos por debajo de ella
+
+    Returns:
+        dict con filas y archivos escritos, la nueva marca y los huecos pendientes
+    """
+    pa = _pyarrow()
+    os.makedirs(destino, exist_ok=True)
+    estado = leer_estado(destino)
+    marca, ejecucion = estado["ultimo_id"], estado["ejecucion"]
+    _limpiar_incompletos(destino, marca, ejecucion)
+    ejecucion += 1
+    ahora = time.time()
+    huecos = [h for h in estado["huecos"] if ahora - h[2] < retencion_huecos]
+
+    tabla = models.Solicitud.__table__
+    with engine.connect() as conn:
+        filas_escritas, archivos, huecos = _exportar_huecos(pa, conn, destino, huecos, ejecucion)
+        _guardar_marca(destino, marca, huecos, ejecucion)
+
+        consulta = select(*(tabla.c[c] for c in COLUMNAS)).where(tabla.c.id > marca).order_by(tabla.c.id)
+        limite = _limite_superior(conn, marca, retraso)
+        if limite is not None:
+            consulta = consulta.where(tabla.c.id < limite)
+        result = conn.execution_options(stream_results=True, max_row_buffer=lote).execute(consulta)
+        for filas in result.partitions(lote):
+            archivos += _escribir(pa, filas, destino)
+            # Ids que faltan entre lo exportado: pueden confirmarse más tarde
+            anterior = marca
+            for fila in filas:
+                if fila[0] > anterior + 1:
+                    huecos.append([anterior + 1, fila[0] - 1, ahora])
+                anterior = fila[0]
+            marca = anterior
+            _guardar_marca(destino, marca, huecos, ejecucion)
+            filas_escritas += len(filas)
+    return {"filas": filas_escritas, "archivos": archivos, "marca": marca, "huecos": len(huecos)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Exportación incremental de solicitudes a Parquet")
+    parser.add_argument("--destino", default=settings.PARQUET_DESTINO, required=not settings.PARQUET_DESTINO,
+                        help="Directorio del dataset Parquet (por defecto PARQUET_DESTINO)")
+    parser.add_argument("--lote", type=int, default=100_000, help="Filas por lote leído del cursor")
+    parser.add_argument("--retraso", type=float, default=60,
+                        help="No exportar solicitudes más recientes que estos segundos")
+    parser.add_argument("--retencion-huecos", type=float, default=7 * 86400,
+                        help="Segundos que se sigue buscando un id que falta por debajo de la marca")
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal, engine, replica_engine
+
+    router = None
+    if settings.SHARD_DATABASE_URLS:
+        from . import shards
+        router = shards.ShardRouter(settings.SHARD_DATABASE_URLS)
+        with SessionLocal() as origen:
+            router.preparar(origen)
+        destinos = [(e, destino_shard(args.destino, k)) for k, e in enumerate(router.engines)]
+    else:
+        # Preferir la réplica de lectura si está configurada
+        destinos = [(replica_engine or engine, args.destino)]
+    try:
+        for origen, destino in destinos:
+            inicio = time.perf_counter()
+            try:
+                resultado = exportar(origen, destino, args.lote, args.retraso, args.retencion_huecos)
+            except RuntimeError as e:
+                print(str(e), file=sys.stderr)
+                return 1
+            segundos = time.perf_counter() - inicio
+            print(f"{destino}: {resultado['filas']} filas en {resultado['archivos']} archivos ({segundos:.1f}s); "
+                  f"marca de agua: {resultado['marca']}, {resultado['huecos']} huecos pendientes", file=sys.stderr)
+    finally:
+        if router is not None:
+            router.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Precalificación sin base de datos
+
+Evalúa la política y calcula la cuota solo en memoria, para dar respuesta
+mientras el usuario llena el formulario sin crear clientes ni solicitudes ni
+tomar conexiones del pool.
+
+Las respuestas se guardan ya serializadas en un LRU cuya clave es la entrada
+normalizada (edad en vez de fecha de nacimiento, montos como Decimal, de
+modo que 50000 y 50000.00 coinciden) más el evaluador de reglas activo; al
+recargar reglas las entradas anteriores dejan de usarse y salen por LRU.
+"""
+import hashlib
+from decimal import Decimal
+from functools import lru_cache
+from typing import NamedTuple
+
+from . import rules
+from .business_logic import calcular_contraoferta
+from .config import settings
+from .crud import calcular_datos_financieros
+from .responses import dumps
+
+CENTAVOS = Decimal("0.01")
+
+
+class Precalificacion(NamedTuple):
+    """Respuesta serializada y su ETag"""
+    body: bytes
+    etag: str
+
+
+@lru_cache(maxsize=settings.PRECALIFICACION_CACHE_SIZE)
+def _precalificar(
+    evaluador: rules.EvaluadorCompilado,
+    edad: int,
+    monto_solicitado: Decimal,
+    ingreso_mensual: Decimal,
+    score_crediticio: int,
+    tiene_tarjeta_credito: bool,
+    tiene_credito_automotriz: bool,
+    plazo_meses: int,
+) -> Precalificacion:
+    # Los contadores de /api/reglas son de solicitudes reales
+    aprobado, motivo_rechazo = evaluador.evaluar_sin_contar(
+        edad, monto_solicitado, ingreso_mensual, score_crediticio,
+        tiene_tarjeta_credito, tiene_credito_automotriz, plazo_meses,
+    )
+    contraoferta = None
+    if not aprobado:
+        contraoferta = calcular_contraoferta(
+            edad, monto_solicitado, ingreso_mensual, score_crediticio,
+            tiene_tarjeta_credito, tiene_credito_automotriz, plazo_meses,
+        )
+    body = dumps({
+        "aprobado": aprobado,
+        "motivo_rechazo": motivo_rechazo,
+        **calcular_datos_financieros(aprobado, monto_solicitado, plazo_meses),
+        "contraoferta": contraoferta,
+        "version_reglas": evaluador.version,
+    })
+    return Precalificacion(body, '"' + hashlib.sha1(body).hexdigest() + '"')
+
+
+def precalificar(datos) -> Precalificacion:
+    """Precalificar una solicitud (schemas.PrecalificacionRequest)"""
+    return _precalificar(
+        rules.evaluador_actual(),
+        datos.edad,
+        datos.monto_solicitado.quantize(CENTAVOS),
+        datos.ingreso_mensual.quantize(CENTAVOS),
+        datos.score_crediticio,
+        datos.tiene_tarjeta_credito,
+        datos.tiene_credito_automotriz,
+        datos.plazo_meses,
+    )
+
+
+def limpiar_cache() -> None:
+    _precalificar.cache_clear()
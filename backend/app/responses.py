@@ -0,0 +1,40 @@
+"""
+Respuestas JSON serializadas con orjson
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _orjson_default(obj: Any) -> Any:
+    """
+    Tipos que orjson no serializa de forma nativa
+
+    Decimal se emite como cadena, igual que el modo JSON de Pydantic, para
+    no perder precisión en los montos ni cambiar el contrato de la API.
+    """
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serializar a JSON con orjson (datetime en UTC con sufijo Z)"""
+    return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Respuesta JSON basada en orjson
+
+    Acepta modelos Pydantic ya construidos: si un endpoint la retorna
+    directamente FastAPI omite la segunda validación del response_model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,373 @@
+"""
+Política de crédito declarativa
+
+Las reglas se leen de un archivo JSON (o YAML si PyYAML está instalado), se
+validan y se compilan una sola vez en una lista de closures. Cada evaluación
+recorre la lista en orden: la primera regla de rechazo que aplica termina con
+su mensaje y una regla `aprobar` termina aprobando; si ninguna decide, la
+solicitud se aprueba.
+
+Tipos de regla (`valor` es el umbral):
+- edad_min / edad_max: rechaza si la edad está fuera del límite
+- score_min: rechaza si el score es menor
+- monto_max_multiplo: rechaza si el monto excede `valor` x ingreso mensual
+- ratio_max: rechaza si la cuota (monto / plazo) excede `valor`% del ingreso
+- aprobar: aprueba sin evaluar las reglas siguientes
+
+`cuando` limita la regla a un perfil (con_historial, score_min, score_max).
+Los mensajes admiten {valor}, {monto_maximo} y {porcentaje_ingreso}.
+
+recargar() compila la nueva tabla completa antes de reemplazar la anterior,
+así que una tabla inválida nunca queda activa y las evaluaciones en curso
+terminan con la versión con la que empezaron.
+"""
+import json
+import os
+import string
+import threading
+import time
+from decimal import Decimal
+from typing import Callable, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, field_validator, model_validator
+
+from .config import settings
+
+REGLAS_PATH_DEFAULT = os.path.join(os.path.dirname(__file__), "reglas_credito.json")
+
+TipoRegla = Literal["edad_min", "edad_max", "score_min", "monto_max_multiplo", "ratio_max", "aprobar"]
+
+# Variables disponibles en el mensaje de cada tipo de regla
+CAMPOS_MENSAJE = {
+    "edad_min": {"valor"},
+    "edad_max": {"valor"},
+    "score_min": {"valor"},
+    "monto_max_multiplo": {"valor", "monto_maximo"},
+    "ratio_max": {"valor", "porcentaje_ingreso"},
+}
+
+
+class CondicionRegla(BaseModel):
+    """Perfil al que aplica una regla; los campos vacíos no restringen"""
+    con_historial: Optional[bool] = None  # tiene tarjeta o crédito automotriz
+    score_min: Optional[int] = None
+    score_max: Optional[int] = None
+
+
+class Regla(BaseModel):
+    """Una regla de la política"""
+    id: str
+    tipo: TipoRegla
+    valor: Optional[Decimal] = None
+    mensaje: Optional[str] = None
+    cuando: CondicionRegla = CondicionRegla()
+
+    @model_validator(mode="after")
+    def validar_campos(self):
+        if self.tipo != "aprobar":
+            if self.valor is None:
+                raise ValueError(f"La regla '{self.id}' requiere 'valor'")
+            if not self.mensaje:
+                raise ValueError(f"La regla '{self.id}' requiere 'mensaje'")
+            permitidos = CAMPOS_MENSAJE[self.tipo]
+            try:
+                usados = {campo for _, campo, _, _ in string.Formatter().parse(self.mensaje) if campo is not None}
+                if not usados <= permitidos:
+                    raise ValueError(f"variables no permitidas: {', '.join(sorted(usados - permitidos))}")
+                self.mensaje.format(**{campo: Decimal(0) for campo in permitidos})
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"Mensaje inválido en la regla '{self.id}': {e}")
+        return self
+
+
+class TablaReglas(BaseModel):
+    """Tabla de reglas versionada"""
+    version: str
+    reglas: List[Regla]
+    plazos: List[int] = [12, 24, 36, 48, 60]  # plazos ofrecidos en contraofertas
+
+    @field_validator("plazos")
+    def plazos_positivos(cls, v):
+        if not v or any(p <= 0 for p in v):
+            raise ValueError("Los plazos deben ser enteros positivos")
+        return v
+
+    @field_validator("reglas")
+    def ids_unicos(cls, v):
+        ids = [r.id for r in v]
+        duplicados = {i for i in ids if ids.count(i) > 1}
+        if duplicados:
+            raise ValueError(f"IDs de regla duplicados: {', '.join(sorted(duplicados))}")
+        return v
+
+
+class Contexto:
+    """Datos de una solicitud ya derivados para evaluar las reglas"""
+    __slots__ = ("edad", "monto", "ingreso", "score", "con_historial", "porcentaje_ingreso")
+
+    def __init__(self, edad, monto, ingreso, score, con_historial, plazo_meses):
+        self.edad = edad
+        self.monto = monto
+        self.ingreso = ingreso
+        self.score = score
+        self.con_historial = con_historial
+        # Cuota simplificada sin intereses, en % del ingreso
+        self.porcentaje_ingreso = (monto / plazo_meses / ingreso) * 100 if ingreso else Decimal("Infinity")
+
+
+# Un paso retorna None si no decide, "" si aprueba o el motivo de rechazo
+Paso = Callable[[Contexto], Optional[str]]
+
+APROBAR = ""
+
+
+def _condicion(cuando: CondicionRegla) -> Optional[Callable[[Contexto], bool]]:
+    con_historial, score_min, score_max = cuando.con_historial, cuando.score_min, cuando.score_max
+    if con_historial is None and score_min is None and score_max is None:
+        return None
+
+    def aplica(ctx: Contexto) -> bool:
+        return (
+            (con_historial is None or ctx.con_historial == con_historial)
+            and (score_min is None or ctx.score >= score_min)
+            and (score_max is None or ctx.score <= score_max)
+        )
+    return aplica
+
+
+def _decision(regla: Regla) -> Paso:
+    """Closure que aplica el umbral de una regla, sin condición ni contadores"""
+    valor, mensaje, tipo = regla.valor, regla.mensaje, regla.tipo
+
+    if tipo == "aprobar":
+        def decide(ctx):
+            return APROBAR
+    elif tipo == "edad_min":
+        texto = mensaje.format(valor=valor)
+
+        def decide(ctx):
+            return texto if ctx.edad < valor else None
+    elif tipo == "edad_max":
+        texto = mensaje.format(valor=valor)
+
+        def decide(ctx):
+            return texto if ctx.edad > valor else None
+    elif tipo == "score_min":
+        texto = mensaje.format(valor=valor)
+
+        def decide(ctx):
+            return texto if ctx.score < valor else None
+    elif tipo == "monto_max_multiplo":
+        def decide(ctx):
+            monto_maximo = ctx.ingreso * valor
+            if ctx.monto > monto_maximo:
+                return mensaje.format(valor=valor, monto_maximo=monto_maximo)
+            return None
+    else:  # ratio_max
+        def decide(ctx):
+            if ctx.porcentaje_ingreso > valor:
+                return mensaje.format(valor=valor, porcentaje_ingreso=ctx.porcentaje_ingreso)
+            return None
+    return decide
+
+
+def _compilar_regla(regla: Regla, contador: List[int]) -> Paso:
+    """Closure de una regla; contador = [evaluaciones, decisiones]"""
+    aplica = _condicion(regla.cuando)
+    decide = _decision(regla)
+
+    def paso(ctx: Contexto) -> Optional[str]:
+        if aplica is not None and not aplica(ctx):
+            return None
+        contador[0] += 1
+        resultado = decide(ctx)
+        if resultado is not None:
+            contador[1] += 1
+        return resultado
+    return paso
+
+
+class EvaluadorCompilado:
+    """Tabla compilada e inmutable con sus contadores"""
+
+    def __init__(self, tabla: TablaReglas, origen: Optional[str] = None):
+        self.version = tabla.version
+        self.origen = origen
+        self.tabla = tabla
+        # Los contadores son aproximados con varios hilos (sin lock por rendimiento)
+        self._contadores = [[0, 0] for _ in tabla.reglas]
+        self._pasos = tuple(_compilar_regla(r, c) for r, c in zip(tabla.reglas, self._contadores))
+        # Para contraofertas: las reglas de monto/plazo se leen como cotas
+        self._cotas = tuple((r.tipo, r.valor, _condicion(r.cuando), _decision(r)) for r in tabla.reglas)
+        self.plazos = tuple(sorted(tabla.plazos))
+        self.evaluaciones = 0
+        self.aprobadas_por_defecto = 0
+
+    def evaluar(
+        self,
+        edad: int,
+        monto_solicitado: Decimal,
+        ingreso_mensual: Decimal,
+        score_crediticio: int,
+        tiene_tarjeta_credito: bool,
+        tiene_credito_automotriz: bool,
+        plazo_meses: int,
+    ) -> Tuple[bool, Optional[str]]:
+        self.evaluaciones += 1
+        ctx = Contexto(
+            edad, monto_solicitado, ingreso_mensual, score_crediticio,
+            bool(tiene_tarjeta_credito or tiene_credito_automotriz), plazo_meses,
+        )
+        for paso in self._pasos:
+            resultado = paso(ctx)
+            if resultado is not None:
+                return (True, None) if resultado == APROBAR else (False, resultado)
+        self.aprobadas_por_defecto += 1
+        return True, None
+
+    def evaluar_sin_contar(
+        self,
+        edad: int,
+        monto_solicitado: Decimal,
+        ingreso_mensual: Decimal,
+        score_crediticio: int,
+        tiene_tarjeta_credito: bool,
+        tiene_credito_automotriz: bool,
+        plazo_meses: int,
+    ) -> Tuple[bool, Optional[str]]:
+        """Misma decisión que evaluar sin tocar los contadores (precalificación)"""
+        ctx = Contexto(
+            edad, monto_solicitado, ingreso_mensual, score_crediticio,
+            bool(tiene_tarjeta_credito or tiene_credito_automotriz), plazo_meses,
+        )
+        for _, _, aplica, decide in self._cotas:
+            if aplica is not None and not aplica(ctx):
+                continue
+            resultado = decide(ctx)
+            if resultado is not None:
+                return (True, None) if resultado == APROBAR else (False, resultado)
+        return True, None
+
+    def limites(
+        self,
+        edad: Optional[int],
+        ingreso_mensual: Decimal,
+        score_crediticio: int,
+        con_historial: bool,
+    ) -> Optional[Tuple[Optional[Decimal], Optional[Decimal]]]:
+        """
+        Cotas de monto que la política impone a un perfil
+
+        Las reglas de edad y score no dependen del monto ni del plazo; las de
+        monto y cuota solo acotan el monto por arriba. Recorriendo la tabla
+        hasta la primera regla `aprobar` que aplica, el perfil es aprobable con
+        cualquier (monto, plazo) que cumpla las cotas. Con edad None se omiten
+        las reglas de edad.
+
+        Returns:
+            (multiplo, ratio): menores `valor` de monto_max_multiplo y
+            ratio_max que aplican (None = sin cota); None si el perfil se
+            rechaza sin importar monto y plazo
+        """
+        ctx = Contexto(edad, Decimal(0), ingreso_mensual, score_crediticio, con_historial, 1)
+        multiplo = ratio = None
+        for tipo, valor, aplica, decide in self._cotas:
+            if aplica is not None and not aplica(ctx):
+                continue
+            if tipo == "aprobar":
+                break
+            if tipo == "monto_max_multiplo":
+                multiplo = valor if multiplo is None else min(multiplo, valor)
+            elif tipo == "ratio_max":
+                ratio = valor if ratio is None else min(ratio, valor)
+            elif tipo.startswith("edad") and edad is None:
+                continue
+            elif decide(ctx) is not None:
+                return None
+        return multiplo, ratio
+
+    def estadisticas(self) -> dict:
+        """Evaluaciones y decisiones por regla desde la última carga"""
+        return {
+            "version": self.version,
+            "origen": self.origen,
+            "evaluaciones": self.evaluaciones,
+            "aprobadas_por_defecto": self.aprobadas_por_defecto,
+            "reglas": [
+                {
+                    "id": regla.id,
+                    "tipo": regla.tipo,
+                    "valor": regla.valor,
+                    "evaluaciones": evaluaciones,
+                    "decisiones": decisiones,
+                }
+                for regla, (evaluaciones, decisiones) in zip(self.tabla.reglas, self._contadores)
+            ],
+        }
+
+
+def cargar_tabla(path: str) -> TablaReglas:
+    """Leer y validar una tabla de reglas JSON o YAML"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Se requiere PyYAML para leer reglas en YAML")
+            datos = yaml.safe_load(f)
+        else:
+            datos = json.load(f)
+    return TablaReglas(**datos)
+
+
+def compilar(tabla: TablaReglas, origen: Optional[str] = None) -> EvaluadorCompilado:
+    return EvaluadorCompilado(tabla, origen)
+
+
+_lock = threading.Lock()
+_path = settings.REGLAS_PATH or REGLAS_PATH_DEFAULT
+_mtime: Optional[float] = None
+_proxima_revision = 0.0
+evaluador: EvaluadorCompilado = None
+
+
+def recargar(path: Optional[str] = None) -> EvaluadorCompilado:
+    """
+    Cargar, compilar y activar una tabla de reglas
+
+    Raises:
+        ValueError / OSError si la tabla no es válida; la activa no cambia
+    """
+    global evaluador, _path, _mtime
+    with _lock:
+        path = path or _path
+        mtime = os.path.getmtime(path)
+        nuevo = compilar(cargar_tabla(path), origen=path)
+        # Asignación atómica: las evaluaciones siguientes usan la nueva tabla
+        evaluador = nuevo
+        _path, _mtime = path, mtime
+        return nuevo
+
+
+def evaluador_actual() -> EvaluadorCompilado:
+    """
+    Evaluador activo
+
+    Con REGLAS_RECARGA_INTERVALO > 0 se revisa el archivo a lo sumo una vez
+    por intervalo y se recarga si cambió; si la nueva tabla es inválida se
+    mantiene la anterior.
+    """
+    global _proxima_revision
+    intervalo = settings.REGLAS_RECARGA_INTERVALO
+    if intervalo > 0 and time.monotonic() >= _proxima_revision:
+        _proxima_revision = time.monotonic() + intervalo
+        try:
+            if os.path.getmtime(_path) != _mtime:
+                recargar()
+                print(f"✅ Reglas de crédito recargadas (versión {evaluador.version})")
+        except (ValueError, OSError) as e:
+            print(f"❌ Reglas de crédito inválidas, se mantiene la versión {evaluador.version}: {e}")
+    return evaluador
+
+
+recargar()
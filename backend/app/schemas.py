@@ -1,10 +1,62 @@
 """
 Esquemas Pydantic para validación de datos
 """
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional
-from datetime import datetime, date
+import re
+import time
+from datetime import datetime, date, timedelta
 from decimal import Decimal
+from functools import cached_property
+from typing import Annotated, Literal, Optional, Union
+
+import email_validator
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, TypeAdapter, ValidationInfo, WithJsonSchema, field_validator
+from pydantic.networks import validate_email
+
+
+# ==================== Tipos comunes ====================
+_hoy = date.min
+_hoy_hasta = 0.0
+
+
+def hoy() -> date:
+    """Fecha local de hoy; solo se recalcula al cambiar de día"""
+    global _hoy, _hoy_hasta
+    ahora = time.time()
+    if ahora >= _hoy_hasta:
+        _hoy = date.today()
+        _hoy_hasta = datetime.combine(_hoy + timedelta(days=1), datetime.min.time()).timestamp()
+    return _hoy
+
+
+# Direcciones ASCII comunes; el resto pasa por la validación completa
+_EMAIL_SIMPLE = re.compile(
+    r"[A-Za-z0-9_%+-]+(?:\.[A-Za-z0-9_%+-]+)*"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}"
+)
+
+
+def _validar_email(valor: str) -> str:
+    """
+    Mismo resultado que EmailStr con un camino rápido
+
+    email_validator (IDNA incluido) domina el costo de validar una
+    solicitud; para direcciones ASCII simples basta la expresión regular y
+    las mismas normalizaciones (dominio en minúsculas, dominios reservados).
+    Un dominio con "--" (punycode xn--, o guiones en la 3a y 4a posición de
+    una etiqueta, que IDNA rechaza) va siempre a la validación completa.
+    """
+    if len(valor) <= 254 and _EMAIL_SIMPLE.fullmatch(valor):
+        local, dominio = valor.rsplit("@", 1)
+        dominio = dominio.lower()
+        if len(local) <= 64 and "--" not in dominio and not any(
+            dominio == reservado or dominio.endswith("." + reservado)
+            for reservado in email_validator.SPECIAL_USE_DOMAIN_NAMES
+        ):
+            return f"{local}@{dominio}"
+    return validate_email(valor)[1]
+
+
+Email = Annotated[str, AfterValidator(_validar_email), WithJsonSchema({"type": "string", "format": "email"})]
 
 
 # ==================== Sucursales ====================
@@ -26,8 +78,7 @@ class Sucursal(SucursalBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ==================== Clientes ====================
@@ -35,17 +86,18 @@ class ClienteBase(BaseModel):
     """Esquema base para clientes"""
     nombre: str = Field(..., min_length=1, max_length=100)
     apellido: str = Field(..., min_length=1, max_length=100)
-    email: EmailStr
+    email: Email
     telefono: Optional[str] = Field(None, max_length=20)
     fecha_nacimiento: date
     edad: int = Field(..., ge=0, le=150)
     
-    @validator('edad')
-    def validar_edad_coherente(cls, v, values):
+    @field_validator('edad')
+    @classmethod
+    def validar_edad_coherente(cls, v: int, info: ValidationInfo) -> int:
         """Validar que la edad sea coherente con la fecha de nacimiento"""
-        if 'fecha_nacimiento' in values:
-            fecha_nac = values['fecha_nacimiento']
-            edad_calculada = (datetime.now().date() - fecha_nac).days // 365
+        if 'fecha_nacimiento' in info.data:
+            fecha_nac = info.data['fecha_nacimiento']
+            edad_calculada = (hoy() - fecha_nac).days // 365
             if abs(edad_calculada - v) > 1:
                 raise ValueError('La edad no es coherente con la fecha de nacimiento')
         return v
@@ -61,11 +113,46 @@ class Cliente(ClienteBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ResumenSolicitudesCliente(BaseModel):
+    """Resumen de las solicitudes de un cliente"""
+    total: int
+    aprobadas: int
+    rechazadas: int
+    monto_total_solicitado: Decimal
+    ultima_solicitud: Optional[datetime] = None
+
+
+class ClienteBusqueda(BaseModel):
+    """Cliente encontrado por la búsqueda"""
+    id: int
+    nombre: str
+    apellido: str
+    email: str
+    telefono: Optional[str] = None
+    relevancia: float
+    solicitudes: ResumenSolicitudesCliente
+
+
+class BusquedaClientesResponse(BaseModel):
+    """Página de resultados; `siguiente` es el cursor de la próxima página"""
+    resultados: list[ClienteBusqueda]
+    siguiente: Optional[str] = None
 
 
 # ==================== Solicitudes ====================
+def calcular_edad(fecha_nacimiento: date) -> int:
+    """Edad cumplida a la fecha de hoy"""
+    referencia = hoy()
+    edad = referencia.year - fecha_nacimiento.year
+    # Ajustar si aún no ha cumplido años este año
+    if (referencia.month, referencia.day) < (fecha_nacimiento.month, fecha_nacimiento.day):
+        edad -= 1
+    return edad
+
+
 class SolicitudBase(BaseModel):
     """Esquema base para solicitudes"""
     monto_solicitado: Decimal = Field(..., gt=0, decimal_places=2)
@@ -82,19 +169,35 @@ class SolicitudCreate(SolicitudBase):
     # Datos del cliente
     nombre: str = Field(..., min_length=1, max_length=100)
     apellido: str = Field(..., min_length=1, max_length=100)
-    email: EmailStr
+    email: Email
     telefono: Optional[str] = Field(None, max_length=20)
     fecha_nacimiento: date
     
-    @property
+    @cached_property
     def edad(self) -> int:
-        """Calcular edad automáticamente desde fecha_nacimiento"""
-        hoy = datetime.now().date()
-        edad = hoy.year - self.fecha_nacimiento.year
-        # Ajustar si aún no ha cumplido años este año
-        if (hoy.month, hoy.day) < (self.fecha_nacimiento.month, self.fecha_nacimiento.day):
-            edad -= 1
-        return edad
+        """Calcular edad automáticamente desde fecha_nacimiento (una vez por instancia)"""
+        return calcular_edad(self.fecha_nacimiento)
+
+
+class SolicitudHistorica(SolicitudCreate):
+    """Solicitud ya decidida en un sistema anterior (ver app/importacion.py)"""
+    estado: Literal["aprobado", "rechazado"]
+    motivo_rechazo: Optional[str] = None
+    fecha_solicitud: Optional[datetime] = None  # sin fecha se usa la de la importación
+
+
+class OpcionContraoferta(BaseModel):
+    """Monto máximo aprobable para un plazo"""
+    plazo_meses: int
+    monto_maximo: Decimal
+    cuota_mensual: Decimal
+
+
+class Contraoferta(BaseModel):
+    """Condiciones aprobables más cercanas a una solicitud rechazada"""
+    monto_maximo: Optional[Decimal] = None  # al plazo solicitado
+    plazo_minimo: Optional[int] = None  # para el monto solicitado
+    opciones: list[OpcionContraoferta] = []
 
 
 class SolicitudResponse(SolicitudBase):
@@ -116,8 +219,37 @@ class SolicitudResponse(SolicitudBase):
     total_a_pagar: Optional[Decimal] = None
     total_intereses: Optional[Decimal] = None
     
-    class Config:
-        from_attributes = True
+    # Solo en rechazos: monto/plazo que sí serían aprobados
+    contraoferta: Optional[Contraoferta] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PrecalificacionRequest(BaseModel):
+    """Datos para precalificar sin registrar cliente ni solicitud"""
+    monto_solicitado: Decimal = Field(..., gt=0, decimal_places=2)
+    ingreso_mensual: Decimal = Field(..., gt=0, decimal_places=2)
+    score_crediticio: int = Field(..., ge=300, le=850)
+    tiene_tarjeta_credito: bool = False
+    tiene_credito_automotriz: bool = False
+    plazo_meses: int = Field(..., gt=0, le=360)
+    fecha_nacimiento: date
+    
+    @cached_property
+    def edad(self) -> int:
+        return calcular_edad(self.fecha_nacimiento)
+
+
+class PrecalificacionResponse(BaseModel):
+    """Resultado de la precalificación"""
+    aprobado: bool
+    motivo_rechazo: Optional[str] = None
+    cuota_mensual: Optional[Decimal] = None
+    tasa_interes_anual: Optional[Decimal] = None
+    total_a_pagar: Optional[Decimal] = None
+    total_intereses: Optional[Decimal] = None
+    contraoferta: Optional[Contraoferta] = None
+    version_reglas: str
 
 
 class Solicitud(BaseModel):
@@ -135,14 +267,26 @@ class Solicitud(BaseModel):
     motivo_rechazo: Optional[str]
     fecha_solicitud: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SolicitudReciente(Solicitud):
+    """Solicitud con los nombres de cliente y sucursal para el dashboard"""
+    cliente_nombre: str
+    cliente_email: str
+    sucursal_nombre: str
 
 
 # ==================== Simulación ====================
 class SimulacionRequest(BaseModel):
     """Esquema para solicitar simulación de múltiples solicitudes"""
     cantidad: int = Field(..., ge=1, le=1000, description="Cantidad de solicitudes a simular")
+    detalle: Literal["none", "sample", "full"] = Field(
+        "full", description="Solicitudes incluidas en la respuesta: ninguna, una muestra o todas"
+    )
+    formato: Literal["json", "ndjson"] = Field(
+        "json", description="ndjson: una línea por solicitud conforme se crea y una línea final con el resumen"
+    )
 
 
 class SimulacionResponse(BaseModel):
@@ -150,7 +294,49 @@ class SimulacionResponse(BaseModel):
     total_generadas: int
     aprobadas: int
     rechazadas: int
-    solicitudes: list[SolicitudResponse]
+    errores: int = Field(0, description="Solicitudes que no se pudieron crear")
+    solicitudes: list[SolicitudResponse] = []
+
+
+class SimulacionJobRequest(BaseModel):
+    """Esquema para crear un trabajo de simulación en segundo plano"""
+    cantidad: int = Field(..., ge=1, le=10_000_000, description="Cantidad de solicitudes a generar")
+
+
+class SimulacionJob(BaseModel):
+    """Estado y progreso de un trabajo de simulación"""
+    id: int
+    cantidad: int
+    procesadas: int
+    aprobadas: int
+    rechazadas: int
+    progreso: float
+    estado: str
+    cancelar: bool
+    mensaje_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
+# ==================== Reglas de crédito ====================
+class ReglaEstadistica(BaseModel):
+    """Uso de una regla desde la última carga"""
+    id: str
+    tipo: str
+    valor: Optional[Decimal] = None
+    evaluaciones: int  # veces que la regla aplicó al perfil
+    decisiones: int  # rechazos (o aprobaciones en reglas `aprobar`)
+
+
+class ReglasEstado(BaseModel):
+    """Tabla de reglas activa y sus contadores"""
+    version: str
+    origen: Optional[str] = None
+    evaluaciones: int
+    aprobadas_por_defecto: int
+    reglas: list[ReglaEstadistica]
 
 
 # ==================== Indicadores ====================
@@ -178,6 +364,61 @@ class IndicadoresGenerales(BaseModel):
     por_sucursal: list[IndicadoresPorSucursal]
 
 
+DimensionSegmento = Literal["score", "edad", "plazo", "tarjeta", "automotriz"]
+
+
+class Segmento(BaseModel):
+    """Tasa de aprobación de un segmento"""
+    valores: dict[str, Union[bool, int, str, None]]
+    total_solicitudes: int
+    aprobadas: int
+    tasa_aprobacion: float
+    monto_total_solicitado: Decimal
+    monto_total_aprobado: Decimal
+
+
+class CorteSegmentos(BaseModel):
+    """Segmentos de una combinación de dimensiones ([] = total)"""
+    dimensiones: list[str]
+    segmentos: list[Segmento]
+
+
+class IndicadoresSegmentos(BaseModel):
+    """Indicadores por segmento y etiquetas de las bandas configuradas"""
+    bandas: dict[str, list[str]]
+    cortes: list[CorteSegmentos]
+
+
+class CubetaHistograma(BaseModel):
+    """Cubeta de un histograma"""
+    desde: float
+    hasta: float
+    cantidad: int
+
+
+class ResumenDistribucion(BaseModel):
+    """Cuantiles (p50, p90, p99) e histograma de una métrica"""
+    cantidad: int
+    minimo: Optional[float]
+    maximo: Optional[float]
+    cuantiles: dict[str, Optional[float]]
+    histograma: list[CubetaHistograma]
+
+
+class DistribucionesSucursal(BaseModel):
+    """Distribuciones de una sucursal"""
+    sucursal_id: int
+    metricas: dict[str, ResumenDistribucion]
+
+
+class IndicadoresDistribuciones(BaseModel):
+    """Distribuciones de score, monto e ingreso con su error relativo"""
+    error_relativo: float
+    version: Union[int, list[int]]  # versión de los datos incluida (una por shard con shards)
+    general: dict[str, ResumenDistribucion]
+    por_sucursal: list[DistribucionesSucursal]
+
+
 # ==================== Autenticación ====================
 class Token(BaseModel):
     """Esquema de token JWT"""
@@ -199,7 +440,7 @@ class LoginRequest(BaseModel):
 class UsuarioAdminBase(BaseModel):
     """Esquema base para usuarios admin"""
     username: str = Field(..., min_length=1, max_length=50)
-    email: EmailStr
+    email: Email
 
 
 class UsuarioAdminCreate(UsuarioAdminBase):
@@ -212,6 +453,10 @@ class UsuarioAdmin(UsuarioAdminBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
 
+# ==================== Validación de listas ====================
+# Adaptadores de módulo: el validador de la lista se construye una sola vez
+SucursalesAdapter = TypeAdapter(list[Sucursal])
+SolicitudesCreateAdapter = TypeAdapter(list[SolicitudCreate])
@@ -0,0 +1,243 @@
+"""
+Tasas de aprobación por segmento
+
+Cortes por banda de score, banda de edad, plazo e historial crediticio
+(tarjeta, crédito automotriz), en total y por sucursal.
+
+En PostgreSQL todos los cortes pedidos salen de una sola consulta con
+GROUPING SETS. En otras bases (SQLite en desarrollo y pruebas) se agrupa una
+vez al grano más fino y los cortes se acumulan en Python en una pasada sobre
+ese resultado, que es pequeño (bandas x plazos x banderas x sucursales).
+
+Las solicitudes archivadas (app/archivo.py) se suman desde resumen_archivado,
+que ya está a ese grano fino; si sus bandas no coinciden con las configuradas
+(el archivado aún no lo reconstruyó) se agrupa la tabla de archivadas.
+
+Con shards cada uno acumula sus métricas (acumular) y se suman antes de
+armar la respuesta (combinar, formatear).
+
+Las bandas se calculan en la base como índices (0, 1, ...) a partir de los
+cortes configurados en SEGMENTOS_BANDAS_SCORE / SEGMENTOS_BANDAS_EDAD y se
+convierten en etiquetas ("<600", "600-649", ">=750") al armar la respuesta.
+"""
+import json
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple, get_args
+
+from sqlalchemy import case, func, literal, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .config import settings
+
+# Dimensiones disponibles, en el orden en que se presentan
+DIMENSIONES = get_args(schemas.DimensionSegmento)
+SUCURSAL = "sucursal"
+# Fila de estado_archivo que escribe app/archivo.py
+ARCHIVO = "solicitudes"
+
+
+def cortes_bandas() -> Dict[str, List[int]]:
+    """Límites inferiores de las bandas configuradas (sin duplicados, ordenados)"""
+    return {
+        "score": sorted(set(settings.SEGMENTOS_BANDAS_SCORE)),
+        "edad": sorted(set(settings.SEGMENTOS_BANDAS_EDAD)),
+    }
+
+
+def etiquetas(cortes: Sequence[int]) -> List[str]:
+    """Etiquetas de las bandas: [600, 650] -> ["<600", "600-649", ">=650"]"""
+    if not cortes:
+        return ["todos"]
+    return (
+        [f"<{cortes[0]}"]
+        + [f"{inicio}-{fin - 1}" for inicio, fin in zip(cortes, cortes[1:])]
+        + [f">={cortes[-1]}"]
+    )
+
+
+def _banda(columna, cortes: Sequence[int]):
+    """Índice de banda calculado en SQL"""
+    if not cortes:
+        return literal(0)
+    return case(
+        *[(columna < corte, indice) for indice, corte in enumerate(cortes)],
+        else_=len(cortes),
+    )
+
+
+def _grupos(dimensiones: Sequence[str], por_sucursal: bool) -> List[Tuple[str, ...]]:
+    """Agrupaciones pedidas: total, cada dimensión y, opcionalmente, por sucursal"""
+    grupos = [()] + [(d,) for d in dimensiones]
+    if por_sucursal:
+        grupos += [(SUCURSAL,)] + [(SUCURSAL, d) for d in dimensiones]
+    return grupos
+
+
+def _base(cortes: Dict[str, List[int]], solicitud=models.Solicitud):
+    """Solicitudes (o archivadas) con las columnas de segmento ya calculadas"""
+    cliente = models.Cliente
+    return (
+        select(
+            _banda(solicitud.score_crediticio, cortes["score"]).label("score"),
+            _banda(cliente.edad, cortes["edad"]).label("edad"),
+            solicitud.plazo_meses.label("plazo"),
+            solicitud.tiene_tarjeta_credito.label("tarjeta"),
+            solicitud.tiene_credito_automotriz.label("automotriz"),
+            solicitud.sucursal_id.label(SUCURSAL),
+            solicitud.estado,
+            solicitud.monto_solicitado,
+            solicitud.score_crediticio,
+        )
+        .join(cliente, cliente.id == solicitud.cliente_id)
+        .subquery()
+    )
+
+
+def _metricas(base):
+    aprobado = base.c.estado == "aprobado"
+    return (
+        func.count().label("total"),
+        func.sum(case((aprobado, 1), else_=0)).label("aprobadas"),
+        func.sum(base.c.monto_solicitado).label("monto"),
+        func.sum(case((aprobado, base.c.monto_solicitado), else_=0)).label("monto_aprobado"),
+    )
+
+
+def consulta_grouping_sets(dimensiones: Sequence[str], por_sucursal: bool, cortes: Dict[str, List[int]]):
+    """Consulta única con GROUPING SETS (PostgreSQL)"""
+    base = _base(cortes)
+    columnas = list(dimensiones) + ([SUCURSAL] if por_sucursal else [])
+    return select(
+        *[base.c[c] for c in columnas],
+        # grouping(x) = 1 cuando x no forma parte del conjunto de la fila
+        *[func.grouping(base.c[c]).label(f"g_{c}") for c in columnas],
+        *_metricas(base),
+    ).group_by(
+        func.grouping_sets(*[tuple_(*[base.c[c] for c in grupo]) for grupo in _grupos(dimensiones, por_sucursal)])
+    )
+
+
+def _acumular(acumulado: dict, clave, fila) -> None:
+    previo = acumulado.get(clave)
+    valores = (fila.total, fila.aprobadas or 0, fila.monto or 0, fila.monto_aprobado or 0)
+    acumulado[clave] = valores if previo is None else tuple(a + b for a, b in zip(previo, valores))
+
+
+def _con_grouping_sets(db: Session, dimensiones, por_sucursal, cortes) -> dict:
+    columnas = ((SUCURSAL,) if por_sucursal else ()) + tuple(dimensiones)
+    acumulado = {}
+    for fila in db.execute(consulta_grouping_sets(dimensiones, por_sucursal, cortes)):
+        grupo = tuple(c for c in columnas if getattr(fila, f"g_{c}") == 0)
+        _acumular(acumulado, (grupo, tuple(getattr(fila, c) for c in grupo)), fila)
+    return acumulado
+
+
+def _acumular_filas(acumulado: dict, filas, grupos) -> dict:
+    # Una pasada sobre el grano fino; cada fila suma a todos los cortes
+    for fila in filas:
+        for grupo in grupos:
+            _acumular(acumulado, (grupo, tuple(getattr(fila, c) for c in grupo)), fila)
+    return acumulado
+
+
+def _en_python(db: Session, dimensiones, por_sucursal, cortes, acumulado=None, solicitud=models.Solicitud) -> dict:
+    base = _base(cortes, solicitud)
+    columnas = list(dimensiones) + ([SUCURSAL] if por_sucursal else [])
+    consulta = select(*[base.c[c] for c in columnas], *_metricas(base)).group_by(*[base.c[c] for c in columnas])
+    return _acumular_filas({} if acumulado is None else acumulado, db.execute(consulta),
+                           _grupos(dimensiones, por_sucursal))
+
+
+# Columnas de resumen_archivado con los nombres de las dimensiones
+COLUMNAS_RESUMEN = {
+    "score": "score_banda", "edad": "edad_banda", "plazo": "plazo_meses",
+    "tarjeta": "tiene_tarjeta_credito", "automotriz": "tiene_credito_automotriz", SUCURSAL: "sucursal_id",
+}
+
+
+def _sumar_archivadas(db: Session, acumulado: dict, dimensiones, por_sucursal, cortes) -> dict:
+    """Agregar las solicitudes archivadas a los cortes ya calculados"""
+    estado = db.get(models.EstadoArchivo, ARCHIVO)
+    if estado is None or not estado.filas:
+        return acumulado
+    if json.loads(estado.cortes) != cortes:
+        return _en_python(db, dimensiones, por_sucursal, cortes, acumulado, models.SolicitudArchivada)
+    resumen = models.ResumenArchivado
+    columnas = [getattr(resumen, COLUMNAS_RESUMEN[c]).label(c)
+                for c in list(dimensiones) + ([SUCURSAL] if por_sucursal else [])]
+    consulta = select(
+        *columnas,
+        func.sum(resumen.total).label("total"),
+        func.sum(resumen.aprobadas).label("aprobadas"),
+        func.sum(resumen.monto).label("monto"),
+        func.sum(resumen.monto_aprobado).label("monto_aprobado"),
+    ).group_by(*columnas)
+    return _acumular_filas(acumulado, db.execute(consulta), _grupos(dimensiones, por_sucursal))
+
+
+def _orden(valor):
+    return (valor is None, valor if valor is not None else 0)
+
+
+def acumular(db: Session, dimensiones: Sequence[str], por_sucursal: bool, cortes: Dict[str, List[int]]) -> dict:
+    """Métricas por (grupo, valores) de las solicitudes activas y archivadas de `db`"""
+    if db.get_bind().dialect.name == "postgresql":
+        acumulado = _con_grouping_sets(db, dimensiones, por_sucursal, cortes)
+    else:
+        acumulado = _en_python(db, dimensiones, por_sucursal, cortes)
+    return _sumar_archivadas(db, acumulado, dimensiones, por_sucursal, cortes)
+
+
+def combinar(acumulados: List[dict]) -> dict:
+    """Sumar los acumulados de varias bases (uno por shard)"""
+    combinado = {}
+    for acumulado in acumulados:
+        for clave, valores in acumulado.items():
+            previo = combinado.get(clave)
+            combinado[clave] = valores if previo is None else tuple(a + b for a, b in zip(previo, valores))
+    return combinado
+
+
+def formatear(acumulado: dict, dimensiones: Sequence[str], por_sucursal: bool, cortes: Dict[str, List[int]]) -> dict:
+    """Respuesta de segmentos a partir de las métricas acumuladas"""
+    bandas = {nombre: etiquetas(limites) for nombre, limites in cortes.items()}
+    resultado = []
+    for grupo in _grupos(dimensiones, por_sucursal):
+        claves = sorted((valores for g, valores in acumulado if g == grupo), key=lambda v: tuple(map(_orden, v)))
+        segmentos = []
+        for valores in claves:
+            total, aprobadas, monto, monto_aprobado = acumulado[(grupo, valores)]
+            if not total:
+                # GROUPING SETS devuelve la fila del total aun sin solicitudes
+                continue
+            segmentos.append({
+                "valores": {
+                    dimension: bandas[dimension][valor] if dimension in bandas and valor is not None else valor
+                    for dimension, valor in zip(grupo, valores)
+                },
+                "total_solicitudes": total,
+                "aprobadas": aprobadas,
+                "tasa_aprobacion": round(aprobadas / total * 100, 2),
+                "monto_total_solicitado": round(Decimal(monto), 2),
+                "monto_total_aprobado": round(Decimal(monto_aprobado), 2),
+            })
+        resultado.append({"dimensiones": list(grupo), "segmentos": segmentos})
+    return {"bandas": bandas, "cortes": resultado}
+
+
+def calcular_segmentos(
+    db: Session,
+    dimensiones: Optional[Sequence[str]] = None,
+    por_sucursal: bool = True,
+) -> dict:
+    """
+    Calcular las tasas de aprobación de los cortes pedidos
+
+    Returns:
+        dict con las etiquetas de banda y una lista de cortes, cada uno con
+        sus segmentos (valores de las dimensiones y métricas)
+    """
+    dimensiones = [d for d in DIMENSIONES if d in (dimensiones or DIMENSIONES)]
+    cortes = cortes_bandas()
+    return formatear(acumular(db, dimensiones, por_sucursal, cortes), dimensiones, por_sucursal, cortes)
@@ -0,0 +1,372 @@
+"""
+Shards de escritura por sucursal (opcional)
+
+Con SHARD_DATABASE_URLS cada sucursal escribe sus clientes y solicitudes en
+una de N bases (shard = sucursal_id % N), de modo que el límite de escritura
+deja de ser un único primario:
+
+- Ids globales sin colisiones: el shard k asigna ids de clientes y
+  solicitudes desde k * SHARD_RANGO_IDS + 1 (secuencia en PostgreSQL,
+  AUTOINCREMENT en SQLite), así que un id identifica su shard
+- Las sucursales son datos de referencia: la base principal es la fuente y
+  se copian a cada shard al preparar
+- POST /api/solicitudes y las lecturas de una sucursal van solo a su shard;
+  los indicadores, segmentos, distribuciones, solicitudes recientes y la
+  búsqueda de clientes se consultan en todos los shards en paralelo y se
+  combinan
+- Un cliente que solicita en sucursales de shards distintos tiene un registro
+  en cada uno (y aparece una vez por shard en la búsqueda)
+
+La base principal conserva usuarios, trabajos e idempotencia; cada shard
+guarda los sketches de cuantiles de sus solicitudes. Los comandos offline
+(app.archivo, app.sketches --reconstruir, app.parquet_export) recorren cada
+shard por separado. Los trabajos en segundo plano y el write-behind escriben
+en la base principal, así que no están disponibles con shards.
+
+Las funciones de módulo (crear_solicitud, get_indicadores, ...) usan el
+router si está configurado y la base principal en caso contrario.
+
+Preparar los shards (también se hace al arrancar la API):
+    python -m app.shards --preparar
+"""
+import argparse
+import heapq
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import busqueda, crud, eventos, models, schemas, segmentos, sketches
+from .config import settings
+from .database import Base, SessionLocal, create_db_engine, engine, foto_consistente
+
+# Tablas de cada shard; sucursales es la copia de referencia, importaciones
+# guarda el avance de app.importacion, el archivo (app.archivo) las
+# solicitudes antiguas junto a las filas del shard, versiones las versiones
+# de cambios del shard (app.versiones) y los sketches sus deltas y su base
+TABLAS = (
+    models.Sucursal.__table__, models.Cliente.__table__, models.Solicitud.__table__,
+    models.Importacion.__table__, models.SolicitudArchivada.__table__,
+    models.ResumenArchivado.__table__, models.EstadoArchivo.__table__, models.VersionDatos.__table__, models.VersionConfirmada.__table__,
+    models.SketchDistribucion.__table__, models.SketchDelta.__table__,
+)
+TABLAS_CON_RANGO = ("clientes", "solicitudes")
+
+
+class ShardRouter:
+    """Engines de los shards y enrutamiento por sucursal"""
+
+    def __init__(self, urls: Sequence[str], rango_ids: int = settings.SHARD_RANGO_IDS):
+        if not urls:
+            raise ValueError("Se requiere al menos una URL de shard")
+        self.rango_ids = rango_ids
+        # Un shard con la misma URL que la base principal reutiliza su engine
+        self.engines = [engine if url == settings.database_url else create_db_engine(url) for url in urls]
+        self._sesiones = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in self.engines]
+        self._executor = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="shard")
+        # Sketches de cuantiles de cada shard, al día en memoria
+        self._distribuciones = [sketches.Distribuciones() for _ in urls]
+
+    @property
+    def cantidad(self) -> int:
+        return len(self.engines)
+
+    def shard_de(self, sucursal_id: int) -> int:
+        return sucursal_id % self.cantidad
+
+    def shard_de_id(self, id_global: int) -> int:
+        """Shard que asignó un id de cliente o solicitud"""
+        return (id_global - 1) // self.rango_ids
+
+    @contextmanager
+    def sesion(self, shard: int) -> Iterator[Session]:
+        db = self._sesiones[shard]()
+        # Los eventos en vivo se versionan por shard
+        db.info[eventos.SHARD] = shard
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def sesion_sucursal(self, sucursal_id: int):
+        return self.sesion(self.shard_de(sucursal_id))
+
+    def en_paralelo(self, funcion: Callable[[Session], object]) -> list:
+        """Ejecutar funcion(db) en todos los shards a la vez; resultados en orden de shard"""
+        return self.en_paralelo_por_shard(lambda shard, db: funcion(db))
+
+    def en_paralelo_por_shard(self, funcion: Callable[[int, Session], object]) -> list:
+        """Como en_paralelo, con funcion(shard, db)"""
+        def ejecutar(shard):
+            with self.sesion(shard) as db:
+                return funcion(shard, db)
+        return list(self._executor.map(ejecutar, range(self.cantidad)))
+
+    def cerrar(self) -> None:
+        self._executor.shutdown(wait=True)
+        for shard_engine in self.engines:
+            if shard_engine is not engine:
+                shard_engine.dispose()
+
+    # ------------------------------------------------------- preparación
+    def preparar(self, origen: Session) -> None:
+        """
+        Crear las tablas, reservar los rangos de ids y copiar las sucursales
+
+        Los índices de tablas que ya existían los agrega app.migraciones.
+        """
+        sucursales = [
+            {c.name: getattr(s, c.name) for c in models.Sucursal.__table__.columns}
+            for s in origen.query(models.Sucursal).all()
+        ]
+        for shard, shard_engine in enumerate(self.engines):
+            Base.metadata.create_all(bind=shard_engine, tables=TABLAS)
+            with self.sesion(shard) as db:
+                for tabla in TABLAS_CON_RANGO:
+                    self._reservar_rango(db, tabla, shard)
+                for sucursal in sucursales:
+                    db.merge(models.Sucursal(**sucursal))
+                db.commit()
+
+    def _reservar_rango(self, db: Session, tabla: str, shard: int) -> None:
+        """Hacer que los ids nuevos del shard empiecen en su rango"""
+        inicio = shard * self.rango_ids + 1
+        maximo = db.execute(text(f"SELECT max(id) FROM {tabla}")).scalar() or 0
+        if maximo >= inicio:
+            return
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(
+                text(f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), :inicio, false)"),
+                {"inicio": inicio}
+            )
+            return
+        sql = db.execute(text("SELECT sql FROM sqlite_master WHERE name = :t"), {"t": tabla}).scalar()
+        if "AUTOINCREMENT" not in sql.upper():
+            raise RuntimeError(f"La tabla {tabla} del shard {shard} no usa AUTOINCREMENT")
+        if not db.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :t"),
+                          {"seq": inicio - 1, "t": tabla}).rowcount:
+            db.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:t, :seq)"),
+                       {"seq": inicio - 1, "t": tabla})
+
+    # --------------------------------------------------------- escrituras
+    def crear_solicitud(self, solicitud_data: schemas.SolicitudCreate) -> schemas.SolicitudResponse:
+        with self.sesion_sucursal(solicitud_data.sucursal_id) as db:
+            return crud.crear_solicitud(db, solicitud_data)
+
+    def insertar_lote_evaluado(self, filas: List[dict]) -> Tuple[int, int]:
+        """Insertar cada fila en el shard de su sucursal; un commit por shard, en paralelo"""
+        por_shard = defaultdict(list)
+        for fila in filas:
+            por_shard[self.shard_de(fila["sucursal_id"])].append(fila)
+
+        def escribir(shard):
+            with self.sesion(shard) as db:
+                conteo = crud.insertar_lote_evaluado(db, por_shard[shard])
+                db.commit()
+                return conteo
+        conteos = list(self._executor.map(escribir, por_shard))
+        return sum(a for a, _ in conteos), sum(r for _, r in conteos)
+
+    # ----------------------------------------------------------- lecturas
+    def version_solicitudes(self) -> tuple:
+        return tuple(self.en_paralelo(crud.version_solicitudes))
+
+    def get_indicadores(self) -> schemas.IndicadoresGenerales:
+        return combinar_indicadores(self.en_paralelo(crud.get_indicadores))
+
+    def get_indicadores_con_version(self) -> Tuple[tuple, schemas.IndicadoresGenerales]:
+        """Versión de cada shard e indicadores combinados; cada shard lee de una sola foto"""
+        partes = self.en_paralelo(crud.get_indicadores_con_version)
+        return tuple(v for v, _ in partes), combinar_indicadores([p for _, p in partes])
+
+    def get_solicitudes_recientes(
+        self, limit: int = 50, sucursal_id: Optional[int] = None,
+        desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+    ) -> List[schemas.SolicitudReciente]:
+        if sucursal_id is not None:
+            with self.sesion_sucursal(sucursal_id) as db:
+                return crud.get_solicitudes_recientes(db, limit, sucursal_id, desde, hasta)
+        # Cada shard entrega sus `limit` más recientes ya ordenadas
+        listas = self.en_paralelo(lambda db: crud.get_solicitudes_recientes(db, limit, desde=desde, hasta=hasta))
+        ordenadas = heapq.merge(*listas, key=lambda s: (s.fecha_solicitud, s.id), reverse=True)
+        return list(islice(ordenadas, limit))
+
+    def buscar_clientes(self, q: str, limite: int = 20, cursor: Optional[str] = None) -> dict:
+        paginas = self.en_paralelo(lambda db: busqueda.buscar_clientes(db, q, limite, cursor))
+        return busqueda.combinar_paginas(paginas, limite)
+
+    def calcular_segmentos_con_version(self, dimensiones: Sequence[str], por_sucursal: bool) -> Tuple[tuple, dict]:
+        """Versión de cada shard y segmentos sumados; cada shard lee de una sola foto"""
+        cortes = segmentos.cortes_bandas()
+
+        def leer(db):
+            with foto_consistente(db):
+                return crud.version_solicitudes(db), segmentos.acumular(db, dimensiones, por_sucursal, cortes)
+        partes = self.en_paralelo(leer)
+        acumulado = segmentos.combinar([a for _, a in partes])
+        return tuple(v for v, _ in partes), segmentos.formatear(acumulado, dimensiones, por_sucursal, cortes)
+
+    def distribuciones(self) -> List[sketches.Distribuciones]:
+        """Sketches de cada shard al día (sketches.EstadoNoDisponible si alguno no tiene base)"""
+        def actualizar(shard, db):
+            self._distribuciones[shard].actualizar(db)
+            return self._distribuciones[shard]
+        return self.en_paralelo_por_shard(actualizar)
+
+    def compactar_distribuciones(self) -> None:
+        for shard, estado in enumerate(self._distribuciones):
+            if estado.debe_compactar():
+                with self.sesion(shard) as db:
+                    estado.compactar(db)
+
+
+def combinar_indicadores(partes: List[schemas.IndicadoresGenerales]) -> schemas.IndicadoresGenerales:
+    """
+    Sumar los indicadores de cada shard
+
+    Los promedios se ponderan por número de solicitudes. Todas las sucursales
+    aparecen en cada shard (con ceros donde no escriben) y se suman por id.
+    """
+    total = sum(p.total_solicitudes for p in partes)
+    aprobadas = sum(p.total_aprobadas for p in partes)
+    suma_score = sum(p.score_promedio * p.total_solicitudes for p in partes)
+
+    por_sucursal = {}
+    for parte in partes:
+        for fila in parte.por_sucursal:
+            acumulada = por_sucursal.get(fila.sucursal_id)
+            if acumulada is None:
+                por_sucursal[fila.sucursal_id] = fila.model_copy(
+                    update={"monto_promedio": fila.monto_promedio * fila.total_solicitudes}
+                )
+                continue
+            acumulada.total_solicitudes += fila.total_solicitudes
+            acumulada.aprobadas += fila.aprobadas
+            acumulada.rechazadas += fila.rechazadas
+            acumulada.monto_promedio += fila.monto_promedio * fila.total_solicitudes
+            acumulada.monto_aprobado_total += fila.monto_aprobado_total
+    for fila in por_sucursal.values():
+        # monto_promedio acumuló la suma de montos
+        fila.monto_promedio = (
+            round(fila.monto_promedio / fila.total_solicitudes, 2) if fila.total_solicitudes else Decimal("0.00")
+        )
+
+    return schemas.IndicadoresGenerales(
+        total_solicitudes=total,
+        total_aprobadas=aprobadas,
+        total_rechazadas=sum(p.total_rechazadas for p in partes),
+        tasa_aprobacion=round(aprobadas / total * 100, 2) if total else 0,
+        monto_total_solicitado=sum((p.monto_total_solicitado for p in partes), Decimal("0.00")),
+        monto_total_aprobado=sum((p.monto_total_aprobado for p in partes), Decimal("0.00")),
+        score_promedio=round(suma_score / total, 2) if total else 0,
+        por_sucursal=list(por_sucursal.values()),
+    )
+
+
+# ==================== Acceso con o sin shards ====================
+
+def crear_solicitud(db: Session, solicitud_data: schemas.SolicitudCreate) -> schemas.SolicitudResponse:
+    if router is not None:
+        return router.crear_solicitud(solicitud_data)
+    return crud.crear_solicitud(db, solicitud_data)
+
+
+def insertar_lote_evaluado(db: Session, filas: List[dict]) -> Tuple[int, int]:
+    """Insertar y confirmar un lote de solicitudes ya evaluadas"""
+    if router is not None:
+        return router.insertar_lote_evaluado(filas)
+    conteo = crud.insertar_lote_evaluado(db, filas)
+    db.commit()
+    return conteo
+
+
+def version_solicitudes(db: Session):
+    return router.version_solicitudes() if router is not None else crud.version_solicitudes(db)
+
+
+def get_indicadores(db: Session) -> schemas.IndicadoresGenerales:
+    return router.get_indicadores() if router is not None else crud.get_indicadores(db)
+
+
+def get_indicadores_con_version(db: Session) -> Tuple[object, schemas.IndicadoresGenerales]:
+    """Versión (tupla por shard con shards) e indicadores de una misma foto"""
+    if router is not None:
+        return router.get_indicadores_con_version()
+    return crud.get_indicadores_con_version(db)
+
+
+def get_solicitudes_recientes(
+    db: Session, limit: int = 50, sucursal_id: Optional[int] = None,
+    desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+) -> List[schemas.SolicitudReciente]:
+    if router is not None:
+        return router.get_solicitudes_recientes(limit, sucursal_id, desde, hasta)
+    return crud.get_solicitudes_recientes(db, limit, sucursal_id, desde, hasta)
+
+
+def buscar_clientes(db: Session, q: str, limite: int = 20, cursor: Optional[str] = None) -> dict:
+    if router is not None:
+        return router.buscar_clientes(q, limite, cursor)
+    return busqueda.buscar_clientes(db, q, limite, cursor)
+
+
+def calcular_segmentos_con_version(db: Session, dimensiones: Sequence[str], por_sucursal: bool) -> Tuple[object, dict]:
+    """Versión (tupla por shard con shards) y segmentos de una misma foto"""
+    if router is not None:
+        return router.calcular_segmentos_con_version(dimensiones, por_sucursal)
+    with foto_consistente(db):
+        return crud.version_solicitudes(db), segmentos.calcular_segmentos(db, dimensiones, por_sucursal)
+
+
+def distribuciones(db: Session) -> List[sketches.Distribuciones]:
+    """Sketches al día: uno por shard o el del proceso con `db` (puede ser la réplica)"""
+    if router is not None:
+        return router.distribuciones()
+    sketches.distribuciones.actualizar(db)
+    return [sketches.distribuciones]
+
+
+def compactar_distribuciones() -> None:
+    """Guardar como base los sketches que toque compactar (en el primario o en cada shard)"""
+    if router is not None:
+        router.compactar_distribuciones()
+    elif sketches.distribuciones.debe_compactar():
+        with SessionLocal() as escritura:
+            sketches.distribuciones.compactar(escritura)
+
+
+# Instancia del proceso; se crea en el arranque si SHARD_DATABASE_URLS
+router: Optional[ShardRouter] = None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Shards de escritura por sucursal")
+    parser.add_argument("--preparar", action="store_true",
+                        help="crear tablas, reservar rangos de ids y copiar sucursales")
+    args = parser.parse_args(argv)
+    if not settings.SHARD_DATABASE_URLS:
+        print("SHARD_DATABASE_URLS no está configurado", file=sys.stderr)
+        return 1
+    if not args.preparar:
+        parser.print_help()
+        return 0
+    shards = ShardRouter(settings.SHARD_DATABASE_URLS)
+    with SessionLocal() as origen:
+        shards.preparar(origen)
+    for shard, shard_engine in enumerate(shards.engines):
+        with shards.sesion(shard) as db:
+            solicitudes = db.execute(select(func.count(models.Solicitud.id))).scalar()
+        print(f"✅ Shard {shard} ({shard_engine.url.render_as_string()}): {solicitudes} solicitudes")
+    shards.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
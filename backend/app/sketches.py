@@ -0,0 +1,541 @@
+"""
+Distribuciones de score, monto e ingreso con sketches de cuantiles
+
+Calcular percentiles exactos en cada carga del dashboard obliga a ordenar
+toda la tabla. En su lugar se mantiene un DDSketch por sucursal y métrica:
+
+- Error relativo garantizado: cada cuantil reportado está dentro de
+  ±SKETCHES_ERROR_RELATIVO (1% por defecto) del valor exacto de ese rango
+- Mergeable: el total general es la unión de los sketches por sucursal, y
+  dos sketches con el mismo error se combinan sumando sus bins
+- Tamaño logarítmico en el rango de valores (unos 500 bins para montos de
+  $1,000 a $10,000,000 con error del 1%), independiente del número de filas
+
+El estado avanza por versión de los datos (app/versiones.py), no por id:
+
+- Cada transacción que inserta solicitudes (por una Session, sea ORM o
+  insert() de Core; la importación lo hace explícito) acumula sus valores y,
+  al confirmarse, guarda en sketches_delta un delta con la versión que le
+  tocó. Una solicitud confirmada tarde con un id menor llega en su delta
+- La consulta lee de una sola foto la base (sketches_distribucion) y los
+  deltas posteriores a lo que ya tiene en memoria hasta la marca de la foto
+  (versiones.marca), con la sesión de lectura (réplica si la hay). No
+  recorre la tabla de solicitudes
+- Cada SKETCHES_PERSISTIR_INTERVALO segundos un worker compacta: guarda su
+  estado como base en el primario y borra los deltas que ya incluye
+- Una base nueva empieza vacía en la versión 0. Si la tabla se crea en una
+  base que ya tenía solicitudes (o cambia el error relativo), la consulta
+  responde 503 hasta reconstruir desde todo el historial con el comando
+  offline:
+    python -m app.sketches --reconstruir
+
+Con shards (app/shards.py) cada shard guarda la base y los deltas de sus
+solicitudes; la consulta los combina y el comando recorre cada shard.
+"""
+import argparse
+import math
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import orjson
+from sqlalchemy import delete, event, insert, inspect, select, union_all, update
+from sqlalchemy.orm import Session
+
+from . import models, versiones
+from .config import settings
+from .database import foto_consistente
+
+METRICAS = ("score_crediticio", "monto_solicitado", "ingreso_mensual")
+CUANTILES = (0.5, 0.9, 0.99)
+NOMBRE = "solicitudes"
+# Valores de las solicitudes insertadas en la transacción actual de una sesión
+DELTA = "sketches_delta"
+
+
+class DDSketch:
+    """
+    Sketch de cuantiles con error relativo acotado (DDSketch)
+
+    Cada valor positivo x cae en el bin ceil(log_gamma(x)) con
+    gamma = (1 + a) / (1 - a); el representante del bin está a lo más a un
+    factor a de cualquier valor que contenga.
+    """
+
+    __slots__ = ("error_relativo", "_log_gamma", "bins", "ceros", "cantidad", "minimo", "maximo")
+
+    def __init__(self, error_relativo: float = 0.01):
+        if not 0 < error_relativo < 1:
+            raise ValueError("error_relativo debe estar entre 0 y 1")
+        self.error_relativo = error_relativo
+        self._log_gamma = math.log((1 + error_relativo) / (1 - error_relativo))
+        self.bins: Dict[int, int] = {}
+        self.ceros = 0  # valores <= 0 (fuera del dominio logarítmico)
+        self.cantidad = 0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def agregar(self, valor: float, veces: int = 1) -> None:
+        valor = float(valor)
+        if valor > 0:
+            indice = math.ceil(math.log(valor) / self._log_gamma)
+            self.bins[indice] = self.bins.get(indice, 0) + veces
+        else:
+            self.ceros += veces
+        self.cantidad += veces
+        self.minimo = min(self.minimo, valor)
+        self.maximo = max(self.maximo, valor)
+
+    def _valor(self, indice: int) -> float:
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** indice / (gamma + 1)
+
+    def combinar(self, otro: "DDSketch") -> "DDSketch":
+        """Sumar los bins de otro sketch con el mismo error relativo"""
+        if otro.error_relativo != self.error_relativo:
+            raise ValueError("Solo se combinan sketches con el mismo error relativo")
+        for indice, veces in otro.bins.items():
+            self.bins[indice] = self.bins.get(indice, 0) + veces
+        self.ceros += otro.ceros
+        self.cantidad += otro.cantidad
+        self.minimo = min(self.minimo, otro.minimo)
+        self.maximo = max(self.maximo, otro.maximo)
+        return self
+
+    def cuantil(self, q: float) -> Optional[float]:
+        if not self.cantidad:
+            return None
+        # El mínimo y el máximo se conocen exactos
+        if q <= 0:
+            return self.minimo
+        if q >= 1:
+            return self.maximo
+        rango = q * (self.cantidad - 1)
+        acumulado = self.ceros
+        if acumulado > rango:
+            return self.minimo
+        for indice in sorted(self.bins):
+            acumulado += self.bins[indice]
+            if acumulado > rango:
+                return min(max(self._valor(indice), self.minimo), self.maximo)
+        return self.maximo
+
+    def histograma(self, cubetas: int = 10) -> List[dict]:
+        """Conteos en cubetas de igual ancho entre el mínimo y el máximo"""
+        if not self.cantidad:
+            return []
+        ancho = (self.maximo - self.minimo) / cubetas or 1
+        conteos = [0] * cubetas
+        conteos[0] += self.ceros
+        for indice, veces in self.bins.items():
+            valor = min(max(self._valor(indice), self.minimo), self.maximo)
+            conteos[min(int((valor - self.minimo) / ancho), cubetas - 1)] += veces
+        return [
+            {"desde": round(self.minimo + i * ancho, 2), "hasta": round(self.minimo + (i + 1) * ancho, 2), "cantidad": c}
+            for i, c in enumerate(conteos)
+        ]
+
+    def resumen(self, cubetas: int = 10) -> dict:
+        vacio = not self.cantidad
+        return {
+            "cantidad": self.cantidad,
+            "minimo": None if vacio else self.minimo,
+            "maximo": None if vacio else self.maximo,
+            "cuantiles": {f"p{round(q * 100)}": self._redondear(self.cuantil(q)) for q in CUANTILES},
+            "histograma": self.histograma(cubetas),
+        }
+
+    @staticmethod
+    def _redondear(valor: Optional[float]) -> Optional[float]:
+        return None if valor is None else round(valor, 2)
+
+    def a_dict(self) -> dict:
+        return {
+            "error_relativo": self.error_relativo,
+            "bins": {str(i): v for i, v in self.bins.items()},
+            "ceros": self.ceros,
+            "cantidad": self.cantidad,
+            "minimo": self.minimo if self.cantidad else None,
+            "maximo": self.maximo if self.cantidad else None,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: dict) -> "DDSketch":
+        sketch = cls(datos["error_relativo"])
+        sketch.bins = {int(i): v for i, v in datos["bins"].items()}
+        sketch.ceros = datos["ceros"]
+        sketch.cantidad = datos["cantidad"]
+        if sketch.cantidad:
+            sketch.minimo, sketch.maximo = datos["minimo"], datos["maximo"]
+        return sketch
+
+
+class EstadoNoDisponible(RuntimeError):
+    """No hay una base de sketches utilizable: se requiere --reconstruir"""
+
+
+Sketches = Dict[int, Dict[str, DDSketch]]
+
+
+def _agregar(por_sucursal: Sketches, sucursal_id: int, valores: Iterable, error_relativo: float) -> None:
+    sketches = por_sucursal.get(sucursal_id)
+    if sketches is None:
+        sketches = por_sucursal[sucursal_id] = {m: DDSketch(error_relativo) for m in METRICAS}
+    for sketch, valor in zip(sketches.values(), valores):
+        sketch.agregar(valor)
+
+
+def _combinar(destino: Sketches, origen: Sketches) -> None:
+    for sucursal_id, sketches in origen.items():
+        actuales = destino.setdefault(sucursal_id, {})
+        for metrica, sketch in sketches.items():
+            if metrica in actuales:
+                actuales[metrica].combinar(sketch)
+            else:
+                actuales[metrica] = sketch
+
+
+def _serializar(por_sucursal: Sketches) -> bytes:
+    return orjson.dumps({
+        str(sucursal): {m: s.a_dict() for m, s in sketches.items()}
+        for sucursal, sketches in por_sucursal.items()
+    })
+
+
+def _deserializar(datos: bytes) -> Sketches:
+    return {
+        int(sucursal): {m: DDSketch.desde_dict(s) for m, s in sketches.items()}
+        for sucursal, sketches in orjson.loads(datos).items()
+    }
+
+
+def _cantidad(por_sucursal: Sketches) -> int:
+    return sum(sketches[METRICAS[0]].cantidad for sketches in por_sucursal.values())
+
+
+# ==================== Deltas al confirmar ====================
+
+def _valor(solicitud, campo: str):
+    if isinstance(solicitud, dict):
+        return solicitud.get(campo)
+    return getattr(solicitud, campo, None)
+
+
+def delta_de(solicitudes: Iterable, error_relativo: Optional[float] = None) -> Sketches:
+    """Sketches por sucursal de un conjunto de solicitudes (modelos o dicts)"""
+    error_relativo = error_relativo or settings.SKETCHES_ERROR_RELATIVO
+    por_sucursal: Sketches = {}
+    for solicitud in solicitudes:
+        _agregar(por_sucursal, _valor(solicitud, "sucursal_id"),
+                 (_valor(solicitud, m) for m in METRICAS), error_relativo)
+    return por_sucursal
+
+
+def guardar_delta(conn, version: int, por_sucursal: Sketches) -> None:
+    """Guardar el delta de una transacción con su versión (Connection o Session)"""
+    if por_sucursal:
+        conn.execute(insert(models.SketchDelta.__table__).values(
+            version=version, datos=_serializar(por_sucursal), creado=datetime.utcnow()
+        ))
+
+
+def _acumular(session: Session, solicitudes: Iterable) -> None:
+    _combinar(session.info.setdefault(DELTA, {}), delta_de(solicitudes))
+
+
+@event.listens_for(Session, "after_flush")
+def _acumular_flush(session: Session, contexto) -> None:
+    nuevas = [objeto for objeto in session.new if isinstance(objeto, models.Solicitud)]
+    if nuevas:
+        _acumular(session, nuevas)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _acumular_insert(estado) -> None:
+    tabla = getattr(estado.statement, "table", None)
+    if not estado.is_insert or tabla is None or tabla.name != models.Solicitud.__tablename__:
+        return
+    parametros = estado.parameters
+    if parametros:
+        _acumular(estado.session, parametros if isinstance(parametros, list) else [parametros])
+
+
+@versiones.al_confirmar
+def _guardar_delta(session: Session, version: int) -> None:
+    por_sucursal = session.info.pop(DELTA, None)
+    if por_sucursal:
+        guardar_delta(session, version, por_sucursal)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(session: Session) -> None:
+    session.info.pop(DELTA, None)
+
+
+@event.listens_for(models.SketchDistribucion.__table__, "after_create")
+def _base_inicial(tabla, conn, **kw) -> None:
+    """Una base sin solicitudes empieza con sketches vacíos en la versión 0"""
+    existentes = inspect(conn)
+    for modelo in (models.Solicitud, models.SolicitudArchivada):
+        if existentes.has_table(modelo.__tablename__) and conn.execute(select(modelo.id).limit(1)).first():
+            return
+    conn.execute(insert(tabla).values(
+        nombre=NOMBRE, version=0, error_relativo=settings.SKETCHES_ERROR_RELATIVO,
+        datos=_serializar({}), actualizado=datetime.utcnow(),
+    ))
+
+
+# ==================== Estado en memoria ====================
+
+_base = models.SketchDistribucion.__table__
+_deltas = models.SketchDelta.__table__
+
+
+class Distribuciones:
+    """Sketches por sucursal y métrica de una base, al día hasta la versión `version`"""
+
+    def __init__(self, error_relativo: Optional[float] = None):
+        self.error_relativo = error_relativo or settings.SKETCHES_ERROR_RELATIVO
+        self.version: Optional[int] = None  # None hasta cargar la base
+        self.por_sucursal: Sketches = {}
+        self._compactado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _cargar(self, db: Session) -> None:
+        fila = db.execute(select(_base).where(_base.c.nombre == NOMBRE)).first()
+        if fila.error_relativo != self.error_relativo:
+            raise EstadoNoDisponible(
+                f"Los sketches guardados usan error relativo {fila.error_relativo}; ejecute --reconstruir"
+            )
+        self.por_sucursal = _deserializar(fila.datos)
+        self.version = fila.version
+
+    def actualizar(self, db: Session) -> int:
+        """
+        Incorporar los deltas confirmados después de `version`
+
+        Lee base y deltas de una misma foto (db puede ser la réplica).
+
+        Returns:
+            Número de solicitudes nuevas
+        """
+        with self._lock, foto_consistente(db):
+            # Primero la versión: en motores sin foto, lo confirmado después
+            # queda para la siguiente consulta. Solo hasta la marca: un delta
+            # con versión menor aún puede estar por confirmarse
+            vigente = versiones.marca(db)
+            base = db.execute(select(_base.c.version).where(_base.c.nombre == NOMBRE)).scalar()
+            if base is None:
+                if self.version is None:
+                    raise EstadoNoDisponible("No hay sketches guardados; ejecute python -m app.sketches --reconstruir")
+                # Reconstrucción en curso: se sigue con los deltas, que no se compactan mientras tanto
+            elif self.version is None or base > self.version:
+                self._cargar(db)
+            nuevas = 0
+            for version, datos in db.execute(
+                select(_deltas.c.version, _deltas.c.datos)
+                .where(_deltas.c.version > self.version, _deltas.c.version <= vigente)
+                .order_by(_deltas.c.version)
+            ):
+                delta = _deserializar(datos)
+                try:
+                    _combinar(self.por_sucursal, delta)
+                except ValueError as e:
+                    raise EstadoNoDisponible(f"{e}; ejecute --reconstruir")
+                nuevas += _cantidad(delta)
+            self.version = max(self.version, vigente)
+        return nuevas
+
+    def debe_compactar(self) -> bool:
+        return self.version is not None and (
+            time.monotonic() - self._compactado >= settings.SKETCHES_PERSISTIR_INTERVALO
+        )
+
+    def compactar(self, db: Session) -> bool:
+        """
+        Guardar el estado como base y borrar los deltas que ya incluye
+
+        `db` es una sesión del primario. Si otro worker ya guardó una base
+        más reciente (o no hay base por una reconstrucción en curso) no se
+        cambia nada.
+
+        Returns:
+            Si se guardó la base
+        """
+        with self._lock:
+            version, datos = self.version, _serializar(self.por_sucursal)
+        self._compactado = time.monotonic()
+        if version is None:
+            return False
+        guardada = db.execute(
+            update(_base)
+            .where(_base.c.nombre == NOMBRE, _base.c.version < version, _base.c.error_relativo == self.error_relativo)
+            .values(version=version, datos=datos, actualizado=datetime.utcnow())
+        ).rowcount
+        if guardada:
+            db.execute(delete(_deltas).where(_deltas.c.version <= version))
+        db.commit()
+        return bool(guardada)
+
+    def resumen(self, cubetas: int = 10) -> dict:
+        """Cuantiles e histogramas generales y por sucursal del estado en memoria"""
+        return resumir([self], cubetas)
+
+
+def resumir(estados: List[Distribuciones], cubetas: int = 10) -> dict:
+    """
+    Resumen de uno o varios estados (uno por shard), combinando sus sketches
+
+    Con varios estados `version` es la lista de versiones de cada uno.
+    """
+    error_relativo = estados[0].error_relativo
+    general = {m: DDSketch(error_relativo) for m in METRICAS}
+    por_sucursal: Sketches = {}
+    for estado in estados:
+        with estado._lock:
+            for sucursal_id, sketches in estado.por_sucursal.items():
+                for metrica, sketch in sketches.items():
+                    general[metrica].combinar(sketch)
+                    copia = por_sucursal.setdefault(sucursal_id, {}).setdefault(metrica, DDSketch(error_relativo))
+                    copia.combinar(sketch)
+    return {
+        "error_relativo": error_relativo,
+        "version": estados[0].version if len(estados) == 1 else [e.version for e in estados],
+        "general": {m: s.resumen(cubetas) for m, s in general.items()},
+        "por_sucursal": [
+            {"sucursal_id": sucursal_id, "metricas": {m: s.resumen(cubetas) for m, s in por_sucursal[sucursal_id].items()}}
+            for sucursal_id in sorted(por_sucursal)
+        ],
+    }
+
+
+# Estado de este proceso
+distribuciones = Distribuciones()
+
+
+# ==================== Reconstrucción offline ====================
+
+def _preparar_base(db: Session) -> None:
+    """
+    Quitar la base guardada antes de recorrer el historial
+
+    Sin base los workers no compactan, así que los deltas posteriores a la
+    foto de la reconstrucción siguen ahí cuando se guarde. Una tabla de una
+    versión anterior (marca por id) se vuelve a crear.
+    """
+    inspector = inspect(db.connection())
+    anterior = inspector.has_table(_base.name) and "version" not in {
+        c["name"] for c in inspector.get_columns(_base.name)
+    }
+    db.commit()
+    if anterior:
+        _base.drop(db.get_bind())
+    _base.create(db.get_bind(), checkfirst=True)
+    db.execute(delete(_base))
+    db.commit()
+
+
+def _recorrer_historial(lectura: Session, nuevas: Distribuciones, lote: int) -> None:
+    ultimo_id = 0
+    while True:
+        solicitudes = union_all(*(
+            select(
+                tabla.id, tabla.sucursal_id, tabla.score_crediticio,
+                tabla.monto_solicitado, tabla.ingreso_mensual,
+            ).where(tabla.id > ultimo_id)
+            for tabla in (models.Solicitud, models.SolicitudArchivada)
+        )).subquery()
+        filas = lectura.execute(select(solicitudes).order_by(solicitudes.c.id).limit(lote)).all()
+        for _, sucursal_id, *valores in filas:
+            _agregar(nuevas.por_sucursal, sucursal_id, valores, nuevas.error_relativo)
+        if len(filas) < lote:
+            return
+        ultimo_id = filas[-1].id
+
+
+def reconstruir(lectura: Session, escritura: Optional[Session] = None, lote: int = 10_000) -> Distribuciones:
+    """
+    Recalcular desde todo el historial y reemplazar el estado guardado
+
+    Recorre solicitudes y solicitudes_archivadas (conservan su id) desde una
+    sola foto de `lectura`, que puede ser la réplica, y guarda la base con la
+    versión de esa foto en `escritura` (el primario; por defecto `lectura`).
+    La foto no debe tener versiones confirmadas después de la marca, cuyos
+    deltas se sumarían dos veces: si las tiene se toma otra.
+    Solo para el comando offline: lee toda la tabla.
+    """
+    escritura = escritura or lectura
+    _preparar_base(escritura)
+    nuevas = Distribuciones()
+    while True:
+        with foto_consistente(lectura):
+            version = versiones.leer(lectura)
+            if not isinstance(version, versiones.Foto):
+                _recorrer_historial(lectura, nuevas, lote)
+                break
+        # Transacciones a medio confirmar: se espera a una foto sin huecos
+        time.sleep(0.05)
+    nuevas.version = version
+    escritura.execute(insert(_base).values(
+        nombre=NOMBRE, version=version, error_relativo=nuevas.error_relativo,
+        datos=_serializar(nuevas.por_sucursal), actualizado=datetime.utcnow(),
+    ))
+    escritura.execute(delete(_deltas).where(_deltas.c.version <= version))
+    escritura.commit()
+    return nuevas
+
+
+def _procesar(lectura: Session, escritura: Session, reconstruir_todo: bool, estado: Distribuciones) -> Distribuciones:
+    if reconstruir_todo:
+        return reconstruir(lectura, escritura)
+    estado.actualizar(lectura)
+    estado.compactar(escritura)
+    return estado
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sketches de distribución de solicitudes")
+    parser.add_argument("--reconstruir", action="store_true", help="Recalcular desde todo el historial")
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal, replica_engine
+
+    if settings.SHARD_DATABASE_URLS:
+        # Cada shard guarda los sketches de sus solicitudes
+        from . import shards
+        router = shards.ShardRouter(settings.SHARD_DATABASE_URLS)
+        try:
+            with SessionLocal() as origen:
+                router.preparar(origen)
+            for shard in range(router.cantidad):
+                try:
+                    with router.sesion(shard) as db:
+                        estado = _procesar(db, db, args.reconstruir, Distribuciones())
+                except EstadoNoDisponible as e:
+                    print(f"❌ Shard {shard}: {e}", file=sys.stderr)
+                    return 1
+                print(f"✅ Shard {shard}: sketches al día hasta la versión {estado.version}", file=sys.stderr)
+        finally:
+            router.cerrar()
+        return 0
+
+    escritura = SessionLocal()
+    # El recorrido completo se hace en la réplica si hay una
+    lectura = SessionLocal(bind=replica_engine) if replica_engine is not None else escritura
+    try:
+        estado = _procesar(lectura, escritura, args.reconstruir, distribuciones)
+    except EstadoNoDisponible as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        lectura.close()
+        escritura.close()
+    print(f"✅ Sketches al día hasta la versión {estado.version} "
+          f"(error relativo {estado.error_relativo:.2%})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
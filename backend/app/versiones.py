@@ -0,0 +1,234 @@
+"""
+Versión de los datos de solicitudes
+
+Cada transacción que inserta, modifica o borra solicitudes (API,
+write-behind, lotes de simulación y de batch, importación histórica y
+archivado) recibe al confirmarse un número de versión: una fila nueva en
+`versiones_confirmadas`, cuya llave sale de la secuencia de la tabla
+(AUTOINCREMENT en SQLite). Los ETag de indicadores, segmentos y
+distribuciones y los eventos en vivo se ordenan con ella.
+
+A diferencia del id máximo no depende del orden en que se asignaron los ids:
+una transacción que confirma tarde un id menor (concurrencia o bloques del
+write-behind) también la mueve, y archivar no la hace retroceder.
+
+- Con una Session basta escribir en solicitudes o solicitudes_archivadas, por
+  ORM o con insert()/delete() de Core: el cambio se marca en el flush o en
+  execute y la versión se toma en before_commit, justo antes de confirmar
+- Con una Connection de Core (importación, archivo) se llama a
+  `incrementar(conn)` dentro de la transacción
+
+Tomar un valor de la secuencia no bloquea, así que las escrituras no se
+esperan entre sí. A cambio los números no siguen el orden de confirmación:
+la 8 puede confirmarse mientras la 7 aún no termina. Por eso de una foto
+(database.foto_consistente) se leen dos cosas:
+
+- `marca(db)`: la mayor versión N tal que todas las anteriores ya están en
+  la foto. Los sketches (app/sketches.py) avanzan solo hasta ella
+- `leer(db)`: la versión exacta de la foto, la marca o, si ya se confirmaron
+  versiones posteriores, `Foto(marca, posteriores)`. Dos fotos con la misma
+  versión contienen las mismas transacciones; la usan los ETag y los
+  eventos en vivo (`incluye`)
+
+Un hueco que sigue abierto VERSIONES_HUECO_SEGUNDOS después de confirmarse
+la versión siguiente se da por descartado (rollback después de tomar el
+número) y la marca lo salta; si esa transacción aún se confirmara, los
+sketches y los eventos en vivo no la verían hasta reconstruir o reconectar.
+
+Cada VERSIONES_PURGA_INTERVALO segundos, una de las transacciones que toman
+versión en cada proceso guarda la marca en la fila de `versiones` y borra
+las filas de versiones_confirmadas que ya cubre. Si otra purga tiene la fila
+tomada se salta, así que tampoco ahí se esperan las escrituras.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Callable, List, NamedTuple, Sequence, Tuple, Union
+
+from sqlalchemy import delete, event, func, insert, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+NOMBRE = "solicitudes"
+# Tablas cuyos cambios mueven la versión
+TABLAS = frozenset({models.Solicitud.__tablename__, models.SolicitudArchivada.__tablename__})
+CAMBIOS = "versiones_cambios"
+
+_tabla = models.VersionDatos.__table__
+_confirmadas = models.VersionConfirmada.__table__
+_al_confirmar: List[Callable[[Session, int], None]] = []
+_purga_lock = threading.Lock()
+_proxima_purga = 0.0
+
+
+class Foto(NamedTuple):
+    """Versión de una foto que ya contiene versiones posteriores a su marca"""
+    marca: int
+    posteriores: Tuple[int, ...]
+
+
+Version = Union[int, Foto]
+
+
+def incrementar(conn) -> int:
+    """Versión de la transacción de `conn` (Connection o Session)"""
+    return conn.execute(
+        insert(_confirmadas).values(creado=datetime.utcnow()).returning(_confirmadas.c.valor)
+    ).scalar()
+
+
+def recorrer(base: int, confirmadas: Sequence[Tuple[int, datetime]], ahora: datetime) -> Tuple[int, Tuple[int, ...]]:
+    """
+    Marca y versiones posteriores a partir de las confirmadas después de `base`
+
+    `confirmadas` son (valor, creado) en orden de valor. Un hueco se salta
+    si la versión que lo sigue se tomó hace más de VERSIONES_HUECO_SEGUNDOS.
+    """
+    marca = base
+    limite = ahora - timedelta(seconds=settings.VERSIONES_HUECO_SEGUNDOS)
+    for i, (valor, creado) in enumerate(confirmadas):
+        if valor > marca + 1 and creado > limite:
+            return marca, tuple(v for v, _ in confirmadas[i:])
+        marca = valor
+    return marca, ()
+
+
+def _leer(db) -> Tuple[int, Tuple[int, ...]]:
+    # Cada consulta lee la base purgada y las confirmadas de una misma foto
+    base = select(func.coalesce(func.max(_tabla.c.valor), 0).label("base")).where(
+        _tabla.c.nombre == NOMBRE
+    ).subquery()
+    unidas = base.outerjoin(_confirmadas, _confirmadas.c.valor > base.c.base)
+    inicio, cantidad, maximo = db.execute(
+        select(base.c.base, func.count(_confirmadas.c.valor), func.max(_confirmadas.c.valor))
+        .select_from(unidas).group_by(base.c.base)
+    ).one()
+    if maximo is None or maximo - inicio == cantidad:
+        # Sin huecos (lo habitual): no hace falta recorrerlas
+        return maximo or inicio, ()
+    filas = db.execute(
+        select(base.c.base, _confirmadas.c.valor, _confirmadas.c.creado)
+        .select_from(unidas).order_by(_confirmadas.c.valor)
+    ).all()
+    return recorrer(filas[0].base, [(f.valor, f.creado) for f in filas if f.valor is not None], datetime.utcnow())
+
+
+def leer(db) -> Version:
+    """Versión exacta de la foto de `db` (0 si nunca se escribió una solicitud)"""
+    marca_foto, posteriores = _leer(db)
+    return Foto(marca_foto, posteriores) if posteriores else marca_foto
+
+
+def marca(db) -> int:
+    """Mayor versión de la foto de `db` con todas las anteriores ya confirmadas"""
+    return _leer(db)[0]
+
+
+def incluye(version: Version, valor: int) -> bool:
+    """Si la foto de versión `version` contiene la transacción de versión `valor`"""
+    if isinstance(version, Foto):
+        return valor <= version.marca or valor in version.posteriores
+    return valor <= version
+
+
+def purgar(conn) -> bool:
+    """
+    Guardar la marca en `versiones` y borrar las confirmadas que cubre
+
+    Returns:
+        Si se purgó (no, si otra transacción tiene tomada la fila)
+    """
+    vigente = conn.execute(
+        select(_tabla.c.valor).where(_tabla.c.nombre == NOMBRE).with_for_update(skip_locked=True)
+    ).first()
+    if vigente is None:
+        if conn.execute(select(_tabla.c.nombre).where(_tabla.c.nombre == NOMBRE)).first() is not None:
+            return False
+        # Base nueva: la fila se crea una vez aunque otra transacción se adelante
+        dialecto = conn.get_bind().dialect if isinstance(conn, Session) else conn.dialect
+        insertar = postgresql.insert if dialecto.name == "postgresql" else sqlite.insert
+        if not conn.execute(insertar(_tabla).values(nombre=NOMBRE, valor=0).on_conflict_do_nothing()).rowcount:
+            return False
+    nueva, _ = _leer(conn)
+    conn.execute(update(_tabla).where(_tabla.c.nombre == NOMBRE, _tabla.c.valor < nueva).values(valor=nueva))
+    conn.execute(delete(_confirmadas).where(_confirmadas.c.valor <= nueva))
+    return True
+
+
+def marcar(db: Session) -> None:
+    """Hacer que la transacción actual de `db` tome versión al confirmarse"""
+    db.info[CAMBIOS] = True
+
+
+def al_confirmar(funcion: Callable[[Session, int], None]) -> Callable[[Session, int], None]:
+    """
+    Registrar funcion(db, version) para las transacciones que toman versión
+
+    Se llama en before_commit, después de tomarla, en el orden de registro.
+    """
+    _al_confirmar.append(funcion)
+    return funcion
+
+
+def _toca_purgar() -> bool:
+    global _proxima_purga
+    with _purga_lock:
+        if time.monotonic() < _proxima_purga:
+            return False
+        _proxima_purga = time.monotonic() + settings.VERSIONES_PURGA_INTERVALO
+        return True
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_flush(session: Session, contexto) -> None:
+    # En after_flush new/dirty/deleted aún tienen lo que se acaba de escribir
+    if any(
+        getattr(objeto, "__tablename__", None) in TABLAS
+        for objeto in chain(session.new, session.dirty, session.deleted)
+    ):
+        marcar(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _marcar_dml(estado) -> None:
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    tabla = getattr(estado.statement, "table", None)
+    if tabla is not None and tabla.name in TABLAS:
+        marcar(estado.session)
+
+
+@event.listens_for(Session, "before_commit")
+def _incrementar_al_confirmar(session: Session) -> None:
+    # commit() hace el último flush después de before_commit
+    session.flush()
+    if not session.info.pop(CAMBIOS, False):
+        return
+    version = incrementar(session)
+    for funcion in _al_confirmar:
+        funcion(session, version)
+    if _toca_purgar():
+        purgar(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar(session: Session) -> None:
+    session.info.pop(CAMBIOS, None)
+
+
+@event.listens_for(_confirmadas, "after_create")
+def _continuar_contador(tabla, conn, **kw) -> None:
+    """En una base con el contador de versiones anterior, las nuevas siguen después de él"""
+    if not inspect(conn).has_table(_tabla.name):
+        return
+    valor = conn.execute(select(_tabla.c.valor).where(_tabla.c.nombre == NOMBRE)).scalar()
+    if not valor:
+        return
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{tabla.name}', 'valor'), :v)"), {"v": valor})
+    else:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:t, :v)"), {"t": tabla.name, "v": valor})
@@ -0,0 +1,377 @@
+"""
+Persistencia diferida (write-behind) de decisiones de crédito
+
+Con WRITE_BEHIND_ENABLED la API responde la decisión en cuanto se evalúa y
+encola la escritura. Un hilo writer agrupa los registros en lotes de hasta
+WRITE_BEHIND_BATCH_SIZE (o lo acumulado en WRITE_BEHIND_FLUSH_INTERVAL_MS) y
+los confirma con un solo commit.
+
+Durabilidad:
+- WRITE_BEHIND_WAL_PATH: cada registro se agrega y sincroniza (fsync) a un
+  archivo antes de responder; al arrancar se reinsertan los registros que no
+  llegaron a la base de datos y el archivo se trunca solo cuando todo lo
+  escrito en él está confirmado (o guardado en `<WAL>.fallidos`)
+- Los errores transitorios de la base de datos (conexión caída, bloqueo) no
+  descartan nada: el lote se reintenta con espera exponencial entre
+  WRITE_BEHIND_REINTENTO_INICIAL y WRITE_BEHIND_REINTENTO_MAX segundos,
+  mientras la cola se llena y aplica backpressure
+- Un registro que falla por otra causa, aun solo, se agrega a
+  `<WAL>.fallidos` con el error para revisarlo y reinsertarlo a mano
+- La cola es acotada: si sigue llena tras WRITE_BEHIND_ENQUEUE_TIMEOUT se
+  lanza ColaLlena (la API responde 503)
+- close() deja de aceptar registros y vacía la cola antes de terminar
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from . import eventos, models
+from .config import settings
+
+
+class ColaLlena(Exception):
+    """La cola de escritura está llena (backpressure)"""
+
+
+def _transitorio(error: Exception) -> bool:
+    """Si el error es de disponibilidad de la BD y el mismo lote puede confirmarse después"""
+    if isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class IdAllocator:
+    """
+    Asigna ids por bloques para poder responder antes de insertar
+
+    Los bloques salen del mismo contador que usan los INSERT sin id (API
+    síncrona, lotes, importación), así que no chocan con ellos: en
+    PostgreSQL la secuencia de la tabla y en SQLite sqlite_sequence, que se
+    avanza en una transacción (la tabla debe usar AUTOINCREMENT). Otros
+    motores no se admiten.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], modelo, bloque: int):
+        self.session_factory = session_factory
+        self.modelo = modelo
+        self.bloque = bloque
+        self._disponibles: deque = deque()
+        self._lock = threading.Lock()
+
+    def verificar(self) -> None:
+        """RuntimeError si el motor no permite reservar bloques sin choques"""
+        tabla = self.modelo.__tablename__
+        with self.session_factory() as db:
+            dialecto = db.get_bind().dialect.name
+            if dialecto == "postgresql":
+                return
+            if dialecto != "sqlite":
+                raise RuntimeError(f"El write-behind no admite el motor {dialecto}")
+            sql = db.execute(text("SELECT sql FROM sqlite_master WHERE name = :t"), {"t": tabla}).scalar()
+        if sql is None or "AUTOINCREMENT" not in sql.upper():
+            raise RuntimeError(f"La tabla {tabla} no usa AUTOINCREMENT; el write-behind no puede reservar ids")
+
+    def siguiente(self) -> int:
+        with self._lock:
+            if not self._disponibles:
+                self._disponibles.extend(self._reservar_bloque())
+            return self._disponibles.popleft()
+
+    def _reservar_bloque(self) -> List[int]:
+        tabla = self.modelo.__tablename__
+        with self.session_factory() as db:
+            if db.get_bind().dialect.name == "postgresql":
+                ids = db.execute(
+                    text(f"SELECT nextval(pg_get_serial_sequence('{tabla}', 'id')) FROM generate_series(1, :n)"),
+                    {"n": self.bloque}
+                ).scalars().all()
+                return sorted(ids)
+            # El UPDATE toma el bloqueo de escritura antes de leer el contador
+            params = {"t": tabla, "n": self.bloque}
+            maximo = f"(SELECT coalesce(max(id), 0) FROM {tabla})"
+            if not db.execute(
+                text(f"UPDATE sqlite_sequence SET seq = max(seq, {maximo}) + :n WHERE name = :t"), params
+            ).rowcount:
+                db.execute(text(f"INSERT INTO sqlite_sequence (name, seq) VALUES (:t, {maximo} + :n)"), params)
+            fin = db.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :t"), params).scalar()
+            db.commit()
+        return list(range(fin - self.bloque + 1, fin + 1))
+
+
+def _a_json(valor):
+    if isinstance(valor, (Decimal, date, datetime)):
+        return valor.isoformat() if isinstance(valor, (date, datetime)) else str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _desde_json(registro: dict) -> dict:
+    """Restaurar los tipos de un registro leído del WAL"""
+    solicitud = dict(registro["solicitud"])
+    for campo in ("monto_solicitado", "ingreso_mensual"):
+        solicitud[campo] = Decimal(solicitud[campo])
+    solicitud["fecha_solicitud"] = datetime.fromisoformat(solicitud["fecha_solicitud"])
+    cliente = registro.get("cliente")
+    if cliente:
+        cliente = dict(cliente)
+        cliente["fecha_nacimiento"] = date.fromisoformat(cliente["fecha_nacimiento"])
+    return {"cliente": cliente, "solicitud": solicitud}
+
+
+class WriteBehindQueue:
+    """Cola acotada con un writer que confirma en lote (group commit)"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_queue: int = settings.WRITE_BEHIND_MAX_QUEUE,
+        batch_size: int = settings.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval_ms: int = settings.WRITE_BEHIND_FLUSH_INTERVAL_MS,
+        enqueue_timeout: float = settings.WRITE_BEHIND_ENQUEUE_TIMEOUT,
+        wal_path: Optional[str] = settings.WRITE_BEHIND_WAL_PATH,
+        id_block: int = settings.WRITE_BEHIND_ID_BLOCK,
+        reintento_inicial: float = settings.WRITE_BEHIND_REINTENTO_INICIAL,
+        reintento_max: float = settings.WRITE_BEHIND_REINTENTO_MAX,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout
+        self.wal_path = wal_path
+        self.fallidos_path = f"{wal_path}.fallidos" if wal_path else None
+        self.reintento_inicial = reintento_inicial
+        self.reintento_max = reintento_max
+        self._cola: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._ids_solicitud = IdAllocator(session_factory, models.Solicitud, id_block)
+        self._ids_cliente = IdAllocator(session_factory, models.Cliente, id_block)
+        # Clientes nuevos aún no escritos: email -> id pre-asignado
+        self._clientes_pendientes: Dict[str, int] = {}
+        self._pendientes_lock = threading.Lock()
+        self._wal_lock = threading.Lock()
+        self._wal = None
+        self._cerrada = False
+        self._hilo: Optional[threading.Thread] = None
+        self.errores = 0
+
+    # ---------------------------------------------------------------- API
+    def start(self) -> None:
+        """
+        Recuperar el WAL pendiente e iniciar el writer
+
+        RuntimeError si el motor no permite reservar ids por bloques.
+        """
+        self._ids_solicitud.verificar()
+        self._ids_cliente.verificar()
+        if self.wal_path:
+            self._recuperar_wal()
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._hilo = threading.Thread(target=self._writer, name="write-behind", daemon=True)
+        self._hilo.start()
+
+    def reservar_cliente(self, email: str) -> Tuple[int, bool]:
+        """Id pre-asignado para un cliente nuevo; (id, es_nuevo)"""
+        with self._pendientes_lock:
+            if email in self._clientes_pendientes:
+                return self._clientes_pendientes[email], False
+            cliente_id = self._ids_cliente.siguiente()
+            self._clientes_pendientes[email] = cliente_id
+            return cliente_id, True
+
+    def siguiente_id_solicitud(self) -> int:
+        return self._ids_solicitud.siguiente()
+
+    def encolar(self, registro: dict) -> None:
+        """Encolar un registro; con WAL retorna solo cuando está en disco"""
+        if self._cerrada:
+            raise ColaLlena("La cola de escritura está cerrada")
+        try:
+            self._cola.put(registro, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._olvidar_cliente(registro)
+            raise ColaLlena("La cola de escritura está llena")
+        if self._wal is not None:
+            linea = json.dumps(registro, default=_a_json) + "\n"
+            with self._wal_lock:
+                self._wal.write(linea)
+                self._wal.flush()
+                os.fsync(self._wal.fileno())
+
+    def pendientes(self) -> int:
+        return self._cola.unfinished_tasks
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que todo lo encolado esté confirmado"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self._cola.unfinished_tasks:
+            if limite is not None and time.monotonic() > limite:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Dejar de aceptar registros, vaciar la cola y detener el writer"""
+        self._cerrada = True
+        if self._hilo is not None:
+            self.flush(timeout)
+            self._hilo.join(timeout=timeout)
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    # ----------------------------------------------------------- internos
+    def _olvidar_cliente(self, registro: dict) -> None:
+        cliente = registro.get("cliente")
+        if cliente:
+            with self._pendientes_lock:
+                self._clientes_pendientes.pop(cliente["email"], None)
+
+    def _siguiente_lote(self) -> List[dict]:
+        try:
+            lote = [self._cola.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.flush_interval
+        while len(lote) < self.batch_size:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _writer(self) -> None:
+        while not (self._cerrada and self._cola.unfinished_tasks == 0):
+            lote = self._siguiente_lote()
+            if not lote:
+                continue
+            try:
+                self._con_reintentos(lambda: self._escribir(lote))
+            except Exception as e:
+                # Se reintenta registro por registro para aislar el que falla
+                print(f"❌ Error en write-behind, reintentando individualmente: {e}")
+                for registro in lote:
+                    try:
+                        self._con_reintentos(lambda: self._escribir_individual(registro))
+                    except Exception as e:
+                        self.errores += 1
+                        self._guardar_fallido(registro, e)
+            for registro in lote:
+                self._olvidar_cliente(registro)
+                self._cola.task_done()
+            self._truncar_wal_si_vacia()
+
+    def _con_reintentos(self, escribir: Callable[[], None]) -> None:
+        """Ejecutar `escribir` hasta que no falle por un error transitorio de la BD"""
+        espera = self.reintento_inicial
+        while True:
+            try:
+                return escribir()
+            except Exception as e:
+                if not _transitorio(e):
+                    raise
+                print(f"❌ Base de datos no disponible para el write-behind, reintento en {espera:.1f}s: {e}")
+            time.sleep(espera)
+            espera = min(espera * 2, self.reintento_max)
+
+    def _guardar_fallido(self, registro: dict, error: Exception) -> None:
+        """Agregar el registro a `<WAL>.fallidos` antes de sacarlo de la cola"""
+        if self.fallidos_path is None:
+            print(f"❌ Solicitud {registro['solicitud']['id']} descartada: {error}")
+            return
+        linea = json.dumps({**registro, "error": str(error)}, default=_a_json) + "\n"
+        with open(self.fallidos_path, "a", encoding="utf-8") as f:
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"❌ Solicitud {registro['solicitud']['id']} guardada en {self.fallidos_path}: {error}")
+
+    def _escribir(self, lote: List[dict]) -> None:
+        with self.session_factory() as db:
+            clientes = [r["cliente"] for r in lote if r.get("cliente")]
+            if clientes:
+                db.execute(insert(models.Cliente), clientes)
+            solicitudes = [r["solicitud"] for r in lote]
+            db.execute(insert(models.Solicitud), solicitudes)
+            eventos.registrar(db, solicitudes)
+            db.commit()
+
+    def _escribir_individual(self, registro: dict) -> None:
+        try:
+            self._escribir([registro])
+        except Exception:
+            # Otra petición pudo crear el mismo cliente entre la lectura y el
+            # encolado: se reutiliza el existente
+            cliente = registro.get("cliente")
+            if not cliente:
+                raise
+            with self.session_factory() as db:
+                existente = get_id_cliente(db, cliente["email"])
+            if existente is None:
+                raise
+            registro["cliente"] = None
+            registro["solicitud"]["cliente_id"] = existente
+            self._escribir([registro])
+
+    def _truncar_wal_si_vacia(self) -> None:
+        if self._wal is None:
+            return
+        with self._wal_lock:
+            # Sin registros pendientes todo lo escrito en el WAL ya está en la
+            # BD o en el archivo de fallidos
+            if self._cola.unfinished_tasks == 0:
+                self._wal.truncate(0)
+                self._wal.seek(0)
+
+    def _recuperar_wal(self) -> None:
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, encoding="utf-8") as f:
+            registros = [_desde_json(json.loads(linea)) for linea in f if linea.strip()]
+        if registros:
+            with self.session_factory() as db:
+                ids = [r["solicitud"]["id"] for r in registros]
+                existentes = set(db.execute(
+                    select(models.Solicitud.id).where(models.Solicitud.id.in_(ids))
+                ).scalars())
+                emails = [r["cliente"]["email"] for r in registros if r.get("cliente")]
+                clientes_existentes = set(db.execute(
+                    select(models.Cliente.email).where(models.Cliente.email.in_(emails))
+                ).scalars()) if emails else set()
+            faltantes = []
+            for registro in registros:
+                if registro["solicitud"]["id"] in existentes:
+                    continue
+                cliente = registro.get("cliente")
+                if cliente and cliente["email"] in clientes_existentes:
+                    registro["cliente"] = None
+                elif cliente:
+                    clientes_existentes.add(cliente["email"])
+                faltantes.append(registro)
+            for i in range(0, len(faltantes), self.batch_size):
+                self._escribir(faltantes[i:i + self.batch_size])
+            print(f"✅ Write-behind: {len(faltantes)} registros recuperados del WAL")
+        open(self.wal_path, "w").close()
+
+
+def get_id_cliente(db: Session, email: str) -> Optional[int]:
+    return db.execute(select(models.Cliente.id).where(models.Cliente.email == email)).scalar()
+
+
+# Instancia del proceso; se crea en el arranque si WRITE_BEHIND_ENABLED
+cola: Optional[WriteBehindQueue] = None
+
+
+def get_write_behind_queue() -> Optional[WriteBehindQueue]:
+    """Dependency que retorna la cola write-behind (None si está desactivada)"""
+    return cola
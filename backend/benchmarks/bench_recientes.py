@@ -0,0 +1,120 @@
+"""
+Benchmark de GET /api/solicitudes/recientes con 1000 filas
+
+Compara tres formas de obtener las solicitudes con nombre de cliente y
+sucursal sobre SQLite:
+
+- ORM con relaciones perezosas: una consulta por cliente y por sucursal
+- ORM con joinedload: una consulta, pero con identity map y objetos
+- select de columnas con joins + model_construct (crud.get_solicitudes_recientes)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_recientes
+"""
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app import crud, models, schemas  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.responses import dumps  # noqa: E402
+
+FILAS = 1000
+REPETICIONES = 20
+
+
+def _poblar() -> None:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    if db.query(models.Solicitud).count() >= FILAS:
+        db.close()
+        return
+    sucursales = [models.Sucursal(nombre=f"Sucursal {i}", ciudad="CDMX", direccion="Av. Juárez") for i in range(5)]
+    db.add_all(sucursales)
+    db.flush()
+    clientes = [
+        models.Cliente(nombre="Juan", apellido=f"Pérez {i}", email=f"juan{i}@email.com",
+                       fecha_nacimiento=date(1985, 5, 20), edad=40)
+        for i in range(FILAS)
+    ]
+    db.add_all(clientes)
+    db.flush()
+    inicio = datetime(2025, 1, 1)
+    db.add_all([
+        models.Solicitud(
+            cliente_id=cliente.id, sucursal_id=sucursales[i % 5].id, monto_solicitado=Decimal("125000.00"),
+            ingreso_mensual=Decimal("35000.00"), score_crediticio=700, tiene_tarjeta_credito=True,
+            tiene_credito_automotriz=False, plazo_meses=36, estado="aprobado",
+            fecha_solicitud=inicio + timedelta(minutes=i),
+        )
+        for i, cliente in enumerate(clientes)
+    ])
+    db.commit()
+    db.close()
+
+
+def _enriquecer(solicitud: models.Solicitud) -> dict:
+    datos = schemas.Solicitud.model_validate(solicitud).model_dump()
+    datos.update(
+        cliente_nombre=f"{solicitud.cliente.nombre} {solicitud.cliente.apellido}",
+        cliente_email=solicitud.cliente.email,
+        sucursal_nombre=solicitud.sucursal.nombre,
+    )
+    return datos
+
+
+def _perezoso(db):
+    solicitudes = db.query(models.Solicitud).order_by(
+        models.Solicitud.fecha_solicitud.desc(), models.Solicitud.id.desc()
+    ).limit(FILAS).all()
+    return [_enriquecer(s) for s in solicitudes]
+
+
+def _joinedload(db):
+    solicitudes = db.query(models.Solicitud).options(
+        joinedload(models.Solicitud.cliente), joinedload(models.Solicitud.sucursal)
+    ).order_by(models.Solicitud.fecha_solicitud.desc(), models.Solicitud.id.desc()).limit(FILAS).all()
+    return [_enriquecer(s) for s in solicitudes]
+
+
+def _columnas(db):
+    return crud.get_solicitudes_recientes(db, limit=FILAS)
+
+
+def _medir(funcion) -> tuple:
+    consultas = 0
+
+    def contar(*args):
+        nonlocal consultas
+        consultas += 1
+
+    event.listen(engine, "before_cursor_execute", contar)
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        # Sesión nueva por repetición, como en cada petición
+        db = SessionLocal()
+        body = dumps(funcion(db))
+        db.close()
+    total = (time.perf_counter() - inicio) / REPETICIONES * 1000
+    event.remove(engine, "before_cursor_execute", contar)
+    return total, consultas // REPETICIONES, len(body)
+
+
+if __name__ == "__main__":
+    _poblar()
+    print(f"Solicitudes recientes, {FILAS} filas (consulta + serialización)")
+    for nombre, funcion in [
+        ("ORM + relaciones perezosas", _perezoso),
+        ("ORM + joinedload", _joinedload),
+        ("columnas + model_construct", _columnas),
+    ]:
+        ms, consultas, tamano = _medir(funcion)
+        print(f"  {nombre:28s}: {ms:8.2f} ms  {consultas:5d} consultas  {tamano / 1024:.0f} KiB")
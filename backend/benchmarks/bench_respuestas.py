@@ -0,0 +1,115 @@
+"""
+Benchmark de serialización de respuestas
+
+Compara la ruta estándar de FastAPI (response_model valida y serializa de
+nuevo el modelo) contra FastJSONResponse con el modelo ya validado, usando
+una SimulacionResponse de 1000 elementos, y mide POST /api/solicitudes/simular
+con cantidad=1000 de punta a punta sobre SQLite.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_respuestas
+"""
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import schemas  # noqa: E402
+from app.responses import FastJSONResponse  # noqa: E402
+
+ITEMS = 1000
+REPETICIONES = 20
+
+
+def _simulacion(n: int) -> schemas.SimulacionResponse:
+    ahora = datetime.now(timezone.utc)
+    solicitudes = [
+        schemas.SolicitudResponse(
+            id=i,
+            cliente_id=i,
+            sucursal_id=1 + i % 5,
+            monto_solicitado=Decimal("125000.00"),
+            ingreso_mensual=Decimal("35000.00"),
+            score_crediticio=700,
+            tiene_tarjeta_credito=True,
+            plazo_meses=36,
+            estado="aprobado",
+            motivo_rechazo=None,
+            fecha_solicitud=ahora,
+            cliente_nombre="Juan Pérez",
+            cliente_email=f"juan{i}@email.com",
+            sucursal_nombre="Sucursal Centro",
+            cuota_mensual=Decimal("4151.79"),
+            tasa_interes_anual=Decimal("12.0"),
+            total_a_pagar=Decimal("149464.44"),
+            total_intereses=Decimal("24464.44"),
+        )
+        for i in range(n)
+    ]
+    return schemas.SimulacionResponse(
+        total_generadas=n, aprobadas=n, rechazadas=0, solicitudes=solicitudes
+    )
+
+
+def _medir(client: TestClient, method: str, url: str, **kwargs) -> float:
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        response = client.request(method, url, **kwargs)
+        assert response.status_code < 300, response.text
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000
+
+
+def bench_serializacion() -> None:
+    modelo = _simulacion(ITEMS)
+    bench_app = FastAPI()
+
+    @bench_app.get("/response-model", response_model=schemas.SimulacionResponse,
+                   response_class=JSONResponse)
+    async def via_response_model():
+        return modelo
+
+    @bench_app.get("/directo", response_model=schemas.SimulacionResponse)
+    async def directo():
+        return FastJSONResponse(modelo)
+
+    with TestClient(bench_app) as client:
+        client.get("/directo")
+        antes = _medir(client, "GET", "/response-model")
+        despues = _medir(client, "GET", "/directo")
+    print(f"SimulacionResponse {ITEMS} elementos")
+    print(f"  response_model + JSONResponse : {antes:8.2f} ms/petición")
+    print(f"  FastJSONResponse (sin revalidar): {despues:8.2f} ms/petición")
+    print(f"  mejora: {antes / despues:.1f}x")
+
+
+def bench_simular() -> None:
+    from app.database import SessionLocal
+    from app.main import app
+    from app.models import Sucursal
+
+    db = SessionLocal()
+    if not db.query(Sucursal).count():
+        db.add(Sucursal(nombre="Sucursal Centro", ciudad="CDMX", direccion="Av. Juárez 123"))
+        db.commit()
+    db.close()
+
+    with TestClient(app) as client:
+        inicio = time.perf_counter()
+        response = client.post("/api/solicitudes/simular", json={"cantidad": ITEMS})
+        total = (time.perf_counter() - inicio) * 1000
+    assert response.status_code == 200, response.text
+    print(f"POST /api/solicitudes/simular cantidad={ITEMS}: {total:8.1f} ms "
+          f"({len(response.content) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    bench_serializacion()
+    bench_simular()
@@ -0,0 +1,84 @@
+"""
+Benchmark de validación de esquemas
+
+Mide el parseo de SolicitudCreate y ClienteCreate desde dicts (como llegan
+en el cuerpo JSON), incluyendo los tres accesos a `edad` que hace
+crud.crear_solicitud, y la validación de una lista completa.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_schemas
+"""
+import os
+import tempfile
+import time
+from typing import List
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from app import schemas  # noqa: E402
+
+N = 20000
+
+
+def _solicitud(i: int) -> dict:
+    return {
+        "nombre": "Juan",
+        "apellido": "Pérez",
+        "email": f"juan.perez{i}@email.com",
+        "telefono": "55-1234-5678",
+        "fecha_nacimiento": "1985-05-20",
+        "monto_solicitado": "125000.00",
+        "ingreso_mensual": "35000.00",
+        "score_crediticio": 700,
+        "tiene_tarjeta_credito": True,
+        "tiene_credito_automotriz": False,
+        "plazo_meses": 36,
+        "sucursal_id": 1 + i % 5,
+    }
+
+
+def _cliente(i: int) -> dict:
+    return {
+        "nombre": "Juan",
+        "apellido": "Pérez",
+        "email": f"juan.perez{i}@email.com",
+        "fecha_nacimiento": "1985-05-20",
+        "edad": 40,
+    }
+
+
+def _medir(nombre: str, funcion) -> None:
+    inicio = time.perf_counter()
+    funcion()
+    segundos = time.perf_counter() - inicio
+    print(f"  {nombre:<40} {N / segundos:>10,.0f} objetos/s")
+
+
+def main() -> None:
+    solicitudes = [_solicitud(i) for i in range(N)]
+    clientes = [_cliente(i) for i in range(N)]
+    adapter = getattr(schemas, "SolicitudesCreateAdapter", None) or TypeAdapter(List[schemas.SolicitudCreate])
+
+    def solicitud_y_edad():
+        for datos in solicitudes:
+            solicitud = schemas.SolicitudCreate.model_validate(datos)
+            solicitud.edad, solicitud.edad, solicitud.edad
+
+    def cliente():
+        for datos in clientes:
+            schemas.ClienteCreate.model_validate(datos)
+
+    def lista():
+        adapter.validate_python(solicitudes)
+
+    print(f"Validación de esquemas ({N} objetos)")
+    _medir("SolicitudCreate + 3 accesos a edad", solicitud_y_edad)
+    _medir("ClienteCreate (validador de edad)", cliente)
+    _medir("list[SolicitudCreate] con TypeAdapter", lista)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
-from app.database import Base, get_db
+from app import admission, eventos, http_cache, sketches
+from app.database import Base, get_db, get_read_db
 from app.main import app
 from app.models import Sucursal, UsuarioAdmin
 from app.auth import get_password_hash
@@ -42,6 +43,13 @@ def client(db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    # Buckets de rate limit limpios en cada test
+    admission.controller = admission.crear_controller()
+    http_cache.indicadores = http_cache.UltimaRespuesta()
+    http_cache.segmentos = http_cache.UltimaRespuesta(capacidad=32)
+    sketches.distribuciones = sketches.Distribuciones()
+    eventos.difusor = eventos.Difusor()
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -0,0 +1,106 @@
+"""
+Pruebas unitarias para el control de admisión
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.admission import AdmissionController, TokenBucketLimiter, get_admission_controller
+from app.main import app
+
+
+def _solicitud_data(sucursal_id: int, i: int) -> dict:
+    return {
+        "nombre": "Ana",
+        "apellido": "López",
+        "email": f"ana.{i}@test.com",
+        "fecha_nacimiento": "1985-05-20",
+        "monto_solicitado": 50000,
+        "ingreso_mensual": 25000,
+        "score_crediticio": 700,
+        "tiene_tarjeta_credito": True,
+        "plazo_meses": 24,
+        "sucursal_id": sucursal_id,
+    }
+
+
+class TestTokenBucket:
+    """Tests para el token bucket por cliente"""
+
+    def test_rafaga_y_espera(self):
+        """Test que la ráfaga se admite y luego se indica el tiempo de espera"""
+        limiter = TokenBucketLimiter(rate=2, burst=3)
+        assert [limiter.consumir("a") for _ in range(3)] == [0, 0, 0]
+        espera = limiter.consumir("a")
+        assert 0 < espera <= 0.5
+        # Otro cliente tiene su propio bucket
+        assert limiter.consumir("b") == 0
+
+
+class TestConcurrencia:
+    """Tests para el límite global de concurrencia"""
+
+    def test_descarta_al_exceder_presupuesto_de_cola(self):
+        """Test que sin cupo en el tiempo de espera se responde 503"""
+        controller = AdmissionController(rate=100, burst=100, max_concurrencia=1,
+                                         max_cola=10, queue_timeout=0.01)
+
+        async def escenario():
+            async with controller.admitir("a"):
+                with pytest.raises(HTTPException) as exc_info:
+                    async with controller.admitir("b"):
+                        pass
+                return exc_info.value
+
+        error = asyncio.run(escenario())
+        assert error.status_code == 503
+        assert error.headers["Retry-After"] == "1"
+
+    def test_cola_llena_descarta_inmediato(self):
+        """Test que con la cola llena no se espera"""
+        controller = AdmissionController(rate=100, burst=100, max_concurrencia=1,
+                                         max_cola=0, queue_timeout=10)
+
+        async def escenario():
+            async with controller.admitir("a"):
+                inicio = asyncio.get_running_loop().time()
+                with pytest.raises(HTTPException):
+                    async with controller.admitir("b"):
+                        pass
+                return asyncio.get_running_loop().time() - inicio
+
+        assert asyncio.run(escenario()) < 1
+
+    def test_cupo_se_libera(self):
+        """Test que al terminar una petición el cupo queda disponible"""
+        controller = AdmissionController(rate=100, burst=100, max_concurrencia=1,
+                                         max_cola=10, queue_timeout=0.01)
+
+        async def escenario():
+            for cliente in ("a", "b", "c"):
+                async with controller.admitir(cliente):
+                    pass
+
+        asyncio.run(escenario())
+
+
+class TestAdmissionEndpoint:
+    """Tests del control de admisión sobre POST /api/solicitudes"""
+
+    def test_rate_limit_responde_429(self, client, test_sucursales):
+        """Test que al agotar el bucket se responde 429 con Retry-After"""
+        controller = AdmissionController(rate=0.5, burst=2, max_concurrencia=5,
+                                         max_cola=5, queue_timeout=0.1)
+        app.dependency_overrides[get_admission_controller] = lambda: controller
+        try:
+            codigos = [
+                client.post("/api/solicitudes", json=_solicitud_data(test_sucursales[0].id, i)).status_code
+                for i in range(3)
+            ]
+            response = client.post("/api/solicitudes", json=_solicitud_data(test_sucursales[0].id, 9))
+        finally:
+            app.dependency_overrides.pop(get_admission_controller, None)
+        assert codigos == [201, 201, 429]
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
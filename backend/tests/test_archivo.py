@@ -0,0 +1,124 @@
+"""
+Pruebas del archivado de solicitudes antiguas
+"""
+from datetime import datetime, timedelta
+
+from app import archivo, crud, database, parquet_export, segmentos, sketches
+from app.config import settings
+from app.models import EstadoArchivo, ResumenArchivado, Solicitud, SolicitudArchivada
+from tests.conftest import engine
+from tests.test_segmentos import _poblar
+
+
+def _envejecer(db, cada=2):
+    """Mover al pasado (2015) una de cada `cada` solicitudes"""
+    for solicitud in db.query(Solicitud).filter(Solicitud.id % cada == 0):
+        solicitud.fecha_solicitud = datetime(2015, 1, 1) + timedelta(hours=solicitud.id)
+    db.commit()
+
+
+class TestArchivado:
+    """Movimiento por lotes y agregados conservados"""
+
+    def test_agregados_no_cambian_al_archivar(self, db, test_sucursales):
+        """Test que indicadores y segmentos son los mismos antes y después de archivar"""
+        _poblar(db, test_sucursales, cantidad=200)
+        _envejecer(db)
+        indicadores = crud.get_indicadores(db)
+        cortes = segmentos.calcular_segmentos(db)
+
+        resultado = archivo.archivar(engine, horizonte_dias=365, lote=30, pausa=0)
+        db.expire_all()
+        assert (resultado["filas"], resultado["lotes"]) == (100, 4)
+        assert db.query(Solicitud).count() == 100
+        assert db.query(SolicitudArchivada).count() == 100
+        assert db.query(Solicitud).filter(Solicitud.fecha_solicitud < datetime(2016, 1, 1)).count() == 0
+        estado = db.get(EstadoArchivo, segmentos.ARCHIVO)
+        assert estado.filas == 100
+        assert estado.fecha_max.replace(tzinfo=None) == datetime(2015, 1, 1) + timedelta(hours=200)
+
+        assert crud.get_indicadores(db) == indicadores
+        assert segmentos.calcular_segmentos(db) == cortes
+
+        # Sin solicitudes por archivar no hace nada
+        assert archivo.archivar(engine, horizonte_dias=365, pausa=0)["filas"] == 0
+
+    def test_bandas_nuevas_reconstruyen_el_resumen(self, db, test_sucursales, monkeypatch):
+        """Test que con otras bandas el resumen se reconstruye y los segmentos siguen cuadrando"""
+        _poblar(db, test_sucursales, cantidad=120)
+        _envejecer(db, cada=3)
+        archivo.archivar(engine, horizonte_dias=365, pausa=0)
+
+        monkeypatch.setattr(settings, "SEGMENTOS_BANDAS_SCORE", [500, 700])
+        esperado = segmentos.calcular_segmentos(db)  # agrupa la tabla de archivadas
+        db.rollback()
+        archivo.archivar(engine, horizonte_dias=365, pausa=0)
+        db.expire_all()
+        assert {r.score_banda for r in db.query(ResumenArchivado)} <= {0, 1, 2}
+        assert segmentos.calcular_segmentos(db) == esperado
+
+    def test_respeta_la_marca_de_parquet(self, db, test_sucursales):
+        """Test que no se archivan solicitudes con id mayor a `hasta_id`"""
+        _poblar(db, test_sucursales, cantidad=40)
+        _envejecer(db, cada=1)
+        archivo.archivar(engine, horizonte_dias=365, pausa=0, hasta_id=10)
+        assert db.query(SolicitudArchivada.id).order_by(SolicitudArchivada.id).all() == [(i,) for i in range(1, 11)]
+
+    def test_sketches_reconstruidos_incluyen_archivadas(self, db, test_sucursales):
+        _poblar(db, test_sucursales, cantidad=60)
+        _envejecer(db)
+        archivo.archivar(engine, horizonte_dias=365, pausa=0)
+        estado = sketches.reconstruir(db)
+        assert estado.version == crud.version_solicitudes(db)
+        assert estado.resumen()["general"]["score_crediticio"]["cantidad"] == 60
+
+
+class TestListado:
+    """Listados que llegan al archivo solo cuando el rango lo pide"""
+
+    def test_recientes_con_rango_de_fechas(self, db, test_sucursales, client, auth_token):
+        _poblar(db, test_sucursales, cantidad=20)
+        _envejecer(db)
+        archivo.archivar(engine, horizonte_dias=365, pausa=0)
+        headers = {"Authorization": f"Bearer {auth_token}"}
+
+        # La página se llena con la tabla activa: no se consulta el archivo
+        ids = [s["id"] for s in client.get("/api/solicitudes/recientes?limit=5", headers=headers).json()]
+        assert ids == [19, 17, 15, 13, 11]
+
+        # Sin límite que llenar se completan con las archivadas, en orden
+        ids = [s["id"] for s in client.get("/api/solicitudes/recientes?limit=15", headers=headers).json()]
+        assert ids == [19, 17, 15, 13, 11, 9, 7, 5, 3, 1, 20, 18, 16, 14, 12]
+
+        respuesta = client.get(
+            "/api/solicitudes/recientes",
+            params={"desde": "2015-01-01T05:00:00", "hasta": "2015-01-01T12:00:00"}, headers=headers,
+        )
+        assert respuesta.status_code == 200
+        assert [s["id"] for s in respuesta.json()] == [10, 8, 6]
+        assert respuesta.json()[0]["cliente_nombre"].startswith("C ")
+
+
+class TestCLI:
+    """Marca de agua de la exportación a Parquet configurada"""
+
+    def test_no_archiva_sin_marca_legible(self, db, test_sucursales, tmp_path, monkeypatch):
+        """Test que con PARQUET_DESTINO la marca se lee por defecto y sin ella no se archiva nada"""
+        _poblar(db, test_sucursales, cantidad=20)
+        _envejecer(db, cada=1)
+        destino = tmp_path / "solicitudes"
+        monkeypatch.setattr(database, "engine", engine)
+        monkeypatch.setattr(settings, "PARQUET_DESTINO", str(destino))
+
+        assert archivo.main(["--pausa", "0"]) == 1
+        destino.mkdir()
+        (destino / parquet_export.MARCA).write_text("{incompleta", encoding="utf-8")
+        assert archivo.main(["--pausa", "0"]) == 1
+        assert db.query(SolicitudArchivada).count() == 0
+
+        parquet_export._guardar_marca(str(destino), 5)
+        assert archivo.main(["--pausa", "0"]) == 0
+        assert db.query(SolicitudArchivada).count() == 5
+
+        assert archivo.main(["--pausa", "0", "--sin-parquet"]) == 0
+        assert db.query(SolicitudArchivada).count() == 20
@@ -0,0 +1,109 @@
+"""
+Pruebas de la evaluación por lotes sin HTTP (app.batch_score)
+"""
+import csv
+import io
+import json
+from datetime import date
+
+from app import batch_score, models, shards
+from app.business_logic import evaluar_solicitud_credito
+from app.generator import _edad
+
+REFERENCIA = date(2025, 6, 30)
+ENCABEZADO = (
+    "nombre,apellido,email,telefono,fecha_nacimiento,monto_solicitado,ingreso_mensual,"
+    "score_crediticio,tiene_tarjeta_credito,tiene_credito_automotriz,plazo_meses,sucursal_id\n"
+)
+
+
+def _csv(filas: int, sucursal_id: int = 1) -> str:
+    lineas = [
+        f"Ana,García,ana{i}@test.com,,1990-01-15,{50000 + i * 40000},30000,{560 + i % 20 * 15},"
+        f"{'true' if i % 2 else 'false'},,36,{sucursal_id}\n"
+        for i in range(filas)
+    ]
+    return ENCABEZADO + "".join(lineas)
+
+
+def _decisiones(resultados):
+    return [json.loads(linea) for r in resultados for linea in r.salida.splitlines()]
+
+
+class TestEvaluacion:
+    """Validación, decisión y orden de salida"""
+
+    def test_csv_a_ndjson_con_errores_por_linea(self):
+        """Test que las filas inválidas se reportan con su línea y no detienen el lote"""
+        entrada = _csv(3) + "Luis,Pérez,no-es-email,,1990-01-15,100000,30000,900,true,false,36,1\n"
+        resultados = list(batch_score.evaluar_archivo(io.StringIO(entrada), "csv", fecha_referencia=REFERENCIA))
+        decisiones = _decisiones(resultados)
+        assert [d["linea"] for d in decisiones] == [2, 3, 4]
+        for i, decision in enumerate(decisiones):
+            aprobado, motivo = evaluar_solicitud_credito(
+                _edad(date(1990, 1, 15), REFERENCIA), 50000 + i * 40000, 30000, 560 + i * 15, i % 2 == 1, False, 36
+            )
+            assert decision["estado"] == ("aprobado" if aprobado else "rechazado")
+            assert decision["motivo_rechazo"] == motivo
+            assert (decision["cuota_mensual"] is None) == (not aprobado)
+
+        errores = [json.loads(linea) for r in resultados for linea in r.errores.splitlines()]
+        assert [e["linea"] for e in errores] == [5]
+        assert {e["campo"] for e in errores[0]["errores"]} == {"email", "score_crediticio"}
+
+    def test_ndjson_y_salida_csv(self):
+        entrada = "\n".join([
+            json.dumps({"nombre": "Ana", "apellido": "García", "email": "ana@test.com",
+                        "fecha_nacimiento": "1990-01-15", "monto_solicitado": 100000, "ingreso_mensual": 30000,
+                        "score_crediticio": 720, "tiene_tarjeta_credito": True, "plazo_meses": 36, "sucursal_id": 1}),
+            "[1, 2]",
+            "{no es json",
+        ])
+        resultados = list(batch_score.evaluar_archivo(
+            io.StringIO(entrada), "ndjson", "csv", fecha_referencia=REFERENCIA
+        ))
+        filas = list(csv.DictReader(io.StringIO(",".join(batch_score.COLUMNAS_SALIDA) + "\n" + resultados[0].salida)))
+        assert len(filas) == 1 and filas[0]["estado"] == "aprobado" and filas[0]["linea"] == "1"
+        assert resultados[0].invalidas == 2
+
+    def test_resultado_independiente_de_workers(self):
+        """Test que el pool de procesos conserva el orden y el contenido"""
+        entrada = _csv(40)
+        secuencial = list(batch_score.evaluar_archivo(io.StringIO(entrada), "csv", fecha_referencia=REFERENCIA, lote=7))
+        paralelo = list(batch_score.evaluar_archivo(
+            io.StringIO(entrada), "csv", fecha_referencia=REFERENCIA, lote=7, workers=2
+        ))
+        assert _decisiones(paralelo) == _decisiones(secuencial)
+        assert len(_decisiones(paralelo)) == 40
+
+
+class TestPersistencia:
+    """Inserción en bloque de las filas evaluadas"""
+
+    def test_reutiliza_clientes_y_verifica_sucursal(self, db, test_sucursales):
+        """Test que los emails existentes o repetidos no crean clientes nuevos"""
+        sucursales = frozenset(s.id for s in test_sucursales)
+        entrada = _csv(3, test_sucursales[0].id) + _csv(2, 999).split("\n", 1)[1]
+        for _ in range(2):
+            for resultado in batch_score.evaluar_archivo(
+                io.StringIO(entrada), "csv", fecha_referencia=REFERENCIA, sucursales=sucursales, persistir=True
+            ):
+                assert resultado.invalidas == 2
+                shards.insertar_lote_evaluado(db, resultado.filas)
+        assert db.query(models.Cliente).count() == 3
+        assert db.query(models.Solicitud).count() == 6
+        assert {s.sucursal_id for s in db.query(models.Solicitud)} == {test_sucursales[0].id}
+
+
+class TestCLI:
+    def test_main_con_archivos(self, tmp_path):
+        (tmp_path / "entrada.csv").write_text(_csv(5), encoding="utf-8")
+        codigo = batch_score.main([
+            "--entrada", str(tmp_path / "entrada.csv"), "--salida", str(tmp_path / "salida.ndjson"),
+            "--errores", str(tmp_path / "errores.ndjson"), "--workers", "1", "--lote", "2",
+            "--fecha-referencia", REFERENCIA.isoformat(),
+        ])
+        assert codigo == 0
+        lineas = (tmp_path / "salida.ndjson").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(linea)["email"] for linea in lineas] == [f"ana{i}@test.com" for i in range(5)]
+        assert (tmp_path / "errores.ndjson").read_text(encoding="utf-8") == ""
@@ -3,7 +3,14 @@ Pruebas unitarias para la lógica de negocio
 """
 import pytest
 from decimal import Decimal
-from app.business_logic import evaluar_solicitud_credito, calcular_cuota_mensual
+import random
+
+from app.business_logic import (
+    evaluar_solicitud_credito,
+    calcular_cuota_mensual,
+    calcular_contraoferta,
+    obtener_recomendaciones,
+)
 
 
 class TestEvaluacionSolicitud:
@@ -195,3 +202,86 @@ class TestCalculoCuota:
         assert cuota > Decimal("400")
         assert cuota < Decimal("500")
 
+
+class TestContraoferta:
+    """Tests para la contraoferta de solicitudes rechazadas"""
+    
+    def test_limites_segun_perfil(self):
+        """Test que la contraoferta usa el límite del perfil sin historial (30%, 5x)"""
+        contraoferta = calcular_contraoferta(
+            edad=30,
+            monto_solicitado=Decimal("200000"),
+            ingreso_mensual=Decimal("20000"),
+            score_crediticio=700,
+            tiene_tarjeta_credito=False,
+            tiene_credito_automotriz=False,
+            plazo_meses=12
+        )
+        # 30% de 20,000 x 12 meses = 72,000; tope 5x ingreso = 100,000
+        assert contraoferta["monto_maximo"] == Decimal("72000")
+        assert contraoferta["plazo_minimo"] is None
+        assert {o["plazo_meses"]: o["monto_maximo"] for o in contraoferta["opciones"]}[24] == Decimal("100000")
+    
+    def test_plazo_minimo(self):
+        """Test del plazo mínimo aprobable para el monto solicitado"""
+        contraoferta = calcular_contraoferta(
+            edad=30,
+            monto_solicitado=Decimal("150000"),
+            ingreso_mensual=Decimal("20000"),
+            score_crediticio=620,
+            tiene_tarjeta_credito=True,
+            tiene_credito_automotriz=False,
+            plazo_meses=12
+        )
+        # Historial con score justo: 35% -> 7,000 al mes -> 150,000 requiere 22 meses
+        assert contraoferta["plazo_minimo"] == 24
+    
+    def test_perfil_no_aprobable(self):
+        """Test que no hay contraoferta si el perfil se rechaza por edad o score"""
+        assert calcular_contraoferta(17, Decimal("10000"), Decimal("20000"), 700, True, False, 24) is None
+        assert calcular_contraoferta(30, Decimal("10000"), Decimal("20000"), 630, False, False, 24) is None
+    
+    def test_contraoferta_siempre_aprobada(self):
+        """Test que cada opción ofrecida es aprobada por el evaluador"""
+        rng = random.Random(3)
+        for _ in range(2000):
+            perfil = dict(
+                edad=rng.randint(18, 70),
+                ingreso_mensual=Decimal(rng.randrange(5000, 80000, 500)),
+                score_crediticio=rng.randint(600, 850),
+                tiene_tarjeta_credito=rng.random() < 0.5,
+                tiene_credito_automotriz=rng.random() < 0.3,
+            )
+            monto = Decimal(rng.randrange(10000, 900000, 100))
+            plazo = rng.choice([12, 24, 36, 48, 60])
+            contraoferta = calcular_contraoferta(monto_solicitado=monto, plazo_meses=plazo, **perfil)
+            if contraoferta is None:
+                continue
+            for opcion in contraoferta["opciones"]:
+                aprobado, _ = evaluar_solicitud_credito(
+                    monto_solicitado=opcion["monto_maximo"], plazo_meses=opcion["plazo_meses"], **perfil
+                )
+                assert aprobado
+                # 100 más ya no se aprobaría
+                aprobado, _ = evaluar_solicitud_credito(
+                    monto_solicitado=opcion["monto_maximo"] + 100, plazo_meses=opcion["plazo_meses"], **perfil
+                )
+                assert not aprobado
+            if contraoferta["plazo_minimo"] is not None:
+                aprobado, _ = evaluar_solicitud_credito(
+                    monto_solicitado=monto, plazo_meses=contraoferta["plazo_minimo"], **perfil
+                )
+                assert aprobado
+    
+    def test_recomendaciones_con_contraoferta(self):
+        """Test que las recomendaciones sugieren el plazo y monto de la contraoferta"""
+        resultado = obtener_recomendaciones(
+            monto_solicitado=Decimal("150000"),
+            ingreso_mensual=Decimal("20000"),
+            plazo_meses=12,
+            score_crediticio=620,
+            tiene_tarjeta_credito=True
+        )
+        assert "Considere extender el plazo a 24 meses" in resultado["recomendaciones"]
+        assert "O reduzca el monto a $84,000.00" in resultado["recomendaciones"]
+
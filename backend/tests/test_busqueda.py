@@ -0,0 +1,104 @@
+"""
+Pruebas para la búsqueda de clientes
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app import busqueda
+from app.models import Cliente, Solicitud
+
+
+def _cliente(db, nombre, apellido, email):
+    cliente = Cliente(nombre=nombre, apellido=apellido, email=email,
+                      fecha_nacimiento=date(1990, 1, 1), edad=35)
+    db.add(cliente)
+    db.commit()
+    return cliente
+
+
+@pytest.fixture
+def clientes(db, test_sucursales):
+    creados = [
+        _cliente(db, "María", "González", "maria.gonzalez@test.com"),
+        _cliente(db, "Mariana", "López", "mlopez@test.com"),
+        _cliente(db, "Juan", "Martínez", "juan@empresa.mx"),
+        _cliente(db, "Rosa", "Marín", "rmarin@test.com"),
+    ]
+    for monto, estado in [(Decimal("10000"), "aprobado"), (Decimal("5000.50"), "rechazado")]:
+        db.add(Solicitud(
+            cliente_id=creados[0].id, sucursal_id=test_sucursales[0].id, monto_solicitado=monto,
+            ingreso_mensual=Decimal("20000"), score_crediticio=700, plazo_meses=12, estado=estado,
+        ))
+    db.commit()
+    return creados
+
+
+class TestBuscarClientes:
+    """Tests de buscar_clientes()"""
+
+    def test_coincidencia_parcial_y_resumen(self, db, clientes):
+        """Test de coincidencia en nombre, apellido o email con resumen de solicitudes"""
+        resultado = busqueda.buscar_clientes(db, "mari")
+        ids = [r["id"] for r in resultado["resultados"]]
+        # María, Mariana y Marín (apellido); Martínez no contiene "mari"
+        assert sorted(ids) == [clientes[0].id, clientes[1].id, clientes[3].id]
+        maria = next(r for r in resultado["resultados"] if r["id"] == clientes[0].id)
+        assert maria["solicitudes"]["total"] == 2 and maria["solicitudes"]["aprobadas"] == 1
+        assert maria["solicitudes"]["monto_total_solicitado"] == Decimal("15000.50")
+        assert busqueda.buscar_clientes(db, "empresa")["resultados"][0]["id"] == clientes[2].id
+
+    def test_todas_las_palabras(self, db, clientes):
+        """Test que cada palabra debe aparecer en algún campo"""
+        resultado = busqueda.buscar_clientes(db, "mari gonz")
+        assert [r["id"] for r in resultado["resultados"]] == [clientes[0].id]
+        # Palabras cortas (sin trigramas) también filtran
+        assert [r["id"] for r in busqueda.buscar_clientes(db, "ju")["resultados"]] == [clientes[2].id]
+
+    def test_paginacion_keyset(self, db, clientes):
+        """Test que recorrer las páginas devuelve todos los resultados sin repetir"""
+        completa = [r["id"] for r in busqueda.buscar_clientes(db, "test.com", limite=10)["resultados"]]
+        assert len(completa) == 3
+
+        vistos, cursor = [], None
+        while True:
+            pagina = busqueda.buscar_clientes(db, "test.com", limite=1, cursor=cursor)
+            vistos += [r["id"] for r in pagina["resultados"]]
+            cursor = pagina["siguiente"]
+            if cursor is None:
+                break
+        assert vistos == completa
+
+    def test_cliente_nuevo_indexado(self, db, clientes):
+        """Test que los triggers mantienen el índice al crear y actualizar"""
+        nuevo = _cliente(db, "Zoe", "Quintana", "zq@test.com")
+        assert [r["id"] for r in busqueda.buscar_clientes(db, "quinta")["resultados"]] == [nuevo.id]
+        nuevo.apellido = "Ruiz"
+        db.commit()
+        assert busqueda.buscar_clientes(db, "quinta")["resultados"] == []
+
+    def test_cursor_invalido(self, db, clientes):
+        with pytest.raises(ValueError):
+            busqueda.buscar_clientes(db, "mari", cursor="no-es-cursor")
+
+    def test_consulta_postgresql(self):
+        """Test que en PostgreSQL se filtra con ILIKE (índices GIN de pg_trgm)"""
+        sql = str(busqueda._candidatos_postgresql("mari", ["mari"]).compile(dialect=postgresql.dialect()))
+        assert "similarity(" in sql and sql.count("ILIKE") == 3
+
+
+class TestEndpoint:
+    """Tests de GET /api/clientes/buscar"""
+
+    def test_buscar(self, client, clientes, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        assert client.get("/api/clientes/buscar?q=mari").status_code == 403
+        response = client.get("/api/clientes/buscar?q=gonz&limite=5", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["siguiente"] is None
+        assert data["resultados"][0]["email"] == "maria.gonzalez@test.com"
+        assert client.get("/api/clientes/buscar?q=mari&cursor=xx", headers=headers).status_code == 400
+        assert client.get("/api/clientes/buscar?q=m", headers=headers).status_code == 422
@@ -0,0 +1,122 @@
+"""
+Pruebas unitarias para la configuración del pool de conexiones
+"""
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.pool import NullPool
+
+from app import database
+from app.config import settings
+
+
+class TestEngineOptions:
+    """Tests para la construcción de opciones del engine"""
+
+    def test_pool_configurable(self, monkeypatch, tmp_path):
+        """Test que el pool usa los valores de Settings"""
+        monkeypatch.setattr(settings, "DB_POOL_SIZE", 3)
+        monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 2)
+        monkeypatch.setattr(settings, "DB_POOL_TIMEOUT", 1.5)
+        engine = database.create_db_engine(f"sqlite:///{tmp_path}/pool.db")
+        assert engine.pool.size() == 3
+        assert engine.pool._max_overflow == 2
+        assert engine.pool._timeout == 1.5
+        engine.dispose()
+
+    def test_statement_timeout_postgres(self, monkeypatch):
+        """Test que el statement_timeout se envía como parámetro de arranque"""
+        monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 2500)
+        monkeypatch.setattr(settings, "DB_PGBOUNCER", False)
+        options = database._engine_options("postgresql://u:p@localhost/db")
+        assert options["connect_args"]["options"] == "-c statement_timeout=2500"
+
+    def test_modo_pgbouncer(self, monkeypatch):
+        """Test del modo PgBouncer: NullPool y sin parámetros de arranque"""
+        monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 2500)
+        monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+        options = database._engine_options("postgresql+psycopg://u:p@localhost/db")
+        assert options["poolclass"] is NullPool
+        assert "pool_size" not in options
+        assert "options" not in options["connect_args"]
+        assert options["connect_args"]["prepare_threshold"] is None
+
+
+class TestGetDb:
+    """Tests para la dependencia get_db"""
+
+    def test_pool_agotado_responde_503(self, monkeypatch, tmp_path):
+        """Test que un pool agotado produce 503 rápido en lugar de colgarse"""
+        monkeypatch.setattr(settings, "DB_POOL_SIZE", 1)
+        monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 0)
+        monkeypatch.setattr(settings, "DB_POOL_TIMEOUT", 0.05)
+        engine = database.create_db_engine(f"sqlite:///{tmp_path}/agotado.db")
+        monkeypatch.setattr(database, "engine", engine)
+
+        ocupada = engine.connect()
+        try:
+            with pytest.raises(HTTPException) as exc_info:
+                next(database.get_db())
+            assert exc_info.value.status_code == 503
+            assert "Retry-After" in exc_info.value.headers
+        finally:
+            ocupada.close()
+            engine.dispose()
+
+    def test_sesion_conserva_conexion_tras_commit(self, monkeypatch, tmp_path):
+        """Test que la sesión no devuelve la conexión al pool entre commits"""
+        engine = database.create_db_engine(f"sqlite:///{tmp_path}/sesion.db")
+        monkeypatch.setattr(database, "engine", engine)
+
+        gen = database.get_db()
+        db = next(gen)
+        db.commit()
+        assert engine.pool.checkedout() == 1
+        gen.close()
+        assert engine.pool.checkedout() == 0
+        engine.dispose()
+
+
+class TestGetReadDb:
+    """Tests para el enrutamiento de lecturas a la réplica"""
+
+    def _configurar(self, monkeypatch, primario_url, replica_url, max_lag=5.0):
+        primario = database.create_db_engine(primario_url)
+        replica = database.create_db_engine(replica_url)
+        monkeypatch.setattr(database, "engine", primario)
+        monkeypatch.setattr(database, "replica_engine", replica)
+        monkeypatch.setattr(
+            database, "replica_monitor", database.ReplicaMonitor(replica, max_lag, 60)
+        )
+        return primario, replica
+
+    def test_lee_de_replica_sana(self, monkeypatch, tmp_path):
+        """Test que las lecturas van a la réplica cuando está disponible"""
+        primario, replica = self._configurar(
+            monkeypatch, f"sqlite:///{tmp_path}/primario.db", f"sqlite:///{tmp_path}/replica.db"
+        )
+        gen = database.get_read_db()
+        db = next(gen)
+        assert db.get_bind().engine is replica
+        gen.close()
+
+    def test_replica_inalcanzable_usa_primario(self, monkeypatch, tmp_path):
+        """Test del fallback al primario cuando la réplica no responde"""
+        primario, replica = self._configurar(
+            monkeypatch, f"sqlite:///{tmp_path}/primario.db", f"sqlite:///{tmp_path}/no/existe.db"
+        )
+        gen = database.get_read_db()
+        db = next(gen)
+        assert db.get_bind().engine is primario
+        gen.close()
+
+    def test_replica_con_retraso_usa_primario(self, monkeypatch, tmp_path):
+        """Test del fallback al primario cuando el retraso supera el umbral"""
+        primario, replica = self._configurar(
+            monkeypatch, f"sqlite:///{tmp_path}/primario.db", f"sqlite:///{tmp_path}/replica.db",
+            max_lag=1.0,
+        )
+        monkeypatch.setattr(database, "replication_lag", lambda connection: 30.0)
+        gen = database.get_read_db()
+        db = next(gen)
+        assert db.get_bind().engine is primario
+        gen.close()
@@ -1,9 +1,14 @@
 """
 Pruebas unitarias para los endpoints de la API
 """
+import json
 import pytest
 from datetime import date
 
+from sqlalchemy import event
+
+from app import models, shards
+
 
 class TestHealthEndpoints:
     """Tests para endpoints de health check"""
@@ -86,6 +91,29 @@ class TestSolicitudesEndpoints:
         assert data["estado"] == "rechazado"
         assert "edad" in data["motivo_rechazo"].lower()
     
+    def test_crear_solicitud_rechazada_con_contraoferta(self, client, test_sucursales):
+        """Test que un rechazo por monto incluye la contraoferta"""
+        solicitud_data = {
+            "nombre": "Laura",
+            "apellido": "Pérez",
+            "email": "laura.perez@test.com",
+            "fecha_nacimiento": "1985-05-20",
+            "monto_solicitado": 150000,
+            "ingreso_mensual": 20000,
+            "score_crediticio": 620,
+            "tiene_tarjeta_credito": True,
+            "plazo_meses": 12,
+            "sucursal_id": test_sucursales[0].id
+        }
+        
+        response = client.post("/api/solicitudes", json=solicitud_data)
+        assert response.status_code == 201
+        data = response.json()
+        assert data["estado"] == "rechazado"
+        assert data["contraoferta"]["plazo_minimo"] == 24
+        assert float(data["contraoferta"]["monto_maximo"]) == 84000
+        assert len(data["contraoferta"]["opciones"]) == 5
+    
     def test_crear_solicitud_sin_sucursal(self, client):
         """Test de error al crear solicitud sin sucursal válida"""
         solicitud_data = {
@@ -137,6 +165,82 @@ class TestSolicitudesEndpoints:
         assert data["total_generadas"] == 5
         assert data["aprobadas"] + data["rechazadas"] == 5
         assert len(data["solicitudes"]) == 5
+    
+    def test_simular_solicitudes_detalle(self, client, test_sucursales):
+        """Test de simulación solo con conteos y con muestra"""
+        data = client.post("/api/solicitudes/simular", json={"cantidad": 30, "detalle": "none"}).json()
+        assert data["total_generadas"] == 30
+        assert data["solicitudes"] == []
+        
+        data = client.post("/api/solicitudes/simular", json={"cantidad": 30, "detalle": "sample"}).json()
+        assert data["total_generadas"] == 30
+        assert len(data["solicitudes"]) == 10
+        assert len({s["id"] for s in data["solicitudes"]}) == 10
+    
+    def test_simular_solicitudes_ndjson(self, client, test_sucursales, db):
+        """Test de simulación en streaming NDJSON"""
+        response = client.post("/api/solicitudes/simular", json={"cantidad": 5, "formato": "ndjson"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lineas = [json.loads(linea) for linea in response.text.splitlines()]
+        assert len(lineas) == 6
+        assert all("estado" in linea for linea in lineas[:5])
+        assert lineas[-1]["resumen"]["total_generadas"] == 5
+        assert db.query(models.Solicitud).count() == 5
+    
+    def test_simular_reporta_errores(self, client, test_sucursales, db, monkeypatch):
+        """Test que una solicitud que falla se cuenta en errores y no corta la simulación"""
+        original = shards.crear_solicitud
+        llamadas = []
+
+        def crear(db, solicitud_data):
+            llamadas.append(1)
+            if len(llamadas) == 2:
+                raise RuntimeError("falla simulada")
+            return original(db, solicitud_data)
+
+        monkeypatch.setattr(shards, "crear_solicitud", crear)
+        data = client.post("/api/solicitudes/simular", json={"cantidad": 5}).json()
+        assert data["total_generadas"] == 4
+        assert data["errores"] == 1
+        assert db.query(models.Solicitud).count() == 4
+
+        llamadas.clear()
+        response = client.post("/api/solicitudes/simular", json={"cantidad": 5, "formato": "ndjson"})
+        lineas = [json.loads(linea) for linea in response.text.splitlines()]
+        assert lineas[1]["error"] == {"indice": 1, "detalle": "falla simulada"}
+        assert lineas[-1]["resumen"]["total_generadas"] == 4
+        assert lineas[-1]["resumen"]["errores"] == 1
+
+    def test_simular_ndjson_sin_sucursales(self, client):
+        """Test que el error de sucursales se responde antes de iniciar el stream"""
+        response = client.post("/api/solicitudes/simular", json={"cantidad": 5, "formato": "ndjson"})
+        assert response.status_code == 400
+
+    def test_solicitudes_recientes(self, client, test_sucursales, auth_token, db):
+        """Test de solicitudes recientes con nombres en una sola consulta"""
+        client.post("/api/solicitudes/simular", json={"cantidad": 12})
+
+        consultas = []
+        def registrar(conn, cursor, statement, *args):
+            consultas.append(statement)
+        event.listen(db.get_bind(), "before_cursor_execute", registrar)
+        try:
+            response = client.get(
+                "/api/solicitudes/recientes?limit=10",
+                headers={"Authorization": f"Bearer {auth_token}"}
+            )
+        finally:
+            event.remove(db.get_bind(), "before_cursor_execute", registrar)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 10
+        assert [s["id"] for s in data] == sorted((s["id"] for s in data), reverse=True)
+        nombres = {s.nombre for s in test_sucursales}
+        assert all(s["sucursal_nombre"] in nombres and "@" in s["cliente_email"] for s in data)
+        # Una consulta para el usuario del token y una para las solicitudes
+        assert sum("FROM solicitudes" in c for c in consultas) == 1
 
 
 class TestAuthEndpoints:
@@ -0,0 +1,197 @@
+"""
+Pruebas de los eventos en vivo del dashboard
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+
+from app import crud, database, eventos, models, responses, schemas
+from app.config import settings
+from tests.conftest import engine
+
+
+def _solicitud(sucursal_id, email="ana@test.com", monto=100000, score=720):
+    return schemas.SolicitudCreate(
+        nombre="Ana", apellido="García", email=email, fecha_nacimiento=date(1990, 1, 15),
+        monto_solicitado=monto, ingreso_mensual=30000, score_crediticio=score,
+        tiene_tarjeta_credito=True, plazo_meses=36, sucursal_id=sucursal_id,
+    )
+
+
+def _mensajes(texto):
+    """(evento, datos) de cada mensaje de un stream SSE"""
+    mensajes = []
+    for bloque in texto.split("\n\n"):
+        campos = dict(linea.split(": ", 1) for linea in bloque.splitlines() if linea.startswith(("event", "data")))
+        if "event" in campos:
+            mensajes.append((campos["event"], json.loads(campos["data"])))
+    return mensajes
+
+
+class TestEventos:
+    """Construcción y agrupación de eventos"""
+
+    def test_delta_por_sucursal(self):
+        evento = eventos.construir_evento([
+            {"id": 1, "sucursal_id": 1, "estado": "aprobado", "monto_solicitado": Decimal("100.50"), "score_crediticio": 700},
+            {"id": 2, "sucursal_id": 1, "estado": "rechazado", "monto_solicitado": Decimal("50"), "score_crediticio": 600},
+            {"sucursal_id": 2, "estado": "aprobado", "monto_solicitado": Decimal("10"), "score_crediticio": 650},
+        ])
+        assert "version" not in evento  # se asigna al confirmar
+        assert [d["id"] for d in evento["decisiones"]] == [1, 2]
+        sucursal_1 = evento["delta"][0]
+        assert (sucursal_1["total_solicitudes"], sucursal_1["aprobadas"], sucursal_1["rechazadas"]) == (2, 1, 1)
+        assert sucursal_1["monto_solicitado"] == Decimal("150.50")
+        assert sucursal_1["monto_aprobado"] == Decimal("100.50")
+        assert sucursal_1["suma_score"] == 1300
+        assert eventos.construir_evento([]) is None
+
+    def test_combinar_descarta_lo_incluido_en_la_foto(self):
+        """Test que se suman los deltas y se omiten los eventos con versión <= la de la foto"""
+        viejo = {**eventos.construir_evento([{"id": 6, "sucursal_id": 1, "estado": "aprobado", "monto_solicitado": 1, "score_crediticio": 1}]), "version": 5}
+        # Id menor confirmado después de la foto: se suma
+        nuevo = {**eventos.construir_evento([{"id": 4, "sucursal_id": 1, "estado": "aprobado", "monto_solicitado": 2, "score_crediticio": 1}]), "version": 6}
+        # Como llega por pg_notify: montos serializados como cadena
+        lote = json.loads(responses.dumps({**eventos.construir_evento([
+            {"id": 3, "sucursal_id": 1, "estado": "rechazado", "monto_solicitado": Decimal("3.25"), "score_crediticio": 1}
+        ]), "version": 7}))
+        actualizacion = eventos.combinar([viejo, nuevo, lote], version=5)
+        assert [d["id"] for d in actualizacion["decisiones"]] == [4, 3]
+        assert actualizacion["delta"][0]["total_solicitudes"] == 2
+        assert actualizacion["delta"][0]["monto_solicitado"] == Decimal("5.25")
+        assert eventos.combinar([viejo], version=5) is None
+
+    def test_combinar_por_shard(self):
+        """Test que con shards cada evento se compara con la versión de su shard"""
+        def evento(shard, version):
+            return {**eventos.construir_evento([
+                {"id": version, "sucursal_id": 1, "estado": "aprobado", "monto_solicitado": 1, "score_crediticio": 1}
+            ]), "version": version, "shard": shard}
+        actualizacion = eventos.combinar([evento(0, 3), evento(1, 3), evento(0, 4), evento(None, 9)], version=(3, 2))
+        assert [d["id"] for d in actualizacion["decisiones"]] == [3, 4]
+
+
+class TestPublicacion:
+    """Los eventos se publican solo al confirmar"""
+
+    def test_publica_al_confirmar_y_descarta_rollback(self, db, test_sucursales):
+        async def escenario():
+            suscripcion = eventos.difusor.suscribir()
+            respuesta = crud.crear_solicitud(db, _solicitud(test_sucursales[0].id))
+            evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=1)
+            assert evento["decisiones"][0]["id"] == respuesta.id
+            assert evento["delta"][0]["sucursal_id"] == test_sucursales[0].id
+            assert evento["version"] == crud.version_solicitudes(db) == 1
+
+            eventos.registrar(db, [{"sucursal_id": 1, "estado": "aprobado", "monto_solicitado": 1, "score_crediticio": 1}])
+            db.rollback()
+            db.commit()
+            await asyncio.sleep(0.05)
+            assert suscripcion.cola.empty()
+            suscripcion.cancelar()
+
+        asyncio.run(escenario())
+
+    def test_lote_con_ids_y_sin_doble_conteo(self, db, test_sucursales):
+        """Test que un lote confirmado entre la suscripción y la foto no se suma dos veces"""
+        filas = [{
+            "nombre": "Ana", "apellido": str(i), "email": f"lote{i}@test.com", "telefono": None,
+            "fecha_nacimiento": date(1990, 1, 15), "edad": 35, "sucursal_id": test_sucursales[0].id,
+            "monto_solicitado": Decimal("1000"), "ingreso_mensual": Decimal("30000"), "score_crediticio": 700,
+            "tiene_tarjeta_credito": True, "tiene_credito_automotriz": False, "plazo_meses": 12,
+            "estado": "aprobado", "motivo_rechazo": None,
+        } for i in range(3)]
+
+        async def escenario():
+            suscripcion = eventos.difusor.suscribir()
+            crud.insertar_lote_simulado(db, filas)
+            db.commit()
+            evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=1)
+            suscripcion.cancelar()
+            return evento
+
+        evento = asyncio.run(escenario())
+        assert [d["id"] for d in evento["decisiones"]] == [1, 2, 3]
+        version, indicadores = crud.get_indicadores_con_version(db)
+        assert indicadores.total_solicitudes == 3
+        assert eventos.combinar([evento], version) is None
+
+    def test_notify_en_postgresql(self):
+        sql = str(
+            func.pg_notify(settings.EVENTOS_CANAL, "{}").select().compile(dialect=postgresql.dialect())
+        )
+        assert sql.startswith("SELECT pg_notify(")
+
+
+class TestEndpoint:
+    """Tests de GET /api/indicadores/eventos"""
+
+    def test_sin_auth(self, client):
+        assert client.get("/api/indicadores/eventos").status_code == 403
+
+    def _abrir(self, client, auth_token, monkeypatch):
+        """Abrir el stream en otro hilo y esperar a que se suscriba"""
+        # El endpoint abre su propia sesión, sin get_db
+        monkeypatch.setattr(database, "engine", engine)
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        resultado = {}
+        hilo = threading.Thread(
+            target=lambda: resultado.update(response=client.get("/api/indicadores/eventos", headers=headers))
+        )
+        hilo.start()
+        limite = time.monotonic() + 5
+        while eventos.difusor.suscriptores == 0 and time.monotonic() < limite:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        return hilo, resultado
+
+    def test_foto_y_actualizaciones(self, client, test_sucursales, auth_token, monkeypatch):
+        """Test que llegan la foto inicial y las decisiones confirmadas después"""
+        monkeypatch.setattr(settings, "EVENTOS_INTERVALO_MS", 50)
+        hilo, resultado = self._abrir(client, auth_token, monkeypatch)
+
+        for i, monto in enumerate([100000, 2000000]):
+            eventos.difusor.publicar(eventos.construir_evento([{
+                "id": 1000 + i, "sucursal_id": test_sucursales[0].id, "estado": "aprobado" if i == 0 else "rechazado",
+                "monto_solicitado": Decimal(monto), "score_crediticio": 700,
+            }]))
+        time.sleep(0.2)
+        eventos.difusor.cerrar()
+        hilo.join(timeout=5)
+
+        response = resultado["response"]
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        mensajes = _mensajes(response.text)
+        assert mensajes[0][0] == "indicadores" and mensajes[0][1]["total_solicitudes"] == 0
+        actualizaciones = [datos for tipo, datos in mensajes if tipo == "actualizacion"]
+        assert [d["id"] for a in actualizaciones for d in a["decisiones"]] == [1000, 1001]
+        assert sum(a["delta"][0]["aprobadas"] for a in actualizaciones) == 1
+        assert eventos.difusor.suscriptores == 0
+
+    def test_no_retiene_conexion(self, client, db, auth_token, monkeypatch):
+        """Test que con el stream abierto su conexión ya volvió al pool"""
+        db.close()
+        antes = engine.pool.checkedout()
+        hilo, resultado = self._abrir(client, auth_token, monkeypatch)
+        assert eventos.difusor.suscriptores == 1
+        assert engine.pool.checkedout() == antes
+
+        eventos.difusor.cerrar()
+        hilo.join(timeout=5)
+        assert resultado["response"].status_code == 200
+        assert _mensajes(resultado["response"].text)[0][0] == "indicadores"
+
+    def test_token_de_usuario_inexistente(self, client, db, auth_token, monkeypatch):
+        monkeypatch.setattr(database, "engine", engine)
+        db.query(models.UsuarioAdmin).delete()
+        db.commit()
+        response = client.get("/api/indicadores/eventos", headers={"Authorization": f"Bearer {auth_token}"})
+        assert response.status_code == 401
+        assert eventos.difusor.suscriptores == 0
@@ -0,0 +1,83 @@
+"""
+Pruebas unitarias para el generador reproducible de datos sintéticos
+"""
+import csv
+import io
+import json
+from datetime import date
+
+from app import generator, models
+from app.generator import DistribucionConfig
+from tests.conftest import TestingSessionLocal
+
+REFERENCIA = date(2025, 6, 30)
+
+
+def _todas(**kwargs):
+    return [fila for shard in generator.generar(fecha_referencia=REFERENCIA, **kwargs) for fila in shard]
+
+
+class TestGenerador:
+    """Tests para la generación de filas"""
+
+    def test_misma_semilla_mismas_filas(self):
+        """Test de reproducibilidad con la misma semilla"""
+        a = _todas(cantidad=50, seed=7, sucursal_ids=[1, 2, 3], shard_size=20)
+        b = _todas(cantidad=50, seed=7, sucursal_ids=[1, 2, 3], shard_size=20)
+        assert a == b
+        assert a != _todas(cantidad=50, seed=8, sucursal_ids=[1, 2, 3], shard_size=20)
+
+    def test_resultado_independiente_de_workers(self):
+        """Test que el pool de procesos produce exactamente la misma salida"""
+        secuencial = _todas(cantidad=60, seed=3, sucursal_ids=[1, 2], shard_size=15, workers=1)
+        paralelo = _todas(cantidad=60, seed=3, sucursal_ids=[1, 2], shard_size=15, workers=2)
+        assert secuencial == paralelo
+
+    def test_filas_validas_y_edad_exacta(self):
+        """Test de rangos válidos y edad coherente con la fecha de referencia"""
+        filas = _todas(cantidad=300, seed=1, sucursal_ids=[4, 5])
+        for fila in filas:
+            assert 300 <= fila["score_crediticio"] <= 850
+            assert fila["monto_solicitado"] > 0 and fila["ingreso_mensual"] > 0
+            assert fila["sucursal_id"] in (4, 5)
+            assert fila["estado"] in ("aprobado", "rechazado")
+            assert generator._edad(fila["fecha_nacimiento"], REFERENCIA) == fila["edad"]
+        assert len({fila["email"] for fila in filas}) == 300
+
+    def test_pesos_configurables(self):
+        """Test de pesos de sucursal y plazo configurables"""
+        config = DistribucionConfig(sucursal_pesos={9: 1.0, 10: 0.0}, plazos={24: 1.0})
+        filas = _todas(cantidad=100, seed=2, sucursal_ids=[1], config=config)
+        assert {fila["sucursal_id"] for fila in filas} == {9}
+        assert {fila["plazo_meses"] for fila in filas} == {24}
+
+
+class TestDestinos:
+    """Tests para los destinos de escritura"""
+
+    def test_ndjson_y_csv(self):
+        """Test de escritura NDJSON y CSV"""
+        filas = _todas(cantidad=5, seed=1, sucursal_ids=[1])
+
+        salida = io.StringIO()
+        generator.NDJSONSink(salida).write(filas)
+        lineas = salida.getvalue().splitlines()
+        assert len(lineas) == 5
+        assert json.loads(lineas[0])["monto_solicitado"] == str(filas[0]["monto_solicitado"])
+
+        salida = io.StringIO()
+        sink = generator.CSVSink(salida)
+        sink.write(filas)
+        leidas = list(csv.DictReader(io.StringIO(salida.getvalue())))
+        assert [r["email"] for r in leidas] == [f["email"] for f in filas]
+
+    def test_destino_base_de_datos(self, db, test_sucursales):
+        """Test de inserción en bloque en la base de datos"""
+        ids = [s.id for s in test_sucursales]
+        sink = generator.DatabaseSink(TestingSessionLocal)
+        for shard in generator.generar(cantidad=30, seed=5, sucursal_ids=ids, shard_size=10):
+            sink.write(shard)
+        assert db.query(models.Solicitud).count() == 30
+        assert db.query(models.Cliente).count() == 30
+        solicitud = db.query(models.Solicitud).order_by(models.Solicitud.id).first()
+        assert solicitud.cliente.email.endswith(".s5.0@email.com")
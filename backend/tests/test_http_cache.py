@@ -0,0 +1,72 @@
+"""
+Pruebas de GET condicional (ETag / If-None-Match)
+"""
+from app import crud, http_cache
+
+
+class TestHttpCache:
+    """Tests de las utilidades de ETag"""
+
+    def test_coincide(self):
+        """Test de la comparación de If-None-Match"""
+        etag = http_cache.etag("x", 1)
+        assert http_cache.coincide(etag, etag)
+        assert http_cache.coincide(f'"otro", W/{etag}', etag)
+        assert http_cache.coincide("*", etag)
+        assert not http_cache.coincide(None, etag)
+        assert not http_cache.coincide(http_cache.etag("x", 2), etag)
+
+
+class TestEndpointsCondicionales:
+    """Tests de 304 en sucursales e indicadores"""
+
+    def test_sucursales_304(self, client, test_sucursales):
+        """Test que la lista de sucursales se revalida con su ETag"""
+        response = client.get("/api/sucursales")
+        etag = response.headers["etag"]
+        assert "max-age" in response.headers["cache-control"]
+
+        response = client.get("/api/sucursales", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        # Otra paginación es otro recurso
+        assert client.get("/api/sucursales?limit=1", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_indicadores_304_sin_recalcular(self, client, test_sucursales, auth_token, monkeypatch):
+        """Test que un If-None-Match vigente no recalcula los indicadores"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.get("/api/indicadores", headers=headers)
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        def no_llamar(db):
+            raise AssertionError("No se deben recalcular los indicadores")
+        monkeypatch.setattr(crud, "get_indicadores", no_llamar)
+        response = client.get("/api/indicadores", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        # Sin If-None-Match se reutiliza el cuerpo de la misma versión
+        assert client.get("/api/indicadores", headers=headers).status_code == 200
+
+    def test_indicadores_cambian_con_nueva_solicitud(self, client, test_sucursales, auth_token):
+        """Test que una solicitud nueva cambia el ETag"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.get("/api/indicadores", headers=headers)
+        etag = response.headers["etag"]
+        assert response.json()["total_solicitudes"] == 0
+
+        client.post("/api/solicitudes", json={
+            "nombre": "Ana",
+            "apellido": "López",
+            "email": "ana.etag@test.com",
+            "fecha_nacimiento": "1985-05-20",
+            "monto_solicitado": 50000,
+            "ingreso_mensual": 25000,
+            "score_crediticio": 700,
+            "tiene_tarjeta_credito": True,
+            "plazo_meses": 24,
+            "sucursal_id": test_sucursales[0].id,
+        })
+        response = client.get("/api/indicadores", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["total_solicitudes"] == 1
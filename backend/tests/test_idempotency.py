@@ -0,0 +1,150 @@
+"""
+Pruebas unitarias para Idempotency-Key en POST /api/solicitudes
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.idempotency import (
+    DatabaseIdempotencyStore,
+    IdempotencyConflict,
+    MemoryIdempotencyStore,
+    get_idempotency_store,
+)
+from app.main import app
+
+
+def _solicitud_data(sucursal_id: int, monto: int = 100000) -> dict:
+    return {
+        "nombre": "Juan",
+        "apellido": "Pérez",
+        "email": "juan.idem@test.com",
+        "telefono": "55-1234-5678",
+        "fecha_nacimiento": "1990-01-15",
+        "monto_solicitado": monto,
+        "ingreso_mensual": 30000,
+        "score_crediticio": 720,
+        "tiene_tarjeta_credito": True,
+        "tiene_credito_automotriz": False,
+        "plazo_meses": 36,
+        "sucursal_id": sucursal_id,
+    }
+
+
+@pytest.fixture(params=["memory", "database"])
+def idempotency_store(request):
+    """Fixture que provee un almacén limpio de cada tipo"""
+    store_cls = MemoryIdempotencyStore if request.param == "memory" else DatabaseIdempotencyStore
+    store = store_cls(ttl_seconds=60, max_entries=100)
+    app.dependency_overrides[get_idempotency_store] = lambda: store
+    yield store
+    app.dependency_overrides.pop(get_idempotency_store, None)
+
+
+class TestIdempotencyEndpoint:
+    """Tests de reintentos sobre el endpoint"""
+
+    def test_reintento_reproduce_respuesta(self, client, db, test_sucursales, idempotency_store):
+        """Test que el reintento devuelve la misma respuesta sin duplicar"""
+        headers = {"Idempotency-Key": "abc-123"}
+        data = _solicitud_data(test_sucursales[0].id)
+        primera = client.post("/api/solicitudes", json=data, headers=headers)
+        segunda = client.post("/api/solicitudes", json=data, headers=headers)
+
+        assert primera.status_code == segunda.status_code == 201
+        assert segunda.json() == primera.json()
+        assert segunda.headers["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in primera.headers
+        assert db.query(models.Solicitud).count() == 1
+
+    def test_misma_clave_otro_cuerpo(self, client, test_sucursales, idempotency_store):
+        """Test que reutilizar la clave con otro contenido se rechaza"""
+        headers = {"Idempotency-Key": "abc-456"}
+        client.post("/api/solicitudes", json=_solicitud_data(test_sucursales[0].id), headers=headers)
+        response = client.post(
+            "/api/solicitudes", json=_solicitud_data(test_sucursales[0].id, monto=90000), headers=headers
+        )
+        assert response.status_code == 422
+
+    def test_error_libera_clave(self, client, test_sucursales, idempotency_store):
+        """Test que una petición fallida no deja la clave reservada"""
+        headers = {"Idempotency-Key": "abc-789"}
+        response = client.post("/api/solicitudes", json=_solicitud_data(99999), headers=headers)
+        assert response.status_code == 400
+        response = client.post("/api/solicitudes", json=_solicitud_data(99999), headers=headers)
+        assert response.status_code == 400
+
+    def test_sin_header_no_deduplica(self, client, db, test_sucursales, idempotency_store):
+        """Test que sin header cada petición crea una solicitud"""
+        data = _solicitud_data(test_sucursales[0].id)
+        client.post("/api/solicitudes", json=data)
+        client.post("/api/solicitudes", json=data)
+        assert db.query(models.Solicitud).count() == 2
+
+
+class TestMemoryIdempotencyStore:
+    """Tests del LRU en memoria"""
+
+    def test_peticion_en_curso(self):
+        """Test que un reintento concurrente recibe 409"""
+        store = MemoryIdempotencyStore(ttl_seconds=60, max_entries=10)
+        assert store.reservar(None, "k", "h") is None
+        with pytest.raises(IdempotencyConflict) as exc_info:
+            store.reservar(None, "k", "h")
+        assert exc_info.value.status_code == 409
+
+    def test_ttl_y_capacidad(self):
+        """Test de expiración por TTL y desalojo LRU"""
+        store = MemoryIdempotencyStore(ttl_seconds=0, max_entries=10)
+        store.completar(None, "k", "h", 201, b"{}")
+        assert store.buscar("k") is None
+
+        store = MemoryIdempotencyStore(ttl_seconds=60, max_entries=2)
+        for clave in ("a", "b", "c"):
+            store.completar(None, clave, "h", 201, b"{}")
+        assert store.buscar("a") is None
+        assert store.buscar("c").status_code == 201
+
+
+class TestDatabaseIdempotencyStore:
+    """Tests de reservas vencidas y purga en la tabla compartida"""
+
+    def _vencer(self, db, clave):
+        db.query(models.IdempotencyKey).filter(models.IdempotencyKey.clave == clave).update(
+            {"expira_en": datetime.utcnow() - timedelta(seconds=1)}
+        )
+        db.commit()
+
+    def test_reserva_abandonada_se_toma_al_vencer(self, db):
+        """Test que una reserva sin completar (worker caído) no bloquea los reintentos por todo el TTL"""
+        store = DatabaseIdempotencyStore(ttl_seconds=86400, max_entries=10, lease_seconds=60)
+        assert store.reservar(db, "k", "h") is None
+        fila = db.get(models.IdempotencyKey, "k")
+        assert fila.expira_en < datetime.utcnow() + timedelta(seconds=120)
+        with pytest.raises(IdempotencyConflict) as exc_info:
+            store.reservar(db, "k", "h")
+        assert exc_info.value.status_code == 409
+
+        self._vencer(db, "k")
+        assert store.reservar(db, "k", "h") is None
+        with pytest.raises(IdempotencyConflict):
+            store.reservar(db, "k", "h")
+
+    def test_completar_guarda_por_el_ttl(self, db):
+        store = DatabaseIdempotencyStore(ttl_seconds=86400, max_entries=10, lease_seconds=60)
+        store.reservar(db, "k", "h")
+        store.completar(db, "k", "h", 201, b"{}")
+        fila = db.get(models.IdempotencyKey, "k", populate_existing=True)
+        assert fila.expira_en > datetime.utcnow() + timedelta(hours=23)
+        store.memoria.eliminar("k")
+        assert store.reservar(db, "k", "h").status_code == 201
+
+    def test_purga_claves_vencidas(self, db):
+        store = DatabaseIdempotencyStore(ttl_seconds=60, max_entries=10, purga_intervalo=3600)
+        for clave in ("a", "b", "c"):
+            store.reservar(db, clave, "h")
+        self._vencer(db, "a")
+        self._vencer(db, "b")
+        assert store.purgar(db) == 2
+        assert [f.clave for f in db.query(models.IdempotencyKey)] == ["c"]
@@ -0,0 +1,113 @@
+"""
+Pruebas de la importación histórica (staging + combinación y checkpoints)
+"""
+import io
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app import importacion, models
+from tests.conftest import engine
+
+ENCABEZADO = (
+    "nombre,apellido,email,telefono,fecha_nacimiento,monto_solicitado,ingreso_mensual,score_crediticio,"
+    "tiene_tarjeta_credito,tiene_credito_automotriz,plazo_meses,sucursal_id,estado,motivo_rechazo,fecha_solicitud\n"
+)
+
+
+def _csv(filas, sucursal_id) -> str:
+    """filas: lista de (email, estado, fecha_solicitud)"""
+    return ENCABEZADO + "".join(
+        f"Ana,García,{email},,1990-01-15,100000,30000,700,true,,36,{sucursal_id},{estado},"
+        f"{'' if estado == 'aprobado' else 'Score bajo'},{fecha}\n"
+        for email, estado, fecha in filas
+    )
+
+
+def _importar(texto, nombre="hist", lote=2, sucursales=None, errores=None):
+    destino = importacion.Destino(engine, nombre)
+    try:
+        return importacion.importar(io.StringIO(texto), nombre, [destino], sucursales=sucursales,
+                                    lote=lote, errores=errores)
+    finally:
+        destino.cerrar()
+
+
+@pytest.fixture
+def cliente_existente(db):
+    cliente = models.Cliente(nombre="Ana", apellido="García", email="existente@test.com",
+                             fecha_nacimiento=datetime(1990, 1, 15).date(), edad=35)
+    db.add(cliente)
+    db.commit()
+    return cliente
+
+
+class TestImportacion:
+    """Deduplicación de clientes, combinación y reporte de errores"""
+
+    def test_deduplica_clientes_por_email(self, db, test_sucursales, cliente_existente):
+        """Test que los emails repetidos o ya existentes no crean clientes nuevos"""
+        sucursal = test_sucursales[0].id
+        texto = _csv([
+            ("nuevo@test.com", "aprobado", "2019-03-01T10:00:00"),
+            ("existente@test.com", "rechazado", "2019-03-02T10:00:00"),
+            ("nuevo@test.com", "aprobado", "2019-03-03T10:00:00"),
+            ("otro@test.com", "aprobado", ""),
+        ], sucursal) + "Luis,Pérez,no-es-email,,1990-01-15,100000,30000,900,true,,36,1,pendiente,,\n"
+        errores = io.StringIO()
+        totales = _importar(texto, sucursales={s.id for s in test_sucursales}, errores=errores)
+
+        assert (totales["filas"], totales["clientes_nuevos"], totales["invalidas"]) == (4, 2, 1)
+        assert db.query(models.Cliente).count() == 3
+        solicitudes = db.query(models.Solicitud).order_by(models.Solicitud.id).all()
+        assert [s.cliente.email for s in solicitudes] == [
+            "nuevo@test.com", "existente@test.com", "nuevo@test.com", "otro@test.com"
+        ]
+        assert solicitudes[1].cliente_id == cliente_existente.id
+        assert solicitudes[1].motivo_rechazo == "Score bajo"
+        assert solicitudes[0].fecha_solicitud.replace(tzinfo=None) == datetime(2019, 3, 1, 10)
+        # Sin fecha de origen se usa la de la importación
+        assert solicitudes[3].fecha_solicitud.year >= 2025
+
+        error = json.loads(errores.getvalue())
+        assert error["linea"] == 6
+        assert {e["campo"] for e in error["errores"]} == {"email", "score_crediticio", "estado"}
+
+    def test_reanuda_desde_el_checkpoint(self, db, test_sucursales, monkeypatch):
+        """Test que un lote fallido no deja filas y la segunda ejecución continúa sin duplicar"""
+        texto = _csv([(f"c{i}@test.com", "aprobado", "2020-01-01T00:00:00") for i in range(5)], test_sucursales[0].id)
+        cargar = importacion.Destino.cargar
+        llamadas = []
+
+        def fallar_en_el_segundo(self, solicitudes, hasta_linea):
+            llamadas.append(hasta_linea)
+            if len(llamadas) == 2:
+                # Dentro de la transacción, después de cargar las tablas temporales
+                self._avanzar = lambda *args: (_ for _ in ()).throw(RuntimeError("corte"))
+            return cargar(self, solicitudes, hasta_linea)
+
+        monkeypatch.setattr(importacion.Destino, "cargar", fallar_en_el_segundo)
+        with pytest.raises(RuntimeError):
+            _importar(texto)
+        monkeypatch.undo()
+        assert db.query(models.Solicitud).count() == 2
+        assert db.get(models.Importacion, "hist").linea == 3
+
+        totales = _importar(texto)
+        assert totales["filas"] == 3
+        assert db.query(models.Solicitud).count() == 5
+        assert db.query(models.Cliente).count() == 5
+        db.expire_all()
+        checkpoint = db.get(models.Importacion, "hist")
+        assert (checkpoint.linea, checkpoint.filas, checkpoint.clientes_nuevos) == (6, 5, 5)
+
+        # Repetir una importación terminada no inserta nada
+        assert _importar(texto)["filas"] == 0
+
+    def test_tablas_temporales_en_postgresql(self):
+        ddl = str(CreateTable(importacion.STAGING_SOLICITUDES).compile(dialect=postgresql.dialect()))
+        assert ddl.startswith("\nCREATE TEMPORARY TABLE importacion_solicitudes")
+        assert "ON COMMIT DROP" in ddl
@@ -0,0 +1,111 @@
+"""
+Pruebas de los índices declarados en los modelos
+
+Los planes se verifican con EXPLAIN QUERY PLAN de SQLite; la forma exacta de
+los índices de PostgreSQL (INCLUDE, GIN) se verifica sobre el DDL compilado.
+"""
+import re
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from app import busqueda, migraciones, models
+from app.database import Base, asegurar_indices
+
+INIT_SQL = Path(__file__).resolve().parents[2] / "database" / "init.sql"
+
+
+def _plan(db, consulta) -> str:
+    compilada = consulta.statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    filas = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compilada}").all()
+    return "\n".join(fila[-1] for fila in filas)
+
+
+class TestPlanes:
+    """Las consultas frecuentes usan los índices compuestos"""
+
+    def test_conteo_por_sucursal_y_estado(self, db):
+        consulta = db.query(func.count(models.Solicitud.id)).filter(
+            models.Solicitud.sucursal_id == 1, models.Solicitud.estado == "aprobado"
+        )
+        assert "USING COVERING INDEX idx_solicitudes_sucursal_estado (sucursal_id=? AND estado=?)" in _plan(db, consulta)
+
+    def test_recientes_sin_ordenar(self, db):
+        """Test que el índice entrega el orden y no se ordena en memoria"""
+        consulta = db.query(models.Solicitud).order_by(
+            models.Solicitud.fecha_solicitud.desc(), models.Solicitud.id.desc()
+        ).limit(50)
+        plan = _plan(db, consulta)
+        assert "idx_solicitudes_fecha_id" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_solicitudes_de_cliente(self, db):
+        consulta = db.query(models.Solicitud).filter(models.Solicitud.cliente_id == 1)
+        assert "USING INDEX idx_solicitudes_cliente (cliente_id=?)" in _plan(db, consulta)
+
+
+class TestDefiniciones:
+    """Los modelos, init.sql y las bases existentes coinciden"""
+
+    def test_ddl_postgresql(self):
+        indices = {i.name: i for i in models.Solicitud.__table__.indexes}
+        ddl = str(CreateIndex(indices["idx_solicitudes_sucursal_estado"]).compile(dialect=postgresql.dialect()))
+        assert ddl.endswith("(sucursal_id, estado) INCLUDE (monto_solicitado)")
+        ddl = str(CreateIndex(indices["idx_solicitudes_fecha_id"]).compile(dialect=postgresql.dialect()))
+        assert ddl.endswith("(fecha_solicitud DESC, id DESC)")
+
+    def test_init_sql_declara_los_mismos_indices(self):
+        """Test que cada índice de los modelos está en init.sql con el mismo nombre"""
+        en_sql = set(re.findall(r"CREATE INDEX IF NOT EXISTS (\w+)", INIT_SQL.read_text(encoding="utf-8")))
+        en_modelos = {i.name for tabla in Base.metadata.sorted_tables for i in tabla.indexes}
+        assert en_modelos <= en_sql
+
+    def test_asegurar_indices_en_base_existente(self, tmp_path):
+        """Test que se crean los índices faltantes y se eliminan los obsoletos"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'existente.db'}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX idx_solicitudes_fecha_id")
+            conn.exec_driver_sql("CREATE INDEX idx_solicitudes_estado ON solicitudes(estado)")
+
+        assert asegurar_indices(engine) == ["idx_solicitudes_fecha_id"]
+        nombres = {i["name"] for i in inspect(engine).get_indexes("solicitudes")}
+        assert "idx_solicitudes_fecha_id" in nombres and "idx_solicitudes_estado" not in nombres
+        # Los índices GIN son solo para PostgreSQL
+        assert not any(i["name"].endswith("_trgm") for i in inspect(engine).get_indexes("clientes"))
+        assert asegurar_indices(engine) == []
+        engine.dispose()
+
+    def test_migrar_base_existente(self, tmp_path):
+        """Test que la migración crea tablas e índices faltantes y puede repetirse"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'existente.db'}")
+        models.Solicitud.__table__.create(bind=engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX idx_solicitudes_cliente")
+
+        assert migraciones.migrar(engine) == ["idx_solicitudes_cliente"]
+        assert "clientes" in inspect(engine).get_table_names()
+        assert migraciones.migrar(engine) == []
+        engine.dispose()
+
+    def test_migrar_crea_indice_de_busqueda(self, tmp_path):
+        """Test que la migración crea la tabla FTS5 en una base anterior a la búsqueda"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'existente.db'}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO clientes (nombre, apellido, email, fecha_nacimiento, edad) "
+                "VALUES ('María', 'González', 'maria@test.com', '1990-01-01', 35)"
+            )
+            conn.exec_driver_sql("DROP TABLE clientes_fts")
+            for trigger in ("ai", "ad", "au"):
+                conn.exec_driver_sql(f"DROP TRIGGER clientes_fts_{trigger}")
+
+        migraciones.migrar(engine)
+        with Session(engine) as db:
+            assert [r["email"] for r in busqueda.buscar_clientes(db, "gonz")["resultados"]] == ["maria@test.com"]
+        assert busqueda.asegurar_fts(engine) is False
+        engine.dispose()
@@ -0,0 +1,104 @@
+"""
+Pruebas unitarias para los trabajos de simulación en segundo plano
+"""
+import pytest
+from datetime import datetime, timedelta
+
+from app import models
+from app.jobs import SimulacionJobManager, get_job_manager
+from app.main import app
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(scope="function")
+def job_manager(db):
+    """Fixture que provee un administrador de trabajos sobre la BD de pruebas"""
+    manager = SimulacionJobManager(TestingSessionLocal, max_workers=1, chunk_size=7)
+    app.dependency_overrides[get_job_manager] = lambda: manager
+    yield manager
+    manager.shutdown()
+    app.dependency_overrides.pop(get_job_manager, None)
+
+
+class TestSimulacionJobs:
+    """Tests para el ciclo de vida de los trabajos de simulación"""
+
+    def test_crear_y_completar_trabajo(self, client, auth_token, test_sucursales, job_manager, db):
+        """Test de un trabajo que se completa en varios lotes"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.post("/api/simulaciones", json={"cantidad": 20}, headers=headers)
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+
+        job_manager.esperar(job_id, timeout=30)
+
+        response = client.get(f"/api/simulaciones/{job_id}", headers=headers)
+        data = response.json()
+        assert data["estado"] == "completado"
+        assert data["procesadas"] == 20
+        assert data["progreso"] == 100.0
+        assert data["aprobadas"] + data["rechazadas"] == 20
+        db.expire_all()
+        assert db.query(models.Solicitud).count() == 20
+
+    def test_limite_por_trabajo(self, client, auth_token, job_manager):
+        """Test que la cantidad ya no está limitada a 1000 pero sí acotada"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.post("/api/simulaciones", json={"cantidad": 20_000_000}, headers=headers)
+        assert response.status_code == 422
+
+    def test_sin_sucursales(self, client, auth_token, job_manager):
+        """Test de error cuando no hay sucursales"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.post("/api/simulaciones", json={"cantidad": 5}, headers=headers)
+        assert response.status_code == 400
+
+    def test_cancelar_trabajo(self, client, auth_token, test_sucursales, job_manager, db):
+        """Test de cancelación: el trabajo se detiene antes del siguiente lote"""
+        job = models.SimulacionJob(cantidad=50, procesadas=0, aprobadas=0, rechazadas=0,
+                                   estado="pendiente", cancelar=False)
+        db.add(job)
+        db.commit()
+
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.delete(f"/api/simulaciones/{job.id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["estado"] == "cancelado"
+
+        job_manager.start()
+        db.expire_all()
+        assert db.get(models.SimulacionJob, job.id).procesadas == 0
+        assert db.query(models.Solicitud).count() == 0
+
+    def test_reanudar_trabajo_huerfano(self, test_sucursales, job_manager, db):
+        """Test que un trabajo huérfano se reanuda desde el último lote confirmado"""
+        job = models.SimulacionJob(
+            cantidad=25, procesadas=10, aprobadas=4, rechazadas=6,
+            estado="en_proceso", cancelar=False, propietario="worker-caido",
+            heartbeat=datetime.utcnow() - timedelta(hours=1),
+        )
+        db.add(job)
+        db.commit()
+
+        job_manager.start()
+        job_manager.esperar(job.id, timeout=30)
+
+        db.expire_all()
+        job = db.get(models.SimulacionJob, job.id)
+        assert job.estado == "completado"
+        assert job.procesadas == 25
+        assert job.aprobadas + job.rechazadas == 25
+        assert db.query(models.Solicitud).count() == 15
+
+    def test_no_toma_trabajo_con_dueno_activo(self, test_sucursales, job_manager, db):
+        """Test que no se reanuda un trabajo cuyo dueño sigue latiendo"""
+        job = models.SimulacionJob(
+            cantidad=10, procesadas=0, aprobadas=0, rechazadas=0,
+            estado="en_proceso", cancelar=False, propietario="otro-worker",
+            heartbeat=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+
+        job_manager.start()
+        assert job.id not in job_manager._futures
@@ -0,0 +1,152 @@
+"""
+Pruebas para la exportación incremental a Parquet
+"""
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from app import parquet_export  # noqa: E402
+from app.models import Cliente, Solicitud  # noqa: E402
+
+from .conftest import engine  # noqa: E402
+
+
+def _agregar_solicitudes(db, sucursal, fechas):
+    cliente = Cliente(
+        nombre="Ana", apellido="Pérez", email=f"ana{len(fechas)}-{fechas[0]:%Y%m}@test.com",
+        fecha_nacimiento=date(1990, 1, 1), edad=35,
+    )
+    db.add(cliente)
+    db.flush()
+    for i, fecha in enumerate(fechas):
+        db.add(Solicitud(
+            cliente_id=cliente.id, sucursal_id=sucursal.id,
+            monto_solicitado=Decimal("50000.25") + i, ingreso_mensual=Decimal("25000.00"),
+            score_crediticio=700, tiene_tarjeta_credito=True, tiene_credito_automotriz=False,
+            plazo_meses=24, estado="aprobado", fecha_solicitud=fecha,
+        ))
+    db.commit()
+
+
+def _leer(destino):
+    return ds.dataset(destino, format="parquet", partitioning="hive").to_table().sort_by("id")
+
+
+class TestExportacion:
+    """Tests de exportar() contra la base de pruebas"""
+
+    def test_incremental_por_marca(self, db, test_sucursales, tmp_path):
+        """Test que la segunda ejecución solo agrega las filas nuevas"""
+        destino = str(tmp_path / "solicitudes")
+        _agregar_solicitudes(db, test_sucursales[0], [datetime(2025, 1, 10), datetime(2025, 2, 3)])
+
+        primero = parquet_export.exportar(engine, destino, lote=1, retraso=0)
+        assert primero["filas"] == 2 and primero["archivos"] == 2
+        assert sorted(os.listdir(destino)) == ["_watermark.json", "anio_mes=2025-01", "anio_mes=2025-02"]
+
+        _agregar_solicitudes(db, test_sucursales[1], [datetime(2025, 2, 20), datetime(2025, 3, 1)])
+        segundo = parquet_export.exportar(engine, destino, retraso=0)
+        assert segundo["filas"] == 2
+        assert segundo["marca"] == parquet_export.leer_marca(destino) == 4
+
+        tabla = _leer(destino)
+        assert tabla.column("id").to_pylist() == [1, 2, 3, 4]
+        assert tabla.column("anio_mes").to_pylist() == ["2025-01", "2025-02", "2025-02", "2025-03"]
+        # Sin cambios: no se escribe nada
+        assert parquet_export.exportar(engine, destino, retraso=0)["filas"] == 0
+
+    def test_tipos_y_lectura_memory_map(self, db, test_sucursales, tmp_path):
+        """Test que los montos son decimales y los archivos se leen con memory map"""
+        destino = str(tmp_path / "solicitudes")
+        _agregar_solicitudes(db, test_sucursales[0], [datetime(2025, 5, 5)])
+        parquet_export.exportar(engine, destino, retraso=0)
+
+        carpeta = os.path.join(destino, "anio_mes=2025-05")
+        (archivo,) = os.listdir(carpeta)
+        assert archivo == "part-000000000001-000000000001.parquet"
+        tabla = pq.read_table(os.path.join(carpeta, archivo), memory_map=True)
+        assert tabla.schema.field("monto_solicitado").type == pa.decimal128(15, 2)
+        assert tabla.column("monto_solicitado").to_pylist() == [Decimal("50000.25")]
+        assert pq.ParquetFile(os.path.join(carpeta, archivo)).metadata.row_group(0).column(0).compression == "ZSTD"
+
+    def test_retraso_excluye_recientes(self, db, test_sucursales, tmp_path):
+        """Test que las filas más recientes que el margen esperan a la siguiente ejecución"""
+        destino = str(tmp_path / "solicitudes")
+        _agregar_solicitudes(db, test_sucursales[0], [datetime(2025, 1, 10), datetime.utcnow()])
+        resultado = parquet_export.exportar(engine, destino, retraso=3600)
+        assert resultado["filas"] == 1 and resultado["marca"] == 1
+
+    def test_limpia_ejecucion_interrumpida(self, db, test_sucursales, tmp_path):
+        """Test que los archivos posteriores a la marca se descartan y se reescriben"""
+        destino = str(tmp_path / "solicitudes")
+        _agregar_solicitudes(db, test_sucursales[0], [datetime(2025, 1, 10), datetime(2025, 1, 11)])
+        parquet_export.exportar(engine, destino, lote=1, retraso=0)
+        # Simular una ejecución que escribió el segundo archivo pero no avanzó la marca
+        parquet_export._guardar_marca(destino, 1)
+
+        assert parquet_export.exportar(engine, destino, retraso=0)["filas"] == 1
+        assert _leer(destino).column("id").to_pylist() == [1, 2]
+
+
+class TestHuecos:
+    """Ids menores que se confirman después de exportar uno mayor"""
+
+    def _con_ids(self, db, sucursal, ids):
+        cliente = Cliente(nombre="Ana", apellido="Pérez", email=f"ana-{ids[0]}@test.com",
+                          fecha_nacimiento=date(1990, 1, 1), edad=35)
+        db.add(cliente)
+        db.flush()
+        for id_ in ids:
+            db.add(Solicitud(
+                id=id_, cliente_id=cliente.id, sucursal_id=sucursal.id,
+                monto_solicitado=Decimal("50000.00"), ingreso_mensual=Decimal("25000.00"),
+                score_crediticio=700, tiene_tarjeta_credito=True, tiene_credito_automotriz=False,
+                plazo_meses=24, estado="aprobado", fecha_solicitud=datetime(2025, 1, id_),
+            ))
+        db.commit()
+
+    def test_id_menor_confirmado_despues(self, db, test_sucursales, tmp_path):
+        """Test que un id por debajo de la marca, confirmado tarde, también se exporta"""
+        destino = str(tmp_path / "solicitudes")
+        self._con_ids(db, test_sucursales[0], [1, 2, 4])
+        primero = parquet_export.exportar(engine, destino, retraso=0)
+        assert (primero["marca"], primero["huecos"]) == (4, 1)
+        assert parquet_export.leer_estado(destino)["huecos"][0][:2] == [3, 3]
+        # No se archiva lo que aún puede llegar al hueco
+        assert parquet_export.limite_archivo(destino) == 2
+
+        self._con_ids(db, test_sucursales[0], [3])
+        segundo = parquet_export.exportar(engine, destino, retraso=0)
+        assert (segundo["filas"], segundo["marca"], segundo["huecos"]) == (1, 4, 0)
+        assert _leer(destino).column("id").to_pylist() == [1, 2, 3, 4]
+        assert parquet_export.limite_archivo(destino) == 4
+        # Ya no se vuelve a exportar
+        assert parquet_export.exportar(engine, destino, retraso=0)["filas"] == 0
+        assert _leer(destino).column("id").to_pylist() == [1, 2, 3, 4]
+
+    def test_huecos_vencidos_se_descartan(self, db, test_sucursales, tmp_path):
+        destino = str(tmp_path / "solicitudes")
+        self._con_ids(db, test_sucursales[0], [1, 5])
+        assert parquet_export.exportar(engine, destino, retraso=0)["huecos"] == 1
+        assert parquet_export.exportar(engine, destino, retraso=0, retencion_huecos=0)["huecos"] == 0
+        assert parquet_export.limite_archivo(destino) == 5
+
+    def test_limpia_huecos_de_ejecucion_interrumpida(self, db, test_sucursales, tmp_path):
+        """Test que un archivo de huecos sin marca guardada se descarta y se reescribe"""
+        destino = str(tmp_path / "solicitudes")
+        self._con_ids(db, test_sucursales[0], [1, 3])
+        parquet_export.exportar(engine, destino, retraso=0)
+        estado = parquet_export.leer_estado(destino)
+        self._con_ids(db, test_sucursales[0], [2])
+        parquet_export.exportar(engine, destino, retraso=0)
+        # Simular que la ejecución escribió el archivo del hueco pero no la marca
+        parquet_export._guardar_marca(destino, estado["ultimo_id"], estado["huecos"], estado["ejecucion"])
+
+        assert parquet_export.exportar(engine, destino, retraso=0)["filas"] == 1
+        assert _leer(destino).column("id").to_pylist() == [1, 2, 3]
@@ -0,0 +1,94 @@
+"""
+Pruebas para la precalificación sin base de datos
+"""
+import pytest
+
+from app import models, precalificacion, rules
+from app.database import get_db, get_read_db
+from app.main import app
+
+
+def _datos(**cambios) -> dict:
+    datos = {
+        "fecha_nacimiento": "1985-05-20",
+        "monto_solicitado": 50000,
+        "ingreso_mensual": 25000,
+        "score_crediticio": 700,
+        "tiene_tarjeta_credito": True,
+        "plazo_meses": 24,
+    }
+    datos.update(cambios)
+    return datos
+
+
+@pytest.fixture
+def sin_bd(client):
+    """Falla si algún endpoint pide una sesión de base de datos"""
+    def prohibido():
+        raise AssertionError("La precalificación no debe usar la base de datos")
+    app.dependency_overrides[get_db] = prohibido
+    app.dependency_overrides[get_read_db] = prohibido
+    precalificacion.limpiar_cache()
+    yield client
+    precalificacion.limpiar_cache()
+
+
+class TestPrecalificacion:
+    """Tests de POST y GET /api/precalificar"""
+
+    def test_aprobada_sin_sesion(self, sin_bd, db):
+        """Test que se evalúa y calcula la cuota sin registrar nada"""
+        response = sin_bd.post("/api/precalificar", json=_datos())
+        assert response.status_code == 200
+        data = response.json()
+        assert data["aprobado"] is True
+        assert data["cuota_mensual"] is not None
+        assert data["version_reglas"]
+        assert db.query(models.Solicitud).count() == 0
+        assert db.query(models.Cliente).count() == 0
+
+    def test_rechazada_con_contraoferta(self, sin_bd):
+        """Test que un rechazo incluye motivo y contraoferta"""
+        data = sin_bd.post("/api/precalificar", json=_datos(monto_solicitado=400000, plazo_meses=12)).json()
+        assert data["aprobado"] is False
+        assert "excede" in data["motivo_rechazo"]
+        assert data["contraoferta"]["opciones"]
+
+    def test_cache_entradas_normalizadas(self, sin_bd):
+        """Test que entradas equivalentes comparten la respuesta en caché"""
+        r1 = sin_bd.post("/api/precalificar", json=_datos(monto_solicitado=50000))
+        r2 = sin_bd.post("/api/precalificar", json=_datos(monto_solicitado="50000.00"))
+        assert r1.content == r2.content
+        assert r1.headers["etag"] == r2.headers["etag"]
+        assert precalificacion._precalificar.cache_info().hits == 1
+
+    def test_get_sin_cache_compartida_y_304(self, sin_bd):
+        """Test que el GET no se guarda en proxies y responde 304 con If-None-Match"""
+        response = sin_bd.get("/api/precalificar", params=_datos())
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "private, no-store"
+        assert response.json()["aprobado"] is True
+
+        response = sin_bd.get("/api/precalificar", params=_datos(),
+                              headers={"If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_get_datos_invalidos(self, sin_bd):
+        """Test de validación en la variante GET"""
+        response = sin_bd.get("/api/precalificar", params=_datos(score_crediticio=900))
+        assert response.status_code == 422
+
+    def test_no_cuenta_en_las_reglas(self, sin_bd):
+        """Test que precalificar no cambia las estadísticas de /api/reglas"""
+        antes = rules.evaluador_actual().estadisticas()
+        sin_bd.post("/api/precalificar", json=_datos())
+        sin_bd.post("/api/precalificar", json=_datos(monto_solicitado=400000, plazo_meses=12))
+        assert rules.evaluador_actual().estadisticas() == antes
+
+    def test_misma_decision_que_evaluar(self):
+        evaluador = rules.evaluador_actual()
+        for score in (500, 650, 720, 800):
+            for monto in (10000, 200000, 900000):
+                args = (35, monto, 25000, score, score > 600, False, 24)
+                assert evaluador.evaluar_sin_contar(*args) == evaluador.evaluar(*args)
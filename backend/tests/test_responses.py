@@ -0,0 +1,52 @@
+"""
+Pruebas unitarias para la serialización JSON con orjson
+"""
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from app import schemas
+from app.responses import FastJSONResponse
+
+
+def _solicitud_response(i: int = 1) -> schemas.SolicitudResponse:
+    return schemas.SolicitudResponse(
+        id=i,
+        cliente_id=i,
+        sucursal_id=1,
+        monto_solicitado=Decimal("100000.00"),
+        ingreso_mensual=Decimal("30000.50"),
+        score_crediticio=720,
+        plazo_meses=36,
+        estado="aprobado",
+        motivo_rechazo=None,
+        fecha_solicitud=datetime(2025, 1, 15, 10, 30, tzinfo=timezone.utc),
+        cuota_mensual=Decimal("3321.43"),
+    )
+
+
+class TestFastJSONResponse:
+    """Tests para FastJSONResponse"""
+
+    def test_mismo_json_que_pydantic(self):
+        """Test que la salida coincide con el modo JSON de Pydantic"""
+        modelo = _solicitud_response()
+        body = FastJSONResponse(modelo).body
+        assert json.loads(body) == json.loads(modelo.model_dump_json())
+
+    def test_decimal_y_datetime(self):
+        """Test de codificación de Decimal (cadena exacta) y datetime UTC"""
+        data = json.loads(FastJSONResponse(_solicitud_response()).body)
+        assert data["ingreso_mensual"] == "30000.50"
+        assert data["fecha_solicitud"] == "2025-01-15T10:30:00Z"
+
+    def test_lista_anidada(self):
+        """Test de una simulación con lista de modelos anidados"""
+        simulacion = schemas.SimulacionResponse(
+            total_generadas=3,
+            aprobadas=3,
+            rechazadas=0,
+            solicitudes=[_solicitud_response(i) for i in range(3)],
+        )
+        data = json.loads(FastJSONResponse(simulacion).body)
+        assert data == json.loads(simulacion.model_dump_json())
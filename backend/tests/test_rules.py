@@ -0,0 +1,130 @@
+"""
+Pruebas unitarias para la tabla de reglas de crédito
+"""
+import json
+import random
+from decimal import Decimal
+
+import pytest
+
+from app import rules
+
+
+def _evaluar_referencia(edad, monto, ingreso, score, tarjeta, automotriz, plazo):
+    """Política original escrita como condicionales, para comparar"""
+    if edad < 18:
+        return False, "Edad inferior al mínimo requerido (18 años)"
+    if edad > 70:
+        return False, "Edad superior al máximo permitido (70 años)"
+    if score < 600:
+        return False, "Score crediticio insuficiente"
+    monto_maximo = ingreso * 10
+    if monto > monto_maximo:
+        return False, f"Monto solicitado excede el máximo permitido (10x ingreso mensual: ${monto_maximo:,.2f})"
+    porcentaje = (monto / plazo / ingreso) * 100
+    if porcentaje > 40:
+        return False, f"Cuota mensual excede el 40% del ingreso ({porcentaje:.1f}%). Considere un plazo mayor o menor monto."
+    if tarjeta or automotriz:
+        if score >= 650:
+            return True, None
+        if porcentaje > 35:
+            return False, f"Para su perfil crediticio, la cuota mensual no debe exceder el 35% del ingreso ({porcentaje:.1f}%)"
+        return True, None
+    if score < 650:
+        return False, "Para clientes sin historial crediticio se requiere score mínimo de 650"
+    if porcentaje > 30:
+        return False, f"Para clientes sin historial crediticio, la cuota no debe exceder el 30% del ingreso ({porcentaje:.1f}%)"
+    if monto > ingreso * 5:
+        return False, "Para clientes sin historial crediticio, el monto máximo es 5x el ingreso mensual"
+    return True, None
+
+
+def _escribir_tabla(path, reglas, version="test"):
+    path.write_text(json.dumps({"version": version, "reglas": reglas}), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def restaurar_reglas():
+    """Restaurar la tabla por defecto al terminar"""
+    yield
+    rules.recargar(rules.REGLAS_PATH_DEFAULT)
+
+
+class TestTablaPorDefecto:
+    """Tests de equivalencia con la política original"""
+
+    def test_equivalencia_aleatoria(self):
+        """Test que la tabla compilada decide igual que los condicionales originales"""
+        evaluador = rules.compilar(rules.cargar_tabla(rules.REGLAS_PATH_DEFAULT))
+        rng = random.Random(7)
+        for _ in range(5000):
+            args = (
+                rng.randint(15, 80),
+                Decimal(rng.randrange(1000, 600000, 100)),
+                Decimal(rng.randrange(5000, 80000, 500)),
+                rng.randint(300, 850),
+                rng.random() < 0.5,
+                rng.random() < 0.3,
+                rng.choice([6, 12, 24, 36, 48, 60]),
+            )
+            assert evaluador.evaluar(*args) == _evaluar_referencia(*args)
+
+    def test_contadores(self):
+        """Test que se cuentan evaluaciones y decisiones por regla"""
+        evaluador = rules.compilar(rules.cargar_tabla(rules.REGLAS_PATH_DEFAULT))
+        evaluador.evaluar(16, Decimal(1000), Decimal(20000), 700, True, False, 12)
+        evaluador.evaluar(30, Decimal(1000), Decimal(20000), 700, True, False, 12)
+        stats = {r["id"]: r for r in evaluador.estadisticas()["reglas"]}
+        assert stats["edad_minima"] == {**stats["edad_minima"], "evaluaciones": 2, "decisiones": 1}
+        assert stats["historial_score_alto"]["decisiones"] == 1
+        # Las reglas de clientes sin historial no aplicaron
+        assert stats["sin_historial_score"]["evaluaciones"] == 0
+        assert evaluador.estadisticas()["evaluaciones"] == 2
+
+    def test_simulacion_cuenta_una_vez(self, client, test_sucursales, restaurar_reglas):
+        """Test que cada solicitud simulada suma una sola evaluación a los contadores"""
+        rules.recargar(rules.REGLAS_PATH_DEFAULT)
+        response = client.post("/api/solicitudes/simular", json={"cantidad": 25, "detalle": "none"})
+        assert response.json()["total_generadas"] == 25
+        stats = rules.evaluador_actual().estadisticas()
+        assert stats["evaluaciones"] == 25
+        assert sum(r["decisiones"] for r in stats["reglas"]) + stats["aprobadas_por_defecto"] == 25
+
+
+class TestRecarga:
+    """Tests de validación y recarga de la tabla"""
+
+    def test_recargar_cambia_umbral(self, tmp_path, restaurar_reglas):
+        """Test que un umbral nuevo se aplica tras recargar"""
+        path = _escribir_tabla(tmp_path / "reglas.json", [
+            {"id": "edad", "tipo": "edad_min", "valor": 21, "mensaje": "Menor de {valor}"},
+        ], version="v2")
+        rules.recargar(path)
+        assert rules.evaluador_actual().version == "v2"
+        assert rules.evaluador_actual().evaluar(19, Decimal(1), Decimal(1), 300, False, False, 12) == (False, "Menor de 21")
+
+    @pytest.mark.parametrize("reglas", [
+        [{"id": "a", "tipo": "score_min", "mensaje": "sin valor"}],
+        [{"id": "a", "tipo": "edad_min", "valor": 18, "mensaje": "{porcentaje_ingreso}"}],
+        [{"id": "a", "tipo": "aprobar"}, {"id": "a", "tipo": "aprobar"}],
+        [{"id": "a", "tipo": "desconocido", "valor": 1, "mensaje": "x"}],
+    ])
+    def test_tabla_invalida_no_reemplaza(self, tmp_path, reglas, restaurar_reglas):
+        """Test que una tabla inválida se rechaza y se mantiene la activa"""
+        activa = rules.evaluador_actual()
+        path = _escribir_tabla(tmp_path / "reglas.json", reglas)
+        with pytest.raises(ValueError):
+            rules.recargar(path)
+        assert rules.evaluador_actual() is activa
+
+    def test_endpoints_admin(self, client, auth_token):
+        """Test de consulta y recarga de reglas por la API"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        assert client.get("/api/reglas").status_code == 403
+
+        response = client.post("/api/reglas/recargar", headers=headers)
+        assert response.status_code == 200
+        data = client.get("/api/reglas", headers=headers).json()
+        assert data["version"] == response.json()["version"]
+        assert [r["id"] for r in data["reglas"]][:2] == ["edad_minima", "edad_maxima"]
@@ -0,0 +1,118 @@
+"""
+Pruebas unitarias para los esquemas de validación
+"""
+from datetime import date
+
+import pytest
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from pydantic.networks import validate_email
+
+from app import schemas
+
+EMAILS = [
+    "juan.perez@email.com",
+    "Juan.Perez@Email.COM",
+    "a+etiqueta@sub.Example.org",
+    "x_y%z@dominio-con-guion.mx",
+    "José@ejemplo.com",
+    "Juan <juan@email.com>",
+    "x@localhost",
+    "x@foo.test",
+    "x@algo.local",
+    "a..b@x.com",
+    ".a@x.com",
+    "a@-x.com",
+    "a@b.c1",
+    "sin-arroba",
+    "a" * 65 + "@x.com",
+    "a@xn--abc.com",
+    "a@ab--c.com",
+    "a@xn--a.com",
+    "a@xn--bcher-kva.com",
+    "a@a--b.com",
+]
+# Etiquetas de dominio para comparar contra EmailStr en combinación
+ETIQUETAS = ["ab", "a-b", "a--b", "ab--c", "xn--abc", "xn--a", "xn--bcher-kva", "XN--BCHER-KVA", "-a", "a-"]
+TLDS = ["com", "mx", "c1", "xn--p1ai"]
+
+
+class TestEmail:
+    """Tests del camino rápido de validación de email"""
+
+    @pytest.mark.parametrize("email", EMAILS)
+    def test_equivalente_a_email_validator(self, email):
+        """Test que se acepta, normaliza y rechaza igual que EmailStr"""
+        try:
+            esperado = validate_email(email)[1]
+        except Exception:
+            esperado = None
+        try:
+            obtenido = schemas._validar_email(email)
+        except Exception:
+            obtenido = None
+        assert obtenido == esperado
+
+    def test_paridad_con_emailstr_en_dominios_con_guiones(self):
+        """Test que etiquetas con guiones y punycode dan el mismo resultado que EmailStr"""
+        adaptador = TypeAdapter(EmailStr)
+        for etiqueta in ETIQUETAS:
+            for tld in TLDS:
+                email = f"ana@{etiqueta}.{tld}"
+                try:
+                    esperado = adaptador.validate_python(email)
+                except ValidationError:
+                    esperado = None
+                try:
+                    obtenido = schemas._validar_email(email)
+                except Exception:
+                    obtenido = None
+                assert obtenido == esperado, email
+
+
+class TestEdad:
+    """Tests del cálculo de edad"""
+
+    def test_edad_se_calcula_una_vez(self, monkeypatch):
+        """Test que la edad se calcula una sola vez por solicitud"""
+        solicitud = schemas.PrecalificacionRequest(
+            monto_solicitado=1000, ingreso_mensual=1000, score_crediticio=700,
+            plazo_meses=12, fecha_nacimiento="1985-05-20",
+        )
+        llamadas = []
+        original = schemas.calcular_edad
+        monkeypatch.setattr(schemas, "calcular_edad", lambda f: llamadas.append(f) or original(f))
+        assert solicitud.edad == solicitud.edad
+        assert len(llamadas) == 1
+
+    def test_hoy_cambia_de_dia(self, monkeypatch):
+        """Test que la fecha en caché se renueva al pasar la medianoche"""
+        monkeypatch.setattr(schemas, "_hoy", date(2000, 1, 1))
+        monkeypatch.setattr(schemas, "_hoy_hasta", float("inf"))
+        assert schemas.hoy() == date(2000, 1, 1)
+        monkeypatch.setattr(schemas, "_hoy_hasta", 0.0)
+        assert schemas.hoy() == date.today()
+
+    def test_edad_incoherente(self):
+        """Test del validador de coherencia entre edad y fecha de nacimiento"""
+        with pytest.raises(ValidationError):
+            schemas.ClienteCreate(
+                nombre="Ana", apellido="López", email="ana@email.com",
+                fecha_nacimiento="1985-05-20", edad=20,
+            )
+
+
+class TestAdapters:
+    """Tests de validación de listas"""
+
+    def test_lista_de_solicitudes(self):
+        """Test que el adaptador valida y reporta el índice del elemento inválido"""
+        datos = {
+            "nombre": "Ana", "apellido": "López", "email": "ana@email.com",
+            "fecha_nacimiento": "1985-05-20", "monto_solicitado": 1000,
+            "ingreso_mensual": 1000, "score_crediticio": 700, "plazo_meses": 12,
+            "sucursal_id": 1,
+        }
+        assert len(schemas.SolicitudesCreateAdapter.validate_python([datos, datos])) == 2
+        with pytest.raises(ValidationError) as error:
+            schemas.SolicitudesCreateAdapter.validate_python([datos, {**datos, "score_crediticio": 10}])
+        assert error.value.errors()[0]["loc"][0] == 1
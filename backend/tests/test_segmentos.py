@@ -0,0 +1,112 @@
+"""
+Pruebas para los indicadores por segmento
+"""
+import random
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy.dialects import postgresql
+
+from app import segmentos
+from app.config import settings
+from app.models import Cliente, Solicitud
+
+
+def _poblar(db, sucursales, cantidad=300, seed=3):
+    rng = random.Random(seed)
+    clientes = [
+        Cliente(nombre="C", apellido=str(i), email=f"c{seed}-{i}@test.com",
+                fecha_nacimiento=date(1980, 1, 1), edad=rng.randint(18, 75))
+        for i in range(40)
+    ]
+    db.add_all(clientes)
+    db.flush()
+    for _ in range(cantidad):
+        db.add(Solicitud(
+            cliente_id=rng.choice(clientes).id, sucursal_id=rng.choice(sucursales).id,
+            monto_solicitado=Decimal(rng.randrange(1000, 100000, 100)), ingreso_mensual=Decimal("20000"),
+            score_crediticio=rng.randint(400, 850), tiene_tarjeta_credito=rng.random() < 0.5,
+            tiene_credito_automotriz=rng.random() < 0.3, plazo_meses=rng.choice([12, 24, 36]),
+            estado=rng.choice(["aprobado", "rechazado"]),
+        ))
+    db.commit()
+    return {c.id: c.edad for c in clientes}
+
+
+class TestCalculo:
+    """Tests de calcular_segmentos()"""
+
+    def test_coincide_con_conteo_directo(self, db, test_sucursales):
+        """Test que cada corte coincide con contar las solicitudes una por una"""
+        edades = _poblar(db, test_sucursales)
+        resultado = segmentos.calcular_segmentos(db)
+        cortes = {tuple(c["dimensiones"]): c["segmentos"] for c in resultado["cortes"]}
+        assert len(cortes) == 1 + 5 + 1 + 5
+
+        (total,) = cortes[()]
+        solicitudes = db.query(Solicitud).all()
+        assert total["total_solicitudes"] == len(solicitudes)
+        assert total["aprobadas"] == sum(s.estado == "aprobado" for s in solicitudes)
+
+        banda = {b: i for i, b in enumerate(resultado["bandas"]["edad"])}
+        esperado = Counter(
+            (s.sucursal_id, sum(edades[s.cliente_id] >= c for c in settings.SEGMENTOS_BANDAS_EDAD))
+            for s in solicitudes
+        )
+        obtenido = {
+            (seg["valores"]["sucursal"], banda[seg["valores"]["edad"]]): seg["total_solicitudes"]
+            for seg in cortes[("sucursal", "edad")]
+        }
+        assert obtenido == dict(esperado)
+
+        aprobados = sum(s.monto_solicitado for s in solicitudes if s.estado == "aprobado" and s.plazo_meses == 24)
+        (plazo_24,) = [seg for seg in cortes[("plazo",)] if seg["valores"]["plazo"] == 24]
+        assert plazo_24["monto_total_aprobado"] == aprobados
+
+    def test_bandas_configurables(self, db, test_sucursales, monkeypatch):
+        """Test que las bandas salen de la configuración"""
+        monkeypatch.setattr(settings, "SEGMENTOS_BANDAS_SCORE", [700])
+        _poblar(db, test_sucursales, cantidad=50)
+        resultado = segmentos.calcular_segmentos(db, ["score"], por_sucursal=False)
+        assert resultado["bandas"]["score"] == ["<700", ">=700"]
+        assert [c["dimensiones"] for c in resultado["cortes"]] == [[], ["score"]]
+        assert [s["valores"]["score"] for s in resultado["cortes"][1]["segmentos"]] == ["<700", ">=700"]
+
+    def test_consulta_postgresql_grouping_sets(self):
+        """Test que en PostgreSQL todos los cortes van en una sola consulta"""
+        consulta = segmentos.consulta_grouping_sets(["score", "plazo"], True, segmentos.cortes_bandas())
+        sql = str(consulta.compile(dialect=postgresql.dialect()))
+        assert sql.count("GROUPING SETS") == 1
+        assert "grouping(anon_1.score)" in sql
+
+
+class TestEndpoint:
+    """Tests de GET /api/indicadores/segmentos"""
+
+    def test_requiere_auth(self, client):
+        assert client.get("/api/indicadores/segmentos").status_code == 403
+
+    def test_etag_por_version(self, client, db, test_sucursales, auth_token):
+        """Test de 304 mientras no haya solicitudes nuevas"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        _poblar(db, test_sucursales, cantidad=20)
+        url = "/api/indicadores/segmentos?dimensiones=tarjeta&por_sucursal=false"
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["cortes"][0]["segmentos"][0]["total_solicitudes"] == 20
+        etag = response.headers["ETag"]
+
+        assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+        # Otros parámetros, otro ETag
+        assert client.get("/api/indicadores/segmentos", headers=headers).headers["ETag"] != etag
+
+        _poblar(db, test_sucursales, cantidad=1, seed=4)
+        assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    def test_dimension_invalida(self, client, auth_token):
+        response = client.get(
+            "/api/indicadores/segmentos?dimensiones=color",
+            headers={"Authorization": f"Bearer {auth_token}"},
+        )
+        assert response.status_code == 422
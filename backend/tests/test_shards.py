@@ -0,0 +1,150 @@
+"""
+Pruebas de los shards de escritura por sucursal (N archivos SQLite)
+"""
+from datetime import date
+
+import pytest
+
+from app import busqueda, crud, models, schemas, segmentos, shards, sketches
+
+RANGO = 1000
+
+
+def _solicitud(sucursal_id, n, monto=100000, score=720):
+    return schemas.SolicitudCreate(
+        nombre="Ana", apellido=f"García {n}", email=f"ana{n}@test.com", fecha_nacimiento=date(1990, 1, 15),
+        monto_solicitado=monto, ingreso_mensual=30000, score_crediticio=score,
+        tiene_tarjeta_credito=True, plazo_meses=36, sucursal_id=sucursal_id,
+    )
+
+
+@pytest.fixture
+def router(tmp_path, db, test_sucursales):
+    urls = [f"sqlite:///{tmp_path / f'shard{k}.db'}" for k in range(2)]
+    router = shards.ShardRouter(urls, rango_ids=RANGO)
+    router.preparar(db)
+    yield router
+    router.cerrar()
+
+
+class TestRouter:
+    """Enrutamiento y combinación de resultados"""
+
+    def test_escritura_en_el_shard_de_la_sucursal(self, router, test_sucursales):
+        """Test que cada sucursal escribe en su shard con ids de su rango"""
+        for sucursal in test_sucursales:
+            respuesta = router.crear_solicitud(_solicitud(sucursal.id, sucursal.id))
+            shard = router.shard_de(sucursal.id)
+            assert shard * RANGO < respuesta.id <= (shard + 1) * RANGO
+            assert shard * RANGO < respuesta.cliente_id <= (shard + 1) * RANGO
+            assert router.shard_de_id(respuesta.id) == shard
+            assert respuesta.sucursal_nombre == sucursal.nombre
+            with router.sesion(shard) as db:
+                assert {s.sucursal_id for s in db.query(models.Solicitud)} == {sucursal.id}
+
+    def test_preparar_es_idempotente(self, router, db, test_sucursales):
+        router.crear_solicitud(_solicitud(test_sucursales[0].id, 1))
+        router.preparar(db)
+        respuesta = router.crear_solicitud(_solicitud(test_sucursales[0].id, 2))
+        assert router.shard_de_id(respuesta.id) == router.shard_de(test_sucursales[0].id)
+        with router.sesion(0) as shard:
+            assert shard.query(models.Sucursal).count() == len(test_sucursales)
+
+    def test_indicadores_iguales_a_una_sola_base(self, router, db, test_sucursales):
+        """Test que la combinación de shards coincide con los mismos datos en una base"""
+        datos = [
+            _solicitud(test_sucursales[i % 2].id, i, monto=50000 + i * 37000, score=560 + i * 23)
+            for i in range(12)
+        ]
+        for solicitud in datos:
+            router.crear_solicitud(solicitud)
+            crud.crear_solicitud(db, solicitud)
+
+        combinados = router.get_indicadores().model_dump()
+        esperados = crud.get_indicadores(db).model_dump()
+        assert combinados.pop("score_promedio") == pytest.approx(esperados.pop("score_promedio"), abs=0.01)
+        assert combinados == esperados
+
+    def test_recientes_de_todos_los_shards(self, router, test_sucursales):
+        ids = [router.crear_solicitud(_solicitud(test_sucursales[i % 2].id, i)).id for i in range(6)]
+        recientes = router.get_solicitudes_recientes(limit=4)
+        assert len(recientes) == 4
+        claves = [(s.fecha_solicitud, s.id) for s in recientes]
+        assert claves == sorted(claves, reverse=True)
+        assert {s.id for s in recientes} <= set(ids)
+
+        de_sucursal = router.get_solicitudes_recientes(limit=10, sucursal_id=test_sucursales[1].id)
+        assert len(de_sucursal) == 3
+        assert {s.sucursal_id for s in de_sucursal} == {test_sucursales[1].id}
+
+
+    def test_segmentos_iguales_a_una_sola_base(self, router, db, test_sucursales):
+        for i in range(12):
+            solicitud = _solicitud(test_sucursales[i % 2].id, i, monto=50000 + i * 37000, score=560 + i * 23)
+            router.crear_solicitud(solicitud)
+            crud.crear_solicitud(db, solicitud)
+
+        version, combinados = router.calcular_segmentos_con_version(segmentos.DIMENSIONES, True)
+        assert len(version) == router.cantidad
+        assert combinados == segmentos.calcular_segmentos(db)
+
+    def test_busqueda_combina_las_paginas(self, router, test_sucursales):
+        """Test que la búsqueda recorre los shards con un solo cursor, sin repetir ni saltar clientes"""
+        ids = {router.crear_solicitud(_solicitud(test_sucursales[i % 2].id, i)).cliente_id for i in range(7)}
+        vistos, cursor = [], None
+        while True:
+            pagina = router.buscar_clientes("garcía", limite=3, cursor=cursor)
+            vistos += [r["id"] for r in pagina["resultados"]]
+            cursor = pagina["siguiente"]
+            if cursor is None:
+                break
+        assert sorted(vistos) == sorted(ids)
+        assert {router.shard_de_id(i) for i in vistos} == {0, 1}
+
+    def test_distribuciones_de_cada_shard(self, router, db, test_sucursales):
+        for i in range(6):
+            router.crear_solicitud(_solicitud(test_sucursales[i % 2].id, i, score=600 + i * 10))
+        estados = router.distribuciones()
+        assert len(estados) == router.cantidad
+        resumen = sketches.resumir(estados)
+        assert resumen["general"]["score_crediticio"]["cantidad"] == 6
+        assert len(resumen["version"]) == router.cantidad
+        assert {s["sucursal_id"] for s in resumen["por_sucursal"]} == {s.id for s in test_sucursales[:2]}
+
+
+class TestEndpoints:
+    """La API usa el router cuando está configurado"""
+
+    def test_api_con_shards(self, client, router, db, test_sucursales, auth_token, monkeypatch):
+        monkeypatch.setattr(shards, "router", router)
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        datos = _solicitud(test_sucursales[0].id, 1).model_dump(mode="json")
+        response = client.post("/api/solicitudes", json=datos)
+        assert response.status_code == 201
+        assert router.shard_de_id(response.json()["id"]) == router.shard_de(test_sucursales[0].id)
+        # La base principal no recibe solicitudes
+        assert db.query(models.Solicitud).count() == 0
+
+        data = client.get("/api/indicadores", headers=headers).json()
+        assert data["total_solicitudes"] == 1
+        recientes = client.get(f"/api/solicitudes/recientes?sucursal_id={test_sucursales[0].id}", headers=headers)
+        assert [s["id"] for s in recientes.json()] == [response.json()["id"]]
+        assert client.post("/api/simulaciones", json={"cantidad": 10}, headers=headers).status_code == 409
+
+    def test_lecturas_combinan_los_shards(self, client, router, db, test_sucursales, auth_token, monkeypatch):
+        """Test que búsqueda, segmentos y distribuciones no consultan solo la base principal"""
+        monkeypatch.setattr(shards, "router", router)
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        for i in range(4):
+            router.crear_solicitud(_solicitud(test_sucursales[i % 2].id, i))
+
+        buscar = client.get("/api/clientes/buscar?q=garcía", headers=headers).json()
+        assert len(buscar["resultados"]) == 4
+        segmentos_ = client.get("/api/indicadores/segmentos?dimensiones=plazo&por_sucursal=false", headers=headers)
+        assert segmentos_.json()["cortes"][0]["segmentos"][0]["total_solicitudes"] == 4
+        etag = segmentos_.headers["etag"]
+        assert client.get("/api/indicadores/segmentos?dimensiones=plazo&por_sucursal=false",
+                          headers={**headers, "If-None-Match": etag}).status_code == 304
+        distribuciones = client.get("/api/indicadores/distribuciones", headers=headers).json()
+        assert distribuciones["general"]["score_crediticio"]["cantidad"] == 4
+        assert len(distribuciones["version"]) == router.cantidad
@@ -0,0 +1,174 @@
+"""
+Pruebas para los sketches de cuantiles
+"""
+import random
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from app import crud, sketches
+from app.config import settings
+from app.models import Cliente, SketchDelta, SketchDistribucion, Solicitud
+
+
+def _exacto(valores, q):
+    ordenados = sorted(valores)
+    return ordenados[int(q * (len(ordenados) - 1))]
+
+
+def _poblar(db, sucursales, cantidad, inicio=0):
+    cliente = Cliente(nombre="C", apellido="D", email=f"c{inicio}@test.com",
+                      fecha_nacimiento=date(1980, 1, 1), edad=45)
+    db.add(cliente)
+    db.flush()
+    rng = random.Random(inicio)
+    for i in range(cantidad):
+        db.add(Solicitud(
+            cliente_id=cliente.id, sucursal_id=sucursales[i % len(sucursales)].id,
+            monto_solicitado=Decimal(rng.randrange(1000, 500000, 100)), ingreso_mensual=Decimal(rng.randrange(5000, 90000)),
+            score_crediticio=rng.randint(300, 850), plazo_meses=24, estado="aprobado",
+        ))
+    db.commit()
+
+
+class TestDDSketch:
+    """Tests del sketch"""
+
+    @pytest.mark.parametrize("error", [0.01, 0.05])
+    def test_error_relativo_acotado(self, error):
+        """Test que cada cuantil está dentro del error relativo declarado"""
+        rng = random.Random(1)
+        valores = [rng.lognormvariate(10, 1.5) for _ in range(20000)]
+        sketch = sketches.DDSketch(error)
+        for valor in valores:
+            sketch.agregar(valor)
+        for q in (0.01, 0.25, 0.5, 0.9, 0.99, 0.999):
+            exacto = _exacto(valores, q)
+            assert abs(sketch.cuantil(q) - exacto) <= error * exacto
+        assert sketch.cuantil(0) == min(valores) and sketch.cuantil(1) == max(valores)
+
+    def test_combinar_equivale_a_union(self):
+        """Test que combinar dos sketches es igual a un sketch de la unión"""
+        rng = random.Random(2)
+        a, b, union = sketches.DDSketch(), sketches.DDSketch(), sketches.DDSketch()
+        for i in range(5000):
+            valor = rng.uniform(300, 850)
+            (a if i % 3 else b).agregar(valor)
+            union.agregar(valor)
+        combinado = a.combinar(b)
+        assert combinado.bins == union.bins and combinado.cantidad == union.cantidad
+        assert combinado.cuantil(0.9) == union.cuantil(0.9)
+        with pytest.raises(ValueError):
+            combinado.combinar(sketches.DDSketch(0.05))
+
+    def test_serializacion_e_histograma(self):
+        sketch = sketches.DDSketch()
+        for valor in range(1, 101):
+            sketch.agregar(valor)
+        copia = sketches.DDSketch.desde_dict(sketch.a_dict())
+        assert copia.resumen(5) == sketch.resumen(5)
+        histograma = sketch.histograma(5)
+        assert sum(c["cantidad"] for c in histograma) == 100
+        assert histograma[0]["desde"] == 1 and histograma[-1]["hasta"] == 100
+
+
+class TestDistribuciones:
+    """Tests del estado incremental por deltas y su compactación"""
+
+    def test_incremental_y_compactado(self, db, test_sucursales):
+        """Test que solo se leen los deltas nuevos y el estado compactado sobrevive al reinicio"""
+        _poblar(db, test_sucursales, 200)
+        estado = sketches.Distribuciones()
+        assert estado.actualizar(db) == 200
+        assert estado.actualizar(db) == 0
+
+        _poblar(db, test_sucursales, 50, inicio=1)
+        assert db.query(SketchDelta).count() == 2
+        assert estado.actualizar(db) == 50
+        assert estado.version == crud.version_solicitudes(db)
+
+        assert estado.compactar(db)
+        assert db.query(SketchDelta).count() == 0
+        # Otro proceso parte de la base compactada, sin releer el historial
+        reiniciado = sketches.Distribuciones()
+        assert reiniciado.actualizar(db) == 0
+        assert reiniciado.resumen() == estado.resumen()
+
+        scores = [s.score_crediticio for s in db.query(Solicitud).all()]
+        p50 = reiniciado.resumen()["general"]["score_crediticio"]["cuantiles"]["p50"]
+        assert abs(p50 - _exacto(scores, 0.5)) <= settings.SKETCHES_ERROR_RELATIVO * _exacto(scores, 0.5)
+
+    def test_id_menor_confirmado_despues(self, db, test_sucursales):
+        """Test que una solicitud con id menor confirmada tarde no se pierde"""
+        _poblar(db, test_sucursales, 1)
+        estado = sketches.Distribuciones()
+        db.execute(insert(Solicitud), [dict(
+            id=100, cliente_id=1, sucursal_id=test_sucursales[0].id, monto_solicitado=Decimal("1000"),
+            ingreso_mensual=Decimal("5000"), score_crediticio=500, plazo_meses=12, estado="aprobado",
+        )])
+        db.commit()
+        assert estado.actualizar(db) == 2
+        # Como un bloque del write-behind reservado antes y confirmado después
+        db.add(Solicitud(
+            id=50, cliente_id=1, sucursal_id=test_sucursales[0].id, monto_solicitado=Decimal("2000"),
+            ingreso_mensual=Decimal("5000"), score_crediticio=600, plazo_meses=12, estado="aprobado",
+        ))
+        db.commit()
+        assert estado.actualizar(db) == 1
+        assert estado.resumen()["general"]["score_crediticio"]["cantidad"] == 3
+
+    def test_rollback_no_deja_delta(self, db, test_sucursales):
+        _poblar(db, test_sucursales, 5)
+        db.add(Solicitud(
+            cliente_id=1, sucursal_id=test_sucursales[0].id, monto_solicitado=Decimal("2000"),
+            ingreso_mensual=Decimal("5000"), score_crediticio=600, plazo_meses=12, estado="aprobado",
+        ))
+        db.flush()
+        db.rollback()
+        assert db.query(SketchDelta).count() == 1
+
+    def test_sin_base_no_recorre_la_tabla(self, db, test_sucursales):
+        """Test que sin base guardada se pide reconstruir en lugar de leer el historial"""
+        _poblar(db, test_sucursales, 10)
+        db.query(SketchDistribucion).delete()
+        db.commit()
+        with pytest.raises(sketches.EstadoNoDisponible):
+            sketches.Distribuciones().actualizar(db)
+
+    def test_reconstruir(self, db, test_sucursales):
+        _poblar(db, test_sucursales, 30)
+        db.query(SketchDistribucion).delete()
+        db.query(SketchDelta).delete()
+        db.commit()
+        estado = sketches.reconstruir(db)
+        assert estado.version == crud.version_solicitudes(db)
+        assert db.query(SketchDelta).count() == 0
+        assert [s["sucursal_id"] for s in estado.resumen()["por_sucursal"]] == [s.id for s in test_sucursales]
+
+        _poblar(db, test_sucursales, 5, inicio=1)
+        reiniciado = sketches.Distribuciones()
+        reiniciado.actualizar(db)
+        assert reiniciado.resumen()["general"]["monto_solicitado"]["cantidad"] == 35
+
+    def test_endpoint(self, client, db, test_sucursales, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        assert client.get("/api/indicadores/distribuciones").status_code == 403
+        _poblar(db, test_sucursales, 40)
+        response = client.get("/api/indicadores/distribuciones?cubetas=4", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["error_relativo"] == settings.SKETCHES_ERROR_RELATIVO
+        assert data["general"]["monto_solicitado"]["cantidad"] == 40
+        assert len(data["general"]["ingreso_mensual"]["histograma"]) == 4
+        assert len(data["por_sucursal"]) == 2
+        etag = response.headers["ETag"]
+        assert client.get(
+            "/api/indicadores/distribuciones?cubetas=4", headers={**headers, "If-None-Match": etag}
+        ).status_code == 304
+
+        db.query(SketchDistribucion).delete()
+        db.commit()
+        sketches.distribuciones = sketches.Distribuciones()
+        assert client.get("/api/indicadores/distribuciones", headers=headers).status_code == 503
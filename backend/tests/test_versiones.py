@@ -0,0 +1,185 @@
+"""
+Pruebas del contador de versión de las solicitudes
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from app import archivo, crud, eventos, sketches, versiones
+from app.config import settings
+from app.models import Cliente, Solicitud, VersionConfirmada, VersionDatos
+from tests.conftest import engine
+from tests.test_archivo import _envejecer
+from tests.test_importacion import _csv, _importar
+from tests.test_segmentos import _poblar
+
+
+def _solicitud(cliente_id, sucursal_id, **extra):
+    return dict(
+        cliente_id=cliente_id, sucursal_id=sucursal_id, monto_solicitado=Decimal("50000"),
+        ingreso_mensual=Decimal("25000"), score_crediticio=700, tiene_tarjeta_credito=True,
+        tiene_credito_automotriz=False, plazo_meses=24, estado="aprobado", **extra,
+    )
+
+
+def _cliente(db):
+    cliente = Cliente(nombre="Ana", apellido="Ruiz", email="ana.version@test.com",
+                      fecha_nacimiento=date(1990, 1, 1), edad=35)
+    db.add(cliente)
+    db.commit()
+    return cliente
+
+
+class TestContador:
+    """Cuándo sube la versión"""
+
+    def test_sube_con_orm_y_core_y_no_con_rollback(self, db, test_sucursales):
+        cliente = _cliente(db)
+        assert crud.version_solicitudes(db) == 0
+
+        db.add(Solicitud(**_solicitud(cliente.id, test_sucursales[0].id)))
+        db.commit()
+        assert crud.version_solicitudes(db) == 1
+
+        db.execute(insert(Solicitud), [_solicitud(cliente.id, test_sucursales[0].id) for _ in range(3)])
+        db.commit()
+        assert crud.version_solicitudes(db) == 2
+
+        db.add(Solicitud(**_solicitud(cliente.id, test_sucursales[0].id)))
+        db.flush()
+        db.rollback()
+        # Un commit sin cambios en solicitudes tampoco la mueve
+        db.add(Cliente(nombre="B", apellido="C", email="b@test.com", fecha_nacimiento=date(1990, 1, 1), edad=35))
+        db.commit()
+        assert crud.version_solicitudes(db) == 2
+
+    def test_id_menor_confirmado_despues(self, db, test_sucursales):
+        """Test que una solicitud con id menor que el máximo, confirmada tarde, cambia la versión"""
+        cliente = _cliente(db)
+        db.add(Solicitud(id=10, **_solicitud(cliente.id, test_sucursales[0].id)))
+        db.commit()
+        antes = crud.version_solicitudes(db)
+
+        # Como un bloque del write-behind que se confirma después de otro posterior
+        db.execute(insert(Solicitud), [_solicitud(cliente.id, test_sucursales[0].id, id=5)])
+        db.commit()
+        assert crud.version_solicitudes(db) > antes
+
+    def test_archivar_e_importar_suben(self, db, test_sucursales):
+        _poblar(db, test_sucursales, cantidad=20)
+        _envejecer(db)
+        antes = crud.version_solicitudes(db)
+
+        archivo.archivar(engine, horizonte_dias=365, lote=4, pausa=0)
+        db.rollback()
+        archivada = crud.version_solicitudes(db)
+        # Un incremento por lote aunque el id máximo no cambie
+        assert archivada == antes + 3
+
+        _importar(_csv([("imp@test.com", "aprobado", datetime(2019, 3, 1))], test_sucursales[0].id))
+        db.rollback()
+        assert crud.version_solicitudes(db) == archivada + 1
+
+    def test_incrementar_crea_la_fila(self, db):
+        with engine.begin() as conn:
+            assert versiones.incrementar(conn) == 1
+            assert versiones.incrementar(conn) == 2
+        assert versiones.leer(db) == 2
+
+
+class TestHuecos:
+    """Versiones que se confirman en otro orden que el de la secuencia"""
+
+    def _confirmar(self, db, valor, hace=0):
+        db.execute(insert(VersionConfirmada).values(valor=valor, creado=datetime.utcnow() - timedelta(seconds=hace)))
+        db.commit()
+
+    def test_foto_con_hueco(self, db):
+        """Test que una foto con la 4 confirmada y la 3 pendiente no es la de la 4"""
+        for valor in (1, 2, 4):
+            self._confirmar(db, valor)
+        version = versiones.leer(db)
+        assert version == versiones.Foto(2, (4,))
+        assert versiones.marca(db) == 2
+        assert [versiones.incluye(version, v) for v in (1, 3, 4, 5)] == [True, False, True, False]
+
+        self._confirmar(db, 3)
+        assert versiones.leer(db) == 4
+
+    def test_hueco_viejo_se_salta(self, db):
+        self._confirmar(db, 1)
+        self._confirmar(db, 3, hace=settings.VERSIONES_HUECO_SEGUNDOS + 1)
+        assert versiones.leer(db) == 3
+
+    def test_sketches_solo_hasta_la_marca(self, db, test_sucursales):
+        """Test que el delta de una versión posterior a un hueco espera a que se cierre"""
+        estado = sketches.Distribuciones()
+        for valor, score in ((1, 600), (3, 700)):
+            fila = {"sucursal_id": test_sucursales[0].id, "score_crediticio": score,
+                    "monto_solicitado": Decimal("1000"), "ingreso_mensual": Decimal("5000")}
+            sketches.guardar_delta(db, valor, sketches.delta_de([fila]))
+            self._confirmar(db, valor)
+        assert estado.actualizar(db) == 1
+        assert estado.version == 1
+
+        self._confirmar(db, 2)
+        assert estado.actualizar(db) == 1
+        assert estado.version == 3
+
+    def test_eventos_de_una_foto_con_hueco(self):
+        foto = versiones.Foto(2, (4,))
+        assert eventos.incluido({"version": 4}, foto)
+        assert not eventos.incluido({"version": 3}, foto)
+        # Con shards, la versión de cada uno
+        assert not eventos.incluido({"version": 3, eventos.SHARD: 0}, (foto, 5))
+        assert eventos.incluido({"version": 3, eventos.SHARD: 1}, (foto, 5))
+
+    def test_purga(self, db, test_sucursales, monkeypatch):
+        """Test que la purga guarda la marca y borra las confirmadas sin cambiar la versión"""
+        cliente = _cliente(db)
+        for _ in range(3):
+            db.add(Solicitud(**_solicitud(cliente.id, test_sucursales[0].id)))
+            db.commit()
+        antes = versiones.leer(db)
+
+        monkeypatch.setattr(versiones, "_proxima_purga", 0.0)
+        db.add(Solicitud(**_solicitud(cliente.id, test_sucursales[0].id)))
+        db.commit()
+        assert db.get(VersionDatos, versiones.NOMBRE).valor == antes + 1
+        assert db.query(VersionConfirmada).count() == 0
+        assert versiones.leer(db) == antes + 1
+
+        db.add(Solicitud(**_solicitud(cliente.id, test_sucursales[0].id)))
+        db.commit()
+        assert versiones.leer(db) == antes + 2
+
+    def test_sigue_al_contador_anterior(self, db):
+        """Test que en una base con el contador de una sola fila las versiones siguen después de él"""
+        VersionConfirmada.__table__.drop(engine)
+        db.execute(insert(VersionDatos).values(nombre=versiones.NOMBRE, valor=41))
+        db.commit()
+        VersionConfirmada.__table__.create(engine)
+        assert versiones.leer(db) == 41
+        with engine.begin() as conn:
+            assert versiones.incrementar(conn) == 42
+        assert versiones.leer(db) == 42
+
+
+class TestEtag:
+    """El ETag de indicadores sigue la versión, no el id máximo"""
+
+    def test_indicadores_con_id_menor_tardio(self, client, db, test_sucursales, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        cliente = _cliente(db)
+        db.add(Solicitud(id=10, **_solicitud(cliente.id, test_sucursales[0].id)))
+        db.commit()
+        response = client.get("/api/indicadores", headers=headers)
+        etag = response.headers["etag"]
+        assert response.json()["total_solicitudes"] == 1
+
+        db.add(Solicitud(id=5, **_solicitud(cliente.id, test_sucursales[0].id)))
+        db.commit()
+        response = client.get("/api/indicadores", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["total_solicitudes"] == 2
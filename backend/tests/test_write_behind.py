@@ -0,0 +1,208 @@
+"""
+Pruebas unitarias para la persistencia diferida (write-behind)
+"""
+import json
+import threading
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from app import models
+from app.main import app
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.write_behind import ColaLlena, IdAllocator, WriteBehindQueue, get_write_behind_queue
+from tests.conftest import TestingSessionLocal
+
+
+def _solicitud_data(sucursal_id: int, email: str = "diferida@test.com") -> dict:
+    return {
+        "nombre": "Laura",
+        "apellido": "Torres",
+        "email": email,
+        "fecha_nacimiento": "1988-03-10",
+        "monto_solicitado": 80000,
+        "ingreso_mensual": 30000,
+        "score_crediticio": 720,
+        "tiene_tarjeta_credito": True,
+        "plazo_meses": 24,
+        "sucursal_id": sucursal_id,
+    }
+
+
+@pytest.fixture(scope="function")
+def cola(db):
+    """Fixture que provee una cola write-behind sobre la BD de pruebas"""
+    cola = WriteBehindQueue(TestingSessionLocal, max_queue=100, batch_size=50,
+                            flush_interval_ms=5, enqueue_timeout=0.01, wal_path=None, id_block=10)
+    cola.start()
+    app.dependency_overrides[get_write_behind_queue] = lambda: cola
+    yield cola
+    app.dependency_overrides.pop(get_write_behind_queue, None)
+    cola.close(timeout=5)
+
+
+class TestWriteBehindEndpoint:
+    """Tests del endpoint en modo write-behind"""
+
+    def test_responde_y_persiste_en_lote(self, client, db, test_sucursales, cola):
+        """Test que la decisión se responde con id y luego se persiste"""
+        ids = []
+        for i in range(5):
+            response = client.post("/api/solicitudes",
+                                   json=_solicitud_data(test_sucursales[0].id, f"wb{i}@test.com"))
+            assert response.status_code == 201
+            ids.append(response.json()["id"])
+
+        assert cola.flush(timeout=5)
+        db.expire_all()
+        guardadas = db.query(models.Solicitud).order_by(models.Solicitud.id).all()
+        assert [s.id for s in guardadas] == ids
+        assert all(s.cliente.email.startswith("wb") for s in guardadas)
+
+    def test_mismo_cliente_pendiente(self, client, db, test_sucursales, cola):
+        """Test que dos solicitudes del mismo cliente nuevo comparten el id"""
+        data = _solicitud_data(test_sucursales[0].id)
+        primera = client.post("/api/solicitudes", json=data).json()
+        segunda = client.post("/api/solicitudes", json=data).json()
+        assert primera["cliente_id"] == segunda["cliente_id"]
+
+        assert cola.flush(timeout=5)
+        db.expire_all()
+        assert db.query(models.Cliente).count() == 1
+        assert db.query(models.Solicitud).count() == 2
+
+
+class TestWriteBehindQueue:
+    """Tests de backpressure y durabilidad"""
+
+    def _registro(self, cola, email: str, sucursal_id: int) -> dict:
+        cliente_id, _ = cola.reservar_cliente(email)
+        return {
+            "cliente": {"id": cliente_id, "nombre": "Ana", "apellido": "Ruiz", "email": email,
+                        "telefono": None, "fecha_nacimiento": date(1990, 1, 1), "edad": 35},
+            "solicitud": {"id": cola.siguiente_id_solicitud(), "cliente_id": cliente_id,
+                          "sucursal_id": sucursal_id, "monto_solicitado": Decimal("1000.00"),
+                          "ingreso_mensual": Decimal("5000.00"), "score_crediticio": 700,
+                          "tiene_tarjeta_credito": True, "tiene_credito_automotriz": False,
+                          "plazo_meses": 12, "estado": "aprobado", "motivo_rechazo": None,
+                          "fecha_solicitud": datetime.now(timezone.utc)},
+        }
+
+    def test_backpressure(self, db, test_sucursales):
+        """Test que con la cola llena se lanza ColaLlena"""
+        cola = WriteBehindQueue(TestingSessionLocal, max_queue=1, enqueue_timeout=0.01, wal_path=None)
+        cola.encolar(self._registro(cola, "a@test.com", test_sucursales[0].id))
+        with pytest.raises(ColaLlena):
+            cola.encolar(self._registro(cola, "b@test.com", test_sucursales[0].id))
+
+    def test_recupera_wal_tras_caida(self, db, test_sucursales, tmp_path):
+        """Test que los registros del WAL sin confirmar se insertan al arrancar"""
+        wal = tmp_path / "write_behind.wal"
+        caida = WriteBehindQueue(TestingSessionLocal, wal_path=str(wal), id_block=10)
+        # Abrir el WAL sin iniciar el writer simula una caída antes del commit
+        caida._wal = open(wal, "a", encoding="utf-8")
+        registros = [self._registro(caida, f"wal{i}@test.com", test_sucursales[0].id) for i in range(3)]
+        for registro in registros:
+            caida.encolar(registro)
+        caida._wal.close()
+        assert len(wal.read_text().splitlines()) == 3
+        assert db.query(models.Solicitud).count() == 0
+
+        nueva = WriteBehindQueue(TestingSessionLocal, wal_path=str(wal))
+        nueva.start()
+        nueva.close(timeout=5)
+
+        db.expire_all()
+        assert sorted(s.id for s in db.query(models.Solicitud)) == \
+            sorted(r["solicitud"]["id"] for r in registros)
+        assert wal.read_text() == ""
+
+        # Recuperar dos veces no duplica
+        wal.write_text("\n".join(json.dumps(r, default=str) for r in registros) + "\n")
+        otra = WriteBehindQueue(TestingSessionLocal, wal_path=str(wal))
+        otra.start()
+        otra.close(timeout=5)
+        assert db.query(models.Solicitud).count() == 3
+
+
+    def test_bd_caida_no_descarta(self, db, test_sucursales, tmp_path):
+        """Test que con la BD fallando el lote se reintenta y sigue en el WAL"""
+        wal = tmp_path / "write_behind.wal"
+        cola = WriteBehindQueue(TestingSessionLocal, flush_interval_ms=5, wal_path=str(wal),
+                                id_block=10, reintento_inicial=0.01, reintento_max=0.05)
+        cola.start()
+        escribir, caida, intentos = cola._escribir, threading.Event(), []
+
+        def escribir_con_caida(lote):
+            if caida.is_set():
+                intentos.append(len(lote))
+                raise OperationalError("INSERT", {}, Exception("could not connect to server"))
+            escribir(lote)
+
+        cola._escribir = escribir_con_caida
+        caida.set()
+        for i in range(2):
+            cola.encolar(self._registro(cola, f"caida{i}@test.com", test_sucursales[0].id))
+        limite = time.monotonic() + 5
+        while len(intentos) < 3 and time.monotonic() < limite:
+            time.sleep(0.01)
+        assert len(intentos) >= 3
+        assert cola.pendientes() == 2
+        assert len(wal.read_text().splitlines()) == 2
+
+        caida.clear()
+        assert cola.flush(timeout=5)
+        cola.close(timeout=5)
+        db.expire_all()
+        assert db.query(models.Solicitud).count() == 2
+        assert cola.errores == 0
+        assert wal.read_text() == ""
+
+    def test_registro_fallido_se_guarda(self, db, test_sucursales, tmp_path):
+        """Test que un registro que no se puede escribir queda en el archivo de fallidos"""
+        wal = tmp_path / "write_behind.wal"
+        cola = WriteBehindQueue(TestingSessionLocal, flush_interval_ms=5, wal_path=str(wal), id_block=10)
+        cola.start()
+        registro = self._registro(cola, "fallido@test.com", test_sucursales[0].id)
+        registro["solicitud"]["sucursal_id"] = None
+        cola.encolar(registro)
+        assert cola.flush(timeout=5)
+        cola.close(timeout=5)
+
+        assert cola.errores == 1
+        assert wal.read_text() == ""
+        fallidos = [json.loads(linea) for linea in (tmp_path / "write_behind.wal.fallidos").read_text().splitlines()]
+        assert [f["solicitud"]["id"] for f in fallidos] == [registro["solicitud"]["id"]]
+        assert fallidos[0]["error"]
+        assert db.query(models.Solicitud).count() == 0
+
+
+class TestIdAllocator:
+    """Bloques de ids que no chocan con los INSERT sin id"""
+
+    def test_bloque_no_choca_con_autoincrement(self, db, test_sucursales):
+        """Test que una inserción normal después de reservar no recibe un id del bloque"""
+        ids = IdAllocator(TestingSessionLocal, models.Cliente, bloque=5)
+        bloque = [ids.siguiente() for _ in range(5)]
+        assert bloque == list(range(bloque[0], bloque[0] + 5))
+
+        cliente = models.Cliente(nombre="Ana", apellido="Ruiz", email="auto@test.com",
+                                 fecha_nacimiento=date(1990, 1, 1), edad=35)
+        db.add(cliente)
+        db.commit()
+        assert cliente.id > bloque[-1]
+        assert ids.siguiente() > cliente.id
+
+    def test_rechaza_tabla_sin_autoincrement(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'sin_autoincrement.db'}")
+        with engine.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE clientes (id INTEGER PRIMARY KEY)")
+        ids = IdAllocator(sessionmaker(bind=engine), models.Cliente, bloque=5)
+        with pytest.raises(RuntimeError):
+            ids.verificar()
+        engine.dispose()
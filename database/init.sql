@@ -68,15 +68,149 @@ CREATE TABLE IF NOT EXISTS usuarios_admin (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- =============================================
+-- Tabla: simulacion_jobs
+-- Trabajos de simulación en segundo plano
+-- =============================================
+CREATE TABLE IF NOT EXISTS simulacion_jobs (
+    id SERIAL PRIMARY KEY,
+    cantidad INTEGER NOT NULL,
+    procesadas INTEGER NOT NULL DEFAULT 0,
+    aprobadas INTEGER NOT NULL DEFAULT 0,
+    rechazadas INTEGER NOT NULL DEFAULT 0,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    cancelar BOOLEAN NOT NULL DEFAULT FALSE,
+    mensaje_error TEXT,
+    propietario VARCHAR(64),
+    heartbeat TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =============================================
+-- Tabla: idempotency_keys
+-- Respuestas guardadas por Idempotency-Key (IDEMPOTENCY_BACKEND=database)
+-- =============================================
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    clave VARCHAR(255) PRIMARY KEY,
+    huella VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    body BYTEA,
+    expira_en TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expira_en ON idempotency_keys(expira_en);
+
+-- =============================================
+-- Tablas: sketches_distribucion y sketches_delta
+-- Sketches de cuantiles: base compactada y un delta por transacción que
+-- inserta solicitudes (app/sketches.py). Una base nueva parte vacía en la
+-- versión 0 con el error relativo por defecto
+-- =============================================
+CREATE TABLE IF NOT EXISTS sketches_distribucion (
+    nombre VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL,
+    error_relativo DOUBLE PRECISION NOT NULL,
+    datos BYTEA NOT NULL,
+    actualizado TIMESTAMP NOT NULL
+);
+INSERT INTO sketches_distribucion (nombre, version, error_relativo, datos, actualizado)
+VALUES ('solicitudes', 0, 0.01, convert_to('{}', 'UTF8'), CURRENT_TIMESTAMP)
+ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS sketches_delta (
+    version BIGINT PRIMARY KEY,
+    datos BYTEA NOT NULL,
+    creado TIMESTAMP NOT NULL
+);
+
+-- =============================================
+-- Tabla: versiones
+-- Contador de cambios de las solicitudes (app/versiones.py); sube en la
+-- misma transacción que cada inserción o borrado
+-- =============================================
+CREATE TABLE IF NOT EXISTS versiones (
+    nombre VARCHAR(50) PRIMARY KEY,
+    valor BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO versiones (nombre, valor) VALUES ('solicitudes', 0) ON CONFLICT DO NOTHING;
+
+-- =============================================
+-- Tabla: importaciones
+-- Avance de las importaciones históricas (app/importacion.py)
+-- =============================================
+CREATE TABLE IF NOT EXISTS importaciones (
+    nombre VARCHAR(255) PRIMARY KEY,
+    linea INTEGER NOT NULL,
+    filas INTEGER NOT NULL DEFAULT 0,
+    clientes_nuevos INTEGER NOT NULL DEFAULT 0,
+    actualizado TIMESTAMP NOT NULL
+);
+
+-- =============================================
+-- Archivo de solicitudes antiguas (app/archivo.py)
+-- =============================================
+CREATE TABLE IF NOT EXISTS solicitudes_archivadas (
+    id INTEGER PRIMARY KEY,
+    cliente_id INTEGER NOT NULL,
+    sucursal_id INTEGER NOT NULL,
+    monto_solicitado DECIMAL(15, 2) NOT NULL,
+    ingreso_mensual DECIMAL(15, 2) NOT NULL,
+    score_crediticio INTEGER NOT NULL,
+    tiene_tarjeta_credito BOOLEAN DEFAULT FALSE,
+    tiene_credito_automotriz BOOLEAN DEFAULT FALSE,
+    plazo_meses INTEGER NOT NULL,
+    estado VARCHAR(20) NOT NULL,
+    motivo_rechazo TEXT,
+    fecha_solicitud TIMESTAMP,
+    FOREIGN KEY (cliente_id) REFERENCES clientes(id) ON DELETE CASCADE,
+    FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE RESTRICT
+);
+
+-- Agregados de las archivadas al grano de los segmentos
+CREATE TABLE IF NOT EXISTS resumen_archivado (
+    id SERIAL PRIMARY KEY,
+    sucursal_id INTEGER NOT NULL,
+    score_banda INTEGER NOT NULL,
+    edad_banda INTEGER NOT NULL,
+    plazo_meses INTEGER NOT NULL,
+    tiene_tarjeta_credito BOOLEAN,
+    tiene_credito_automotriz BOOLEAN,
+    total INTEGER NOT NULL DEFAULT 0,
+    aprobadas INTEGER NOT NULL DEFAULT 0,
+    monto DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    monto_aprobado DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    suma_score BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS estado_archivo (
+    nombre VARCHAR(50) PRIMARY KEY,
+    filas INTEGER NOT NULL DEFAULT 0,
+    fecha_max TIMESTAMP,
+    cortes TEXT NOT NULL,
+    actualizado TIMESTAMP NOT NULL
+);
+
 -- =============================================
 -- Índices para mejorar performance
 -- =============================================
+-- Deben coincidir con los declarados en backend/app/models.py (mismos
+-- nombres); el backend crea los que falten al iniciar. clientes.email y
+-- usuarios_admin.username ya tienen el índice de su restricción UNIQUE.
 CREATE INDEX IF NOT EXISTS idx_solicitudes_cliente ON solicitudes(cliente_id);
-CREATE INDEX IF NOT EXISTS idx_solicitudes_sucursal ON solicitudes(sucursal_id);
-CREATE INDEX IF NOT EXISTS idx_solicitudes_estado ON solicitudes(estado);
-CREATE INDEX IF NOT EXISTS idx_solicitudes_fecha ON solicitudes(fecha_solicitud);
-CREATE INDEX IF NOT EXISTS idx_clientes_email ON clientes(email);
-CREATE INDEX IF NOT EXISTS idx_usuarios_admin_username ON usuarios_admin(username);
+-- Conteos y montos por sucursal y estado con index-only scan
+CREATE INDEX IF NOT EXISTS idx_solicitudes_sucursal_estado ON solicitudes(sucursal_id, estado) INCLUDE (monto_solicitado);
+CREATE INDEX IF NOT EXISTS idx_solicitudes_estado_monto ON solicitudes(estado) INCLUDE (monto_solicitado);
+-- Solicitudes recientes (ORDER BY fecha_solicitud DESC, id DESC LIMIT n)
+CREATE INDEX IF NOT EXISTS idx_solicitudes_fecha_id ON solicitudes(fecha_solicitud DESC, id DESC);
+-- Solicitudes archivadas: historial de un cliente y listados por rango de fechas
+CREATE INDEX IF NOT EXISTS idx_solicitudes_archivadas_cliente ON solicitudes_archivadas(cliente_id);
+CREATE INDEX IF NOT EXISTS idx_solicitudes_archivadas_fecha_id ON solicitudes_archivadas(fecha_solicitud DESC, id DESC);
+
+-- Búsqueda de clientes por texto parcial (GET /api/clientes/buscar)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_clientes_nombre_trgm ON clientes USING gin (nombre gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_clientes_apellido_trgm ON clientes USING gin (apellido gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_clientes_email_trgm ON clientes USING gin (email gin_trgm_ops);
 
 -- =============================================
 -- Datos de ejemplo para sucursales
@@ -9,7 +9,10 @@ import type {
   Sucursal,
   SolicitudCreate,
   SolicitudResponse,
+  PrecalificacionRequest,
+  PrecalificacionResponse,
   IndicadoresGenerales,
+  ActualizacionIndicadores,
   SimulacionRequest,
   SimulacionResponse,
 } from '../types';
@@ -77,6 +80,14 @@ export const crearSolicitud = async (
   return response.data;
 };
 
+// GET para aprovechar la caché HTTP del navegador con entradas repetidas
+export const precalificar = async (
+  datos: PrecalificacionRequest
+): Promise<PrecalificacionResponse> => {
+  const response = await api.get<PrecalificacionResponse>('/api/precalificar', { params: datos });
+  return response.data;
+};
+
 export const simularSolicitudes = async (
   datos: SimulacionRequest
 ): Promise<SimulacionResponse> => {
@@ -91,5 +102,65 @@ export const getIndicadores = async (): Promise<IndicadoresGenerales> => {
   return response.data;
 };
 
+export interface ManejadoresEventos {
+  onIndicadores: (indicadores: IndicadoresGenerales) => void;
+  onActualizacion: (actualizacion: ActualizacionIndicadores) => void;
+}
+
+const procesarMensaje = (mensaje: string, manejadores: ManejadoresEventos) => {
+  let evento = '';
+  let datos = '';
+  for (const linea of mensaje.split('\n')) {
+    if (linea.startsWith('event: ')) evento = linea.slice(7);
+    else if (linea.startsWith('data: ')) datos += linea.slice(6);
+  }
+  if (evento === 'indicadores') manejadores.onIndicadores(JSON.parse(datos));
+  else if (evento === 'actualizacion') manejadores.onActualizacion(JSON.parse(datos));
+  // 'resincronizar': el servidor cierra el stream y la reconexión trae una foto nueva
+};
+
+// Stream SSE leído con fetch (EventSource no permite el header Authorization).
+// Al cerrarse el stream se reconecta; retorna la función para cancelar.
+export const suscribirEventosIndicadores = (manejadores: ManejadoresEventos): (() => void) => {
+  const controller = new AbortController();
+  const conectar = async () => {
+    while (!controller.signal.aborted) {
+      let espera = 0;
+      try {
+        const response = await fetch(`${API_BASE_URL}/api/indicadores/eventos`, {
+          headers: { Authorization: `Bearer ${localStorage.getItem('access_token') ?? ''}` },
+          signal: controller.signal,
+        });
+        if (response.status === 401) {
+          localStorage.removeItem('access_token');
+          window.location.href = '/admin';
+          return;
+        }
+        if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          let fin = buffer.indexOf('\n\n');
+          while (fin >= 0) {
+            procesarMensaje(buffer.slice(0, fin), manejadores);
+            buffer = buffer.slice(fin + 2);
+            fin = buffer.indexOf('\n\n');
+          }
+        }
+      } catch {
+        if (controller.signal.aborted) return;
+        espera = 3000;
+      }
+      await new Promise((resolve) => setTimeout(resolve, espera));
+    }
+  };
+  conectar();
+  return () => controller.abort();
+};
+
 export default api;
 
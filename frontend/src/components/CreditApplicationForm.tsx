@@ -19,8 +19,8 @@ import {
   Alert,
 } from '@mui/material';
 import SendIcon from '@mui/icons-material/Send';
-import { crearSolicitud, getSucursales } from '../api';
-import type { Sucursal, SolicitudResponse } from '../types';
+import { crearSolicitud, getSucursales, precalificar } from '../api';
+import type { Sucursal, SolicitudResponse, PrecalificacionResponse } from '../types';
 import ResultModal from './ResultModal';
 
 // Esquema de validación con Zod
@@ -51,12 +51,14 @@ export default function CreditApplicationForm() {
   const [error, setError] = useState<string | null>(null);
   const [resultado, setResultado] = useState<SolicitudResponse | null>(null);
   const [modalOpen, setModalOpen] = useState(false);
+  const [precalificacion, setPrecalificacion] = useState<PrecalificacionResponse | null>(null);
 
   const {
     control,
     handleSubmit,
     formState: { errors },
     reset,
+    watch,
   } = useForm<SolicitudFormData>({
     resolver: zodResolver(solicitudSchema),
     defaultValues: {
@@ -78,6 +80,58 @@ export default function CreditApplicationForm() {
 
   // La edad se calcula automáticamente en el backend
 
+  // Precalificación mientras se llena el formulario (sin registrar la solicitud)
+  const [
+    fechaNacimiento,
+    montoSolicitado,
+    ingresoMensual,
+    scoreCrediticio,
+    tieneTarjeta,
+    tieneAutomotriz,
+    plazoMeses,
+  ] = watch([
+    'fecha_nacimiento',
+    'monto_solicitado',
+    'ingreso_mensual',
+    'score_crediticio',
+    'tiene_tarjeta_credito',
+    'tiene_credito_automotriz',
+    'plazo_meses',
+  ]);
+
+  useEffect(() => {
+    if (!fechaNacimiento || !(montoSolicitado > 0) || !(ingresoMensual > 0)) {
+      setPrecalificacion(null);
+      return;
+    }
+    let vigente = true;
+    const timer = setTimeout(() => {
+      precalificar({
+        fecha_nacimiento: fechaNacimiento,
+        monto_solicitado: montoSolicitado,
+        ingreso_mensual: ingresoMensual,
+        score_crediticio: scoreCrediticio,
+        tiene_tarjeta_credito: tieneTarjeta,
+        tiene_credito_automotriz: tieneAutomotriz,
+        plazo_meses: plazoMeses,
+      })
+        .then((data) => vigente && setPrecalificacion(data))
+        .catch(() => vigente && setPrecalificacion(null));
+    }, 300);
+    return () => {
+      vigente = false;
+      clearTimeout(timer);
+    };
+  }, [
+    fechaNacimiento,
+    montoSolicitado,
+    ingresoMensual,
+    scoreCrediticio,
+    tieneTarjeta,
+    tieneAutomotriz,
+    plazoMeses,
+  ]);
+
   // Cargar sucursales
   useEffect(() => {
     const cargarSucursales = async () => {
@@ -345,6 +399,17 @@ export default function CreditApplicationForm() {
             </Grid>
           </Grid>
 
+          {precalificacion && (
+            <Alert severity={precalificacion.aprobado ? 'success' : 'warning'} sx={{ mt: 3 }}>
+              {precalificacion.aprobado
+                ? `Precalificado: cuota estimada de $${Number(precalificacion.cuota_mensual).toLocaleString('es-MX', {
+                    minimumFractionDigits: 2,
+                    maximumFractionDigits: 2,
+                  })}`
+                : precalificacion.motivo_rechazo}
+            </Alert>
+          )}
+
           <Box sx={{ mt: 4, display: 'flex', justifyContent: 'center' }}>
             <Button
               type="submit"
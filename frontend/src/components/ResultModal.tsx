@@ -212,6 +212,27 @@ export default function ResultModal({ open, onClose, resultado }: ResultModalPro
             </>
           )}
 
+          {/* Contraoferta */}
+          {!esAprobado && resultado.contraoferta && (
+            <Alert severity="info">
+              {resultado.contraoferta.monto_maximo != null && (
+                <Typography variant="body2">
+                  Podemos aprobarle hasta $
+                  {Number(resultado.contraoferta.monto_maximo).toLocaleString('es-MX', {
+                    minimumFractionDigits: 2,
+                    maximumFractionDigits: 2,
+                  })}{' '}
+                  a {resultado.plazo_meses} meses.
+                </Typography>
+              )}
+              {resultado.contraoferta.plazo_minimo != null && (
+                <Typography variant="body2">
+                  O el monto solicitado a un plazo de {resultado.contraoferta.plazo_minimo} meses.
+                </Typography>
+              )}
+            </Alert>
+          )}
+
           {/* Información adicional */}
           {esAprobado && (
             <Alert severity="info">
@@ -11,6 +11,7 @@ import {
   CardContent,
   CircularProgress,
   Alert,
+  Chip,
 } from '@mui/material';
 import {
   PieChart,
@@ -25,17 +26,69 @@ import {
   Legend,
   ResponsiveContainer,
 } from 'recharts';
-import { getIndicadores } from '../api';
-import type { IndicadoresGenerales } from '../types';
+import { getIndicadores, suscribirEventosIndicadores } from '../api';
+import type { IndicadoresGenerales, DecisionEvento, DeltaSucursal } from '../types';
 import TrendingUpIcon from '@mui/icons-material/TrendingUp';
 import TrendingDownIcon from '@mui/icons-material/TrendingDown';
 import AttachMoneyIcon from '@mui/icons-material/AttachMoney';
 import AssessmentIcon from '@mui/icons-material/Assessment';
 
 const COLORS = ['#4caf50', '#f44336'];
+const MAX_DECISIONES = 10;
+
+// Sumar a los indicadores el delta por sucursal recibido en vivo
+function aplicarDelta(
+  indicadores: IndicadoresGenerales,
+  delta: DeltaSucursal[]
+): IndicadoresGenerales {
+  let total = indicadores.total_solicitudes;
+  let aprobadas = indicadores.total_aprobadas;
+  let rechazadas = indicadores.total_rechazadas;
+  let montoSolicitado = Number(indicadores.monto_total_solicitado);
+  let montoAprobado = Number(indicadores.monto_total_aprobado);
+  let sumaScore = indicadores.score_promedio * total;
+  const porSucursal = indicadores.por_sucursal.map((sucursal) => ({ ...sucursal }));
+
+  for (const parcial of delta) {
+    total += parcial.total_solicitudes;
+    aprobadas += parcial.aprobadas;
+    rechazadas += parcial.rechazadas;
+    montoSolicitado += Number(parcial.monto_solicitado);
+    montoAprobado += Number(parcial.monto_aprobado);
+    sumaScore += parcial.suma_score;
+
+    const sucursal = porSucursal.find((s) => s.sucursal_id === parcial.sucursal_id);
+    if (sucursal) {
+      const totalSucursal = sucursal.total_solicitudes + parcial.total_solicitudes;
+      sucursal.monto_promedio =
+        (Number(sucursal.monto_promedio) * sucursal.total_solicitudes +
+          Number(parcial.monto_solicitado)) /
+        totalSucursal;
+      sucursal.total_solicitudes = totalSucursal;
+      sucursal.aprobadas += parcial.aprobadas;
+      sucursal.rechazadas += parcial.rechazadas;
+      sucursal.monto_aprobado_total =
+        Number(sucursal.monto_aprobado_total) + Number(parcial.monto_aprobado);
+    }
+  }
+
+  return {
+    ...indicadores,
+    total_solicitudes: total,
+    total_aprobadas: aprobadas,
+    total_rechazadas: rechazadas,
+    tasa_aprobacion: total > 0 ? (aprobadas / total) * 100 : 0,
+    monto_total_solicitado: montoSolicitado,
+    monto_total_aprobado: montoAprobado,
+    score_promedio: total > 0 ? sumaScore / total : 0,
+    por_sucursal: porSucursal,
+  };
+}
 
 export default function Dashboard() {
   const [indicadores, setIndicadores] = useState<IndicadoresGenerales | null>(null);
+  const [decisiones, setDecisiones] = useState<DecisionEvento[]>([]);
+  const [enVivo, setEnVivo] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -52,6 +105,19 @@ export default function Dashboard() {
     };
 
     cargarIndicadores();
+
+    // Cada mensaje trae solo lo nuevo; al (re)conectar llega la foto completa
+    const cancelar = suscribirEventosIndicadores({
+      onIndicadores: (data) => {
+        setIndicadores(data);
+        setEnVivo(true);
+      },
+      onActualizacion: ({ decisiones: nuevas, delta }) => {
+        setIndicadores((actual) => (actual ? aplicarDelta(actual, delta) : actual));
+        setDecisiones((previas) => [...nuevas].reverse().concat(previas).slice(0, MAX_DECISIONES));
+      },
+    });
+    return cancelar;
   }, []);
 
   if (loading) {
@@ -92,9 +158,12 @@ export default function Dashboard() {
 
   return (
     <Box sx={{ p: 3 }}>
-      <Typography variant="h4" gutterBottom>
-        Dashboard de Indicadores
-      </Typography>
+      <Box sx={{ display: 'flex', alignItems: 'center', gap: 2 }}>
+        <Typography variant="h4" gutterBottom>
+          Dashboard de Indicadores
+        </Typography>
+        {enVivo && <Chip label="En vivo" color="success" size="small" sx={{ mb: 1 }} />}
+      </Box>
       <Typography variant="body2" color="text.secondary" gutterBottom sx={{ mb: 3 }}>
         Resumen general de solicitudes de crédito
       </Typography>
@@ -223,6 +292,74 @@ export default function Dashboard() {
         </Grid>
       </Grid>
 
+      {/* Decisiones recibidas en vivo */}
+      <Paper sx={{ p: 3, mt: 3 }}>
+        <Typography variant="h6" gutterBottom>
+          Últimas Decisiones
+        </Typography>
+        {decisiones.length === 0 ? (
+          <Typography variant="body2" color="text.secondary">
+            Esperando nuevas solicitudes...
+          </Typography>
+        ) : (
+          <Box sx={{ overflowX: 'auto' }}>
+            <table style={{ width: '100%', borderCollapse: 'collapse' }}>
+              <thead>
+                <tr style={{ backgroundColor: '#f5f5f5' }}>
+                  <th style={{ padding: '12px', textAlign: 'left', borderBottom: '2px solid #ddd' }}>
+                    Solicitud
+                  </th>
+                  <th style={{ padding: '12px', textAlign: 'left', borderBottom: '2px solid #ddd' }}>
+                    Sucursal
+                  </th>
+                  <th style={{ padding: '12px', textAlign: 'center', borderBottom: '2px solid #ddd' }}>
+                    Score
+                  </th>
+                  <th style={{ padding: '12px', textAlign: 'right', borderBottom: '2px solid #ddd' }}>
+                    Monto
+                  </th>
+                  <th style={{ padding: '12px', textAlign: 'center', borderBottom: '2px solid #ddd' }}>
+                    Estado
+                  </th>
+                </tr>
+              </thead>
+              <tbody>
+                {decisiones.map((decision) => (
+                  <tr key={decision.id}>
+                    <td style={{ padding: '12px', borderBottom: '1px solid #ddd' }}>
+                      #{decision.id}
+                    </td>
+                    <td style={{ padding: '12px', borderBottom: '1px solid #ddd' }}>
+                      {indicadores.por_sucursal.find((s) => s.sucursal_id === decision.sucursal_id)
+                        ?.sucursal_nombre ?? decision.sucursal_id}
+                    </td>
+                    <td style={{ padding: '12px', textAlign: 'center', borderBottom: '1px solid #ddd' }}>
+                      {decision.score_crediticio}
+                    </td>
+                    <td style={{ padding: '12px', textAlign: 'right', borderBottom: '1px solid #ddd' }}>
+                      ${Number(decision.monto_solicitado).toLocaleString('es-MX', {
+                        minimumFractionDigits: 2,
+                        maximumFractionDigits: 2,
+                      })}
+                    </td>
+                    <td
+                      style={{
+                        padding: '12px',
+                        textAlign: 'center',
+                        borderBottom: '1px solid #ddd',
+                        color: decision.estado === 'aprobado' ? '#4caf50' : '#f44336',
+                      }}
+                    >
+                      {decision.estado === 'aprobado' ? 'Aprobada' : 'Rechazada'}
+                    </td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          </Box>
+        )}
+      </Paper>
+
       {/* Tabla de sucursales */}
       <Paper sx={{ p: 3, mt: 3 }}>
         <Typography variant="h6" gutterBottom>
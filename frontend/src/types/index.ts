@@ -28,6 +28,18 @@ export interface SolicitudCreate {
   sucursal_id: number;
 }
 
+export interface OpcionContraoferta {
+  plazo_meses: number;
+  monto_maximo: number;
+  cuota_mensual: number;
+}
+
+export interface Contraoferta {
+  monto_maximo?: number;
+  plazo_minimo?: number;
+  opciones: OpcionContraoferta[];
+}
+
 export interface SolicitudResponse {
   id: number;
   cliente_id: number;
@@ -49,6 +61,29 @@ export interface SolicitudResponse {
   tasa_interes_anual?: number;
   total_a_pagar?: number;
   total_intereses?: number;
+  // Solo en rechazos: condiciones que sí serían aprobadas
+  contraoferta?: Contraoferta;
+}
+
+export interface PrecalificacionRequest {
+  fecha_nacimiento: string;
+  monto_solicitado: number;
+  ingreso_mensual: number;
+  score_crediticio: number;
+  tiene_tarjeta_credito: boolean;
+  tiene_credito_automotriz: boolean;
+  plazo_meses: number;
+}
+
+export interface PrecalificacionResponse {
+  aprobado: boolean;
+  motivo_rechazo?: string;
+  cuota_mensual?: number;
+  tasa_interes_anual?: number;
+  total_a_pagar?: number;
+  total_intereses?: number;
+  contraoferta?: Contraoferta;
+  version_reglas: string;
 }
 
 export interface LoginRequest {
@@ -90,8 +125,34 @@ export interface IndicadoresGenerales {
   por_sucursal: IndicadoresPorSucursal[];
 }
 
+// Eventos en vivo de GET /api/indicadores/eventos
+export interface DecisionEvento {
+  id: number;
+  sucursal_id: number;
+  estado: 'aprobado' | 'rechazado';
+  monto_solicitado: number;
+  score_crediticio: number;
+}
+
+export interface DeltaSucursal {
+  sucursal_id: number;
+  total_solicitudes: number;
+  aprobadas: number;
+  rechazadas: number;
+  monto_solicitado: number;
+  monto_aprobado: number;
+  suma_score: number;
+}
+
+export interface ActualizacionIndicadores {
+  decisiones: DecisionEvento[];
+  delta: DeltaSucursal[];
+}
+
 export interface SimulacionRequest {
   cantidad: number;
+  // Solicitudes incluidas en la respuesta (por defecto todas)
+  detalle?: 'none' | 'sample' | 'full';
 }
 
 export interface SimulacionResponse {